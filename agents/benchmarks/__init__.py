@@ -0,0 +1 @@
+"""Benchmarks of the agents app, run as modules from the agents directory with src on the PYTHONPATH."""
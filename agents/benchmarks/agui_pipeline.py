@@ -0,0 +1,183 @@
+"""Benchmark of the AG-UI pipeline on synthetic Agno streams: the mapper, the encoders and the /agui route.
+
+Run from the agents directory:
+
+    PYTHONPATH=src python -m benchmarks.agui_pipeline
+    PYTHONPATH=src python -m benchmarks.agui_pipeline --save-baseline
+
+Exits with status 1 if a benchmark regressed against the stored baseline. The baseline holds no timings, only ratios
+measured on the same machine: the events/s of each benchmark over those of the stock ag-ui encoder on the same
+scenario, external code our changes don't speed up or slow down, and its p99 over its p50. It carries over between
+machines, still compare on a quiet one.
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+from ag_ui.core import BaseEvent
+from fastapi import FastAPI
+
+from benchmarks.common import (
+    BenchmarkResult,
+    async_time_events,
+    find_regressions,
+    load_baseline,
+    measure,
+    print_results,
+    relative_results,
+    save_baseline,
+    time_events,
+)
+from benchmarks.synthetic import SCENARIOS, Chunk, SyntheticRunner, build_scenario
+from lib.app.agui.async_router import get_async_agui_router
+from lib.app.agui.encoder import AGUIEventEncoder, FastSSEEventEncoder, SSEEventEncoder
+from lib.app.agui.utils import async_stream_agno_response_as_agui_events, stream_agno_response_as_agui_events
+
+BASELINE_PATH = Path(__file__).parent / "baseline.json"
+
+# The benchmark the others are measured against, on the same scenario
+REFERENCE_BENCHMARK = "encoder_stock"
+
+RUN_INPUT = (
+    b'{"threadId":"benchmark","runId":"benchmark","state":{},"tools":[],"context":[],"forwardedProps":{},'
+    b'"messages":[{"id":"1","role":"user","content":"How is AAPL doing?"}]}'
+)
+
+
+async def _replay(chunks: List[Chunk]):
+    for chunk in chunks:
+        yield chunk
+
+
+def bench_mapper_sync(chunks: List[Chunk]) -> Callable[[], List[int]]:
+    return lambda: time_events(stream_agno_response_as_agui_events(iter(chunks)))
+
+
+def bench_mapper_async(chunks: List[Chunk]) -> Callable[[], List[int]]:
+    return lambda: asyncio.run(async_time_events(async_stream_agno_response_as_agui_events(_replay(chunks))))
+
+
+def _bench_encoder(chunks: List[Chunk], encoder: AGUIEventEncoder) -> Callable[[], List[int]]:
+    events: List[BaseEvent] = list(stream_agno_response_as_agui_events(iter(chunks)))
+
+    def run_once() -> List[int]:
+        latencies = []
+        for event in events:
+            start = time.perf_counter_ns()
+            encoder.encode(event)
+            latencies.append(time.perf_counter_ns() - start)
+        return latencies
+
+    return run_once
+
+
+def bench_encoder(chunks: List[Chunk]) -> Callable[[], List[int]]:
+    return _bench_encoder(chunks, FastSSEEventEncoder())
+
+
+def bench_encoder_stock(chunks: List[Chunk]) -> Callable[[], List[int]]:
+    """The reference ag-ui EventEncoder, which the fast encoder falls back to, for comparison."""
+    return _bench_encoder(chunks, SSEEventEncoder())
+
+
+async def post_agui(app: FastAPI, body: bytes) -> List[int]:
+    """Post the run to the app in process, returning the nanoseconds each SSE frame took to arrive."""
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0", "spec_version": "2.4"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": "/agui",
+        "raw_path": b"/agui",
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        "client": ("127.0.0.1", 50000),
+        "server": ("127.0.0.1", 8000),
+    }
+    messages = [{"type": "http.request", "body": body, "more_body": False}]
+    latencies: List[int] = []
+    last = time.perf_counter_ns()
+
+    async def receive():
+        if messages:
+            return messages.pop()
+        # The client never disconnects
+        await asyncio.Event().wait()
+
+    async def send(message):
+        nonlocal last
+        if message["type"] == "http.response.body" and message.get("body"):
+            now = time.perf_counter_ns()
+            latencies.append(now - last)
+            last = now
+
+    await app(scope, receive, send)
+    return latencies
+
+
+def bench_route(chunks: List[Chunk]) -> Callable[[], List[int]]:
+    app = FastAPI()
+    app.include_router(get_async_agui_router(agent=SyntheticRunner(chunks)))  # type: ignore
+    return lambda: asyncio.run(post_agui(app, RUN_INPUT))
+
+
+BENCHMARKS: Dict[str, Callable[[List[Chunk]], Callable[[], List[int]]]] = {
+    "mapper_sync": bench_mapper_sync,
+    "mapper_async": bench_mapper_async,
+    "encoder": bench_encoder,
+    "encoder_stock": bench_encoder_stock,
+    "route": bench_route,
+}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--benchmark", choices=list(BENCHMARKS), action="append", help="Benchmarks to run")
+    parser.add_argument("--scenario", choices=list(SCENARIOS), action="append", help="Scenarios to run")
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="Store the results as the new baseline")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.25, help="Allowed drop of the relative events/s, as a fraction"
+    )
+    parser.add_argument("--p99-tolerance", type=float, default=0.5, help="Allowed rise of p99 over p50, as a fraction")
+    args = parser.parse_args()
+
+    results: List[BenchmarkResult] = []
+    references: Dict[str, BenchmarkResult] = {}
+    for scenario in args.scenario or list(SCENARIOS):
+        chunks = build_scenario(scenario)
+        scenario_results = []
+        for benchmark in args.benchmark or list(BENCHMARKS):
+            run_once = BENCHMARKS[benchmark](chunks)
+            scenario_results.append(measure(f"{benchmark}/{scenario}", run_once, iterations=args.iterations))
+        reference_name = f"{REFERENCE_BENCHMARK}/{scenario}"
+        reference = next((result for result in scenario_results if result.name == reference_name), None)
+        if reference is None:
+            reference = measure(reference_name, BENCHMARKS[REFERENCE_BENCHMARK](chunks), iterations=args.iterations)
+        references.update({result.name: reference for result in scenario_results})
+        results.extend(scenario_results)
+    relative = relative_results(results, references)
+
+    if args.save_baseline:
+        save_baseline(args.baseline, relative)
+        print_results(results)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    baseline = load_baseline(args.baseline)
+    print_results(results, baseline, relative)
+    regressions = find_regressions(relative, baseline, args.tolerance, args.p99_tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
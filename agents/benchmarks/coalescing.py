@@ -0,0 +1,126 @@
+"""Benchmark of the text delta coalescing: the SSE frames of the runs and the server CPU time spent sending them.
+
+Run from the agents directory:
+
+    PYTHONPATH=src python -m benchmarks.coalescing --scenario long_text --chunk-delay 0.002
+
+The async router is served by uvicorn from a separate process, once without and once with coalescing, its runs
+replaying the synthetic chunks with a delay before each of them, like a model streaming its response. Clients stream
+the runs concurrently over HTTP. Reports the frames and bytes of a run, the frames per second sent by the server, and
+the CPU time of the server per run, mapping, coalescing, encoding and socket writes included.
+"""
+
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+from typing import Optional, Tuple
+
+import httpx
+import uvicorn
+from fastapi import FastAPI
+
+from benchmarks.load_test import wait_until_ready
+from benchmarks.synthetic import SCENARIOS, SyntheticRunner, build_scenario
+from lib.app.agui.async_router import get_async_agui_router
+from lib.app.agui.utils import TextCoalescingConfig
+
+RUN_INPUT = (
+    '{{"threadId":"{run_id}","runId":"{run_id}","state":{{}},"tools":[],"context":[],"forwardedProps":{{}},'
+    '"messages":[{{"id":"1","role":"user","content":"How is AAPL doing?"}}]}}'
+)
+
+
+def serve(args: argparse.Namespace) -> None:
+    text_coalescing = None
+    if args.coalescing:
+        text_coalescing = TextCoalescingConfig(max_bytes=args.max_bytes, max_latency=args.max_latency)
+    runner = SyntheticRunner(build_scenario(args.scenario), chunk_delay=args.chunk_delay)
+    app = FastAPI()
+    app.include_router(get_async_agui_router(agent=runner, text_coalescing=text_coalescing))  # type: ignore
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+def read_cpu_seconds(pid: int) -> float:
+    """User and system CPU time of the process."""
+    with open(f"/proc/{pid}/stat") as stat:
+        # The fields after the command name, which may contain spaces
+        fields = stat.read().rpartition(")")[2].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+async def stream_runs(base_url: str, runs: int, clients: int) -> Tuple[int, int, float]:
+    """Stream the runs, returning their frames, bytes and the wall time in seconds."""
+    frames = size = 0
+    pending = iter(range(runs))
+
+    async def client_loop(client: httpx.AsyncClient) -> None:
+        nonlocal frames, size
+        for run in pending:
+            body = RUN_INPUT.format(run_id=f"run_{run}")
+            headers = {"Content-Type": "application/json"}
+            async with client.stream("POST", f"{base_url}/agui", content=body, headers=headers) as response:
+                async for chunk in response.aiter_bytes():
+                    frames += chunk.count(b"\n\n")
+                    size += len(chunk)
+
+    start = time.perf_counter()
+    async with httpx.AsyncClient(timeout=None) as client:
+        await asyncio.gather(*(client_loop(client) for _ in range(clients)))
+    return frames, size, time.perf_counter() - start
+
+
+def measure(args: argparse.Namespace, coalescing: bool) -> Tuple[int, int, float, float]:
+    """Serve and stream the runs, returning the frames and bytes per run, frames/s and server CPU ms per run."""
+    command = [sys.executable, "-m", "benchmarks.coalescing", "--serve", "--port", str(args.port)]
+    command += ["--scenario", args.scenario, "--chunk-delay", str(args.chunk_delay)]
+    command += ["--max-bytes", str(args.max_bytes), "--max-latency", str(args.max_latency)]
+    if coalescing:
+        command.append("--coalescing")
+    server = subprocess.Popen(command, env=os.environ.copy())
+    base_url = f"http://127.0.0.1:{args.port}"
+    try:
+        asyncio.run(wait_until_ready(base_url, server))
+        cpu_start = read_cpu_seconds(server.pid)
+        frames, size, wall_time = asyncio.run(stream_runs(base_url, args.runs, args.clients))
+        cpu_ms = (read_cpu_seconds(server.pid) - cpu_start) * 1000
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+    return frames // args.runs, size // args.runs, frames / wall_time, cpu_ms / args.runs
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", choices=list(SCENARIOS), default="long_text")
+    parser.add_argument("--chunk-delay", type=float, default=0.002, help="Seconds before each chunk")
+    parser.add_argument("--max-latency", type=float, default=0.05, help="Coalescing window, in seconds")
+    parser.add_argument("--max-bytes", type=int, default=2048)
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--clients", type=int, default=10, help="Concurrent streaming clients")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--coalescing", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args)
+        return 0
+
+    print(f"{args.scenario}: {args.runs} runs by {args.clients} clients, chunks {args.chunk_delay * 1000:g}ms apart")
+    print(f"{'coalescing':<12} {'frames':>8} {'bytes':>10} {'frames/s':>10} {'CPU ms/run':>11} {'CPU saved':>10}")
+    reference_cpu_ms: Optional[float] = None
+    for name, coalescing in (("off", False), ("on", True)):
+        frames, size, frames_per_second, cpu_ms = measure(args, coalescing)
+        reference_cpu_ms = reference_cpu_ms or cpu_ms
+        print(
+            f"{name:<12} {frames:>8,} {size:>10,} {frames_per_second:>10,.0f} {cpu_ms:>11.1f} "
+            f"{1 - cpu_ms / reference_cpu_ms:>10.0%}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
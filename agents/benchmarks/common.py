@@ -0,0 +1,159 @@
+"""Measurement, reporting and baseline comparison shared by the benchmarks."""
+
+import json
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import AsyncIterable, Callable, Dict, Iterable, List, Optional
+
+
+@dataclass
+class BenchmarkResult:
+    name: str
+    events: int  # Events per iteration
+    events_per_sec: float  # Of the fastest iteration
+    p50_us: float  # Per-event latency percentiles, in microseconds
+    p99_us: float
+    peak_alloc_kib: float  # Peak of the memory allocated during one iteration
+
+    def to_dict(self) -> Dict[str, object]:
+        return asdict(self)
+
+
+def percentile(values: List[int], q: float) -> float:
+    """Nearest-rank percentile of the values, q between 0 and 100."""
+    ordered = sorted(values)
+    index = min(max(round(q / 100 * len(ordered)) - 1, 0), len(ordered) - 1)
+    return ordered[index]
+
+
+def time_events(events: Iterable[object]) -> List[int]:
+    """Consume the events, returning the nanoseconds each of them took to arrive."""
+    latencies = []
+    last = time.perf_counter_ns()
+    for _ in events:
+        now = time.perf_counter_ns()
+        latencies.append(now - last)
+        last = now
+    return latencies
+
+
+async def async_time_events(events: AsyncIterable[object]) -> List[int]:
+    """Consume the events, returning the nanoseconds each of them took to arrive."""
+    latencies = []
+    last = time.perf_counter_ns()
+    async for _ in events:
+        now = time.perf_counter_ns()
+        latencies.append(now - last)
+        last = now
+    return latencies
+
+
+def measure(name: str, run_once: Callable[[], List[int]], iterations: int = 20, warmup: int = 2) -> BenchmarkResult:
+    """Run the benchmark, each run returning the per-event latencies in nanoseconds.
+
+    Allocations are measured on a separate run, tracemalloc slows everything down.
+    """
+    for _ in range(warmup):
+        run_once()
+
+    latencies: List[int] = []
+    fastest_ns = None
+    for _ in range(iterations):
+        run_latencies = run_once()
+        latencies.extend(run_latencies)
+        # The fastest run is the least disturbed by the rest of the machine
+        run_ns = sum(run_latencies)
+        fastest_ns = run_ns if fastest_ns is None else min(fastest_ns, run_ns)
+
+    tracemalloc.start()
+    try:
+        run_once()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    events = len(latencies) // iterations
+    return BenchmarkResult(
+        name=name,
+        events=events,
+        events_per_sec=events / fastest_ns * 1e9 if fastest_ns else 0.0,
+        p50_us=percentile(latencies, 50) / 1000,
+        p99_us=percentile(latencies, 99) / 1000,
+        peak_alloc_kib=peak / 1024,
+    )
+
+
+def relative_results(
+    results: List[BenchmarkResult], references: Dict[str, BenchmarkResult]
+) -> Dict[str, Dict[str, float]]:
+    """Ratios of the results that don't depend on the speed of the machine, the form the baseline is stored in.
+
+    Args:
+        results (List[BenchmarkResult]): The results to compare.
+        references (Dict[str, BenchmarkResult]): The reference of each result, by result name, measured alongside it.
+
+    Returns:
+        Dict[str, Dict[str, float]]: By result name, the speed, i.e. its events/s over those of its reference, and the
+            tail, i.e. its p99 over its p50.
+    """
+    return {
+        result.name: {
+            "speed": result.events_per_sec / references[result.name].events_per_sec,
+            "tail": result.p99_us / result.p50_us if result.p50_us else 0.0,
+        }
+        for result in results
+    }
+
+
+def load_baseline(path: Path) -> Dict[str, Dict[str, float]]:
+    if not path.exists():
+        return {}
+    return json.loads(path.read_text())
+
+
+def save_baseline(path: Path, relative: Dict[str, Dict[str, float]]) -> None:
+    baseline = load_baseline(path)
+    for name, ratios in relative.items():
+        baseline[name] = {key: round(value, 3) for key, value in ratios.items()}
+    path.write_text(json.dumps(baseline, indent=2, sort_keys=True) + "\n")
+
+
+def find_regressions(
+    relative: Dict[str, Dict[str, float]],
+    baseline: Dict[str, Dict[str, float]],
+    tolerance: float,
+    p99_tolerance: float,
+) -> List[str]:
+    """Describe the relative results worse than the baseline by more than the tolerances, fractions of the baseline."""
+    regressions = []
+    for name, ratios in relative.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if ratios["speed"] < base["speed"] * (1 - tolerance):
+            regressions.append(f"{name}: {ratios['speed']:.2f}x the reference events/s, baseline {base['speed']:.2f}x")
+        if ratios["tail"] > base["tail"] * (1 + p99_tolerance):
+            regressions.append(f"{name}: p99 {ratios['tail']:.1f}x the p50, baseline {base['tail']:.1f}x")
+    return regressions
+
+
+def print_results(
+    results: List[BenchmarkResult],
+    baseline: Optional[Dict[str, Dict[str, float]]] = None,
+    relative: Optional[Dict[str, Dict[str, float]]] = None,
+) -> None:
+    header = f"{'benchmark':<28} {'events':>7} {'events/s':>12} {'p50 us':>8} {'p99 us':>8} {'peak KiB':>9}"
+    if baseline and relative:
+        header += f" {'vs base':>8}"
+    print(header)
+    for result in results:
+        line = (
+            f"{result.name:<28} {result.events:>7} {result.events_per_sec:>12,.0f} {result.p50_us:>8.2f} "
+            f"{result.p99_us:>8.2f} {result.peak_alloc_kib:>9.1f}"
+        )
+        base = (baseline or {}).get(result.name)
+        if base and relative:
+            line += f" {relative[result.name]['speed'] / base['speed'] - 1:>+8.1%}"
+        print(line)
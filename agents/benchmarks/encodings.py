@@ -0,0 +1,69 @@
+"""Benchmark of the AG-UI encodings on the same synthetic run: JSON SSE against protobuf.
+
+Run from the agents directory:
+
+    PYTHONPATH=src python -m benchmarks.encodings --scenario team
+
+The events of the run are mapped once, then encoded by each encoder. Reports the size of the stream, raw and gzipped
+as a compressing proxy would send it, and the CPU time spent encoding each event, the fastest of the iterations.
+"""
+
+import argparse
+import gzip
+import sys
+import time
+import uuid
+from typing import List
+
+from ag_ui.core import BaseEvent, EventType, RunFinishedEvent, RunStartedEvent
+
+from benchmarks.synthetic import SCENARIOS, build_scenario
+from lib.app.agui.encoder import AGUIEventEncoder, FastSSEEventEncoder, ProtobufEventEncoder, SSEEventEncoder
+from lib.app.agui.utils import stream_agno_response_as_agui_events
+
+
+def build_events(scenario: str) -> List[BaseEvent]:
+    thread_id, run_id = str(uuid.uuid4()), str(uuid.uuid4())
+    return [
+        RunStartedEvent(type=EventType.RUN_STARTED, thread_id=thread_id, run_id=run_id),
+        *stream_agno_response_as_agui_events(iter(build_scenario(scenario))),
+        RunFinishedEvent(type=EventType.RUN_FINISHED, thread_id=thread_id, run_id=run_id),
+    ]
+
+
+def measure_encoder(name: str, encoder: AGUIEventEncoder, events: List[BaseEvent], iterations: int) -> None:
+    fastest_ns = None
+    frames: List[bytes] = []
+    for _ in range(iterations):
+        start = time.process_time_ns()
+        frames = [encoder.encode(event) for event in events]
+        elapsed_ns = time.process_time_ns() - start
+        fastest_ns = elapsed_ns if fastest_ns is None else min(fastest_ns, elapsed_ns)
+
+    stream = b"".join(frames)
+    print(
+        f"{name:<16} {len(stream):>10,} {len(stream) / len(events):>10.1f} {len(gzip.compress(stream)):>10,} "
+        f"{(fastest_ns or 0) / len(events) / 1000:>10.2f}"
+    )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", choices=list(SCENARIOS), default="team")
+    parser.add_argument("--iterations", type=int, default=50)
+    args = parser.parse_args()
+
+    events = build_events(args.scenario)
+    print(f"{args.scenario}: {len(events)} events")
+    print(f"{'encoding':<16} {'bytes':>10} {'B/event':>10} {'gzipped':>10} {'us/event':>10}")
+    for name, encoder in (
+        ("sse (reference)", SSEEventEncoder()),
+        ("sse", FastSSEEventEncoder()),
+        ("protobuf", ProtobufEventEncoder()),
+    ):
+        measure_encoder(name, encoder, events, args.iterations)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
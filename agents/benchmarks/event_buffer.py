@@ -0,0 +1,71 @@
+"""Micro-benchmark of the events held back by blocking tool calls, against the number of events they hold.
+
+Run from the agents directory:
+
+    PYTHONPATH=src python -m benchmarks.event_buffer
+
+Each run starts tool calls, holds text deltas behind them and ends the tool calls, in two shapes: one tool call
+holding every delta, and parallel tool calls started together, ending one after the other, so the held deltas are
+flushed then held again by the next tool call. Reports the nanoseconds per routed event, which stay flat as the held
+events grow if each flush only drains the events of the tool call that ended.
+"""
+
+import argparse
+import sys
+import time
+from typing import List
+
+from ag_ui.core import BaseEvent
+
+from lib.app.agui.events import text_message_content, tool_call_end, tool_call_start
+from lib.app.agui.utils import EventBuffer, _emit_event_logic
+
+
+def single_tool_call(held: int) -> List[BaseEvent]:
+    events: List[BaseEvent] = [tool_call_start(tool_call_id="call_0", tool_call_name="tool")]
+    events += [text_message_content(message_id="message", delta=str(index)) for index in range(held)]
+    events.append(tool_call_end(tool_call_id="call_0"))
+    return events
+
+
+def parallel_tool_calls(held: int, tool_calls: int) -> List[BaseEvent]:
+    events: List[BaseEvent] = []
+    for tool_call in range(tool_calls):
+        events.append(tool_call_start(tool_call_id=f"call_{tool_call}", tool_call_name="tool"))
+        events += [text_message_content(message_id="message", delta=str(index)) for index in range(held // tool_calls)]
+    events += [tool_call_end(tool_call_id=f"call_{tool_call}") for tool_call in range(tool_calls)]
+    return events
+
+
+def time_run(events: List[BaseEvent], repeat: int) -> float:
+    """Nanoseconds per event of the fastest run."""
+    fastest_ns = None
+    for _ in range(repeat):
+        event_buffer = EventBuffer()
+        emitted: List[BaseEvent] = []
+        start = time.perf_counter_ns()
+        for event in events:
+            _emit_event_logic(event, event_buffer, emitted)
+        elapsed_ns = time.perf_counter_ns() - start
+        assert len(emitted) == len(events)
+        fastest_ns = elapsed_ns if fastest_ns is None else min(fastest_ns, elapsed_ns)
+    return fastest_ns / len(events)  # type: ignore
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--held", type=int, action="append", help="Events held back by the tool calls")
+    parser.add_argument("--tool-calls", type=int, default=4, help="Parallel tool calls")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'held':>8} {'1 tool call ns/event':>22} {f'{args.tool_calls} tool calls ns/event':>22}")
+    for held in args.held or [10, 100, 1000, 10000]:
+        single = time_run(single_tool_call(held), args.repeat)
+        parallel = time_run(parallel_tool_calls(held, args.tool_calls), args.repeat)
+        print(f"{held:>8,} {single:>22,.0f} {parallel:>22,.0f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,99 @@
+"""Benchmark of the history passed to the runs against the thread length: its size, and the cost of preparing it.
+
+Run from the agents directory:
+
+    PYTHONPATH=src python -m benchmarks.history
+
+Every thread is replayed turn by turn, each turn resending the whole thread like CopilotKit does, so the message
+cache and the cached summaries are in their steady state. Reports the estimated prompt tokens of the last turn and
+the average time to prepare the messages of the last turns.
+"""
+
+import argparse
+import random
+import sys
+import time
+from typing import Callable, List, Optional, Tuple
+
+from ag_ui.core import AssistantMessage, RunAgentInput, UserMessage
+from ag_ui.core.types import Message as AGUIMessage
+
+from agno.models.message import Message
+from benchmarks.synthetic import WORDS
+from lib.app.agui.history import HistoryCompactor, HistoryWindowConfig, estimate_message_tokens
+from lib.app.agui.utils import AGUIMessageCache, prepare_agno_messages
+
+
+def build_thread(turns: int, seed: int = 0) -> List[AGUIMessage]:
+    rng = random.Random(seed)
+    messages: List[AGUIMessage] = []
+    for turn in range(turns):
+        question = " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 30)))
+        answer = " ".join(rng.choice(WORDS) for _ in range(rng.randint(150, 400)))
+        messages.append(UserMessage(id=f"user_{turn}", role="user", content=question))
+        messages.append(AssistantMessage(id=f"assistant_{turn}", role="assistant", content=answer))
+    return messages
+
+
+def replay(
+    thread: List[AGUIMessage],
+    prepare: Callable[[RunAgentInput], List[Message]],
+    timed_turns: int,
+) -> Tuple[float, int]:
+    """Replay the thread, returning the average microseconds of the last timed_turns and the last turn's tokens."""
+    # Build the inputs up front, parsing the request isn't part of the preparation
+    inputs = [
+        RunAgentInput(
+            thread_id="benchmark",
+            run_id=f"run_{end}",
+            state={},
+            messages=thread[: end + 1],
+            tools=[],
+            context=[],
+            forwarded_props={},
+        )
+        for end in range(0, len(thread), 2)
+    ]
+    elapsed_ns = 0
+    messages: List[Message] = []
+    for index, run_input in enumerate(inputs):
+        start = time.perf_counter_ns()
+        messages = prepare(run_input)
+        if index >= len(inputs) - timed_turns:
+            elapsed_ns += time.perf_counter_ns() - start
+    tokens = sum(estimate_message_tokens(message) for message in messages)
+    return elapsed_ns / min(timed_turns, len(inputs)) / 1000, tokens
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, action="append", help="Thread lengths, in turns")
+    parser.add_argument("--max-tokens", type=int, default=8000, help="Token budget of the history")
+    parser.add_argument("--timed-turns", type=int, default=10)
+    args = parser.parse_args()
+
+    print(f"{'turns':>6} {'preparation':<22} {'tokens':>8} {'us/turn':>10}")
+    for turns in args.turns or [10, 50, 200, 500]:
+        thread = build_thread(turns)
+        message_cache: Optional[AGUIMessageCache] = None
+        compactor: Optional[HistoryCompactor] = None
+
+        def full(run_input: RunAgentInput) -> List[Message]:
+            return prepare_agno_messages(run_input)
+
+        def cached(run_input: RunAgentInput) -> List[Message]:
+            return prepare_agno_messages(run_input, message_cache)
+
+        def compacted(run_input: RunAgentInput) -> List[Message]:
+            return prepare_agno_messages(run_input, message_cache, history_compactor=compactor)
+
+        for name, prepare in (("full", full), ("message cache", cached), ("cache + compaction", compacted)):
+            message_cache = AGUIMessageCache()
+            compactor = HistoryCompactor(HistoryWindowConfig(max_tokens=args.max_tokens))
+            microseconds, tokens = replay(thread, prepare, args.timed_turns)
+            print(f"{turns:>6} {name:<22} {tokens:>8} {microseconds:>10.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,267 @@
+"""Offline load test of the /agui route, the agents in src/agents running on stub models and tools.
+
+Run from the agents directory:
+
+    PYTHONPATH=src python -m benchmarks.load_test --clients 200 --runs 1000
+
+The app from main.create_app is served by a separate process, so its RSS can be sampled, and every client streams
+its runs over HTTP. The AGUI_* variables configure the served app like they configure main.py.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+import uuid
+from dataclasses import asdict, dataclass, field
+from typing import List, Optional, Tuple
+
+import httpx
+import uvicorn
+
+from benchmarks.common import percentile
+from benchmarks.stub_model import StubModel, StubToolBehaviour, use_stub_model
+
+
+@dataclass
+class StubConfig:
+    """Behaviour of the stub models and tools of the served app."""
+
+    tokens_per_second: float = 50.0
+    response_tokens: int = 120
+    first_token_latency: float = 0.4
+    latency_sigma: float = 0.5
+    tool_call_probability: float = 1.0
+    max_tool_calls: int = 1
+    error_rate: float = 0.0  # Per model response, a Team run makes several of them
+    tool_latency: float = 0.2
+    tool_error_rate: float = 0.0
+    tool_result_bytes: int = 512
+    seed: Optional[int] = None
+
+
+@dataclass
+class RunResult:
+    started_at: float
+    time_to_first_byte: Optional[float] = None
+    time_to_first_token: Optional[float] = None
+    duration: float = 0.0
+    events: int = 0
+    error: Optional[str] = None
+
+
+@dataclass
+class LoadTestReport:
+    runs: List[RunResult] = field(default_factory=list)
+    rss_samples: List[Tuple[float, float]] = field(default_factory=list)  # (seconds since start, RSS in MiB)
+    duration: float = 0.0
+
+
+def serve(config: StubConfig, host: str, port: int) -> None:
+    """Serve the app of main.py, with its agents switched to the stub models and tools."""
+    from agents.investment_advisor_team import investment_advisor_team
+
+    def model_factory() -> StubModel:
+        return StubModel(
+            tokens_per_second=config.tokens_per_second,
+            response_tokens=config.response_tokens,
+            first_token_latency=config.first_token_latency,
+            latency_sigma=config.latency_sigma,
+            tool_call_probability=config.tool_call_probability,
+            max_tool_calls=config.max_tool_calls,
+            error_rate=config.error_rate,
+            seed=config.seed,
+        )
+
+    tool_behaviour = StubToolBehaviour(
+        latency=config.tool_latency,
+        latency_sigma=config.latency_sigma,
+        error_rate=config.tool_error_rate,
+        result_bytes=config.tool_result_bytes,
+        seed=config.seed,
+    )
+    use_stub_model(investment_advisor_team, model_factory, tool_behaviour)
+
+    from main import create_app
+
+    uvicorn.run(create_app(), host=host, port=port, log_level="warning")
+
+
+def read_rss_mib(pid: int) -> Optional[float]:
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+async def stream_run(client: httpx.AsyncClient, url: str, prompt: str) -> RunResult:
+    run_id = str(uuid.uuid4())
+    body = {
+        "threadId": str(uuid.uuid4()),
+        "runId": run_id,
+        "state": {},
+        "tools": [],
+        "context": [],
+        "forwardedProps": {},
+        "messages": [{"id": str(uuid.uuid4()), "role": "user", "content": prompt}],
+    }
+    result = RunResult(started_at=time.perf_counter())
+    try:
+        async with client.stream("POST", url, json=body) as response:
+            if response.status_code != 200:
+                await response.aread()
+                result.error = f"HTTP {response.status_code}"
+                return result
+            async for line in response.aiter_lines():
+                if not line.startswith("data: "):
+                    continue
+                elapsed = time.perf_counter() - result.started_at
+                result.events += 1
+                if result.time_to_first_byte is None:
+                    result.time_to_first_byte = elapsed
+                event_type = json.loads(line[6:]).get("type")
+                if event_type == "TEXT_MESSAGE_CONTENT" and result.time_to_first_token is None:
+                    result.time_to_first_token = elapsed
+                elif event_type == "RUN_ERROR":
+                    result.error = "RUN_ERROR"
+    except httpx.HTTPError as e:
+        result.error = type(e).__name__
+    finally:
+        result.duration = time.perf_counter() - result.started_at
+    return result
+
+
+async def run_load(
+    base_url: str,
+    clients: int,
+    runs: int,
+    prompt: str,
+    server_pid: Optional[int],
+    rss_interval: float = 1.0,
+) -> LoadTestReport:
+    report = LoadTestReport()
+    remaining = iter(range(runs))
+    started_at = time.perf_counter()
+
+    async def client_loop(client: httpx.AsyncClient) -> None:
+        for _ in remaining:
+            report.runs.append(await stream_run(client, f"{base_url}/agui", prompt))
+
+    async def sample_rss() -> None:
+        while server_pid is not None:
+            rss = read_rss_mib(server_pid)
+            if rss is not None:
+                report.rss_samples.append((time.perf_counter() - started_at, rss))
+            await asyncio.sleep(rss_interval)
+
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+    timeout = httpx.Timeout(connect=30, read=300, write=30, pool=None)
+    async with httpx.AsyncClient(limits=limits, timeout=timeout) as client:
+        sampler = asyncio.create_task(sample_rss())
+        await asyncio.gather(*(client_loop(client) for _ in range(clients)))
+        sampler.cancel()
+    report.duration = time.perf_counter() - started_at
+    return report
+
+
+def format_distribution(values: List[float]) -> str:
+    if not values:
+        return "n/a"
+    milliseconds = [value * 1000 for value in values]
+    return (
+        f"p50 {percentile(milliseconds, 50):8.1f} ms  p90 {percentile(milliseconds, 90):8.1f} ms  "
+        f"p99 {percentile(milliseconds, 99):8.1f} ms  max {max(milliseconds):8.1f} ms"
+    )
+
+
+def print_report(report: LoadTestReport, clients: int) -> None:
+    runs = report.runs
+    failed = [run for run in runs if run.error is not None]
+    succeeded = [run for run in runs if run.error is None]
+    print(f"clients        {clients}")
+    print(f"runs           {len(runs)} in {report.duration:.1f}s, {len(runs) / report.duration:.2f} runs/s")
+    print(f"events         {sum(run.events for run in runs) / report.duration:,.0f} events/s")
+    print(f"errors         {len(failed)} ({len(failed) / max(len(runs), 1):.1%})")
+    errors = sorted({run.error for run in failed if run.error})
+    for error in errors:
+        print(f"  {error:<12} {sum(run.error == error for run in failed)}")
+    first_bytes = [run.time_to_first_byte for run in runs if run.time_to_first_byte is not None]
+    first_tokens = [run.time_to_first_token for run in succeeded if run.time_to_first_token is not None]
+    print(f"first byte     {format_distribution(first_bytes)}")
+    print(f"first token    {format_distribution(first_tokens)}")
+    print(f"run duration   {format_distribution([run.duration for run in succeeded])}")
+    if report.rss_samples:
+        start, end = report.rss_samples[0][1], report.rss_samples[-1][1]
+        peak = max(rss for _, rss in report.rss_samples)
+        print(f"server RSS     start {start:.0f} MiB  peak {peak:.0f} MiB  end {end:.0f} MiB")
+        step = max(len(report.rss_samples) // 20, 1)
+        print("  " + "  ".join(f"{elapsed:.0f}s:{rss:.0f}" for elapsed, rss in report.rss_samples[::step]))
+
+
+async def wait_until_ready(base_url: str, server: subprocess.Popen, timeout: float = 60) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise RuntimeError(f"The server exited with status {server.returncode}")
+            try:
+                if (await client.get(f"{base_url}/status")).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.2)
+    raise TimeoutError(f"The server was not ready within {timeout}s")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=100, help="Concurrent streaming clients")
+    parser.add_argument("--runs", type=int, default=500, help="Total runs, spread over the clients")
+    parser.add_argument("--prompt", default="How is TSLA doing?")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--url", help="Load an already running server instead of starting one")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    for name, default in asdict(StubConfig()).items():
+        parser.add_argument(f"--{name.replace('_', '-')}", type=type(default) if default is not None else int)
+    args = parser.parse_args()
+
+    config = StubConfig(**{name: value for name in asdict(StubConfig()) if (value := getattr(args, name)) is not None})
+    if args.serve:
+        serve(config, args.host, args.port)
+        return 0
+
+    server = None
+    base_url = args.url
+    if base_url is None:
+        base_url = f"http://{args.host}:{args.port}"
+        command = [sys.executable, "-m", "benchmarks.load_test", "--serve", "--host", args.host]
+        command += ["--port", str(args.port)]
+        for name, value in asdict(config).items():
+            if value is not None:
+                command += [f"--{name.replace('_', '-')}", str(value)]
+        server = subprocess.Popen(command, env=os.environ.copy())
+
+    try:
+        if server is not None:
+            asyncio.run(wait_until_ready(base_url, server))
+        report = asyncio.run(
+            run_load(base_url, args.clients, args.runs, args.prompt, server.pid if server is not None else None)
+        )
+        print_report(report, args.clients)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,80 @@
+"""Benchmark of the preparation of a run's messages against the length of the thread, with and without the cache.
+
+Run from the agents directory:
+
+    PYTHONPATH=src python -m benchmarks.messages
+
+CopilotKit resends the whole thread on every turn, only its last message being new. Each preparation is timed on a
+thread of the given length: converted in full, through the AGUIMessageCache holding the earlier messages from the
+previous turn, and converting the new message only, like with history_delta_only.
+"""
+
+import argparse
+import sys
+import time
+from typing import Callable, List
+
+from ag_ui.core import RunAgentInput
+
+from benchmarks.history import build_thread
+from lib.app.agui.utils import AGUIMessageCache, prepare_agno_messages
+
+
+def build_run_input(thread, end: int) -> RunAgentInput:
+    return RunAgentInput(
+        thread_id="benchmark",
+        run_id=f"run_{end}",
+        state={},
+        messages=thread[:end],
+        tools=[],
+        context=[],
+        forwarded_props={},
+    )
+
+
+def time_preparation(prepare: Callable[[], object], before: Callable[[], object], repeat: int) -> float:
+    """Microseconds of the fastest preparation, before() setting up each of them untimed."""
+    fastest_ns = None
+    for _ in range(repeat):
+        before()
+        start = time.perf_counter_ns()
+        prepare()
+        elapsed_ns = time.perf_counter_ns() - start
+        fastest_ns = elapsed_ns if fastest_ns is None else min(fastest_ns, elapsed_ns)
+    return fastest_ns / 1000  # type: ignore
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, action="append", help="Thread lengths, in messages")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'messages':>9} {'full us':>10} {'cached us':>10} {'delta us':>10} {'cached speedup':>15}")
+    for length in args.messages or [10, 100, 1000]:
+        # End with the user message of the new turn, the even lengths opening with an assistant message
+        start = 1 if length % 2 == 0 else 0
+        thread = build_thread(length // 2 + 1)[start : start + length]
+        previous_turn = build_run_input(thread, length - 1)
+        run_input = build_run_input(thread, length)
+        message_cache = AGUIMessageCache()
+
+        def nothing() -> None:
+            pass
+
+        full = time_preparation(lambda: prepare_agno_messages(run_input), nothing, args.repeat)
+        cached = time_preparation(
+            lambda: prepare_agno_messages(run_input, message_cache),
+            # Back to the cache of the previous turn, the whole thread but its new message
+            lambda: prepare_agno_messages(previous_turn, message_cache),
+            args.repeat,
+        )
+        delta = time_preparation(
+            lambda: prepare_agno_messages(run_input, history_delta_only=True), nothing, args.repeat
+        )
+        print(f"{length:>9,} {full:>10.1f} {cached:>10.1f} {delta:>10.1f} {full / cached:>14.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
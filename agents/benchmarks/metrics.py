@@ -0,0 +1,86 @@
+"""Benchmark of the overhead of the streaming metrics on every event of a run, and of rendering /metrics.
+
+Run from the agents directory:
+
+    PYTHONPATH=src python -m benchmarks.metrics
+
+The chunks of the synthetic scenarios are mapped to events and encoded as the routers stream them, once as they are
+and once with every event recorded by a RunObserver, the two runs interleaved so a noisy machine affects both alike.
+Reports the nanoseconds per event of each, the overhead of the metrics per event and its share of the pipeline, then
+the time to render the registry once every metric has samples, which a scrape spends on the event loop.
+"""
+
+import argparse
+import sys
+import time
+from typing import List, Tuple
+
+from benchmarks.synthetic import SCENARIOS, Chunk, build_scenario
+from lib.app.agui.encoder import FastSSEEventEncoder
+from lib.app.agui.metrics import RunObserver
+from lib.app.agui.utils import stream_agno_response_as_agui_events
+from lib.app.metrics import registry
+
+
+def time_pipeline(chunks: List[Chunk], observed: bool) -> Tuple[float, int]:
+    """Nanoseconds per event to map and encode the chunks of a run, recorded by a RunObserver if observed."""
+    encoder = FastSSEEventEncoder()
+    events = 0
+    start = time.perf_counter_ns()
+    if observed:
+        observer = RunObserver()
+        for event in stream_agno_response_as_agui_events(iter(chunks)):
+            observer.observe(event)
+            encoder.encode(event)
+            events += 1
+        observer.finish()
+    else:
+        for event in stream_agno_response_as_agui_events(iter(chunks)):
+            encoder.encode(event)
+            events += 1
+    return (time.perf_counter_ns() - start) / events, events
+
+
+def compare(chunks: List[Chunk], repeat: int) -> Tuple[float, float, int]:
+    """Fastest nanoseconds per event without and with the metrics, the two runs interleaved, and the events."""
+    plain: List[float] = []
+    observed: List[float] = []
+    for _ in range(repeat):
+        plain_ns, events = time_pipeline(chunks, observed=False)
+        plain.append(plain_ns)
+        observed.append(time_pipeline(chunks, observed=True)[0])
+    return min(plain), min(observed), events
+
+
+def time_render(repeat: int) -> Tuple[float, int]:
+    """Fastest milliseconds to render the registry, and the size of the exposition in bytes."""
+    fastest = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        exposition = registry.render()
+        elapsed = time.perf_counter() - start
+        fastest = elapsed if fastest is None else min(fastest, elapsed)
+    return fastest * 1000, len(exposition.encode())  # type: ignore
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", choices=list(SCENARIOS), action="append", help="Defaults to every scenario")
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    print(f"{'scenario':<12} {'events':>8} {'plain ns/ev':>12} {'metrics ns/ev':>14} {'overhead ns':>12} {'share':>7}")
+    for name in args.scenario or list(SCENARIOS):
+        plain_ns, observed_ns, events = compare(build_scenario(name), args.repeat)
+        print(
+            f"{name:<12} {events:>8,} {plain_ns:>12,.0f} {observed_ns:>14,.0f} "
+            f"{observed_ns - plain_ns:>12,.0f} {(observed_ns - plain_ns) / plain_ns:>7.1%}"
+        )
+
+    render_ms, size = time_render(args.repeat)
+    print(f"\n/metrics render: {render_ms:.3f} ms for {size:,} bytes")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
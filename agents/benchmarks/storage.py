@@ -0,0 +1,122 @@
+"""Benchmark of the latency of session writes on the request path, and its tail under concurrent runs.
+
+Run from the agents directory:
+
+    PYTHONPATH=src python -m benchmarks.storage --threads 8 --turns 30
+
+Each thread stands in for a conversation, upserting its team session at the end of every turn like the team does,
+the session growing by a question, a long answer and member responses each turn. The writes go to a SQLite storage
+on a temporary file directly, through the WriteBehindStorage, and through the CachedStorage in front of it like the
+investment advisor team. Reports the latency of the upserts, from the call to its return.
+"""
+
+import argparse
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from agno.storage.base import Storage
+from agno.storage.session.team import TeamSession
+from agno.storage.sqlite import SqliteStorage
+
+from benchmarks.common import percentile
+from benchmarks.synthetic import WORDS
+from lib.storage import CachedStorage, WriteBehindStorage
+
+
+def grow_session(session: TeamSession, turn: int) -> None:
+    """Append the messages of a turn to the session, like a team run does."""
+    answer = " ".join(WORDS[(turn + index) % len(WORDS)] for index in range(300))
+    messages = [
+        {"role": "user", "content": f"How is ticker {turn} doing?"},
+        {"role": "assistant", "content": answer},
+    ]
+    session.memory["runs"].append(  # type: ignore
+        {
+            "run_id": f"run_{turn}",
+            "messages": messages,
+            "member_responses": [{"content": answer[:500], "messages": messages} for _ in range(2)],
+        }
+    )
+    session.updated_at = int(time.time())
+
+
+def write_turns(storage: Storage, thread: int, turns: int, latencies: List[int], start: threading.Barrier) -> None:
+    session = TeamSession(
+        session_id=f"session_{thread}",
+        team_id="benchmark",
+        memory={"runs": []},
+        session_data={},
+        created_at=int(time.time()),
+    )
+    start.wait()
+    for turn in range(turns):
+        grow_session(session, turn)
+        started_at = time.perf_counter_ns()
+        storage.upsert(session)
+        latencies.append(time.perf_counter_ns() - started_at)
+
+
+def run(storage: Storage, threads: int, turns: int) -> List[int]:
+    latencies: List[int] = []
+    start = threading.Barrier(threads)
+    workers = [
+        threading.Thread(target=write_turns, args=(storage, thread, turns, latencies, start))
+        for thread in range(threads)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return latencies
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=8, help="Concurrent conversations")
+    parser.add_argument("--turns", type=int, default=30, help="Turns of each conversation")
+    args = parser.parse_args()
+
+    def sqlite_storage(directory: Path, name: str) -> SqliteStorage:
+        storage = SqliteStorage(table_name="sessions", db_file=str(directory / f"{name}.db"), mode="team")
+        storage.create()
+        return storage
+
+    def write_behind(directory: Path) -> Tuple[Storage, Optional[WriteBehindStorage]]:
+        storage = WriteBehindStorage(sqlite_storage(directory, "write_behind"))
+        return storage, storage
+
+    def cached_write_behind(directory: Path) -> Tuple[Storage, Optional[WriteBehindStorage]]:
+        storage = WriteBehindStorage(sqlite_storage(directory, "cached"))
+        return CachedStorage(storage), storage
+
+    # Each returns the storage written to, and the write-behind storage to close at the end
+    storages: Dict[str, Callable[[Path], Tuple[Storage, Optional[WriteBehindStorage]]]] = {
+        "sqlite": lambda directory: (sqlite_storage(directory, "sqlite"), None),
+        "write-behind": write_behind,
+        "cached write-behind": cached_write_behind,
+    }
+
+    print(f"{args.threads} threads upserting their session {args.turns} times")
+    print(f"{'storage':<22} {'p50 us':>9} {'p99 us':>9} {'max us':>9} {'flush ms':>9}")
+    with tempfile.TemporaryDirectory() as directory:
+        for name, create_storage in storages.items():
+            storage, write_behind_storage = create_storage(Path(directory))
+            latencies = [latency // 1000 for latency in run(storage, args.threads, args.turns)]
+            # The time left to persist the queued sessions, off the request path
+            flush_start = time.perf_counter()
+            if write_behind_storage is not None:
+                write_behind_storage.close()
+            flush_ms = (time.perf_counter() - flush_start) * 1000
+            print(
+                f"{name:<22} {percentile(latencies, 50):>9,} {percentile(latencies, 99):>9,} "
+                f"{max(latencies):>9,} {flush_ms:>9.1f}"
+            )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
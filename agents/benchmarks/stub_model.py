@@ -0,0 +1,233 @@
+"""Offline stand-ins for the Gemini model and the tools of the agents, with configurable latency, tools and errors."""
+
+import asyncio
+import json
+import math
+import random
+import time
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Union
+
+from agno.agent.agent import Agent
+from agno.exceptions import ModelProviderError
+from agno.models.base import Model
+from agno.models.message import Message
+from agno.models.response import ModelResponse
+from agno.team.team import Team
+from agno.tools.function import Function
+from agno.tools.toolkit import Toolkit
+
+from benchmarks.synthetic import WORDS
+
+TRANSFER_TOOL_NAMES = {"transfer_task_to_member", "atransfer_task_to_member"}
+SYMBOLS = ("AAPL", "MSFT", "NVDA", "GOOG", "TSLA")
+
+
+def sample_latency(rng: random.Random, median: float, sigma: float) -> float:
+    """Sample a log-normal latency, the usual shape of model and API latencies, around its median."""
+    if median <= 0:
+        return 0.0
+    return rng.lognormvariate(math.log(median), sigma) if sigma > 0 else median
+
+
+@dataclass
+class StubModel(Model):
+    """Streams generated text at a set token rate, calling the tools it is given.
+
+    A Team leader given member_ids transfers the task to each member in turn before responding, like the
+    coordinate mode of the investment advisor team.
+    """
+
+    id: str = "stub"
+    name: str = "StubModel"
+    provider: str = "Stub"
+
+    tokens_per_second: float = 50.0
+    response_tokens: int = 120
+    first_token_latency: float = 0.4  # Median seconds before the first token
+    latency_sigma: float = 0.5  # Spread of the log-normal latencies, 0 for a fixed latency
+    tool_call_probability: float = 1.0  # Chance of calling a tool on each turn, while max_tool_calls isn't reached
+    max_tool_calls: int = 1
+    error_rate: float = 0.0  # Chance of a response failing midway with a ModelProviderError
+    member_ids: List[str] = field(default_factory=list)
+    seed: Optional[int] = None
+
+    def __post_init__(self):
+        super().__post_init__()
+        self.rng = random.Random(self.seed)
+
+    def _plan(self, messages: List[Message], tools: Optional[List[Dict[str, Any]]]) -> Optional[Dict[str, Any]]:
+        """Return the tool call of this turn, if the model calls a tool."""
+        functions = [tool["function"] for tool in tools or [] if tool.get("type") == "function"]
+        if not functions:
+            return None
+
+        # Tool calls made since the last user message
+        tool_calls_made = 0
+        for message in reversed(messages):
+            if message.role == "user":
+                break
+            if message.role == "assistant" and message.tool_calls:
+                tool_calls_made += len(message.tool_calls)
+
+        transfer = next((function for function in functions if function["name"] in TRANSFER_TOOL_NAMES), None)
+        if transfer is not None and self.member_ids:
+            if tool_calls_made >= len(self.member_ids):
+                return None
+            function = transfer
+            arguments = self._fake_arguments(function, member_id=self.member_ids[tool_calls_made])
+        else:
+            if tool_calls_made >= self.max_tool_calls or self.rng.random() >= self.tool_call_probability:
+                return None
+            function = self.rng.choice(functions)
+            arguments = self._fake_arguments(function)
+
+        return {
+            "id": f"call_{self.rng.getrandbits(48):012x}",
+            "type": "function",
+            "function": {"name": function["name"], "arguments": json.dumps(arguments)},
+        }
+
+    def _fake_arguments(self, function: Dict[str, Any], **overrides: Any) -> Dict[str, Any]:
+        parameters = function.get("parameters") or {}
+        properties: Dict[str, Dict[str, Any]] = parameters.get("properties") or {}
+        required = parameters.get("required") or list(properties)
+        arguments: Dict[str, Any] = {}
+        for name in required:
+            schema = properties.get(name, {})
+            if name in overrides:
+                arguments[name] = overrides[name]
+            elif schema.get("enum"):
+                arguments[name] = schema["enum"][0]
+            elif schema.get("type") == "integer":
+                arguments[name] = self.rng.randint(1, 10)
+            elif schema.get("type") == "number":
+                arguments[name] = round(self.rng.uniform(1, 10), 2)
+            elif schema.get("type") == "boolean":
+                arguments[name] = True
+            elif schema.get("type") == "array":
+                arguments[name] = []
+            elif schema.get("type") == "object":
+                arguments[name] = {}
+            elif "symbol" in name:
+                arguments[name] = self.rng.choice(SYMBOLS)
+            else:
+                arguments[name] = " ".join(self.rng.choice(WORDS) for _ in range(6))
+        return arguments
+
+    def _tokens(self) -> Iterator[str]:
+        failing_at = self.rng.randrange(self.response_tokens) if self.rng.random() < self.error_rate else None
+        for index in range(self.response_tokens):
+            if index == failing_at:
+                raise ModelProviderError("Injected stub model error", status_code=503, model_name=self.name)
+            yield self.rng.choice(WORDS) + " "
+
+    def invoke(self, messages: List[Message], tools: Optional[List[Dict[str, Any]]] = None, **kwargs) -> Any:
+        return list(self.invoke_stream(messages, tools=tools))
+
+    async def ainvoke(self, messages: List[Message], tools: Optional[List[Dict[str, Any]]] = None, **kwargs) -> Any:
+        return [delta async for delta in self.ainvoke_stream(messages, tools=tools)]
+
+    def invoke_stream(
+        self, messages: List[Message], tools: Optional[List[Dict[str, Any]]] = None, **kwargs
+    ) -> Iterator[ModelResponse]:
+        time.sleep(sample_latency(self.rng, self.first_token_latency, self.latency_sigma))
+        tool_call = self._plan(messages, tools)
+        if tool_call is not None:
+            yield ModelResponse(role="assistant", tool_calls=[tool_call])
+            return
+
+        for token in self._tokens():
+            yield ModelResponse(role="assistant", content=token)
+            time.sleep(1 / self.tokens_per_second)
+
+    async def ainvoke_stream(
+        self, messages: List[Message], tools: Optional[List[Dict[str, Any]]] = None, **kwargs
+    ) -> AsyncIterator[ModelResponse]:
+        await asyncio.sleep(sample_latency(self.rng, self.first_token_latency, self.latency_sigma))
+        tool_call = self._plan(messages, tools)
+        if tool_call is not None:
+            yield ModelResponse(role="assistant", tool_calls=[tool_call])
+            return
+
+        for token in self._tokens():
+            yield ModelResponse(role="assistant", content=token)
+            await asyncio.sleep(1 / self.tokens_per_second)
+
+    def parse_provider_response(self, response: Any, **kwargs) -> ModelResponse:
+        # Non-streaming responses are the list of streamed deltas
+        content = "".join(delta.content or "" for delta in response)
+        tool_calls = [tool_call for delta in response for tool_call in delta.tool_calls]
+        return ModelResponse(role="assistant", content=content or None, tool_calls=tool_calls)
+
+    def parse_provider_response_delta(self, response: Any) -> ModelResponse:
+        return response
+
+
+@dataclass
+class StubToolBehaviour:
+    """How the stub tools respond."""
+
+    latency: float = 0.2  # Median seconds per call
+    latency_sigma: float = 0.5
+    error_rate: float = 0.0  # Chance of a call raising an error
+    result_bytes: int = 512
+    seed: Optional[int] = None
+
+
+def stub_function(function: Function, behaviour: StubToolBehaviour, rng: random.Random) -> Function:
+    """Return a function with the name and parameters of the given one, answering with generated data."""
+    if not function.skip_entrypoint_processing:
+        function.process_entrypoint()
+
+    async def call_stub(**kwargs: Any) -> str:
+        await asyncio.sleep(sample_latency(rng, behaviour.latency, behaviour.latency_sigma))
+        if rng.random() < behaviour.error_rate:
+            raise RuntimeError(f"Injected error of the stub {function.name} tool")
+        filler = " ".join(rng.choice(WORDS) for _ in range(behaviour.result_bytes // 6))
+        return json.dumps({"tool": function.name, "arguments": kwargs, "result": filler[: behaviour.result_bytes]})
+
+    return Function(
+        name=function.name,
+        description=function.description,
+        parameters=function.parameters,
+        entrypoint=call_stub,
+        skip_entrypoint_processing=True,
+    )
+
+
+def stub_tools(
+    tools: List[Union[Toolkit, Callable, Function, Dict]], behaviour: StubToolBehaviour, rng: random.Random
+) -> List[Function]:
+    functions: List[Function] = []
+    for tool in tools:
+        if isinstance(tool, Toolkit):
+            functions.extend(stub_function(function, behaviour, rng) for function in tool.functions.values())
+        elif isinstance(tool, Function):
+            functions.append(stub_function(tool, behaviour, rng))
+        elif callable(tool):
+            functions.append(stub_function(Function.from_callable(tool), behaviour, rng))
+    return functions
+
+
+def use_stub_model(
+    runner: Union[Agent, Team],
+    model_factory: Callable[[], StubModel],
+    tool_behaviour: Optional[StubToolBehaviour] = None,
+) -> None:
+    """Swap the models of the Agent or Team, and of all its members, for stub models, and its tools for stub tools.
+
+    The Agent or Team is modified in place, so that the app definitions using it run offline.
+    """
+    tool_behaviour = tool_behaviour or StubToolBehaviour()
+    rng = random.Random(tool_behaviour.seed)
+
+    model = model_factory()
+    runner.model = model
+    if runner.tools:
+        runner.tools = stub_tools(runner.tools, tool_behaviour, rng)  # type: ignore
+
+    if isinstance(runner, Team):
+        model.member_ids = [runner._get_member_id(member) for member in runner.members]
+        for member in runner.members:
+            use_stub_model(member, model_factory, tool_behaviour)
@@ -0,0 +1,169 @@
+"""Synthetic Agno response streams, shaped like the ones of the agents in src/agents."""
+
+import asyncio
+import itertools
+import random
+from typing import AsyncIterator, Callable, Dict, Iterator, List, Optional, Union
+
+from agno.models.response import ToolExecution
+from agno.run.response import (
+    RunResponseCompletedEvent,
+    RunResponseContentEvent,
+    RunResponseEvent,
+    RunResponsePausedEvent,
+    RunResponseStartedEvent,
+    ToolCallCompletedEvent,
+    ToolCallStartedEvent,
+)
+from agno.run.team import RunResponseCompletedEvent as TeamRunResponseCompletedEvent
+from agno.run.team import RunResponseContentEvent as TeamRunResponseContentEvent
+from agno.run.team import RunResponseStartedEvent as TeamRunResponseStartedEvent
+from agno.run.team import TeamRunResponseEvent
+from agno.run.team import ToolCallCompletedEvent as TeamToolCallCompletedEvent
+from agno.run.team import ToolCallStartedEvent as TeamToolCallStartedEvent
+
+Chunk = Union[RunResponseEvent, TeamRunResponseEvent]
+
+WORDS = (
+    "the stock closed higher after the company reported quarterly earnings above analyst estimates while revenue "
+    "growth slowed and guidance for the next quarter remained cautious amid rising costs"
+).split()
+
+
+class ChunkFactory:
+    """Builds the chunks of synthetic runs, with deterministic ids and text for a given seed."""
+
+    def __init__(self, seed: int = 0):
+        self.random = random.Random(seed)
+        self.ids = itertools.count(1)
+
+    def next_id(self, prefix: str) -> str:
+        return f"{prefix}_{next(self.ids)}"
+
+    def text_delta(self, words: int = 4) -> str:
+        return " ".join(self.random.choice(WORDS) for _ in range(words)) + " "
+
+    def tool(self, tool_name: str, result: Optional[str] = None, **tool_args: object) -> ToolExecution:
+        return ToolExecution(tool_call_id=self.next_id("call"), tool_name=tool_name, tool_args=tool_args, result=result)
+
+    def agent_run(
+        self,
+        agent_name: str,
+        text_deltas: int,
+        tool_calls: int = 0,
+        deltas_during_tool_call: int = 0,
+    ) -> List[Chunk]:
+        """The chunks of an Agent run, its text interleaved with tool calls.
+
+        deltas_during_tool_call text deltas arrive while each tool call is in progress, held back by the mapper.
+        """
+        run_id = self.next_id("run")
+        chunks: List[Chunk] = [RunResponseStartedEvent(run_id=run_id, agent_name=agent_name)]
+        deltas_per_segment = text_deltas // (tool_calls + 1)
+
+        for segment in range(tool_calls + 1):
+            for _ in range(deltas_per_segment):
+                chunks.append(RunResponseContentEvent(run_id=run_id, agent_name=agent_name, content=self.text_delta()))
+            if segment == tool_calls:
+                break
+
+            symbol = self.random.choice(("AAPL", "MSFT", "NVDA", "GOOG"))
+            tool = self.tool("get_current_stock_price", symbol=symbol)
+            chunks.append(ToolCallStartedEvent(run_id=run_id, agent_name=agent_name, tool=tool))
+            for _ in range(deltas_during_tool_call):
+                chunks.append(RunResponseContentEvent(run_id=run_id, agent_name=agent_name, content=self.text_delta()))
+            completed_tool = ToolExecution(
+                tool_call_id=tool.tool_call_id,
+                tool_name=tool.tool_name,
+                tool_args=tool.tool_args,
+                result=f'{{"symbol": "{symbol}", "price": {self.random.uniform(50, 900):.2f}}}',
+            )
+            chunks.append(ToolCallCompletedEvent(run_id=run_id, agent_name=agent_name, tool=completed_tool))
+
+        chunks.append(RunResponseCompletedEvent(run_id=run_id, agent_name=agent_name))
+        return chunks
+
+
+def long_text(factory: ChunkFactory) -> List[Chunk]:
+    """A single Agent run streaming a long text response."""
+    return factory.agent_run("Stock Summary Agent", text_deltas=2000)
+
+
+def tool_calls(factory: ChunkFactory) -> List[Chunk]:
+    """An Agent run making many tool calls, with text arriving while they are in progress."""
+    return factory.agent_run("Stock Price Agent", text_deltas=400, tool_calls=100, deltas_during_tool_call=2)
+
+
+def team(factory: ChunkFactory) -> List[Chunk]:
+    """A Team run transferring the task to each member, whose runs are nested in the Team stream."""
+    team_run_id = factory.next_id("team_run")
+    team_name = "Investment Advisor Team"
+    chunks: List[Chunk] = [TeamRunResponseStartedEvent(run_id=team_run_id, team_name=team_name)]
+
+    for member_name in ("Stock Price Agent", "Company News Agent", "Stock Summary Agent"):
+        transfer = factory.tool("atransfer_task_to_member", member_id=member_name, task_description="Analyse AAPL")
+        chunks.append(TeamToolCallStartedEvent(run_id=team_run_id, team_name=team_name, tool=transfer))
+        chunks.extend(factory.agent_run(member_name, text_deltas=200, tool_calls=3, deltas_during_tool_call=1))
+        chunks.append(TeamToolCallCompletedEvent(run_id=team_run_id, team_name=team_name, tool=transfer))
+
+    for _ in range(300):
+        chunks.append(TeamRunResponseContentEvent(run_id=team_run_id, team_name=team_name, content=factory.text_delta()))
+    chunks.append(TeamRunResponseCompletedEvent(run_id=team_run_id, team_name=team_name))
+    return chunks
+
+
+def paused(factory: ChunkFactory) -> List[Chunk]:
+    """An Agent run pausing on frontend tools, i.e. tools with external_execution=True."""
+    chunks = factory.agent_run("Stock Price Agent", text_deltas=100, tool_calls=2)
+    # The paused event replaces the completion event
+    completed = chunks.pop()
+    external_tools = [
+        ToolExecution(
+            tool_call_id=factory.next_id("call"),
+            tool_name="show_stock_chart",
+            tool_args={"symbol": symbol, "period": "1y"},
+            external_execution_required=True,
+        )
+        for symbol in ("AAPL", "MSFT", "NVDA", "GOOG", "AMZN")
+    ]
+    chunks.append(RunResponsePausedEvent(run_id=completed.run_id, agent_name=completed.agent_name, tools=external_tools))
+    return chunks
+
+
+SCENARIOS: Dict[str, Callable[[ChunkFactory], List[Chunk]]] = {
+    "long_text": long_text,
+    "tool_calls": tool_calls,
+    "team": team,
+    "paused": paused,
+}
+
+
+def build_scenario(name: str, seed: int = 0) -> List[Chunk]:
+    return SCENARIOS[name](ChunkFactory(seed))
+
+
+class SyntheticRunner:
+    """Stands in for an Agent or Team in the AG-UI routers, replaying a synthetic stream on every run."""
+
+    def __init__(self, chunks: List[Chunk], chunk_delay: float = 0.0):
+        """
+        Args:
+            chunks (List[Chunk]): The chunks replayed by every run.
+            chunk_delay (float): Seconds waited before each chunk of the async runs.
+        """
+        self.chunks = chunks
+        self.chunk_delay = chunk_delay
+        self.name = "Synthetic Runner"
+
+    def run(self, *args, **kwargs) -> Iterator[Chunk]:
+        # A generator, like the response streams the sync router closes
+        yield from self.chunks
+
+    async def arun(self, *args, **kwargs) -> AsyncIterator[Chunk]:
+        async def replay() -> AsyncIterator[Chunk]:
+            for chunk in self.chunks:
+                if self.chunk_delay:
+                    await asyncio.sleep(self.chunk_delay)
+                yield chunk
+
+        return replay()
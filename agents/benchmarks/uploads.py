@@ -0,0 +1,92 @@
+"""Memory benchmark of reading uploads: whole into memory, as before, against the spooling MediaIntake.
+
+Run from the agents directory:
+
+    PYTHONPATH=src python -m benchmarks.uploads --size-mib 64 --concurrency 8
+
+Each upload is read from a temporary file, like the ones Starlette spools the multipart uploads to, by concurrent
+threads. Reports the peak of the memory allocated while reading them and the read throughput.
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List
+
+from fastapi import UploadFile
+from starlette.datastructures import Headers
+
+from lib.app.utils import MediaIntake, MiB, UploadLimits, process_video
+
+
+def make_uploads(count: int, size: int, unique: bool) -> List[UploadFile]:
+    block = os.urandom(MiB)
+    uploads = []
+    for index in range(count):
+        spooled = tempfile.SpooledTemporaryFile(max_size=MiB)
+        for offset in range(0, size, MiB):
+            spooled.write(block[: min(MiB, size - offset)])
+        if unique:
+            spooled.write(index.to_bytes(4, "big"))
+        spooled.seek(0)
+        headers = Headers({"content-type": "video/mp4"})
+        uploads.append(UploadFile(spooled, size=None, filename=f"upload_{index}.mp4", headers=headers))
+    return uploads
+
+
+def read_whole(upload: UploadFile) -> bytes:
+    # What process_video did before spooling, the content is then held in memory until the run ends
+    return upload.file.read()
+
+
+def measure_reads(name: str, read: Callable[[UploadFile], object], uploads: List[UploadFile], concurrency: int) -> None:
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(read, uploads))
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    elapsed = time.perf_counter() - start
+    total = sum(upload.file.tell() for upload in uploads)
+    print(f"{name:<24} {peak / MiB:>10.1f} {total / MiB / elapsed:>10.1f}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mib", type=int, default=64, help="Size of each upload")
+    parser.add_argument("--concurrency", type=int, default=8, help="Uploads read at once")
+    parser.add_argument("--duplicates", action="store_true", help="Upload the same content every time")
+    args = parser.parse_args()
+
+    size = args.size_mib * MiB
+    directory = tempfile.mkdtemp(prefix="upload_benchmark_")
+    intake = MediaIntake(directory=directory, limits=UploadLimits(video=size + MiB))
+    print(f"{args.concurrency} uploads of {args.size_mib} MiB")
+    print(f"{'reader':<24} {'peak MiB':>10} {'MiB/s':>10}")
+    try:
+        for name, read in (
+            ("read whole", read_whole),
+            ("media intake", lambda upload: process_video(upload, intake)),
+        ):
+            uploads = make_uploads(args.concurrency, size, unique=not args.duplicates)
+            try:
+                measure_reads(name, read, uploads, args.concurrency)
+            finally:
+                for upload in uploads:
+                    upload.file.close()
+        stored = [entry for entry in os.scandir(directory) if entry.is_file()]
+        print(f"stored uploads           {len(stored)} files, {sum(e.stat().st_size for e in stored) / MiB:.1f} MiB")
+    finally:
+        shutil.rmtree(directory)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,196 @@
+"""Benchmark of a chatty session over HTTP, resending the thread on every turn, against a WebSocket sending deltas.
+
+Run from the agents directory:
+
+    PYTHONPATH=src python -m benchmarks.websocket --turns 30
+
+The async router is served by uvicorn on localhost, its runs replaying a short synthetic answer with a tool call. The
+HTTP clients rebuild the thread from the events of each run and post all of it on the next turn, like CopilotKit does,
+either over a new connection behind a CORS preflight, like a browser past its idle timeout, or over a kept-alive one.
+The WebSocket client keeps one connection to the thread and only sends the new user message of each turn.
+
+Reports the bytes uploaded per turn, request heads and frame headers included, and the latency of the turns, from
+sending the run to its last event.
+"""
+
+import argparse
+import asyncio
+import sys
+import threading
+import time
+import uuid
+from typing import List, Tuple
+
+import httpx
+import uvicorn
+from ag_ui.core import RunAgentInput, UserMessage
+from ag_ui.core.events import Event
+from fastapi import FastAPI
+from fastapi.middleware.cors import CORSMiddleware
+from pydantic import TypeAdapter
+from websockets.asyncio.client import connect
+
+from benchmarks.common import percentile
+from benchmarks.synthetic import WORDS, ChunkFactory, SyntheticRunner
+from lib.app.agui.async_router import get_async_agui_router
+from lib.app.agui.websocket import AGUIThread, AGUIWebSocketSessions
+
+ORIGIN = "http://localhost:3000"
+RUN_END_TYPES = ('"type":"RUN_FINISHED"', '"type":"RUN_ERROR"')
+
+event_adapter: TypeAdapter = TypeAdapter(Event)
+
+
+def serve(port: int) -> uvicorn.Server:
+    """Serve the async router on a background thread, with the CORS middleware of the apps."""
+    runner = SyntheticRunner(ChunkFactory().agent_run("Stock Price Agent", text_deltas=60, tool_calls=1))
+    app = FastAPI()
+    app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])
+    app.include_router(get_async_agui_router(agent=runner, websocket_sessions=AGUIWebSocketSessions()))
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+def user_message(turn: int) -> UserMessage:
+    content = " ".join(WORDS[(turn * 7 + index) % len(WORDS)] for index in range(20))
+    return UserMessage(id=f"user_{turn}", role="user", content=content)
+
+
+def request_bytes(request: httpx.Request) -> int:
+    """Bytes of the HTTP/1.1 request on the wire, request line and headers included."""
+    head = f"{request.method} {request.url.raw_path.decode()} HTTP/1.1\r\n"
+    head += "".join(f"{name}: {value}\r\n" for name, value in request.headers.items()) + "\r\n"
+    return len(head.encode()) + len(request.content)
+
+
+def frame_bytes(payload: str) -> int:
+    """Bytes of the masked client WebSocket frame carrying the payload."""
+    length = len(payload.encode())
+    return length + (6 if length < 126 else 8 if length < 65536 else 14)
+
+
+async def http_session(base_url: str, turns: int, keep_alive: bool) -> Tuple[List[int], List[float]]:
+    """Run the turns over HTTP, returning the bytes uploaded and the latency of each turn."""
+    url = f"{base_url}/agui"
+    thread = AGUIThread(str(uuid.uuid4()))
+    uploaded: List[int] = []
+    latencies: List[float] = []
+    client = httpx.AsyncClient()
+    try:
+        for turn in range(turns):
+            if not keep_alive:
+                await client.aclose()
+                client = httpx.AsyncClient()
+            thread.upsert(user_message(turn))
+            run_input = RunAgentInput(
+                thread_id=thread.thread_id,
+                run_id=str(uuid.uuid4()),
+                state={},
+                messages=thread.messages,
+                tools=[],
+                context=[],
+                forwarded_props={},
+            )
+
+            start = time.perf_counter()
+            sent = 0
+            if not keep_alive:
+                # JSON posts across origins are preflighted
+                preflight = client.build_request(
+                    "OPTIONS",
+                    url,
+                    headers={
+                        "Origin": ORIGIN,
+                        "Access-Control-Request-Method": "POST",
+                        "Access-Control-Request-Headers": "content-type",
+                    },
+                )
+                sent += request_bytes(preflight)
+                (await client.send(preflight)).raise_for_status()
+            request = client.build_request(
+                "POST",
+                url,
+                content=run_input.model_dump_json(by_alias=True, exclude_none=True),
+                headers={"Origin": ORIGIN, "Content-Type": "application/json", "Accept": "text/event-stream"},
+            )
+            sent += request_bytes(request)
+            response = await client.send(request, stream=True)
+            async for line in response.aiter_lines():
+                if line.startswith("data: "):
+                    thread.record(event_adapter.validate_json(line[6:]))
+            await response.aclose()
+            thread.end_run()
+            latencies.append(time.perf_counter() - start)
+            uploaded.append(sent)
+    finally:
+        await client.aclose()
+    return uploaded, latencies
+
+
+async def websocket_session(base_url: str, turns: int) -> Tuple[List[int], List[float]]:
+    """Run the turns over a WebSocket, returning the bytes uploaded and the latency of each turn.
+
+    The bytes of the opening handshake are counted in the first turn.
+    """
+    url = base_url.replace("http://", "ws://") + "/agui/ws"
+    thread_id = str(uuid.uuid4())
+    uploaded: List[int] = []
+    latencies: List[float] = []
+    async with connect(url, origin=ORIGIN, compression=None) as websocket:  # type: ignore
+        handshake = websocket.request
+        sent = len(f"GET {handshake.path} HTTP/1.1\r\n".encode()) + len(handshake.headers.serialize())  # type: ignore
+        for turn in range(turns):
+            message = user_message(turn).model_dump_json(by_alias=True, exclude_none=True)
+            if turn == 0:
+                payload = f'{{"type":"run","threadId":"{thread_id}","messages":[{message}]}}'
+            else:
+                payload = f'{{"type":"run","messages":[{message}]}}'
+
+            start = time.perf_counter()
+            await websocket.send(payload)
+            sent += frame_bytes(payload)
+            async for frame in websocket:
+                if any(end_type in frame for end_type in RUN_END_TYPES):  # type: ignore
+                    break
+            latencies.append(time.perf_counter() - start)
+            uploaded.append(sent)
+            sent = 0
+    return uploaded, latencies
+
+
+def report(name: str, uploaded: List[int], latencies: List[float]) -> None:
+    turns = len(uploaded)
+    microseconds = [int(latency * 1_000_000) for latency in latencies]
+    print(
+        f"{name:<22} {sum(uploaded) / turns:>12,.0f} {uploaded[-1]:>12,} {sum(uploaded):>12,} "
+        f"{percentile(microseconds, 50) / 1000:>9.2f} {percentile(microseconds, 99) / 1000:>9.2f}"
+    )
+
+
+async def run(base_url: str, turns: int) -> None:
+    print(f"{turns} turns")
+    print(f"{'transport':<22} {'B/turn':>12} {'last turn B':>12} {'total B':>12} {'p50 ms':>9} {'p99 ms':>9}")
+    report("http, new connection", *await http_session(base_url, turns, keep_alive=False))
+    report("http, keep-alive", *await http_session(base_url, turns, keep_alive=True))
+    report("websocket", *await websocket_session(base_url, turns))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=30)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    server = serve(args.port)
+    try:
+        asyncio.run(run(f"http://127.0.0.1:{args.port}", args.turns))
+    finally:
+        server.should_exit = True
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,134 @@
+"""Benchmark of the runs per second served by one process against several workers behind the dispatcher.
+
+Run from the agents directory:
+
+    PYTHONPATH=src python -m benchmarks.workers --workers 1 2 4 --scenario tool_calls
+
+The async router is served by uvicorn from a separate process, first on its own, then by each number of workers
+behind the AffinityDispatcher, its runs replaying the synthetic chunks. Clients stream the runs of distinct threads
+concurrently over HTTP. Reports the runs per second and the p50 and p99 latency of a run, from posting it to its last
+event. The mapping and encoding of the events being CPU bound, the workers only scale up to the cores of the machine,
+and one worker measures the cost of the extra hop through the dispatcher.
+"""
+
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+from typing import List, Tuple
+
+import httpx
+import uvicorn
+from fastapi import FastAPI
+
+from benchmarks.common import percentile
+from benchmarks.load_test import wait_until_ready
+from benchmarks.synthetic import SCENARIOS, SyntheticRunner, build_scenario
+from lib.app.agui.async_router import get_async_agui_router
+from lib.app.workers import serve_with_workers
+
+RUN_INPUT = (
+    '{{"threadId":"{run_id}","runId":"{run_id}","state":{{}},"tools":[],"context":[],"forwardedProps":{{}},'
+    '"messages":[{{"id":"1","role":"user","content":"How is AAPL doing?"}}]}}'
+)
+
+
+def create_app() -> FastAPI:
+    """App of each worker, configured by the environment as the workers import it on their own."""
+    chunks = build_scenario(os.environ["BENCHMARK_SCENARIO"])
+    runner = SyntheticRunner(chunks, chunk_delay=float(os.environ["BENCHMARK_CHUNK_DELAY"]))
+    app = FastAPI()
+    app.include_router(get_async_agui_router(agent=runner))  # type: ignore
+    return app
+
+
+def serve(args: argparse.Namespace) -> None:
+    os.environ["BENCHMARK_SCENARIO"] = args.scenario
+    os.environ["BENCHMARK_CHUNK_DELAY"] = str(args.chunk_delay)
+    if args.serve_workers:
+        serve_with_workers(
+            "benchmarks.workers:create_app",
+            host="127.0.0.1",
+            port=args.port,
+            workers=args.serve_workers,
+            factory=True,
+            log_level="warning",
+        )
+    else:
+        uvicorn.run(create_app(), host="127.0.0.1", port=args.port, log_level="warning")
+
+
+async def stream_runs(base_url: str, runs: int, clients: int) -> Tuple[List[int], float]:
+    """Stream the runs, returning their latencies in microseconds and the wall time in seconds."""
+    latencies: List[int] = []
+    pending = iter(range(runs))
+
+    async def client_loop(client: httpx.AsyncClient) -> None:
+        for run in pending:
+            body = RUN_INPUT.format(run_id=f"run_{run}")
+            headers = {"Content-Type": "application/json"}
+            start = time.perf_counter()
+            async with client.stream("POST", f"{base_url}/agui", content=body, headers=headers) as response:
+                async for _ in response.aiter_bytes():
+                    pass
+            latencies.append(int((time.perf_counter() - start) * 1_000_000))
+
+    start = time.perf_counter()
+    async with httpx.AsyncClient(timeout=None, limits=httpx.Limits(max_connections=clients)) as client:
+        await asyncio.gather(*(client_loop(client) for _ in range(clients)))
+    return latencies, time.perf_counter() - start
+
+
+def measure(args: argparse.Namespace, workers: int) -> Tuple[float, List[int]]:
+    """Serve and stream the runs, returning the runs per second and their latencies, 0 workers serving directly."""
+    command = [sys.executable, "-m", "benchmarks.workers", "--serve", "--port", str(args.port)]
+    command += ["--scenario", args.scenario, "--chunk-delay", str(args.chunk_delay)]
+    command += ["--serve-workers", str(workers)]
+    # The access log of the dispatcher
+    server = subprocess.Popen(command, env=os.environ.copy(), stdout=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{args.port}"
+    try:
+        asyncio.run(wait_until_ready(base_url, server))
+        # Warms up the workers, e.g. the connections of the dispatcher
+        asyncio.run(stream_runs(base_url, args.clients, args.clients))
+        latencies, wall_time = asyncio.run(stream_runs(base_url, args.runs, args.clients))
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+    return args.runs / wall_time, latencies
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="Numbers of workers to compare")
+    parser.add_argument("--scenario", choices=list(SCENARIOS), default="tool_calls")
+    parser.add_argument("--chunk-delay", type=float, default=0.0, help="Seconds before each chunk")
+    parser.add_argument("--runs", type=int, default=200)
+    parser.add_argument("--clients", type=int, default=16, help="Concurrent streaming clients")
+    parser.add_argument("--port", type=int, default=8767)
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--serve-workers", type=int, default=0, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args)
+        return 0
+
+    print(f"{args.scenario}: {args.runs} runs by {args.clients} clients on {os.cpu_count()} CPUs")
+    print(f"{'workers':<12} {'runs/s':>10} {'speedup':>8} {'p50 ms':>9} {'p99 ms':>9}")
+    reference = 0.0
+    for workers in [0] + args.workers:
+        runs_per_second, latencies = measure(args, workers)
+        reference = reference or runs_per_second
+        name = str(workers) if workers else "direct"
+        print(
+            f"{name:<12} {runs_per_second:>10,.1f} {runs_per_second / reference:>8.2f} "
+            f"{percentile(latencies, 50) / 1000:>9.2f} {percentile(latencies, 99) / 1000:>9.2f}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
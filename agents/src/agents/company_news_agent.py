@@ -1,6 +1,7 @@
 import os
 from agno.agent import Agent
 from agno.models.google import Gemini
+from agents.tool_cache import tool_cache
 
 def get_company_news(company_name: str):
     """
@@ -61,7 +62,7 @@ company_news_agent = Agent(
         id="gemini-2.5-flash",
         api_key=os.getenv("GEMINI_API_KEY")
     ),
-    tools=[get_company_news],
+    tools=[tool_cache.wrap(get_company_news)],
     instructions="You are a stock news agent. Return news related to specified stock's company.",
     markdown=True
 )
@@ -2,10 +2,15 @@ import os
 from agno.team import Team
 from agno.models.google import Gemini
 from agno.storage.sqlite import SqliteStorage
+from lib.storage import CachedStorage, WriteBehindStorage
 from agents.stock_price_agent import stock_price_agent
 from agents.company_news_agent import company_news_agent
 from agents.stock_summary_agent import stock_summary_agent
 
+# Sessions are persisted in the background, so the end of a run isn't delayed by SQLite.
+# The team reads them through an in-memory cache, avoiding a reload of the session on every turn.
+team_storage = WriteBehindStorage(SqliteStorage(table_name="agent_sessions", db_file="/tmp/data.db"))
+
 # For testing collaborate mode, remove the stock summary agent and the instruction referencing it.
 # For testing coordinate mode, include the stock summary agent and the instruction referencing it.
 investment_advisor_team = Team(
@@ -34,6 +39,6 @@ investment_advisor_team = Team(
     enable_agentic_context=True,
     enable_team_history=True,
     share_member_interactions=True,
-    storage=SqliteStorage(table_name="agent_sessions", db_file="/tmp/data.db"),
+    storage=CachedStorage(team_storage),
     markdown=True
 )
@@ -2,6 +2,7 @@ import os
 from agno.agent import Agent
 from agno.models.google import Gemini
 from agno.tools.yfinance import YFinanceTools
+from agents.tool_cache import tool_cache
 
 stock_price_agent = Agent(
     agent_id="stock_price_agent",
@@ -10,7 +11,7 @@ stock_price_agent = Agent(
         id="gemini-2.5-flash",
         api_key=os.getenv("GEMINI_API_KEY")
     ),
-    tools=[YFinanceTools()],
+    tools=[tool_cache.wrap(YFinanceTools())],
     instructions="You are a stock price agent. Return data of specifed stock.",
     markdown=True
 )
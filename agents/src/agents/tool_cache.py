@@ -0,0 +1,10 @@
+from lib.tools import ToolResultCache
+
+# Shared by all agents, so identical tool calls from concurrent runs hit the upstream APIs once
+tool_cache = ToolResultCache(
+    default_ttl=60,
+    ttls={
+        "get_company_news": 300,
+    },
+    max_entries=1024,
+)
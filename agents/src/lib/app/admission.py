@@ -0,0 +1,200 @@
+"""Admission control limiting the number of runs an API app executes at once."""
+
+import asyncio
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, Iterable, Optional
+
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from agno.utils.log import log_debug
+
+
+class AdmissionRejected(Exception):
+    """Raised when a run is not admitted, carrying the HTTP status it should be answered with."""
+
+    def __init__(self, status_code: int, detail: str, retry_after: int):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+@dataclass
+class AdmissionStats:
+    """Current load and counters of an AdmissionController."""
+
+    max_in_flight: int
+    max_queued: int
+    in_flight: int = 0
+    queued: int = 0
+    admitted: int = 0
+    rejected: int = 0  # Runs turned away because the wait queue was full
+    timed_out: int = 0  # Runs turned away after waiting in the queue for too long
+    total_wait_time: float = 0.0  # Seconds spent in the queue by the admitted runs
+    max_wait_time: float = 0.0
+
+    @property
+    def mean_wait_time(self) -> float:
+        return self.total_wait_time / self.admitted if self.admitted else 0.0
+
+    @property
+    def saturated(self) -> bool:
+        return self.in_flight >= self.max_in_flight
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "queued": self.queued,
+            "max_queued": self.max_queued,
+            "saturated": self.saturated,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "mean_wait_time": self.mean_wait_time,
+            "max_wait_time": self.max_wait_time,
+        }
+
+
+class AdmissionController:
+    """Admits at most max_in_flight runs at once, queueing up to max_queued more in arrival order.
+
+    Runs arriving while the queue is full are rejected right away with a 429. Runs still queued after queue_timeout
+    seconds are rejected with a 503. Both carry a Retry-After header.
+    """
+
+    def __init__(
+        self,
+        max_in_flight: int = 32,
+        max_queued: int = 64,
+        queue_timeout: float = 10.0,
+        retry_after: int = 5,
+    ):
+        """
+        Args:
+            max_in_flight (int): Maximum number of runs executing at once.
+            max_queued (int): Maximum number of runs waiting for a slot, 0 to reject as soon as every slot is taken.
+            queue_timeout (float): Seconds a run waits for a slot before being rejected.
+            retry_after (int): Seconds clients are asked to wait before retrying a rejected run.
+        """
+        self.max_in_flight = max_in_flight
+        self.max_queued = max_queued
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self.stats = AdmissionStats(max_in_flight=max_in_flight, max_queued=max_queued)
+        self.waiters: Deque[asyncio.Future] = deque()
+
+    async def acquire(self) -> None:
+        """Wait for a run slot, raising AdmissionRejected if none frees up in time."""
+        if self.stats.in_flight < self.max_in_flight and not self.waiters:
+            self.stats.in_flight += 1
+            self.stats.admitted += 1
+            return
+
+        if len(self.waiters) >= self.max_queued:
+            self.stats.rejected += 1
+            raise AdmissionRejected(429, "Too many runs in progress", self.retry_after)
+
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters.append(waiter)
+        self.stats.queued += 1
+        start = time.perf_counter()
+        try:
+            # A released slot is handed over to the waiter, in_flight already accounts for it
+            await asyncio.wait_for(waiter, timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            # Handed a slot as the wait timed out, give it back
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            self.stats.timed_out += 1
+            raise AdmissionRejected(503, "Timed out waiting for a run slot", self.retry_after)
+        except BaseException:
+            # Cancelled right after being handed a slot, give it back
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+        finally:
+            self.stats.queued -= 1
+            if not waiter.done():
+                waiter.cancel()
+            try:
+                self.waiters.remove(waiter)
+            except ValueError:
+                pass
+
+        wait_time = time.perf_counter() - start
+        self.stats.admitted += 1
+        self.stats.total_wait_time += wait_time
+        self.stats.max_wait_time = max(self.stats.max_wait_time, wait_time)
+        log_debug(f"Run admitted after waiting {wait_time:.3f}s")
+
+    def release(self) -> None:
+        """Free a run slot, handing it over to the oldest waiting run if there is one."""
+        while self.waiters:
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.stats.in_flight -= 1
+
+
+class AdmissionSlot:
+    """A run slot held by a request, which the route may take over for a run outliving the response."""
+
+    def __init__(self, controller: AdmissionController):
+        self.controller = controller
+        self.held = True
+        self.detached = False
+
+    def detach(self) -> None:
+        """Keep the slot held after the response, until release is called, e.g. once a background run is done."""
+        self.detached = True
+
+    def release(self) -> None:
+        if self.held:
+            self.held = False
+            self.controller.release()
+
+
+def get_admission_slot(scope: Scope) -> Optional[AdmissionSlot]:
+    """Return the run slot the AdmissionMiddleware holds for the request, if any."""
+    return scope.get("state", {}).get("admission_slot")
+
+
+class AdmissionMiddleware:
+    """ASGI middleware holding a run slot of the AdmissionController for the whole response to requests on paths.
+
+    The slot is available to the route from get_admission_slot, and is released with the response unless detached.
+    """
+
+    def __init__(self, app: ASGIApp, controller: AdmissionController, paths: Iterable[str]):
+        self.app = app
+        self.controller = controller
+        self.paths = set(paths)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            await self.controller.acquire()
+        except AdmissionRejected as e:
+            response = JSONResponse(
+                status_code=e.status_code,
+                content={"detail": e.detail},
+                headers={"Retry-After": str(e.retry_after)},
+            )
+            await response(scope, receive, send)
+            return
+
+        slot = AdmissionSlot(self.controller)
+        scope = {**scope, "state": {**scope.get("state", {}), "admission_slot": slot}}
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            if not slot.detached:
+                slot.release()
@@ -1,17 +1,100 @@
 """Main class for the AG-UI app, used to expose an Agno Agent or Team in an AG-UI compatible format."""
 
+from typing import Any, Callable, Dict, Optional
+
 from fastapi.routing import APIRouter
 
 from lib.app.agui.async_router import get_async_agui_router
+from lib.app.agui.coalescing import RunCoalescer
+from lib.app.agui.encoder import AGUIEventEncoder
+from lib.app.agui.event_log import RunEventLog
+from lib.app.agui.executor import RunExecutor
+from lib.app.agui.fan_out import MemberFanOut
+from lib.app.agui.history import HistoryCompactor
+from lib.app.agui.payloads import ToolPayloadConfig
 from lib.app.agui.sync_router import get_sync_agui_router
+from lib.app.agui.tracing import AGUITracing
+from lib.app.agui.utils import AGUIMessageCache, TextCoalescingConfig
+from lib.app.agui.websocket import AGUIWebSocketSessions
 from lib.app.base import BaseAPIApp
+from lib.app.utils import MediaIntake
 
 
 class AGUIApp(BaseAPIApp):
     type = "agui"
+    run_paths = ("/agui", "/agui/multipart")
+
+    def __init__(
+        self,
+        *args,
+        text_coalescing: Optional[TextCoalescingConfig] = None,
+        encoder: Optional[AGUIEventEncoder] = None,
+        message_cache: Optional[AGUIMessageCache] = None,
+        history_delta_only: bool = False,
+        run_coalescer: Optional[RunCoalescer] = None,
+        run_executor: Optional[RunExecutor] = None,
+        member_fan_out: Optional[MemberFanOut] = None,
+        event_log: Optional[RunEventLog] = None,
+        tracing: Optional[AGUITracing] = None,
+        tool_payloads: Optional[ToolPayloadConfig] = None,
+        media_intake: Optional[MediaIntake] = None,
+        history_compactor: Optional[HistoryCompactor] = None,
+        negotiate_encoding: bool = True,
+        websocket_sessions: Optional[AGUIWebSocketSessions] = None,
+        status_stats: Optional[Dict[str, Callable[[], Dict[str, Any]]]] = None,
+        **kwargs,
+    ):
+        super().__init__(*args, **kwargs)
+        self.text_coalescing: Optional[TextCoalescingConfig] = text_coalescing
+        self.encoder: Optional[AGUIEventEncoder] = encoder
+        self.message_cache: Optional[AGUIMessageCache] = message_cache
+        self.history_delta_only: bool = history_delta_only
+        self.run_coalescer: Optional[RunCoalescer] = run_coalescer
+        self.run_executor: Optional[RunExecutor] = run_executor
+        self.member_fan_out: Optional[MemberFanOut] = member_fan_out
+        self.event_log: Optional[RunEventLog] = event_log
+        self.tracing: Optional[AGUITracing] = tracing
+        self.tool_payloads: Optional[ToolPayloadConfig] = tool_payloads
+        self.media_intake: Optional[MediaIntake] = media_intake
+        self.history_compactor: Optional[HistoryCompactor] = history_compactor
+        self.negotiate_encoding: bool = negotiate_encoding
+        self.websocket_sessions: Optional[AGUIWebSocketSessions] = websocket_sessions
+        self.status_stats: Optional[Dict[str, Callable[[], Dict[str, Any]]]] = status_stats
 
     def get_router(self) -> APIRouter:
-        return get_sync_agui_router(agent=self.agent, team=self.team)
+        return get_sync_agui_router(
+            agent=self.agent,
+            team=self.team,
+            text_coalescing=self.text_coalescing,
+            encoder=self.encoder,
+            message_cache=self.message_cache,
+            history_delta_only=self.history_delta_only,
+            run_executor=self.run_executor,
+            admission_control=self.admission_control,
+            tracing=self.tracing,
+            tool_payloads=self.tool_payloads,
+            history_compactor=self.history_compactor,
+            negotiate_encoding=self.negotiate_encoding,
+            status_stats=self.status_stats,
+        )
 
     def get_async_router(self) -> APIRouter:
-        return get_async_agui_router(agent=self.agent, team=self.team)
+        return get_async_agui_router(
+            agent=self.agent,
+            team=self.team,
+            text_coalescing=self.text_coalescing,
+            encoder=self.encoder,
+            message_cache=self.message_cache,
+            history_delta_only=self.history_delta_only,
+            run_coalescer=self.run_coalescer,
+            admission_control=self.admission_control,
+            member_fan_out=self.member_fan_out,
+            event_log=self.event_log,
+            tracing=self.tracing,
+            tool_payloads=self.tool_payloads,
+            media_intake=self.media_intake,
+            history_compactor=self.history_compactor,
+            negotiate_encoding=self.negotiate_encoding,
+            websocket_sessions=self.websocket_sessions,
+            status_stats=self.status_stats,
+        )
@@ -1,8 +1,10 @@
 """Async router handling exposing an Agno Agent or Team in an AG-UI compatible format."""
 
+import asyncio
+import copy
 import logging
 import uuid
-from typing import AsyncIterator, Optional, cast
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, cast
 
 from ag_ui.core import (
     BaseEvent,
@@ -12,25 +14,57 @@ from ag_ui.core import (
     RunStartedEvent,
     RunFinishedEvent
 )
-from ag_ui.encoder import EventEncoder
-from fastapi import APIRouter
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, Header, HTTPException, Query, Request, WebSocket
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import ValidationError
 
 from agno.agent.agent import Agent
-from lib.app.agui.utils import async_stream_agno_response_as_agui_events, convert_agui_messages_to_agno_messages
+from lib.app.admission import AdmissionController, AdmissionSlot, get_admission_slot
+from lib.app.agui.coalescing import RunCoalescer
+from lib.app.agui.encoder import AGUIEventEncoder, FastSSEEventEncoder, ProtobufEventEncoder, negotiate_encoder
+from lib.app.agui.event_log import RunEventLog, parse_event_id
+from lib.app.agui.fan_out import MemberFanOut, get_synthesis_messages, stream_member_fan_out
+from lib.app.agui.history import HistoryCompactor
+from lib.app.agui.metrics import RunObserver
+from lib.app.agui.payloads import TOOL_RESULTS_PATH, ToolPayloadConfig
+from lib.app.agui.tracing import AGUITracing, RunTrace
+from lib.app.agui.utils import (
+    AGUIMessageCache,
+    RunStats,
+    TextCoalescingConfig,
+    async_coalesce_text_deltas,
+    async_stream_agno_response_as_agui_events,
+    prepare_agno_messages,
+    track_run,
+)
+from lib.app.agui.websocket import AGUIWebSocketSessions, serve_agui_websocket
+from lib.app.utils import MediaIntake, UploadedMedia
 from agno.team.team import Team
 
 logger = logging.getLogger(__name__)
 
 
-async def run_agent(agent: Agent, run_input: RunAgentInput) -> AsyncIterator[BaseEvent]:
+async def run_agent(
+    agent: Agent,
+    run_input: RunAgentInput,
+    text_coalescing: Optional[TextCoalescingConfig] = None,
+    message_cache: Optional[AGUIMessageCache] = None,
+    history_delta_only: bool = False,
+    history_compactor: Optional[HistoryCompactor] = None,
+    run_trace: Optional[RunTrace] = None,
+    tool_payloads: Optional[ToolPayloadConfig] = None,
+    media: Optional[UploadedMedia] = None,
+) -> AsyncIterator[BaseEvent]:
     """Run the contextual Agent, mapping AG-UI input messages to Agno format, and streaming the response in AG-UI format."""
     run_id = run_input.run_id or str(uuid.uuid4())
+    observer = RunObserver()
+    response_stream = None
+    events: Optional[AsyncIterator[BaseEvent]] = None
 
     try:
         # Preparing the input for the Agent and emitting the run started event
-        messages = convert_agui_messages_to_agno_messages(run_input.messages or [])
-        yield RunStartedEvent(type=EventType.RUN_STARTED, thread_id=run_input.thread_id, run_id=run_id)
+        messages = prepare_agno_messages(run_input, message_cache, history_delta_only, history_compactor)
+        yield observer.count(RunStartedEvent(type=EventType.RUN_STARTED, thread_id=run_input.thread_id, run_id=run_id))
 
         # Request streaming response from agent
         response_stream = await agent.arun(
@@ -38,90 +72,374 @@ async def run_agent(agent: Agent, run_input: RunAgentInput) -> AsyncIterator[Bas
             session_id=run_input.thread_id,
             stream=True,
             stream_intermediate_steps=True,
+            **(media.to_run_kwargs() if media is not None else {}),
         )
 
         # Stream the response content in AG-UI format
-        async for event in async_stream_agno_response_as_agui_events(
-            response_stream=response_stream
-        ):
+        events = async_stream_agno_response_as_agui_events(
+            response_stream=response_stream, run_trace=run_trace, tool_payloads=tool_payloads
+        )
+        if text_coalescing is not None:
+            events = async_coalesce_text_deltas(events, text_coalescing)
+        async for event in events:
+            observer.observe(event)
             yield event
 
-        yield RunFinishedEvent(type=EventType.RUN_FINISHED, thread_id=run_input.thread_id, run_id=run_id)
+        observer.outcome = "completed"
+        yield observer.count(
+            RunFinishedEvent(type=EventType.RUN_FINISHED, thread_id=run_input.thread_id, run_id=run_id)
+        )
 
     # Emit a RunErrorEvent if any error occurs
     except Exception as e:
         logger.error(f"Error running agent: {e}", exc_info=True)
-        yield RunErrorEvent(type=EventType.RUN_ERROR, message=str(e))
+        observer.outcome = "error"
+        if run_trace is not None:
+            run_trace.record_error(e)
+        yield observer.count(RunErrorEvent(type=EventType.RUN_ERROR, message=str(e)))
+
+    finally:
+        observer.finish()
+        # Stop the underlying run if the stream is closed early, e.g. when the client disconnected.
+        # Close the events first, the text coalescer may still be pulling from the response stream.
+        if events is not None:
+            await events.aclose()  # type: ignore
+        if response_stream is not None:
+            await response_stream.aclose()  # type: ignore
+
 
+async def run_team(
+    team: Team,
+    input: RunAgentInput,
+    text_coalescing: Optional[TextCoalescingConfig] = None,
+    message_cache: Optional[AGUIMessageCache] = None,
+    history_delta_only: bool = False,
+    member_fan_out: Optional[MemberFanOut] = None,
+    history_compactor: Optional[HistoryCompactor] = None,
+    run_trace: Optional[RunTrace] = None,
+    tool_payloads: Optional[ToolPayloadConfig] = None,
+    media: Optional[UploadedMedia] = None,
+) -> AsyncIterator[BaseEvent]:
+    """Run the contextual Team, mapping AG-UI input messages to Agno format, and streaming the response in AG-UI format.
 
-async def run_team(team: Team, input: RunAgentInput) -> AsyncIterator[BaseEvent]:
-    """Run the contextual Team, mapping AG-UI input messages to Agno format, and streaming the response in AG-UI format."""
+    With member_fan_out, the members it lists first run on the input concurrently, each streamed as its own messages.
+    The leader then responds from the member responses.
+    """
     run_id = input.run_id or str(uuid.uuid4())
+    observer = RunObserver()
+    response_stream = None
+    events: Optional[AsyncIterator[BaseEvent]] = None
     try:
         # Extract the last user message for team execution
-        messages = convert_agui_messages_to_agno_messages(input.messages or [])
-        yield RunStartedEvent(type=EventType.RUN_STARTED, thread_id=input.thread_id, run_id=run_id)
+        messages = prepare_agno_messages(input, message_cache, history_delta_only, history_compactor)
+        yield observer.count(RunStartedEvent(type=EventType.RUN_STARTED, thread_id=input.thread_id, run_id=run_id))
 
         # Request streaming response from team.
         # Team.arun() does not handle list[Message] type, join the messages
         str_messages = list(map(lambda msg: cast(str, msg.content), messages))
+
+        if member_fan_out is not None:
+            member_outputs: Dict[str, str] = {}
+            events = stream_member_fan_out(
+                team, member_fan_out, str_messages, input.thread_id, member_outputs, run_trace, tool_payloads
+            )
+            if text_coalescing is not None:
+                events = async_coalesce_text_deltas(events, text_coalescing)
+            async for event in events:
+                observer.observe(event)
+                yield event
+            str_messages = get_synthesis_messages(str_messages, member_outputs)
+
         response_stream = await team.arun(
             message=str_messages,
             session_id=input.thread_id,
             stream=True,
             stream_intermediate_steps=True,
+            **(media.to_run_kwargs() if media is not None else {}),
         )
 
         # Stream the response content in AG-UI format
-        async for event in async_stream_agno_response_as_agui_events(
-            response_stream=response_stream
-        ):
+        events = async_stream_agno_response_as_agui_events(
+            response_stream=response_stream, run_trace=run_trace, tool_payloads=tool_payloads
+        )
+        if text_coalescing is not None:
+            events = async_coalesce_text_deltas(events, text_coalescing)
+        async for event in events:
+            observer.observe(event)
             yield event
 
-        yield RunFinishedEvent(type=EventType.RUN_FINISHED, thread_id=input.thread_id, run_id=run_id)
+        observer.outcome = "completed"
+        yield observer.count(RunFinishedEvent(type=EventType.RUN_FINISHED, thread_id=input.thread_id, run_id=run_id))
 
     except Exception as e:
         logger.error(f"Error running team: {e}", exc_info=True)
-        yield RunErrorEvent(type=EventType.RUN_ERROR, message=str(e))
+        observer.outcome = "error"
+        if run_trace is not None:
+            run_trace.record_error(e)
+        yield observer.count(RunErrorEvent(type=EventType.RUN_ERROR, message=str(e)))
+
+    finally:
+        observer.finish()
+        # Stop the underlying run if the stream is closed early, e.g. when the client disconnected.
+        # Close the events first, the text coalescer may still be pulling from the response stream.
+        if events is not None:
+            await events.aclose()  # type: ignore
+        if response_stream is not None:
+            await response_stream.aclose()  # type: ignore
 
 
-def get_async_agui_router(agent: Optional[Agent] = None, team: Optional[Team] = None) -> APIRouter:
-    """Return an AG-UI compatible FastAPI router."""
+def get_async_agui_router(
+    agent: Optional[Agent] = None,
+    team: Optional[Team] = None,
+    text_coalescing: Optional[TextCoalescingConfig] = None,
+    encoder: Optional[AGUIEventEncoder] = None,
+    message_cache: Optional[AGUIMessageCache] = None,
+    history_delta_only: bool = False,
+    run_coalescer: Optional[RunCoalescer] = None,
+    admission_control: Optional[AdmissionController] = None,
+    member_fan_out: Optional[MemberFanOut] = None,
+    event_log: Optional[RunEventLog] = None,
+    tracing: Optional[AGUITracing] = None,
+    tool_payloads: Optional[ToolPayloadConfig] = None,
+    media_intake: Optional[MediaIntake] = None,
+    history_compactor: Optional[HistoryCompactor] = None,
+    negotiate_encoding: bool = True,
+    websocket_sessions: Optional[AGUIWebSocketSessions] = None,
+    status_stats: Optional[Dict[str, Callable[[], Dict[str, Any]]]] = None,
+) -> APIRouter:
+    """Return an AG-UI compatible FastAPI router.
+
+    With an event_log, every frame carries an SSE id. Clients resume a run by posting it again with the
+    Last-Event-ID header, or from GET /agui/runs/{run_id}?thread_id={thread_id}. Posting a run already in the log
+    without a Last-Event-ID is answered with 409. A run whose client disconnected keeps going for the resume_grace of
+    the log, 0 by default, holding its admission slot until it's done. Without an event_log, the run is cancelled as
+    soon as its client disconnects.
+
+    With member_fan_out, the team members it lists run concurrently on each request before the leader responds.
+
+    With tracing, a sample of the runs is traced, from the Agno chunks to the encoded frames.
+
+    With tool_payloads, oversized tool call args and results are split or truncated. The full truncated results are
+    served from GET /agui/tool-results/{tool_call_id} when the config has a result_store.
+
+    With a media_intake, POST /agui/multipart takes the run input as a run_input form field, along with uploaded files
+    passed to the run as media. Requests over the request limit of the media_intake are rejected with 413, before
+    their form is spooled. Behind multiple workers, the form sends run_input before the files, or the request names
+    the thread in a thread_id query parameter.
+
+    With a history_compactor, the history passed to the runs is kept within a token budget, older turns summarized.
+
+    With negotiate_encoding, runs are streamed in the protobuf encoding to the clients preferring its media type in
+    their Accept header, in SSE to the others. Protobuf streams have no event ids and bypass the event_log.
+
+    With websocket_sessions, clients may keep a WebSocket open to a thread at /agui/ws, sending only the new messages
+    of each run and cancelling the run in progress. WebSocket runs are neither coalesced nor logged.
+
+    GET /status reports the runs, the load, the message_cache and the sections of status_stats, read on every
+    request, e.g. the stats of the tool cache.
+    """
     if (agent is None and team is None) or (agent is not None and team is not None):
         raise ValueError("One of 'agent' or 'team' must be provided.")
+    if member_fan_out is not None:
+        if team is None:
+            raise ValueError("'member_fan_out' requires a 'team'.")
+        member_fan_out.get_members(team)
 
     router = APIRouter()
-    encoder = EventEncoder()
+    event_encoder = encoder or FastSSEEventEncoder()
+    encoders: List[AGUIEventEncoder] = [event_encoder]
+    if negotiate_encoding:
+        encoders.append(ProtobufEventEncoder())
+    run_stats = RunStats()
+
+    def _start_run(
+        run_input: RunAgentInput,
+        run_trace: Optional[RunTrace] = None,
+        media: Optional[UploadedMedia] = None,
+    ) -> AsyncIterator[BaseEvent]:
+        if agent:
+            return run_agent(
+                agent,
+                run_input,
+                text_coalescing,
+                message_cache,
+                history_delta_only,
+                history_compactor,
+                run_trace,
+                tool_payloads,
+                media,
+            )
+        return run_team(
+            team,  # type: ignore
+            run_input,
+            text_coalescing,
+            message_cache,
+            history_delta_only,
+            member_fan_out,
+            history_compactor,
+            run_trace,
+            tool_payloads,
+            media,
+        )
+
+    def _copy_session(from_thread_id: str, to_thread_id: str) -> None:
+        """Store a copy of a thread's session under another thread, for the subscribers of a coalesced run."""
+        storage = (agent or team).storage  # type: ignore
+        if storage is None:
+            return
+        session = storage.read(session_id=from_thread_id)
+        if session is None:
+            return
+        session = copy.deepcopy(session)
+        session.session_id = to_thread_id
+        storage.upsert(session)
+
+    def _streaming_response(
+        content: AsyncIterator[bytes],
+        run_encoder: AGUIEventEncoder = event_encoder,
+    ) -> StreamingResponse:
+        headers = {
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "Access-Control-Allow-Origin": "*",
+            "Access-Control-Allow-Methods": "POST, GET, OPTIONS",
+            "Access-Control-Allow-Headers": "*",
+        }
+        if len(encoders) > 1:
+            headers["Vary"] = "Accept"
+        return StreamingResponse(content, media_type=run_encoder.get_content_type(), headers=headers)
+
+    async def _run(
+        run_input: RunAgentInput,
+        last_event_id: Optional[str] = None,
+        media: Optional[UploadedMedia] = None,
+        accept: Optional[str] = None,
+        admission_slot: Optional[AdmissionSlot] = None,
+    ):
+        run_encoder = negotiate_encoder(accept, encoders)
 
-    async def _run(run_input: RunAgentInput):
         async def event_generator():
-            if agent:
-                async for event in run_agent(agent, run_input):
-                    encoded_event = encoder.encode(event)
-                    yield encoded_event
-            elif team:
-                async for event in run_team(team, run_input):
-                    encoded_event = encoder.encode(event)
+            run_trace = tracing.start_run(run_input) if tracing is not None else None
+
+            # Identical concurrent runs share a single underlying run when coalescing is enabled.
+            # Runs with uploads are never coalesced, the run input doesn't cover them.
+            if run_coalescer is not None and media is None:
+                events = run_coalescer.stream(
+                    run_input, lambda run_input: _start_run(run_input, run_trace), copy_session=_copy_session
+                )
+            else:
+                events = _start_run(run_input, run_trace, media)
+
+            try:
+                async for event in events:
+                    encoded_event = run_encoder.encode(event)
                     yield encoded_event
+            finally:
+                if run_trace is not None:
+                    run_trace.finish()
+                # The run is done with the stored uploads, they may be pruned
+                if media is not None:
+                    media.release()
 
-        return StreamingResponse(
-            event_generator(),
-            media_type="text/event-stream",
-            headers={
-                "Cache-Control": "no-cache",
-                "Connection": "keep-alive",
-                "Access-Control-Allow-Origin": "*",
-                "Access-Control-Allow-Methods": "POST, GET, OPTIONS",
-                "Access-Control-Allow-Headers": "*",
-            },
-        )
+        # The event log frames are SSE, runs streamed in another encoding can't be resumed
+        if event_log is None or run_encoder is not event_encoder:
+            return _streaming_response(track_run(event_generator(), run_stats), run_encoder)
+
+        # A retry of a run already in the log resumes it, given the Last-Event-ID of the client, instead of running it
+        # again. Runs are only known within their thread.
+        run_key = (run_input.thread_id, run_input.run_id)
+        after = 0
+        if last_event_id is not None:
+            event_run_id, after = parse_event_id(last_event_id)
+            if event_run_id not in (None, run_input.run_id):
+                after = 0
+        elif await event_log.has_run(run_key):
+            raise HTTPException(status_code=409, detail="Run already exists, resume it with the Last-Event-ID header")
+
+        def start_logged_run() -> AsyncIterator[bytes]:
+            # The run outlives the response while a client may resume it, it keeps its admission slot until it's done
+            if admission_slot is not None:
+                admission_slot.detach()
+            return track_run(event_generator(), run_stats)
+
+        on_run_done = admission_slot.release if admission_slot is not None else None
+        return _streaming_response(event_log.stream(run_key, start_logged_run, after, on_run_done))
 
     @router.post("/agui")
-    async def run_agent_agui(run_input: RunAgentInput):
-        return await _run(run_input)
+    async def run_agent_agui(
+        request: Request,
+        run_input: RunAgentInput,
+        last_event_id: Optional[str] = Header(None),
+        accept: Optional[str] = Header(None),
+    ):
+        return await _run(run_input, last_event_id, accept=accept, admission_slot=get_admission_slot(request.scope))
+
+    if media_intake is not None:
+
+        @router.post("/agui/multipart")
+        async def run_agent_agui_multipart(
+            request: Request,
+            thread_id: Optional[str] = Query(None),
+            last_event_id: Optional[str] = Header(None),
+            accept: Optional[str] = Header(None),
+        ):
+            # Parsed here rather than as Form parameters, which FastAPI reads in full before any check
+            form = await media_intake.read_form(request)
+            try:
+                run_input = form.get("run_input")
+                if not isinstance(run_input, str):
+                    raise HTTPException(status_code=422, detail="The run_input form field is required")
+                try:
+                    parsed_run_input = RunAgentInput.model_validate_json(run_input)
+                except ValidationError as e:
+                    raise HTTPException(status_code=422, detail=str(e))
+                # The workers' dispatcher routes the run by the thread_id parameter, it must name the run's thread
+                if thread_id is not None and thread_id != parsed_run_input.thread_id:
+                    raise HTTPException(status_code=400, detail="The thread_id parameter doesn't match the run_input")
+                files = [file for file in form.getlist("files") if not isinstance(file, str)]
+                media = await asyncio.to_thread(media_intake.process_uploads, files)
+            finally:
+                await form.close()
+            return await _run(parsed_run_input, last_event_id, media, accept, get_admission_slot(request.scope))
+
+    if event_log is not None:
+
+        @router.get("/agui/runs/{run_id}")
+        async def resume_agent_agui(
+            run_id: str, thread_id: str, after: int = 0, last_event_id: Optional[str] = Header(None)
+        ):
+            if last_event_id is not None:
+                _, after = parse_event_id(last_event_id)
+            if not await event_log.has_run((thread_id, run_id)):
+                raise HTTPException(status_code=404, detail="Run not found")
+            return _streaming_response(event_log.resume((thread_id, run_id), after))
+
+    if websocket_sessions is not None:
+
+        @router.websocket("/agui/ws")
+        async def run_agent_agui_websocket(websocket: WebSocket):
+            await serve_agui_websocket(websocket, websocket_sessions, _start_run, admission_control, tracing, run_stats)
+
+    if tool_payloads is not None and tool_payloads.result_store is not None:
+        result_store = tool_payloads.result_store
+
+        @router.get(TOOL_RESULTS_PATH + "/{tool_call_id}")
+        async def get_tool_result(tool_call_id: str):
+            # Reads the database of a SqliteToolResultStore
+            content = await asyncio.to_thread(result_store.get, tool_call_id)
+            if content is None:
+                raise HTTPException(status_code=404, detail="Tool result not found")
+            return PlainTextResponse(content)
 
     @router.get("/status")
     async def get_status():
-        return {"status": "available"}
+        status = {"status": "available", "runs": run_stats.to_dict()}
+        if admission_control is not None:
+            status["load"] = admission_control.stats.to_dict()
+        if message_cache is not None:
+            status["message_cache"] = message_cache.stats.to_dict()
+        for name, read_stats in (status_stats or {}).items():
+            status[name] = read_stats()
+        return status
 
     return router
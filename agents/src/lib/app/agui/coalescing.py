@@ -0,0 +1,143 @@
+"""Sharing of a single underlying run between identical concurrent AG-UI runs."""
+
+import asyncio
+import json
+import logging
+from functools import partial
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Set
+
+from ag_ui.core import BaseEvent, EventType, RunAgentInput
+
+logger = logging.getLogger(__name__)
+
+# Events carrying the thread_id and run_id of the AG-UI run
+RUN_LIFECYCLE_EVENT_TYPES = {EventType.RUN_STARTED, EventType.RUN_FINISHED}
+
+
+class SharedRun:
+    """A run whose events are fanned out to every subscriber, replaying the events emitted before they joined."""
+
+    def __init__(self, key: str, thread_id: str):
+        self.key = key
+        self.thread_id = thread_id  # The thread of the run that started it, its session is stored under
+        self.thread_ids: Set[str] = {thread_id}  # The threads of every subscriber
+        self.events: List[BaseEvent] = []
+        self.finished = False
+        self.subscribers = 0
+        self.condition = asyncio.Condition()
+        self.task: Optional[asyncio.Task] = None
+
+    async def produce(
+        self,
+        events: AsyncIterator[BaseEvent],
+        on_complete: Optional[Callable[[], Awaitable[None]]] = None,
+    ) -> None:
+        try:
+            async for event in events:
+                async with self.condition:
+                    self.events.append(event)
+                    self.condition.notify_all()
+            # The subscribers' streams end once it's done, so their next runs find what it stored
+            if on_complete is not None:
+                await on_complete()
+        finally:
+            async with self.condition:
+                self.finished = True
+                self.condition.notify_all()
+
+
+class RunCoalescer:
+    """Runs identical concurrent AG-UI runs once, streaming the shared events to each of them.
+
+    Only runs starting a new thread are shared, i.e. runs whose messages are all user messages. Runs are identical
+    when their normalized messages, frontend tools, context and state match. Each subscriber gets its own thread_id
+    and run_id rewritten onto the run lifecycle events. The session of the underlying run is stored under the
+    thread_id of the run that started it, and copied to the threads of the other subscribers by copy_session once
+    the run completed.
+    """
+
+    def __init__(self):
+        self.runs: Dict[str, SharedRun] = {}
+
+    def get_key(self, run_input: RunAgentInput) -> Optional[str]:
+        """Return the key identifying identical runs, or None if the run can't be shared."""
+        messages = run_input.messages or []
+        if not messages or any(msg.role != "user" for msg in messages):
+            return None
+
+        return json.dumps(
+            {
+                "messages": [" ".join((msg.content or "").split()).casefold() for msg in messages],
+                "tools": sorted(tool.name for tool in run_input.tools or []),
+                "context": [context.model_dump() for context in run_input.context or []],
+                "state": run_input.state,
+            },
+            sort_keys=True,
+            default=repr,
+        )
+
+    async def stream(
+        self,
+        run_input: RunAgentInput,
+        start_run: Callable[[RunAgentInput], AsyncIterator[BaseEvent]],
+        copy_session: Optional[Callable[[str, str], None]] = None,
+    ) -> AsyncIterator[BaseEvent]:
+        """Stream the events of the run, joining an identical run in progress if there is one.
+
+        copy_session(from_thread_id, to_thread_id) stores a copy of a thread's session under another thread. It's
+        called from a worker thread, as it usually goes through the storage of the Agent or Team.
+        """
+        key = self.get_key(run_input)
+        if key is None:
+            async for event in start_run(run_input):
+                yield event
+            return
+
+        shared_run = self.runs.get(key)
+        if shared_run is None:
+            shared_run = SharedRun(key, run_input.thread_id)
+            on_complete = partial(self._copy_sessions, shared_run, copy_session) if copy_session is not None else None
+            shared_run.task = asyncio.create_task(shared_run.produce(start_run(run_input), on_complete))
+            shared_run.task.add_done_callback(lambda _: self._remove(shared_run))
+            self.runs[key] = shared_run
+        else:
+            logger.debug(f"Joining shared run for thread {run_input.thread_id}")
+            shared_run.thread_ids.add(run_input.thread_id)
+
+        shared_run.subscribers += 1
+        try:
+            index = 0
+            while True:
+                async with shared_run.condition:
+                    await shared_run.condition.wait_for(
+                        lambda: index < len(shared_run.events) or shared_run.finished
+                    )
+                    pending_events = shared_run.events[index:]
+                if not pending_events:
+                    break
+
+                index += len(pending_events)
+                for event in pending_events:
+                    if event.type in RUN_LIFECYCLE_EVENT_TYPES:
+                        event = event.model_copy(update={"thread_id": run_input.thread_id, "run_id": run_input.run_id})
+                    yield event
+        finally:
+            shared_run.subscribers -= 1
+            # Nobody is listening anymore, stop the underlying run
+            if shared_run.subscribers == 0 and shared_run.task is not None and not shared_run.task.done():
+                self._remove(shared_run)
+                shared_run.task.cancel()
+
+    async def _copy_sessions(self, shared_run: SharedRun, copy_session: Callable[[str, str], None]) -> None:
+        """Copy the session of the completed run to the threads of its other subscribers."""
+        # Identical runs starting from now on run again, no subscriber can join while the sessions are copied
+        self._remove(shared_run)
+        for thread_id in shared_run.thread_ids - {shared_run.thread_id}:
+            try:
+                await asyncio.to_thread(copy_session, shared_run.thread_id, thread_id)
+            except Exception as e:
+                logger.warning(f"Failed to copy the session of thread {shared_run.thread_id} to {thread_id}: {e}")
+
+    def _remove(self, shared_run: SharedRun) -> None:
+        if self.runs.get(shared_run.key) is shared_run:
+            del self.runs[shared_run.key]
@@ -0,0 +1,336 @@
+"""Encoders turning AG-UI events into the bytes streamed by the AG-UI router."""
+
+import struct
+from abc import ABC, abstractmethod
+from json.encoder import encode_basestring  # type: ignore
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Type
+
+from ag_ui.core import (
+    BaseEvent,
+    CustomEvent,
+    EventType,
+    TextMessageContentEvent,
+    ToolCallArgsEvent,
+    ToolCallEndEvent,
+)
+from ag_ui.encoder import AGUI_MEDIA_TYPE, EventEncoder
+from pydantic import BaseModel
+
+
+class AGUIEventEncoder(ABC):
+    """Base class for the encoders used by the AG-UI routers."""
+
+    @abstractmethod
+    def get_content_type(self) -> str:
+        """Return the media type of the encoded stream."""
+        raise NotImplementedError("get_content_type must be implemented")
+
+    @abstractmethod
+    def encode(self, event: BaseEvent) -> bytes:
+        """Encode an event into the bytes of a single stream frame."""
+        raise NotImplementedError("encode must be implemented")
+
+
+class SSEEventEncoder(AGUIEventEncoder):
+    """Encodes events as Server-Sent Events using the reference ag-ui EventEncoder."""
+
+    def __init__(self):
+        self.encoder = EventEncoder()
+
+    def get_content_type(self) -> str:
+        return self.encoder.get_content_type()
+
+    def encode(self, event: BaseEvent) -> bytes:
+        return self.encoder.encode(event).encode("utf-8")
+
+
+class FastSSEEventEncoder(SSEEventEncoder):
+    """SSE encoder rendering the high-volume event types from pre-built frame templates.
+
+    The output is byte-identical to EventEncoder. Events carrying a timestamp or raw_event, and all other event types,
+    go through the reference encoder.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.fast_paths: Dict[Type[BaseEvent], Callable[[Any], str]] = {
+            TextMessageContentEvent: self._render_text_message_content,
+            ToolCallArgsEvent: self._render_tool_call_args,
+            ToolCallEndEvent: self._render_tool_call_end,
+        }
+
+    def encode(self, event: BaseEvent) -> bytes:
+        render = self.fast_paths.get(type(event))
+        if render is None or event.timestamp is not None or event.raw_event is not None:
+            return super().encode(event)
+        return render(event).encode("utf-8")
+
+    @staticmethod
+    def _render_text_message_content(event: TextMessageContentEvent) -> str:
+        return (
+            'data: {"type":"TEXT_MESSAGE_CONTENT","messageId":'
+            + encode_basestring(event.message_id)
+            + ',"delta":'
+            + encode_basestring(event.delta)
+            + "}\n\n"
+        )
+
+    @staticmethod
+    def _render_tool_call_args(event: ToolCallArgsEvent) -> str:
+        return (
+            'data: {"type":"TOOL_CALL_ARGS","toolCallId":'
+            + encode_basestring(event.tool_call_id)
+            + ',"delta":'
+            + encode_basestring(event.delta)
+            + "}\n\n"
+        )
+
+    @staticmethod
+    def _render_tool_call_end(event: ToolCallEndEvent) -> str:
+        return 'data: {"type":"TOOL_CALL_END","toolCallId":' + encode_basestring(event.tool_call_id) + "}\n\n"
+
+
+# Protobuf wire types
+_VARINT = 0
+_FIXED64 = 1
+_LENGTH_DELIMITED = 2
+
+_SMALL_VARINTS = [bytes((value,)) for value in range(0x80)]
+
+# Length of the message prefixing each protobuf frame, 4 bytes big-endian
+_FRAME_LENGTH = struct.Struct(">I")
+
+
+def _encode_varint(value: int) -> bytes:
+    if value < 0x80:
+        return _SMALL_VARINTS[value]
+    out = bytearray()
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def _field_key(field_number: int, wire_type: int) -> bytes:
+    return _encode_varint(field_number << 3 | wire_type)
+
+
+def _length_delimited(field_number: int, payload: bytes) -> bytes:
+    return _field_key(field_number, _LENGTH_DELIMITED) + _encode_varint(len(payload)) + payload
+
+
+# Fields of the google.protobuf Value, Struct and ListValue messages
+_NULL_VALUE = _field_key(1, _VARINT) + b"\x00"
+_NUMBER_VALUE_KEY = _field_key(2, _FIXED64)
+_STRING_VALUE_KEY = _field_key(3, _LENGTH_DELIMITED)
+_TRUE_VALUE = _field_key(4, _VARINT) + b"\x01"
+_FALSE_VALUE = _field_key(4, _VARINT) + b"\x00"
+_STRUCT_VALUE_KEY = _field_key(5, _LENGTH_DELIMITED)
+_LIST_VALUE_KEY = _field_key(6, _LENGTH_DELIMITED)
+# Struct.fields and ListValue.values are field 1, the key and value of the Struct entries fields 1 and 2
+_FIELD_1_KEY = _field_key(1, _LENGTH_DELIMITED)
+_FIELD_2_KEY = _field_key(2, _LENGTH_DELIMITED)
+
+
+def _encode_value(value: Any) -> bytes:
+    """Encode a JSON-like value as a google.protobuf.Value message."""
+    if value is None:
+        return _NULL_VALUE
+    if isinstance(value, str):
+        data = value.encode("utf-8")
+        return _STRING_VALUE_KEY + _encode_varint(len(data)) + data
+    if isinstance(value, bool):
+        return _TRUE_VALUE if value else _FALSE_VALUE
+    if isinstance(value, (int, float)):
+        return _NUMBER_VALUE_KEY + struct.pack("<d", value)
+    if isinstance(value, dict):
+        parts = []
+        for key, item in value.items():
+            name = str(key).encode("utf-8")
+            encoded_item = _encode_value(item)
+            entry = (
+                _FIELD_1_KEY + _encode_varint(len(name)) + name + _FIELD_2_KEY + _encode_varint(len(encoded_item))
+            ) + encoded_item
+            parts += (_FIELD_1_KEY, _encode_varint(len(entry)), entry)
+        data = b"".join(parts)
+        return _STRUCT_VALUE_KEY + _encode_varint(len(data)) + data
+    if isinstance(value, (list, tuple)):
+        parts = []
+        for item in value:
+            encoded_item = _encode_value(item)
+            parts += (_FIELD_1_KEY, _encode_varint(len(encoded_item)), encoded_item)
+        data = b"".join(parts)
+        return _LIST_VALUE_KEY + _encode_varint(len(data)) + data
+    if isinstance(value, BaseModel):
+        return _encode_value(value.model_dump(mode="json", by_alias=True, exclude_none=True))
+    return _encode_value(str(value))
+
+
+# Kinds of the protobuf event fields
+_STRING = "string"  # Omitted when empty
+_OPTIONAL_STRING = "optional_string"  # Omitted when None
+_VALUE = "value"  # google.protobuf.Value, null when None
+_OPTIONAL_VALUE = "optional_value"  # google.protobuf.Value, omitted when None
+
+# AG-UI event type -> (number of the event in the Event oneof and in the EventType enum, its fields), from the
+# events.proto of the AG-UI protocol. Each field is (field number, attribute of the event, kind).
+_PROTOBUF_EVENTS: Dict[EventType, Tuple[int, int, List[Tuple[int, str, str]]]] = {
+    EventType.TEXT_MESSAGE_START: (1, 0, [(2, "message_id", _STRING), (3, "role", _OPTIONAL_STRING)]),
+    EventType.TEXT_MESSAGE_CONTENT: (2, 1, [(2, "message_id", _STRING), (3, "delta", _STRING)]),
+    EventType.TEXT_MESSAGE_END: (3, 2, [(2, "message_id", _STRING)]),
+    EventType.TOOL_CALL_START: (
+        4,
+        3,
+        [(2, "tool_call_id", _STRING), (3, "tool_call_name", _STRING), (4, "parent_message_id", _OPTIONAL_STRING)],
+    ),
+    EventType.TOOL_CALL_ARGS: (5, 4, [(2, "tool_call_id", _STRING), (3, "delta", _STRING)]),
+    EventType.TOOL_CALL_END: (6, 5, [(2, "tool_call_id", _STRING)]),
+    EventType.STATE_SNAPSHOT: (7, 6, [(2, "snapshot", _VALUE)]),
+    EventType.RAW: (10, 9, [(2, "event", _VALUE), (3, "source", _OPTIONAL_STRING)]),
+    EventType.CUSTOM: (11, 10, [(2, "name", _STRING), (3, "value", _OPTIONAL_VALUE)]),
+    EventType.RUN_STARTED: (12, 11, [(2, "thread_id", _STRING), (3, "run_id", _STRING)]),
+    EventType.RUN_FINISHED: (
+        13,
+        12,
+        [(2, "thread_id", _STRING), (3, "run_id", _STRING), (4, "result", _OPTIONAL_VALUE)],
+    ),
+    EventType.RUN_ERROR: (14, 13, [(2, "code", _OPTIONAL_STRING), (3, "message", _STRING)]),
+    EventType.STEP_STARTED: (15, 14, [(2, "step_name", _STRING)]),
+    EventType.STEP_FINISHED: (16, 15, [(2, "step_name", _STRING)]),
+}
+
+
+class ProtobufEventEncoder(AGUIEventEncoder):
+    """Encodes events in the binary protobuf encoding of the AG-UI protocol.
+
+    Each frame is an ag_ui Event message prefixed with its length, 4 bytes big-endian, like @ag-ui/proto frames them.
+    Event types missing from the protobuf schema, e.g. TOOL_CALL_RESULT, are sent as CUSTOM events named after their
+    type, their value being the JSON form of the event.
+    """
+
+    def __init__(self):
+        # (oneof key, type field, base event field, [(field key, attribute, kind)]) per event type, the keys pre-built
+        self.messages: Dict[EventType, Tuple[bytes, bytes, bytes, List[Tuple[bytes, str, str]]]] = {}
+        for event_type, (oneof_number, enum_number, fields) in _PROTOBUF_EVENTS.items():
+            # The default enum value isn't encoded
+            type_field = _field_key(1, _VARINT) + _encode_varint(enum_number) if enum_number else b""
+            self.messages[event_type] = (
+                _field_key(oneof_number, _LENGTH_DELIMITED),
+                type_field,
+                _length_delimited(1, type_field),
+                [(_field_key(number, _LENGTH_DELIMITED), name, kind) for number, name, kind in fields],
+            )
+
+    def get_content_type(self) -> str:
+        return AGUI_MEDIA_TYPE
+
+    def encode(self, event: BaseEvent) -> bytes:
+        message = self.messages.get(event.type)
+        if message is None:
+            return self._encode_as_custom_event(event)
+        oneof_key, type_field, base_field, fields = message
+
+        # BaseEvent: type = 1, optional timestamp = 2, optional raw_event = 3
+        if event.timestamp is not None or event.raw_event is not None:
+            base_field = _length_delimited(1, type_field + _encode_base_options(event))
+        parts = [base_field]
+        for key, name, kind in fields:
+            value = getattr(event, name)
+            if kind == _STRING:
+                if not value:
+                    continue
+                data = value.encode("utf-8")
+            elif value is None and kind != _VALUE:
+                continue
+            elif kind == _OPTIONAL_STRING:
+                data = value.encode("utf-8")
+            else:
+                data = _encode_value(value)
+            parts.append(key)
+            parts.append(_encode_varint(len(data)))
+            parts.append(data)
+        return _frame(oneof_key, b"".join(parts))
+
+    def _encode_as_custom_event(self, event: BaseEvent) -> bytes:
+        oneof_key, type_field, _, _ = self.messages[EventType.CUSTOM]
+        body = (
+            _length_delimited(1, type_field + _encode_base_options(event))
+            + _length_delimited(2, event.type.value.encode("utf-8"))
+            + _length_delimited(3, _encode_value(event.model_dump(by_alias=True, exclude_none=True)))
+        )
+        return _frame(oneof_key, body)
+
+
+def _encode_base_options(event: BaseEvent) -> bytes:
+    """Encode the timestamp and raw_event fields of the BaseEvent message."""
+    fields = b""
+    if event.timestamp is not None:
+        fields += _field_key(2, _VARINT) + _encode_varint(event.timestamp & 0xFFFFFFFFFFFFFFFF)
+    if event.raw_event is not None:
+        fields += _length_delimited(3, _encode_value(event.raw_event))
+    return fields
+
+
+def _frame(oneof_key: bytes, body: bytes) -> bytes:
+    """Frame the event, the Event message prefixed with its length."""
+    message = oneof_key + _encode_varint(len(body)) + body
+    return _FRAME_LENGTH.pack(len(message)) + message
+
+
+def parse_accept(accept: str) -> List[Tuple[str, float]]:
+    """Parse an Accept header into its media ranges and their quality, in the order of the header."""
+    media_ranges = []
+    for part in accept.split(","):
+        media_range, *parameters = part.split(";")
+        media_range = media_range.strip().lower()
+        if not media_range:
+            continue
+        quality = 1.0
+        for parameter in parameters:
+            name, _, value = parameter.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    pass
+        media_ranges.append((media_range, quality))
+    return media_ranges
+
+
+def _get_match(content_type: str, media_ranges: List[Tuple[str, float]]) -> Optional[Tuple[float, int]]:
+    """Quality and position of the most specific media range matching the content type, None if none does."""
+    main_type = content_type.split("/")[0]
+    matches = {}
+    for position, (media_range, quality) in enumerate(media_ranges):
+        if media_range == content_type:
+            specificity = 2
+        elif media_range == main_type + "/*":
+            specificity = 1
+        elif media_range == "*/*":
+            specificity = 0
+        else:
+            continue
+        matches.setdefault(specificity, (quality, position))
+    return matches[max(matches)] if matches else None
+
+
+def negotiate_encoder(accept: Optional[str], encoders: Sequence[AGUIEventEncoder]) -> AGUIEventEncoder:
+    """Pick the encoder of the media type the client prefers in its Accept header.
+
+    Media types of equal quality are preferred in the order the client lists them, the first encoder winning a tie on
+    a shared range like */*. The first encoder is also used when the header accepts none of them, rather than
+    answering 406, as clients not sending an Accept header expect SSE.
+    """
+    if not accept or len(encoders) == 1:
+        return encoders[0]
+    media_ranges = parse_accept(accept)
+    selected = encoders[0]
+    selected_match: Optional[Tuple[float, int]] = None
+    for encoder in encoders:
+        match = _get_match(encoder.get_content_type(), media_ranges)
+        if match is None or match[0] <= 0:
+            continue
+        if selected_match is None or (match[0], -match[1]) > (selected_match[0], -selected_match[1]):
+            selected, selected_match = encoder, match
+    return selected
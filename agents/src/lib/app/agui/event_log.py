@@ -0,0 +1,422 @@
+"""Per-run logs of the streamed AG-UI frames, letting clients resume a run after losing the connection."""
+
+import asyncio
+import itertools
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
+from typing import AsyncIterator, Callable, Deque, Dict, List, Optional, Tuple
+
+from agno.utils.log import log_debug, log_warning
+
+
+def format_event_id(run_id: str, seq: int) -> str:
+    return f"{run_id}:{seq}"
+
+
+def parse_event_id(event_id: str) -> Tuple[Optional[str], int]:
+    """Parse a Last-Event-ID into its run_id, if any, and sequence number. Invalid ids resume from the start."""
+    run_id, _, seq = event_id.rpartition(":")
+    try:
+        return run_id or None, max(int(seq), 0)
+    except ValueError:
+        return None, 0
+
+
+# (thread_id, run_id) of a run. Run ids are chosen by the clients, a run is only known within its thread.
+RunKey = Tuple[str, str]
+
+
+class EventLogBackend(ABC):
+    """Persistence of the run event logs, letting other processes and restarts replay them."""
+
+    @abstractmethod
+    def append(self, run_key: RunKey, seq: int, frame: bytes) -> None:
+        raise NotImplementedError("append must be implemented")
+
+    @abstractmethod
+    def finish(self, run_key: RunKey) -> None:
+        raise NotImplementedError("finish must be implemented")
+
+    @abstractmethod
+    def has_run(self, run_key: RunKey) -> bool:
+        raise NotImplementedError("has_run must be implemented")
+
+    @abstractmethod
+    def read(self, run_key: RunKey, after: int) -> Optional[Tuple[List[bytes], bool]]:
+        """Return the frames after the sequence number and whether the run finished, or None for unknown runs."""
+        raise NotImplementedError("read must be implemented")
+
+    @abstractmethod
+    def evict(self, finished_before: float) -> None:
+        """Delete the logs of the runs finished before the given time."""
+        raise NotImplementedError("evict must be implemented")
+
+
+class SqliteEventLogBackend(EventLogBackend):
+    """Persists the event logs to a local SQLite database, written in batches from a background thread."""
+
+    def __init__(self, db_file: str, batch_interval: float = 0.05):
+        """
+        Args:
+            db_file (str): Path of the SQLite database.
+            batch_interval (float): Seconds the writer waits for more frames before committing a batch.
+        """
+        self.db_file = db_file
+        self.batch_interval = batch_interval
+        self.operations: List[Tuple[str, tuple]] = []
+        self.condition = threading.Condition()
+        self.local = threading.local()
+
+        with self._connect() as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            # Logs written before runs were keyed by thread too, they only live for the ttl of the log
+            columns = [row[1] for row in connection.execute("PRAGMA table_info(agui_runs)")]
+            if columns and "thread_id" not in columns:
+                connection.execute("DROP TABLE agui_runs")
+                connection.execute("DROP TABLE IF EXISTS agui_run_events")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS agui_run_events (thread_id TEXT NOT NULL, run_id TEXT NOT NULL, "
+                "seq INTEGER NOT NULL, frame BLOB NOT NULL, PRIMARY KEY (thread_id, run_id, seq))"
+            )
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS agui_runs "
+                "(thread_id TEXT NOT NULL, run_id TEXT NOT NULL, finished_at REAL, PRIMARY KEY (thread_id, run_id))"
+            )
+        self.writer = threading.Thread(target=self._write, name="agui-event-log", daemon=True)
+        self.writer.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = getattr(self.local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.db_file, check_same_thread=False)
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self.local.connection = connection
+        return connection
+
+    def _enqueue(self, sql: str, parameters: tuple) -> None:
+        with self.condition:
+            self.operations.append((sql, parameters))
+            self.condition.notify()
+
+    def append(self, run_key: RunKey, seq: int, frame: bytes) -> None:
+        if seq == 1:
+            self._enqueue(
+                "INSERT OR REPLACE INTO agui_runs (thread_id, run_id, finished_at) VALUES (?, ?, NULL)", run_key
+            )
+        self._enqueue(
+            "INSERT OR REPLACE INTO agui_run_events (thread_id, run_id, seq, frame) VALUES (?, ?, ?, ?)",
+            (*run_key, seq, frame),
+        )
+
+    def finish(self, run_key: RunKey) -> None:
+        self._enqueue(
+            "INSERT INTO agui_runs (thread_id, run_id, finished_at) VALUES (?, ?, ?) "
+            "ON CONFLICT (thread_id, run_id) DO UPDATE SET finished_at = excluded.finished_at",
+            (*run_key, time.time()),
+        )
+
+    def has_run(self, run_key: RunKey) -> bool:
+        sql = "SELECT 1 FROM agui_runs WHERE thread_id = ? AND run_id = ?"
+        return self._connect().execute(sql, run_key).fetchone() is not None
+
+    def read(self, run_key: RunKey, after: int) -> Optional[Tuple[List[bytes], bool]]:
+        connection = self._connect()
+        run = connection.execute(
+            "SELECT finished_at FROM agui_runs WHERE thread_id = ? AND run_id = ?", run_key
+        ).fetchone()
+        if run is None:
+            return None
+        rows = connection.execute(
+            "SELECT frame FROM agui_run_events WHERE thread_id = ? AND run_id = ? AND seq > ? ORDER BY seq",
+            (*run_key, after),
+        ).fetchall()
+        return [row[0] for row in rows], run[0] is not None
+
+    def evict(self, finished_before: float) -> None:
+        self._enqueue(
+            "DELETE FROM agui_run_events WHERE (thread_id, run_id) IN "
+            "(SELECT thread_id, run_id FROM agui_runs WHERE finished_at < ?)",
+            (finished_before,),
+        )
+        self._enqueue("DELETE FROM agui_runs WHERE finished_at < ?", (finished_before,))
+
+    def _write(self) -> None:
+        connection = self._connect()
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.operations)
+                # Give the following frames a chance to join the batch
+                self.condition.wait(timeout=self.batch_interval)
+                operations, self.operations = self.operations, []
+            try:
+                with connection:
+                    for sql, parameters in operations:
+                        connection.execute(sql, parameters)
+            except sqlite3.Error as e:
+                log_warning(f"Could not persist {len(operations)} event log operations: {e}")
+
+
+class RunLog:
+    """The frames of a run, with the subscribers following it live.
+
+    Only the latest frames are kept once the run exceeds the frame limit of the log, offset counting the dropped ones.
+    """
+
+    def __init__(self, run_key: RunKey):
+        self.run_key = run_key
+        self.frames: Deque[bytes] = deque()
+        self.offset = 0
+        self.size = 0
+        self.finished = False
+        self.subscribers = 0
+        self.condition = asyncio.Condition()
+        self.task: Optional[asyncio.Task] = None
+        self.abandon_handle: Optional[asyncio.TimerHandle] = None
+
+    @property
+    def run_id(self) -> str:
+        return self.run_key[1]
+
+    @property
+    def last_seq(self) -> int:
+        return self.offset + len(self.frames)
+
+
+class RunEventLog:
+    """Records the SSE frames of every run under its thread_id and run_id, each frame's id made of run_id and sequence.
+
+    Runs are produced in the background, independently of the connection streaming them. A client losing the
+    connection can resume from its Last-Event-ID, replaying the missed frames and then following the run live. A run
+    left without any client is cancelled, right away with the default resume_grace of 0, otherwise after resume_grace
+    seconds without a client resuming it.
+
+    Finished runs are kept for ttl seconds. The memory of the log is bounded: a run keeps at most max_run_frames and
+    max_run_bytes of its latest frames, the older ones being replayed from the backend, and the finished runs are
+    dropped oldest first once all the runs hold more than max_bytes.
+    """
+
+    def __init__(
+        self,
+        ttl: float = 600,
+        resume_grace: float = 0,
+        backend: Optional[EventLogBackend] = None,
+        poll_interval: float = 0.2,
+        stall_timeout: float = 30,
+        max_run_frames: int = 10_000,
+        max_run_bytes: int = 8 * 1024 * 1024,
+        max_bytes: int = 64 * 1024 * 1024,
+    ):
+        """
+        Args:
+            ttl (float): Seconds the log of a finished run is kept.
+            resume_grace (float): Seconds a run keeps going without any client, waiting for one to resume it. With the
+                default of 0, a run is cancelled as soon as its last client disconnects, and a client can only resume
+                a run another connection still follows, e.g. after a network switch.
+            backend (Optional[EventLogBackend]): Persistence of the logs, for runs of other processes or restarts.
+            poll_interval (float): Seconds between reads of the backend when following a run of another process.
+            stall_timeout (float): Seconds without new frames after which a run of another process is considered
+                gone and no longer followed.
+            max_run_frames (int): Latest frames of a run kept in memory.
+            max_run_bytes (int): Bytes of the latest frames of a run kept in memory.
+            max_bytes (int): Bytes of the frames of every run kept in memory, finished runs dropped oldest first.
+        """
+        self.ttl = ttl
+        self.resume_grace = resume_grace
+        self.backend = backend
+        self.poll_interval = poll_interval
+        self.stall_timeout = stall_timeout
+        self.max_run_frames = max_run_frames
+        self.max_run_bytes = max_run_bytes
+        self.max_bytes = max_bytes
+        self.runs: Dict[RunKey, RunLog] = {}
+        # Run -> time the run finished, oldest first
+        self.finished_runs: OrderedDict[RunKey, float] = OrderedDict()
+        self.size = 0
+        self.backend_evicted_at = 0.0
+
+    async def has_run(self, run_key: RunKey) -> bool:
+        """Whether the run is in the log, reading the backend off the event loop."""
+        if run_key in self.runs:
+            return True
+        return self.backend is not None and await asyncio.to_thread(self.backend.has_run, run_key)
+
+    async def stream(
+        self,
+        run_key: RunKey,
+        start_run: Callable[[], AsyncIterator[bytes]],
+        after: int = 0,
+        on_run_done: Optional[Callable[[], None]] = None,
+    ) -> AsyncIterator[bytes]:
+        """Stream the frames of the run after the given sequence number, starting the run if it's unknown.
+
+        Args:
+            run_key (RunKey): thread_id and run_id of the run.
+            start_run (Callable[[], AsyncIterator[bytes]]): Start the run, producing its frames.
+            after (int): Sequence number of the last frame the client received.
+            on_run_done (Optional[Callable[[], None]]): Called once a run started by this stream is done, whether it
+                finished, failed or was cancelled, e.g. to release its admission slot.
+        """
+        self.evict()
+        run_log = self.runs.get(run_key)
+        if run_log is None:
+            if self.backend is not None and await asyncio.to_thread(self.backend.has_run, run_key):
+                async for frame in self._follow_backend(run_key, after):
+                    yield frame
+                return
+            run_log = self._start(run_key, start_run(), on_run_done)
+        else:
+            log_debug(f"Resuming run {run_key[1]} of thread {run_key[0]} after event {after}")
+
+        async for frame in self._follow(run_log, after):
+            yield frame
+
+    async def resume(self, run_key: RunKey, after: int = 0) -> AsyncIterator[bytes]:
+        """Stream the frames of a known run after the given sequence number."""
+        run_log = self.runs.get(run_key)
+        if run_log is not None:
+            async for frame in self._follow(run_log, after):
+                yield frame
+        elif self.backend is not None:
+            async for frame in self._follow_backend(run_key, after):
+                yield frame
+
+    def _start(
+        self, run_key: RunKey, frames: AsyncIterator[bytes], on_run_done: Optional[Callable[[], None]]
+    ) -> RunLog:
+        run_log = RunLog(run_key)
+        run_log.task = asyncio.create_task(self._produce(run_log, frames))
+        # Called even if the task is cancelled before it starts
+        if on_run_done is not None:
+            run_log.task.add_done_callback(lambda _: on_run_done())
+        self.runs[run_key] = run_log
+        return run_log
+
+    async def _produce(self, run_log: RunLog, frames: AsyncIterator[bytes]) -> None:
+        try:
+            async for frame in frames:
+                async with run_log.condition:
+                    run_log.frames.append(frame)
+                    run_log.size += len(frame)
+                    self.size += len(frame)
+                    self._trim(run_log)
+                    run_log.condition.notify_all()
+                if self.backend is not None:
+                    self.backend.append(run_log.run_key, run_log.last_seq, frame)
+        finally:
+            async with run_log.condition:
+                run_log.finished = True
+                run_log.condition.notify_all()
+            if self.backend is not None:
+                self.backend.finish(run_log.run_key)
+            self.finished_runs[run_log.run_key] = time.monotonic()
+            self.evict()
+
+    def _trim(self, run_log: RunLog) -> None:
+        """Drop the oldest frames of a run over the frame limits, keeping the latest one."""
+        while len(run_log.frames) > 1 and (
+            len(run_log.frames) > self.max_run_frames or run_log.size > self.max_run_bytes
+        ):
+            frame = run_log.frames.popleft()
+            run_log.offset += 1
+            run_log.size -= len(frame)
+            self.size -= len(frame)
+
+    async def _follow(self, run_log: RunLog, after: int) -> AsyncIterator[bytes]:
+        run_log.subscribers += 1
+        if run_log.abandon_handle is not None:
+            run_log.abandon_handle.cancel()
+            run_log.abandon_handle = None
+
+        try:
+            seq = after
+            while True:
+                async with run_log.condition:
+                    await run_log.condition.wait_for(lambda: seq < run_log.last_seq or run_log.finished)
+                    offset = run_log.offset
+                    pending_frames = list(itertools.islice(run_log.frames, max(seq - offset, 0), None))
+                if seq < offset:
+                    # Dropped from memory, replay them from the backend
+                    dropped_frames = await self._read_dropped(run_log.run_key, seq, offset)
+                    if dropped_frames is None:
+                        log_warning(f"Events {seq + 1} to {offset} of run {run_log.run_id} are no longer available")
+                        return
+                    pending_frames = dropped_frames + pending_frames
+                if not pending_frames:
+                    break
+                for frame in pending_frames:
+                    seq += 1
+                    yield self._with_id(run_log.run_id, seq, frame)
+        finally:
+            run_log.subscribers -= 1
+            # Nobody follows the run anymore, stop it unless a client resumes it in time
+            if run_log.subscribers == 0 and not run_log.finished and self.resume_grace <= 0:
+                self._abandon(run_log)
+            elif run_log.subscribers == 0 and not run_log.finished:
+                run_log.abandon_handle = asyncio.get_running_loop().call_later(
+                    self.resume_grace, self._abandon, run_log
+                )
+
+    async def _read_dropped(self, run_key: RunKey, after: int, offset: int) -> Optional[List[bytes]]:
+        """Read the frames dropped from memory after the sequence number, None if the backend hasn't them all."""
+        if self.backend is None:
+            return None
+        # The latest of them may still be queued by the writer of the backend
+        deadline = time.monotonic() + self.stall_timeout
+        while True:
+            result = await asyncio.to_thread(self.backend.read, run_key, after)
+            if result is not None and len(result[0]) >= offset - after:
+                return result[0][: offset - after]
+            if time.monotonic() > deadline:
+                return None
+            await asyncio.sleep(self.poll_interval)
+
+    async def _follow_backend(self, run_key: RunKey, after: int) -> AsyncIterator[bytes]:
+        seq = after
+        last_progress = time.monotonic()
+        while True:
+            result = await asyncio.to_thread(self.backend.read, run_key, seq)  # type: ignore
+            if result is None:
+                return
+            frames, finished = result
+            for frame in frames:
+                seq += 1
+                yield self._with_id(run_key[1], seq, frame)
+            if finished:
+                return
+
+            # The process running it may be gone
+            if frames:
+                last_progress = time.monotonic()
+            elif time.monotonic() - last_progress > self.stall_timeout:
+                log_warning(f"Run {run_key[1]} made no progress in {self.stall_timeout}s, stopped following it")
+                return
+            await asyncio.sleep(self.poll_interval)
+
+    def _abandon(self, run_log: RunLog) -> None:
+        run_log.abandon_handle = None
+        if run_log.subscribers == 0 and run_log.task is not None and not run_log.task.done():
+            log_debug(f"Run {run_log.run_id} was not resumed, cancelling it")
+            run_log.task.cancel()
+
+    @staticmethod
+    def _with_id(run_id: str, seq: int, frame: bytes) -> bytes:
+        return b"id: " + format_event_id(run_id, seq).encode("utf-8") + b"\n" + frame
+
+    def evict(self) -> None:
+        """Drop the logs of the runs finished more than ttl seconds ago, or the oldest ones over max_bytes."""
+        now = time.monotonic()
+        while self.finished_runs:
+            run_key, finished_at = next(iter(self.finished_runs.items()))
+            if now - finished_at < self.ttl and self.size <= self.max_bytes:
+                break
+            del self.finished_runs[run_key]
+            run_log = self.runs.pop(run_key, None)
+            if run_log is not None:
+                self.size -= run_log.size
+        # The backend is swept less often, its eviction is a query
+        if self.backend is not None and now - self.backend_evicted_at > min(self.ttl, 60):
+            self.backend_evicted_at = now
+            self.backend.evict(time.time() - self.ttl)
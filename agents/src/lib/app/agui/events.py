@@ -0,0 +1,59 @@
+"""Construction of the AG-UI events mapped from the Agno stream, skipping the validation of their fields."""
+
+from typing import Any, Callable, Dict, Type, TypeVar
+
+from ag_ui.core import (
+    BaseEvent,
+    EventType,
+    StepFinishedEvent,
+    StepStartedEvent,
+    TextMessageContentEvent,
+    TextMessageEndEvent,
+    TextMessageStartEvent,
+    ToolCallArgsEvent,
+    ToolCallEndEvent,
+    ToolCallResultEvent,
+    ToolCallStartEvent,
+)
+from pydantic.fields import PydanticUndefined  # type: ignore
+
+E = TypeVar("E", bound=BaseEvent)
+
+_set_attribute = object.__setattr__
+
+
+def trusted_event_factory(event_class: Type[E], event_type: EventType) -> Callable[..., E]:
+    """Return a constructor of event_class that doesn't validate the fields it's given.
+
+    The events are complete model instances, dumped and encoded like validated ones, built in about half the time.
+    Only give it fields of the right types, e.g. the strings of our own Agno stream, as nothing is checked or coerced.
+    """
+    # Every field in the order of the model, which the encoded events follow, the required ones to be given
+    template: Dict[str, Any] = {
+        name: None if field.default is PydanticUndefined else field.default
+        for name, field in event_class.model_fields.items()
+    }
+    template["type"] = event_type
+
+    def construct(**fields: Any) -> E:
+        event = object.__new__(event_class)
+        values = template.copy()
+        values.update(fields)
+        _set_attribute(event, "__dict__", values)
+        _set_attribute(event, "__pydantic_fields_set__", {"type", *fields})
+        _set_attribute(event, "__pydantic_extra__", None)
+        _set_attribute(event, "__pydantic_private__", None)
+        return event
+
+    return construct
+
+
+text_message_start = trusted_event_factory(TextMessageStartEvent, EventType.TEXT_MESSAGE_START)
+text_message_content = trusted_event_factory(TextMessageContentEvent, EventType.TEXT_MESSAGE_CONTENT)
+text_message_end = trusted_event_factory(TextMessageEndEvent, EventType.TEXT_MESSAGE_END)
+tool_call_start = trusted_event_factory(ToolCallStartEvent, EventType.TOOL_CALL_START)
+tool_call_args = trusted_event_factory(ToolCallArgsEvent, EventType.TOOL_CALL_ARGS)
+tool_call_end = trusted_event_factory(ToolCallEndEvent, EventType.TOOL_CALL_END)
+tool_call_result = trusted_event_factory(ToolCallResultEvent, EventType.TOOL_CALL_RESULT)
+step_started = trusted_event_factory(StepStartedEvent, EventType.STEP_STARTED)
+step_finished = trusted_event_factory(StepFinishedEvent, EventType.STEP_FINISHED)
@@ -0,0 +1,149 @@
+"""Dedicated executor running sync Agent and Team runs off the shared Starlette threadpool."""
+
+import asyncio
+import functools
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from typing import Any, AsyncIterator, Dict, Iterator, TypeVar
+
+from agno.utils.log import log_warning
+
+T = TypeVar("T")
+
+# Kinds of the items handed from the run thread to the event loop
+_ITEM = 0
+_END = 1
+_ERROR = 2
+
+
+@dataclass
+class RunExecutorStats:
+    """Load of a RunExecutor."""
+
+    max_workers: int
+    active_runs: int = 0  # Runs currently holding an executor thread
+    waiting_runs: int = 0  # Runs waiting for a free executor thread
+    queued_events: int = 0  # Events produced but not yet consumed, across all runs
+    peak_queued_events: int = 0
+
+    @property
+    def saturation(self) -> float:
+        return self.active_runs / self.max_workers
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {**asdict(self), "saturation": self.saturation}
+
+
+class _Bridge:
+    """Hands the events of one stream from its run thread to the event loop."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, queue_size: int):
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue()
+        # Bounds the events in the queue, the run thread blocks while none is free
+        self.slots = threading.Semaphore(queue_size)
+        self.queued = 0
+        self.stopped = False
+
+    def put(self, kind: int, item: Any) -> None:
+        try:
+            self.loop.call_soon_threadsafe(self.queue.put_nowait, (kind, item))
+        except RuntimeError:
+            # The event loop is closed, nobody is left to read the stream
+            if kind == _ERROR:
+                log_warning(f"Could not report the error of a stream: {item}")
+
+
+class RunExecutor:
+    """Iterates sync event streams on a bounded thread pool, handing the events to the event loop.
+
+    Each stream gets a queue bounded to queue_size events: when the client reads slower than the run produces, the
+    run thread blocks until the queue has room again. When the consumer stops early, the stream is closed, releasing
+    its thread, or never started if it was still waiting for one.
+    """
+
+    def __init__(self, max_workers: int = 16, queue_size: int = 64):
+        """
+        Args:
+            max_workers (int): Maximum number of runs executing at once, further runs wait for a free thread.
+            queue_size (int): Maximum number of events buffered per run.
+        """
+        self.queue_size = queue_size
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="agui-run")
+        self.stats = RunExecutorStats(max_workers=max_workers)
+        self.lock = threading.Lock()
+
+    async def stream(self, events: Iterator[T]) -> AsyncIterator[T]:
+        """Iterate the events on the executor, yielding them on the event loop."""
+        loop = asyncio.get_running_loop()
+        bridge = _Bridge(loop, self.queue_size)
+
+        with self.lock:
+            self.stats.waiting_runs += 1
+        future = self.executor.submit(self._produce, events, bridge)
+        future.add_done_callback(functools.partial(self._on_done, events, bridge))
+
+        try:
+            while True:
+                kind, item = await bridge.queue.get()
+                if kind == _END:
+                    return
+                if kind == _ERROR:
+                    raise item
+
+                with self.lock:
+                    bridge.queued -= 1
+                    self.stats.queued_events -= 1
+                bridge.slots.release()
+                yield item
+        finally:
+            with self.lock:
+                bridge.stopped = True
+                # The events left in the queue are never read
+                self.stats.queued_events -= bridge.queued
+                bridge.queued = 0
+            # Unblock the run thread if it's waiting for room in the queue, or drop the run still waiting for one
+            bridge.slots.release()
+            future.cancel()
+
+    def _produce(self, events: Iterator[Any], bridge: "_Bridge") -> None:
+        with self.lock:
+            self.stats.waiting_runs -= 1
+            self.stats.active_runs += 1
+
+        try:
+            for item in events:
+                bridge.slots.acquire()
+                with self.lock:
+                    if bridge.stopped:
+                        break
+                    bridge.queued += 1
+                    self.stats.queued_events += 1
+                    self.stats.peak_queued_events = max(self.stats.peak_queued_events, self.stats.queued_events)
+                bridge.put(_ITEM, item)
+            else:
+                bridge.put(_END, None)
+        except Exception as e:
+            bridge.put(_ERROR, e)
+        finally:
+            close = getattr(events, "close", None)
+            if close is not None:
+                close()
+            with self.lock:
+                self.stats.active_runs -= 1
+
+    def _on_done(self, events: Iterator[Any], bridge: "_Bridge", future: Future) -> None:
+        if not future.cancelled():
+            return
+        # The run never got a thread, cancelled by its consumer or the shutdown of the executor
+        with self.lock:
+            self.stats.waiting_runs -= 1
+        close = getattr(events, "close", None)
+        if close is not None:
+            close()
+        bridge.put(_ERROR, RuntimeError("The run executor shut down before the run started"))
+
+    def shutdown(self) -> None:
+        """Stop accepting runs and cancel the waiting ones, the running ones end with their streams."""
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,151 @@
+"""Parallel fan-out of a Team run to its members, multiplexing their responses onto one AG-UI stream."""
+
+import asyncio
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Dict, List, Optional, Sequence, Tuple, Union
+
+from ag_ui.core import BaseEvent
+
+from agno.agent.agent import Agent
+from agno.run.response import RunEvent, RunResponseEvent
+from agno.run.team import TeamRunEvent, TeamRunResponseEvent
+from agno.team.team import Team
+from lib.app.agui.payloads import ToolPayloadConfig
+from lib.app.agui.tracing import RunTrace
+from lib.app.agui.utils import async_stream_agno_response_as_agui_events
+
+@dataclass
+class MemberFanOut:
+    """The members of a Team run concurrently on each request, before the leader responds from their responses.
+
+    Only list the members whose tasks don't depend on each other's results, e.g. getting the price and the news of a
+    stock. The other members are left to the leader, which may still transfer tasks to them.
+    """
+
+    # Names of the members run concurrently, in the order their responses are given to the leader
+    members: List[str]
+    # Task given to a member instead of the request, "{request}" replaced by the request
+    tasks: Dict[str, str] = field(default_factory=dict)
+
+    def get_members(self, team: Team) -> List[Tuple[str, Union[Agent, Team]]]:
+        """Return the listed members of the team with their names, raising ValueError for an unknown name."""
+        team_members = {get_member_name(member, index): member for index, member in enumerate(team.members)}
+        unknown_names = [name for name in [*self.members, *self.tasks] if name not in team_members]
+        if unknown_names:
+            raise ValueError(f"Unknown members of team {team.name}: {', '.join(unknown_names)}")
+        return [(name, team_members[name]) for name in self.members]
+
+    def get_task(self, member_name: str, request: str) -> str:
+        task = self.tasks.get(member_name)
+        return request if task is None else task.replace("{request}", request)
+
+
+async def multiplex_event_streams(streams: Sequence[AsyncIterator[BaseEvent]]) -> AsyncIterator[BaseEvent]:
+    """Iterate the AG-UI event streams concurrently, interleaving their events as they come.
+
+    Each stream keeps its own order. Their text messages and tool calls carry their own ids, so the ones of different
+    streams may be in progress at the same time. The first error of a stream is raised, the other streams cancelled.
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def drain(index: int, stream: AsyncIterator[BaseEvent]) -> None:
+        try:
+            async for event in stream:
+                await queue.put((index, event))
+        except Exception as e:
+            await queue.put((index, e))
+        finally:
+            await queue.put((index, None))
+
+    tasks = [asyncio.create_task(drain(index, stream)) for index, stream in enumerate(streams)]
+    try:
+        remaining = len(tasks)
+        while remaining:
+            index, item = await queue.get()
+            if isinstance(item, Exception):
+                raise item
+            if item is None:
+                remaining -= 1
+            else:
+                yield item
+    finally:
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.wait(tasks)
+
+
+def get_member_name(member: Union[Agent, Team], index: int) -> str:
+    return member.name or f"member_{index}"
+
+
+async def stream_member(
+    member: Union[Agent, Team],
+    task: str,
+    session_id: str,
+    member_outputs: Dict[str, str],
+    member_name: str,
+    run_trace: Optional[RunTrace] = None,
+    tool_payloads: Optional[ToolPayloadConfig] = None,
+) -> AsyncIterator[BaseEvent]:
+    """Run a member on the task, streaming its response in AG-UI format and collecting its text in member_outputs."""
+    response_stream = await member.arun(  # type: ignore
+        task,
+        session_id=session_id,
+        stream=True,
+        stream_intermediate_steps=True,
+    )
+    content_parts: List[str] = []
+
+    async def collect_content(
+        chunks: AsyncIterator[Union[RunResponseEvent, TeamRunResponseEvent]],
+    ) -> AsyncIterator[Union[RunResponseEvent, TeamRunResponseEvent]]:
+        async for chunk in chunks:
+            if chunk.event in (RunEvent.run_response_content, TeamRunEvent.run_response_content):
+                if isinstance(chunk.content, str):  # type: ignore
+                    content_parts.append(chunk.content)  # type: ignore
+            yield chunk
+
+    try:
+        # Each member gets its own mapper, hence its own message_id and tool call bookkeeping
+        async for event in async_stream_agno_response_as_agui_events(
+            collect_content(response_stream), run_trace, tool_payloads, new_message_per_completion=True
+        ):
+            yield event
+    finally:
+        member_outputs[member_name] = "".join(content_parts)
+        await response_stream.aclose()
+
+
+def stream_member_fan_out(
+    team: Team,
+    member_fan_out: MemberFanOut,
+    messages: List[str],
+    session_id: str,
+    member_outputs: Dict[str, str],
+    run_trace: Optional[RunTrace] = None,
+    tool_payloads: Optional[ToolPayloadConfig] = None,
+) -> AsyncIterator[BaseEvent]:
+    """Run the members listed by member_fan_out concurrently, interleaving their responses as separate messages.
+
+    Each member runs on its task of member_fan_out, the request made of the messages otherwise. The text response of
+    each member is collected in member_outputs, keyed by member name, in the order of member_fan_out.
+    """
+    request = "\n".join(messages)
+    member_streams = []
+    for member_name, member in member_fan_out.get_members(team):
+        member_outputs[member_name] = ""
+        task = member_fan_out.get_task(member_name, request)
+        member_streams.append(
+            stream_member(member, task, session_id, member_outputs, member_name, run_trace, tool_payloads)
+        )
+    return multiplex_event_streams(member_streams)
+
+
+def get_synthesis_messages(messages: List[str], member_outputs: Dict[str, str]) -> List[str]:
+    """Return the messages for the leader, carrying the responses the members already gave."""
+    member_responses = "\n\n".join(f"{name}:\n{output}" for name, output in member_outputs.items())
+    return messages + [
+        f"The team members {', '.join(member_outputs)} already worked on this request in parallel. Do not transfer "
+        f"tasks to them again, respond to the request using their responses:\n\n{member_responses}"
+    ]
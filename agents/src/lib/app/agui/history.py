@@ -0,0 +1,162 @@
+"""Token-budgeted window over the history of a thread, the turns outside of it folded into a summary."""
+
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, List, Optional, Tuple
+
+from agno.models.message import Message
+from lib.app.agui.metrics import history_tokens
+
+# Tokens taken by the role and separators of a message
+MESSAGE_OVERHEAD_TOKENS = 4
+
+SUMMARY_PREFIX = "Summary of the earlier conversation:\n"
+
+# (summary of the previous turns or None, messages of the turns to fold in) -> updated summary
+Summarizer = Callable[[Optional[str], List[Message]], str]
+
+
+def estimate_tokens(text: Optional[str]) -> int:
+    """Estimate the tokens of the text, about 4 characters per token for English text, without tokenizing it."""
+    return (len(text) + 3) // 4 if text else 0
+
+
+def estimate_message_tokens(message: Message) -> int:
+    content = message.content if isinstance(message.content, str) else None
+    return estimate_tokens(content) + MESSAGE_OVERHEAD_TOKENS
+
+
+def split_turns(messages: List[Message]) -> List[int]:
+    """Return the index at which each turn starts, a turn being a user message and the messages answering it."""
+    starts = [index for index, message in enumerate(messages) if message.role == "user"]
+    if not starts or starts[0] != 0:
+        starts.insert(0, 0)
+    return starts
+
+
+@dataclass
+class HistoryWindowConfig:
+    """Budget of the history passed to the Agent or Team on each run."""
+
+    max_tokens: int = 8000  # Estimated tokens of the history, summary included
+    summary_max_tokens: int = 1000  # Reserved for the summary of the turns outside of the window
+    max_turns: Optional[int] = None  # Most recent turns kept in full, whatever their size
+    excerpt_chars: int = 200  # Characters kept of each message by the default summarizer
+
+    def __post_init__(self):
+        if self.summary_max_tokens >= self.max_tokens:
+            raise ValueError("summary_max_tokens must be lower than max_tokens")
+
+
+class ExcerptSummarizer:
+    """Summarizes turns locally, keeping an excerpt of each of their user and assistant messages.
+
+    The summary keeps the most recent excerpts within max_tokens, each update only excerpting the new turns.
+    """
+
+    def __init__(self, max_tokens: int, excerpt_chars: int = 200):
+        self.max_tokens = max_tokens
+        self.excerpt_chars = excerpt_chars
+
+    def __call__(self, summary: Optional[str], messages: List[Message]) -> str:
+        lines = summary.split("\n") if summary else []
+        for message in messages:
+            if message.role not in ("user", "assistant") or not isinstance(message.content, str):
+                continue
+            excerpt = " ".join(message.content.split())
+            if not excerpt:
+                continue
+            if len(excerpt) > self.excerpt_chars:
+                excerpt = excerpt[: self.excerpt_chars].rstrip() + "..."
+            lines.append(f"{message.role.capitalize()}: {excerpt}")
+
+        # Drop the oldest excerpts past the budget
+        tokens = sum(estimate_tokens(line) + 1 for line in lines)
+        dropped = 0
+        while tokens > self.max_tokens and dropped < len(lines):
+            tokens -= estimate_tokens(lines[dropped]) + 1
+            dropped += 1
+        return "\n".join(lines[dropped:])
+
+
+class HistoryCompactor:
+    """Keeps the history of each run within a token budget, the most recent turns in full and the older ones summarized.
+
+    The summary is passed as a system message ahead of the window, so the model doesn't take it for something the user
+    said. The summary of each thread is cached, along with the messages it covers, and updated with the turns leaving
+    the window on later runs. The thread is summarized again only if the messages it covers changed.
+    """
+
+    def __init__(
+        self,
+        config: Optional[HistoryWindowConfig] = None,
+        summarizer: Optional[Summarizer] = None,
+        max_threads: int = 1024,
+    ):
+        self.config = config or HistoryWindowConfig()
+        self.summarizer: Summarizer = summarizer or ExcerptSummarizer(
+            self.config.summary_max_tokens, self.config.excerpt_chars
+        )
+        self.max_threads = max_threads
+        # thread_id -> (fingerprints of the summarized messages, their summary), least recently used first
+        self.summaries: OrderedDict[str, Tuple[List[int], str]] = OrderedDict()
+        self.lock = threading.Lock()
+
+    def _get_window_start(self, messages: List[Message]) -> int:
+        """Index of the first message of the most recent turns fitting in the budget, the latest turn always kept."""
+        turn_starts = split_turns(messages)
+        budget = self.config.max_tokens - self.config.summary_max_tokens
+        tokens = 0
+        turn_end = len(messages)
+        window_start = len(messages)
+        for turns, turn_start in enumerate(reversed(turn_starts)):
+            if self.config.max_turns is not None and turns >= self.config.max_turns:
+                break
+            tokens += sum(estimate_message_tokens(message) for message in messages[turn_start:turn_end])
+            if tokens > budget and turns > 0:
+                break
+            window_start = turn_start
+            turn_end = turn_start
+        return window_start
+
+    def compact(self, thread_id: str, messages: List[Message]) -> List[Message]:
+        """Return the messages of the run, the turns outside of the window replaced by their summary."""
+        window_start = self._get_window_start(messages)
+        if window_start == 0:
+            history_tokens.observe(sum(estimate_message_tokens(message) for message in messages))
+            return messages
+
+        with self.lock:
+            fingerprints, summary = self.summaries.pop(thread_id, ([], ""))
+
+        # Reuse the summary if the messages it covers are still the oldest of the thread
+        summarized = len(fingerprints)
+        if summarized > window_start or fingerprints != _fingerprint(messages[:summarized]):
+            fingerprints, summary, summarized = [], "", 0
+        if summarized < window_start:
+            summary = self.summarizer(summary or None, messages[summarized:window_start])
+            fingerprints = fingerprints + _fingerprint(messages[summarized:window_start])
+
+        with self.lock:
+            self.summaries[thread_id] = (fingerprints, summary)
+            while len(self.summaries) > self.max_threads:
+                self.summaries.popitem(last=False)
+
+        window = messages[window_start:]
+        if summary:
+            window = [Message(role="system", content=SUMMARY_PREFIX + summary), *window]
+        history_tokens.observe(sum(estimate_message_tokens(message) for message in window))
+        return window
+
+    def clear(self, thread_id: Optional[str] = None) -> None:
+        """Drop the cached summary of a thread, or of every thread."""
+        with self.lock:
+            if thread_id is None:
+                self.summaries.clear()
+            else:
+                self.summaries.pop(thread_id, None)
+
+
+def _fingerprint(messages: List[Message]) -> List[int]:
+    return [hash((message.role, str(message.content))) for message in messages]
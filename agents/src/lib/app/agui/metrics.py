@@ -0,0 +1,80 @@
+"""Metrics of the AG-UI streaming pipeline. The rate of agui_events_total gives the events per second."""
+
+from time import perf_counter
+from typing import Optional, TypeVar
+
+from ag_ui.core import BaseEvent, EventType
+
+from lib.app.metrics import registry
+
+events_total = registry.counter("agui_events", "AG-UI events emitted, by event type.", ["type"])
+time_to_first_byte = registry.histogram(
+    "agui_time_to_first_byte_seconds", "Time from the start of a run to its first event from the Agent or Team."
+)
+time_to_first_token = registry.histogram(
+    "agui_time_to_first_token_seconds", "Time from the start of a run to its first text delta."
+)
+inter_token_gap = registry.histogram("agui_inter_token_gap_seconds", "Time between consecutive text deltas of a run.")
+run_duration = registry.histogram("agui_run_duration_seconds", "Duration of the AG-UI runs, by outcome.", ["outcome"])
+agent_run_duration = registry.histogram(
+    "agui_agent_run_duration_seconds", "Duration of the Agent runs within an AG-UI run, e.g. team members.", ["agent"]
+)
+tool_call_duration = registry.histogram("agui_tool_call_duration_seconds", "Duration of the tool calls.", ["tool"])
+buffer_blocked = registry.histogram(
+    "agui_buffer_blocked_seconds", "Time the event buffer held events back behind an active tool call."
+)
+tool_payload_bytes = registry.histogram(
+    "agui_tool_payload_bytes",
+    "UTF-8 size of the tool call args and results, before any split or truncation, by kind.",
+    ["kind"],
+    buckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304),
+)
+history_tokens = registry.histogram(
+    "agui_history_estimated_tokens",
+    "Estimated tokens of the history passed to the runs, after compaction.",
+    buckets=(500, 1000, 2000, 4000, 8000, 16000, 32000, 64000, 128000),
+)
+tool_payloads_limited = registry.counter(
+    "agui_tool_payloads_limited", "Tool call payloads over the frame limit, by kind and action.", ["kind", "action"]
+)
+
+E = TypeVar("E", bound=BaseEvent)
+
+# Avoids building the label tuples on the hot path
+_EVENT_TYPE_LABELS = {event_type: event_type.value for event_type in EventType}
+
+
+class RunObserver:
+    """Records the latency metrics of one AG-UI run from the events it emits."""
+
+    __slots__ = ("started_at", "first_byte_at", "last_token_at", "outcome")
+
+    def __init__(self):
+        self.started_at = perf_counter()
+        self.first_byte_at: Optional[float] = None
+        self.last_token_at: Optional[float] = None
+        # Set to "completed" or "error" by the run, runs ending otherwise were cancelled
+        self.outcome = "cancelled"
+
+    def observe(self, event: BaseEvent) -> None:
+        """Record an event mapped from the Agent or Team response."""
+        events_total.inc(_EVENT_TYPE_LABELS[event.type])
+        if self.first_byte_at is None:
+            self.first_byte_at = perf_counter()
+            time_to_first_byte.observe(self.first_byte_at - self.started_at)
+
+        if event.type == EventType.TEXT_MESSAGE_CONTENT:
+            now = perf_counter()
+            if self.last_token_at is None:
+                time_to_first_token.observe(now - self.started_at)
+            else:
+                inter_token_gap.observe(now - self.last_token_at)
+            self.last_token_at = now
+
+    def count(self, event: E) -> E:
+        """Record a run lifecycle event, not part of the latency metrics, returning it."""
+        events_total.inc(_EVENT_TYPE_LABELS[event.type])
+        return event
+
+    def finish(self) -> None:
+        run_duration.observe(perf_counter() - self.started_at, self.outcome)
@@ -0,0 +1,222 @@
+"""Size limits of the tool call args and results streamed by the AG-UI router."""
+
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from json.encoder import encode_basestring  # type: ignore
+from typing import Dict, List, Optional, Tuple
+
+from agno.utils.log import log_warning
+from lib.app.agui.metrics import tool_payload_bytes, tool_payloads_limited
+
+TOOL_RESULTS_PATH = "/agui/tool-results"
+
+# Worst case growth of a payload when JSON-escaped, a control character becoming \u00XX
+_MAX_ESCAPE_GROWTH = 6
+
+
+def payload_size(payload: str) -> int:
+    """UTF-8 size of the payload, without encoding it when it's ASCII."""
+    return len(payload) if payload.isascii() else len(payload.encode("utf-8"))
+
+
+def _frame_size(payload: str) -> int:
+    """Size of the payload once JSON-escaped into a frame, without its quotes."""
+    return payload_size(encode_basestring(payload)) - 2
+
+
+def _fits(payload: str, size: int, max_bytes: int) -> bool:
+    # Escaping never shrinks a payload, only escape the ones that could go either way
+    if size > max_bytes:
+        return False
+    return size * _MAX_ESCAPE_GROWTH <= max_bytes or _frame_size(payload) <= max_bytes
+
+
+def _piece_end(payload: str, start: int, max_bytes: int) -> int:
+    """End of the longest piece from start found to fit in max_bytes once JSON-escaped."""
+    # A character takes at least one byte, shrink the piece in proportion to its escaped size until it fits
+    end = min(start + max_bytes, len(payload))
+    size = _frame_size(payload[start:end])
+    while size > max_bytes and end - start > 1:
+        end = start + max((end - start) * max_bytes // size, 1)
+        size = _frame_size(payload[start:end])
+    return end
+
+
+def split_payload(payload: str, max_bytes: int) -> List[str]:
+    """Split the payload into consecutive pieces, each of at most max_bytes once JSON-escaped."""
+    pieces = []
+    start = 0
+    while start < len(payload):
+        end = _piece_end(payload, start, max_bytes)
+        pieces.append(payload[start:end])
+        start = end
+    return pieces
+
+
+class ToolResultStore:
+    """Keeps the full results of the tool calls truncated in the stream, served at /agui/tool-results/{tool_call_id}.
+
+    Results are kept in memory, the least recently stored ones dropped once they take more than max_bytes. Each worker
+    keeps the results of its own runs, use a SqliteToolResultStore to share them.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        # tool_call_id -> (full result, its UTF-8 size), least recently stored first
+        self.results: OrderedDict[str, Tuple[str, int]] = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def put(self, tool_call_id: str, content: str, size: int) -> None:
+        with self.lock:
+            previous = self.results.pop(tool_call_id, None)
+            if previous is not None:
+                self.size -= previous[1]
+            self.results[tool_call_id] = (content, size)
+            self.size += size
+            while self.size > self.max_bytes and len(self.results) > 1:
+                _, (_, dropped_size) = self.results.popitem(last=False)
+                self.size -= dropped_size
+
+    def get(self, tool_call_id: str) -> Optional[str]:
+        with self.lock:
+            entry = self.results.get(tool_call_id)
+        return entry[0] if entry is not None else None
+
+
+class SqliteToolResultStore(ToolResultStore):
+    """ToolResultStore also persisting the results to a local SQLite database, e.g. the one of the event log.
+
+    Every worker serves the results stored by the others. Results are written in batches from a background thread,
+    kept in memory meanwhile, and deleted from the database ttl seconds after being stored.
+    """
+
+    def __init__(
+        self, db_file: str, max_bytes: int = 64 * 1024 * 1024, ttl: float = 600, batch_interval: float = 0.05
+    ):
+        """
+        Args:
+            db_file (str): Path of the SQLite database.
+            max_bytes (int): Size of the results kept in memory.
+            ttl (float): Seconds a result is kept in the database.
+            batch_interval (float): Seconds the writer waits for more results before committing a batch.
+        """
+        super().__init__(max_bytes)
+        self.db_file = db_file
+        self.ttl = ttl
+        self.batch_interval = batch_interval
+        # tool_call_id -> full result, waiting to be written
+        self.pending: Dict[str, str] = {}
+        self.condition = threading.Condition()
+        self.local = threading.local()
+
+        with self._connect() as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS agui_tool_results "
+                "(tool_call_id TEXT PRIMARY KEY, content TEXT NOT NULL, stored_at REAL NOT NULL)"
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS agui_tool_results_stored_at ON agui_tool_results (stored_at)"
+            )
+        self.writer = threading.Thread(target=self._write, name="agui-tool-results", daemon=True)
+        self.writer.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = getattr(self.local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.db_file, check_same_thread=False)
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self.local.connection = connection
+        return connection
+
+    def put(self, tool_call_id: str, content: str, size: int) -> None:
+        super().put(tool_call_id, content, size)
+        with self.condition:
+            self.pending[tool_call_id] = content
+            self.condition.notify()
+
+    def get(self, tool_call_id: str) -> Optional[str]:
+        content = super().get(tool_call_id)
+        if content is not None:
+            return content
+        row = self._connect().execute(
+            "SELECT content FROM agui_tool_results WHERE tool_call_id = ?", (tool_call_id,)
+        ).fetchone()
+        return row[0] if row is not None else None
+
+    def _write(self) -> None:
+        connection = self._connect()
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.pending)
+                # Give the following results a chance to join the batch
+                self.condition.wait(timeout=self.batch_interval)
+                pending, self.pending = self.pending, {}
+            now = time.time()
+            try:
+                with connection:
+                    connection.executemany(
+                        "INSERT OR REPLACE INTO agui_tool_results (tool_call_id, content, stored_at) VALUES (?, ?, ?)",
+                        [(tool_call_id, content, now) for tool_call_id, content in pending.items()],
+                    )
+                    connection.execute("DELETE FROM agui_tool_results WHERE stored_at < ?", (now - self.ttl,))
+            except sqlite3.Error as e:
+                log_warning(f"Could not persist {len(pending)} tool results: {e}")
+
+
+@dataclass
+class ToolPayloadConfig:
+    """Limits keeping the tool call payloads of a run from producing oversized frames.
+
+    Args over max_frame_bytes are split across several TOOL_CALL_ARGS deltas. A TOOL_CALL_RESULT carries a whole
+    message and can't be split, so results over max_result_bytes are truncated, pointing to their full content when
+    a result_store keeps it.
+    """
+
+    max_frame_bytes: int = 16 * 1024  # Payload bytes per frame once JSON-escaped, the frame adds ~100 bytes to it
+    max_result_bytes: Optional[int] = None  # Truncate results to this many bytes, at most max_frame_bytes
+    result_store: Optional[ToolResultStore] = None
+
+    def __post_init__(self):
+        # Leaves room for the truncation marker
+        if self.max_frame_bytes < 256 or (self.max_result_bytes is not None and self.max_result_bytes < 256):
+            raise ValueError("max_frame_bytes and max_result_bytes must be at least 256")
+
+    def get_result_limit(self) -> int:
+        if self.max_result_bytes is None:
+            return self.max_frame_bytes
+        return min(self.max_result_bytes, self.max_frame_bytes)
+
+
+def limit_tool_args(args: str, config: Optional[ToolPayloadConfig]) -> List[str]:
+    """Return the deltas streaming the JSON args of a tool call."""
+    size = payload_size(args)
+    tool_payload_bytes.observe(size, "args")
+    if config is None or _fits(args, size, config.max_frame_bytes):
+        return [args]
+
+    tool_payloads_limited.inc("args", "split")
+    return split_payload(args, config.max_frame_bytes)
+
+
+def limit_tool_result(tool_call_id: str, content: str, config: Optional[ToolPayloadConfig]) -> str:
+    """Return the content streaming the result of a tool call, truncated if it's over the limit."""
+    size = payload_size(content)
+    tool_payload_bytes.observe(size, "result")
+    if config is None:
+        return content
+    limit = config.get_result_limit()
+    if _fits(content, size, limit):
+        return content
+
+    tool_payloads_limited.inc("result", "truncated")
+    if config.result_store is not None:
+        config.result_store.put(tool_call_id, content, size)
+        marker = f"\n[Truncated from {size} bytes, full result at {TOOL_RESULTS_PATH}/{tool_call_id}]"
+    else:
+        marker = f"\n[Truncated from {size} bytes]"
+    return content[: _piece_end(content, 0, max(limit - _frame_size(marker), 1))] + marker
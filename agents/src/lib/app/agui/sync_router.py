@@ -2,7 +2,8 @@
 
 import logging
 import uuid
-from typing import Iterator, Optional, cast
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, cast
 
 from ag_ui.core import (
     BaseEvent,
@@ -12,25 +13,50 @@ from ag_ui.core import (
     RunStartedEvent,
     RunFinishedEvent
 )
-from ag_ui.encoder import EventEncoder
-from fastapi import APIRouter
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.responses import PlainTextResponse, StreamingResponse
 
 from agno.agent.agent import Agent
-from lib.app.agui.utils import convert_agui_messages_to_agno_messages, stream_agno_response_as_agui_events
+from lib.app.admission import AdmissionController
+from lib.app.agui.encoder import AGUIEventEncoder, FastSSEEventEncoder, ProtobufEventEncoder, negotiate_encoder
+from lib.app.agui.executor import RunExecutor
+from lib.app.agui.history import HistoryCompactor
+from lib.app.agui.metrics import RunObserver
+from lib.app.agui.payloads import TOOL_RESULTS_PATH, ToolPayloadConfig
+from lib.app.agui.tracing import AGUITracing, RunTrace
+from lib.app.agui.utils import (
+    AGUIMessageCache,
+    RunStats,
+    TextCoalescingConfig,
+    coalesce_text_deltas,
+    prepare_agno_messages,
+    stream_agno_response_as_agui_events,
+    track_run,
+)
 from agno.team.team import Team
 
 logger = logging.getLogger(__name__)
 
 
-def run_agent(agent: Agent, run_input: RunAgentInput) -> Iterator[BaseEvent]:
+def run_agent(
+    agent: Agent,
+    run_input: RunAgentInput,
+    text_coalescing: Optional[TextCoalescingConfig] = None,
+    message_cache: Optional[AGUIMessageCache] = None,
+    history_delta_only: bool = False,
+    history_compactor: Optional[HistoryCompactor] = None,
+    run_trace: Optional[RunTrace] = None,
+    tool_payloads: Optional[ToolPayloadConfig] = None,
+) -> Iterator[BaseEvent]:
     """Run the contextual Agent, mapping AG-UI input messages to Agno format, and streaming the response in AG-UI format."""
     run_id = run_input.run_id or str(uuid.uuid4())
+    observer = RunObserver()
+    response_stream = None
 
     try:
         # Preparing the input for the Agent and emitting the run started event
-        messages = convert_agui_messages_to_agno_messages(run_input.messages or [])
-        yield RunStartedEvent(type=EventType.RUN_STARTED, thread_id=run_input.thread_id, run_id=run_id)
+        messages = prepare_agno_messages(run_input, message_cache, history_delta_only, history_compactor)
+        yield observer.count(RunStartedEvent(type=EventType.RUN_STARTED, thread_id=run_input.thread_id, run_id=run_id))
 
         # Request streaming response from agent
         response_stream = agent.run(
@@ -41,26 +67,53 @@ def run_agent(agent: Agent, run_input: RunAgentInput) -> Iterator[BaseEvent]:
         )
 
         # Stream the response content in AG-UI format
-        for event in stream_agno_response_as_agui_events(
-            response_stream=response_stream
-        ):
+        events = stream_agno_response_as_agui_events(
+            response_stream=response_stream, run_trace=run_trace, tool_payloads=tool_payloads
+        )
+        if text_coalescing is not None:
+            events = coalesce_text_deltas(events, text_coalescing)
+        for event in events:
+            observer.observe(event)
             yield event
 
-        yield RunFinishedEvent(type=EventType.RUN_FINISHED, thread_id=run_input.thread_id, run_id=run_id)
+        observer.outcome = "completed"
+        yield observer.count(
+            RunFinishedEvent(type=EventType.RUN_FINISHED, thread_id=run_input.thread_id, run_id=run_id)
+        )
 
     # Emit a RunErrorEvent if any error occurs
     except Exception as e:
         logger.error(f"Error running agent: {e}", exc_info=True)
-        yield RunErrorEvent(type=EventType.RUN_ERROR, message=str(e))
+        observer.outcome = "error"
+        if run_trace is not None:
+            run_trace.record_error(e)
+        yield observer.count(RunErrorEvent(type=EventType.RUN_ERROR, message=str(e)))
+
+    finally:
+        observer.finish()
+        # Stop the underlying run if the stream is closed early, e.g. when the client disconnected
+        if response_stream is not None:
+            response_stream.close()  # type: ignore
 
 
-def run_team(team: Team, input: RunAgentInput) -> Iterator[BaseEvent]:
+def run_team(
+    team: Team,
+    input: RunAgentInput,
+    text_coalescing: Optional[TextCoalescingConfig] = None,
+    message_cache: Optional[AGUIMessageCache] = None,
+    history_delta_only: bool = False,
+    history_compactor: Optional[HistoryCompactor] = None,
+    run_trace: Optional[RunTrace] = None,
+    tool_payloads: Optional[ToolPayloadConfig] = None,
+) -> Iterator[BaseEvent]:
     """Run the contextual Team, mapping AG-UI input messages to Agno format, and streaming the response in AG-UI format."""
     run_id = input.run_id or str(uuid.uuid4())
+    observer = RunObserver()
+    response_stream = None
     try:
         # Extract the last user message for team execution
-        messages = convert_agui_messages_to_agno_messages(input.messages or [])
-        yield RunStartedEvent(type=EventType.RUN_STARTED, thread_id=input.thread_id, run_id=run_id)
+        messages = prepare_agno_messages(input, message_cache, history_delta_only, history_compactor)
+        yield observer.count(RunStartedEvent(type=EventType.RUN_STARTED, thread_id=input.thread_id, run_id=run_id))
 
         # Request streaming response from team
         # Team.arun() does not handle list[Message] type, join the messages
@@ -73,55 +126,155 @@ def run_team(team: Team, input: RunAgentInput) -> Iterator[BaseEvent]:
         )
 
         # Stream the response content in AG-UI format
-        for event in stream_agno_response_as_agui_events(
-            response_stream=response_stream
-        ):
+        events = stream_agno_response_as_agui_events(
+            response_stream=response_stream, run_trace=run_trace, tool_payloads=tool_payloads
+        )
+        if text_coalescing is not None:
+            events = coalesce_text_deltas(events, text_coalescing)
+        for event in events:
+            observer.observe(event)
             yield event
 
-        yield RunFinishedEvent(type=EventType.RUN_FINISHED, thread_id=input.thread_id, run_id=run_id)
+        observer.outcome = "completed"
+        yield observer.count(RunFinishedEvent(type=EventType.RUN_FINISHED, thread_id=input.thread_id, run_id=run_id))
 
     except Exception as e:
         logger.error(f"Error running team: {e}", exc_info=True)
-        yield RunErrorEvent(type=EventType.RUN_ERROR, message=str(e))
+        observer.outcome = "error"
+        if run_trace is not None:
+            run_trace.record_error(e)
+        yield observer.count(RunErrorEvent(type=EventType.RUN_ERROR, message=str(e)))
+
+    finally:
+        observer.finish()
+        # Stop the underlying run if the stream is closed early, e.g. when the client disconnected
+        if response_stream is not None:
+            response_stream.close()  # type: ignore
+
+
+def get_sync_agui_router(
+    agent: Optional[Agent] = None,
+    team: Optional[Team] = None,
+    text_coalescing: Optional[TextCoalescingConfig] = None,
+    encoder: Optional[AGUIEventEncoder] = None,
+    message_cache: Optional[AGUIMessageCache] = None,
+    history_delta_only: bool = False,
+    run_executor: Optional[RunExecutor] = None,
+    admission_control: Optional[AdmissionController] = None,
+    tracing: Optional[AGUITracing] = None,
+    tool_payloads: Optional[ToolPayloadConfig] = None,
+    history_compactor: Optional[HistoryCompactor] = None,
+    negotiate_encoding: bool = True,
+    status_stats: Optional[Dict[str, Callable[[], Dict[str, Any]]]] = None,
+) -> APIRouter:
+    """Return an AG-UI compatible FastAPI router.
 
+    Runs execute on the threads of the run_executor, defaulting to a new RunExecutor, instead of the threadpool
+    Starlette shares with every other sync endpoint. The executor is shut down with the app. With tracing, a sample of
+    the runs is traced.
 
-def get_sync_agui_router(agent: Optional[Agent] = None, team: Optional[Team] = None) -> APIRouter:
-    """Return an AG-UI compatible FastAPI router."""
+    With tool_payloads, oversized tool call args and results are split or truncated. The full truncated results are
+    served from GET /agui/tool-results/{tool_call_id} when the config has a result_store.
+
+    With a history_compactor, the history passed to the runs is kept within a token budget, older turns summarized.
+
+    With negotiate_encoding, runs are streamed in the protobuf encoding to the clients preferring its media type in
+    their Accept header, in SSE to the others.
+
+    GET /status reports the runs, the load, the message_cache and the sections of status_stats, read on every
+    request, e.g. the stats of the tool cache.
+    """
     if (agent is None and team is None) or (agent is not None and team is not None):
         raise ValueError("One of 'agent' or 'team' must be provided.")
 
-    router = APIRouter()
-    encoder = EventEncoder()
+    executor = run_executor or RunExecutor()
+
+    @asynccontextmanager
+    async def lifespan(app: Any) -> AsyncIterator[None]:
+        yield
+        executor.shutdown()
+
+    router = APIRouter(lifespan=lifespan)
+    event_encoder = encoder or FastSSEEventEncoder()
+    encoders: List[AGUIEventEncoder] = [event_encoder]
+    if negotiate_encoding:
+        encoders.append(ProtobufEventEncoder())
+    run_stats = RunStats()
+
+    def _run(run_input: RunAgentInput, accept: Optional[str] = None):
+        run_encoder = negotiate_encoder(accept, encoders)
 
-    def _run(run_input: RunAgentInput):
         def event_generator():
-            if agent:
-                for event in run_agent(agent, run_input):
-                    encoded_event = encoder.encode(event)
-                    yield encoded_event
-            elif team:
-                for event in run_team(team, run_input):
-                    encoded_event = encoder.encode(event)
-                    yield encoded_event
+            run_trace = tracing.start_run(run_input) if tracing is not None else None
+            try:
+                if agent:
+                    for event in run_agent(
+                        agent,
+                        run_input,
+                        text_coalescing,
+                        message_cache,
+                        history_delta_only,
+                        history_compactor,
+                        run_trace,
+                        tool_payloads,
+                    ):
+                        encoded_event = run_encoder.encode(event)
+                        yield encoded_event
+                elif team:
+                    for event in run_team(
+                        team,
+                        run_input,
+                        text_coalescing,
+                        message_cache,
+                        history_delta_only,
+                        history_compactor,
+                        run_trace,
+                        tool_payloads,
+                    ):
+                        encoded_event = run_encoder.encode(event)
+                        yield encoded_event
+            finally:
+                if run_trace is not None:
+                    run_trace.finish()
 
+        headers = {
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "Access-Control-Allow-Origin": "*",
+            "Access-Control-Allow-Methods": "POST, GET, OPTIONS",
+            "Access-Control-Allow-Headers": "*",
+        }
+        if len(encoders) > 1:
+            headers["Vary"] = "Accept"
         return StreamingResponse(
-            event_generator(),
-            media_type="text/event-stream",
-            headers={
-                "Cache-Control": "no-cache",
-                "Connection": "keep-alive",
-                "Access-Control-Allow-Origin": "*",
-                "Access-Control-Allow-Methods": "POST, GET, OPTIONS",
-                "Access-Control-Allow-Headers": "*",
-            },
+            track_run(executor.stream(event_generator()), run_stats),
+            media_type=run_encoder.get_content_type(),
+            headers=headers,
         )
 
     @router.post("/agui")
-    def run_agent_agui(run_input: RunAgentInput):
-        return _run(run_input)
+    async def run_agent_agui(run_input: RunAgentInput, accept: Optional[str] = Header(None)):
+        return _run(run_input, accept)
+
+    if tool_payloads is not None and tool_payloads.result_store is not None:
+        result_store = tool_payloads.result_store
+
+        @router.get(TOOL_RESULTS_PATH + "/{tool_call_id}")
+        def get_tool_result(tool_call_id: str):
+            content = result_store.get(tool_call_id)
+            if content is None:
+                raise HTTPException(status_code=404, detail="Tool result not found")
+            return PlainTextResponse(content)
 
     @router.get("/status")
     def get_status():
-        return {"status": "available"}
+        status = {"status": "available", "runs": run_stats.to_dict(), "executor": executor.stats.to_dict()}
+        if admission_control is not None:
+            status["load"] = admission_control.stats.to_dict()
+        if message_cache is not None:
+            status["message_cache"] = message_cache.stats.to_dict()
+        for name, read_stats in (status_stats or {}).items():
+            status[name] = read_stats()
+        return status
 
     return router
@@ -0,0 +1,93 @@
+"""OpenTelemetry tracing of the AG-UI runs, from the Agno chunks to the encoded frames."""
+
+import random
+from typing import Dict, Optional
+
+from ag_ui.core import RunAgentInput
+from opentelemetry import trace
+from opentelemetry.trace import Span, SpanKind, Status, StatusCode, Tracer, TracerProvider
+
+
+class RunTrace:
+    """The spans of one traced AG-UI run: a root span, with a child span per Agent or Team run and per tool call."""
+
+    def __init__(self, tracer: Tracer, root: Span):
+        self.tracer = tracer
+        self.root = root
+        self.root_context = trace.set_span_in_context(root)
+        # Agno run_id -> span of the Agent or Team run
+        self.member_spans: Dict[str, Span] = {}
+        # tool_call_id -> span of the tool call
+        self.tool_call_spans: Dict[str, Span] = {}
+
+    def start_member_run(self, run_id: str, name: str) -> None:
+        self.member_spans[run_id] = self.tracer.start_span(
+            f"agno.run {name}",
+            context=self.root_context,
+            attributes={"agno.run_id": run_id, "agno.name": name},
+        )
+
+    def end_member_run(self, run_id: str) -> None:
+        span = self.member_spans.pop(run_id, None)
+        if span is not None:
+            span.end()
+
+    def start_tool_call(self, tool_call_id: str, tool_name: str, run_id: Optional[str] = None) -> None:
+        """Start the span of a tool call, under the span of the run calling it if it's known."""
+        parent = self.member_spans.get(run_id) if run_id is not None else None
+        self.tool_call_spans[tool_call_id] = self.tracer.start_span(
+            f"agno.tool_call {tool_name}",
+            context=trace.set_span_in_context(parent) if parent is not None else self.root_context,
+            attributes={"agno.tool_call_id": tool_call_id, "agno.tool_name": tool_name},
+        )
+
+    def end_tool_call(self, tool_call_id: str, error: bool = False) -> None:
+        span = self.tool_call_spans.pop(tool_call_id, None)
+        if span is not None:
+            if error:
+                span.set_status(Status(StatusCode.ERROR))
+            span.end()
+
+    def add_event(self, name: str, attributes: Optional[Dict[str, object]] = None) -> None:
+        self.root.add_event(name, attributes=attributes)  # type: ignore
+
+    def record_error(self, error: BaseException) -> None:
+        self.root.record_exception(error)
+        self.root.set_status(Status(StatusCode.ERROR, str(error)))
+
+    def finish(self) -> None:
+        """End the spans left open, e.g. by a cancelled run, then the root span."""
+        for span in list(self.tool_call_spans.values()) + list(self.member_spans.values()):
+            span.end()
+        self.tool_call_spans.clear()
+        self.member_spans.clear()
+        self.root.end()
+
+
+class AGUITracing:
+    """Traces a sample of the AG-UI runs. Runs left out of the sample create no spans at all."""
+
+    def __init__(self, tracer_provider: Optional[TracerProvider] = None, sample_ratio: float = 1.0):
+        """
+        Args:
+            tracer_provider (Optional[TracerProvider]): Provider of the tracer, defaulting to the global provider.
+            sample_ratio (float): Fraction of the runs traced, between 0 and 1.
+        """
+        self.tracer = trace.get_tracer(__name__, tracer_provider=tracer_provider)
+        self.sample_ratio = sample_ratio
+
+    def start_run(self, run_input: RunAgentInput) -> Optional[RunTrace]:
+        """Start tracing the run, returning None if it isn't sampled."""
+        if self.sample_ratio <= 0 or (self.sample_ratio < 1 and random.random() >= self.sample_ratio):
+            return None
+
+        root = self.tracer.start_span(
+            "agui.run",
+            kind=SpanKind.SERVER,
+            attributes={"agui.thread_id": run_input.thread_id, "agui.run_id": run_input.run_id},
+        )
+        # The provider may not record anything, e.g. when none is configured
+        if not root.is_recording():
+            root.end()
+            return None
+        return RunTrace(self.tracer, root)
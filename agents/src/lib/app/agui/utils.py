@@ -1,47 +1,74 @@
 """Logic used by the AG-UI router."""
 
+import asyncio
 import json
+import threading
+import time
 import uuid
-from collections import deque
+from collections import OrderedDict, deque
 from collections.abc import Iterator
-from dataclasses import dataclass
-from typing import AsyncIterator, Deque, List, Optional, Set, Tuple, Union
-
-from ag_ui.core import (
-    BaseEvent,
-    EventType,
-    StepFinishedEvent,
-    StepStartedEvent,
-    TextMessageContentEvent,
-    TextMessageEndEvent,
-    TextMessageStartEvent,
-    ToolCallArgsEvent,
-    ToolCallEndEvent,
-    ToolCallResultEvent,
-    ToolCallStartEvent,
-)
+from dataclasses import asdict, dataclass
+from typing import Any, AsyncIterator, Callable, Deque, Dict, List, Optional, Set, Tuple, TypeVar, Union
+
+from ag_ui.core import BaseEvent, EventType, RunAgentInput, TextMessageContentEvent
 from ag_ui.core.types import Message as AGUIMessage
 
 from agno.models.message import Message
 from agno.run.response import RunEvent, RunResponseContentEvent, RunResponseEvent, RunResponsePausedEvent
 from agno.run.team import RunResponseContentEvent as TeamRunResponseContentEvent
 from agno.run.team import TeamRunEvent, TeamRunResponseEvent
+from agno.utils.log import log_info, log_warning
+from lib.app.agui.events import (
+    step_finished,
+    step_started,
+    text_message_content,
+    text_message_end,
+    text_message_start,
+    tool_call_args,
+    tool_call_end,
+    tool_call_result,
+    tool_call_start,
+)
+from lib.app.agui.history import HistoryCompactor
+from lib.app.agui.metrics import agent_run_duration, buffer_blocked, tool_call_duration
+from lib.app.agui.payloads import ToolPayloadConfig, limit_tool_args, limit_tool_result
+from lib.app.agui.tracing import RunTrace
+
+T = TypeVar("T")
 
 
 @dataclass
 class EventBuffer:
-    """Buffer to manage event ordering constraints, relevant when mapping Agno responses to AG-UI events."""
+    """Buffer to manage event ordering constraints, relevant when mapping Agno responses to AG-UI events.
+
+    Events are held back while a tool call blocks the buffer, until it ends. With max_held_events, a tool call holding
+    more events than that releases them before it ends, bounding the memory of a tool call that never ends at the cost
+    of the ordering: its held events reach the client ahead of its end. Without it, the default, the ordering is always
+    kept and the held events are unbounded.
+    """
 
-    buffer: Deque[BaseEvent]
+    buffer: Deque[BaseEvent]  # The events held back by the current blocking tool call
+    released: Deque[Deque[BaseEvent]]  # The held events of the tool calls that ended, waiting to be routed in order
     blocking_tool_call_id: Optional[str]  # The tool call that's currently blocking the buffer
     active_tool_call_ids: Set[str]  # All currently active tool calls
     ended_tool_call_ids: Set[str]  # All tool calls that have ended
+    blocked_at: float  # When the buffer got blocked by the current blocking tool call
+    tool_call_started_at: Dict[str, float]  # When each tool call in progress started
+    run_started_at: Dict[str, float]  # When each Agent or Team run in progress started, by run_id
+    run_trace: Optional[RunTrace]  # The spans of the run, if it's traced
+    max_held_events: Optional[int]  # Events held back by a blocking tool call before giving up on its ordering
 
-    def __init__(self):
+    def __init__(self, run_trace: Optional[RunTrace] = None, max_held_events: Optional[int] = None):
         self.buffer = deque()
+        self.released = deque()
         self.blocking_tool_call_id = None
         self.active_tool_call_ids = set()
         self.ended_tool_call_ids = set()
+        self.blocked_at = 0.0
+        self.tool_call_started_at = {}
+        self.run_started_at = {}
+        self.run_trace = run_trace
+        self.max_held_events = max_held_events
 
     def is_blocked(self) -> bool:
         """Check if the buffer is currently blocked by an active tool call."""
@@ -52,6 +79,9 @@ class EventBuffer:
         self.active_tool_call_ids.add(tool_call_id)
         if self.blocking_tool_call_id is None:
             self.blocking_tool_call_id = tool_call_id
+            self.blocked_at = time.perf_counter()
+            if self.run_trace is not None:
+                self.run_trace.add_event("agui.buffer.blocked", {"agui.tool_call_id": tool_call_id})
 
     def end_tool_call(self, tool_call_id: str) -> bool:
         """End a tool call, marking it as ended and unblocking the buffer if needed."""
@@ -60,34 +90,256 @@ class EventBuffer:
 
         # Unblock the buffer if the current blocking tool call is the one ending
         if tool_call_id == self.blocking_tool_call_id:
-            self.blocking_tool_call_id = None
+            self._unblock()
             return True
 
         return False
 
+    def release_held_events(self) -> bool:
+        """Release the held events without waiting for the blocking tool call to end, when it held too many."""
+        log_warning(
+            f"Tool call {self.blocking_tool_call_id} held back more than {self.max_held_events} events, "
+            "releasing them before it ends"
+        )
+        self._unblock()
+        return True
+
+    def _unblock(self) -> None:
+        """Release the events held back by the blocking tool call, behind those of the previous ones."""
+        tool_call_id = self.blocking_tool_call_id
+        self.blocking_tool_call_id = None
+        blocked_time = time.perf_counter() - self.blocked_at
+        buffer_blocked.observe(blocked_time)
+        if self.run_trace is not None:
+            self.run_trace.add_event(
+                "agui.buffer.unblocked",
+                {
+                    "agui.tool_call_id": tool_call_id,  # type: ignore
+                    "agui.buffer.held_events": len(self.buffer),
+                    "agui.buffer.blocked_seconds": blocked_time,
+                },
+            )
+        if self.buffer:
+            self.released.append(self.buffer)
+            self.buffer = deque()
+
+
+@dataclass
+class TextCoalescingConfig:
+    """Window within which consecutive text deltas of the same message are merged into a single event."""
+
+    max_bytes: int = 2048  # Flush once the pending text reaches this many UTF-8 bytes
+    max_latency: float = 0.05  # Flush pending text at most this many seconds after its first delta
+
+
+class TextDeltaCoalescer:
+    """Accumulates consecutive TextMessageContentEvents of a single message, releasing them as one merged event."""
+
+    def __init__(self, config: TextCoalescingConfig):
+        self.config = config
+        self.message_id: Optional[str] = None
+        self.first_event: Optional[TextMessageContentEvent] = None
+        self.parts: List[str] = []
+        self.size = 0
+        self.deadline = 0.0
+
+    def has_pending(self) -> bool:
+        """Check if there is buffered text waiting to be flushed."""
+        return self.first_event is not None
+
+    def time_left(self) -> float:
+        """Seconds left before the pending text must be flushed."""
+        return max(self.deadline - time.monotonic(), 0.0)
+
+    def add(self, event: TextMessageContentEvent) -> List[BaseEvent]:
+        """Buffer a content event, returning the events that have to be emitted now."""
+        events_to_emit = []
+
+        # Deltas of another message must never be merged with the pending ones
+        if self.first_event is not None and event.message_id != self.message_id:
+            events_to_emit.extend(self.flush())
+
+        if self.first_event is None:
+            self.first_event = event
+            self.message_id = event.message_id
+            self.deadline = time.monotonic() + self.config.max_latency
+        self.parts.append(event.delta)
+        self.size += len(event.delta.encode("utf-8"))
+
+        if self.size >= self.config.max_bytes:
+            events_to_emit.extend(self.flush())
+
+        return events_to_emit
+
+    def flush(self) -> List[BaseEvent]:
+        """Release the pending text as a single content event."""
+        if self.first_event is None:
+            return []
+
+        # Avoid re-building the event when nothing was merged into it
+        if len(self.parts) == 1:
+            merged_event = self.first_event
+        else:
+            merged_event = text_message_content(message_id=self.first_event.message_id, delta="".join(self.parts))
+
+        self.message_id = None
+        self.first_event = None
+        self.parts = []
+        self.size = 0
+        return [merged_event]
+
+
+def convert_agui_message_to_agno_message(msg: AGUIMessage) -> Optional[Message]:
+    """Convert an AG-UI message to an Agno message. Returns None for roles not forwarded to Agno."""
+    if msg.role == "tool":
+        return Message(role="tool", tool_call_id=msg.tool_call_id, content=msg.content)
+    elif msg.role == "assistant":
+        tool_calls = None
+        if msg.tool_calls:
+            tool_calls = [call.model_dump() for call in msg.tool_calls]
+        return Message(
+            role="assistant",
+            content=msg.content,
+            tool_calls=tool_calls,
+        )
+    elif msg.role == "user":
+        return Message(role="user", content=msg.content)
+    return None
+
 
 def convert_agui_messages_to_agno_messages(messages: List[AGUIMessage]) -> List[Message]:
     """Convert AG-UI messages to Agno messages."""
     result = []
     for msg in messages:
-        if msg.role == "tool":
-            result.append(Message(role="tool", tool_call_id=msg.tool_call_id, content=msg.content))
-        elif msg.role == "assistant":
-            tool_calls = None
-            if msg.tool_calls:
-                tool_calls = [call.model_dump() for call in msg.tool_calls]
-            result.append(
-                Message(
-                    role="assistant",
-                    content=msg.content,
-                    tool_calls=tool_calls,
-                )
-            )
-        elif msg.role == "user":
-            result.append(Message(role="user", content=msg.content))
+        agno_message = convert_agui_message_to_agno_message(msg)
+        if agno_message is not None:
+            result.append(agno_message)
     return result
 
 
+def get_new_agui_messages(messages: List[AGUIMessage]) -> List[AGUIMessage]:
+    """Return the messages sent after the last assistant message, i.e. the input of the current turn."""
+    for index in range(len(messages) - 1, -1, -1):
+        if messages[index].role == "assistant":
+            return messages[index + 1 :]
+    return messages
+
+
+_set_attribute = object.__setattr__
+
+
+def copy_message(message: Message) -> Message:
+    """Shallow copy of a message, the same as message.model_copy() in a fraction of its time.
+
+    pydantic's copy goes through copy.copy for each of the model's attributes, most of the cost of handing out the
+    cached messages of a long thread.
+    """
+    copied = object.__new__(type(message))
+    _set_attribute(copied, "__dict__", message.__dict__.copy())
+    extra = message.__pydantic_extra__
+    _set_attribute(copied, "__pydantic_extra__", None if extra is None else extra.copy())
+    _set_attribute(copied, "__pydantic_fields_set__", message.__pydantic_fields_set__.copy())
+    private = message.__pydantic_private__
+    _set_attribute(copied, "__pydantic_private__", None if private is None else private.copy())
+    return copied
+
+
+@dataclass
+class MessageCacheStats:
+    """Counters describing the effectiveness of an AGUIMessageCache."""
+
+    hits: int = 0  # Messages reused from the previous turns of their thread
+    misses: int = 0  # Messages converted, new or changed since the previous turn
+    evictions: int = 0  # Threads dropped to respect max_threads
+
+    def to_dict(self) -> Dict[str, int]:
+        return asdict(self)
+
+
+class AGUIMessageCache:
+    """Thread-scoped cache of converted messages, so each turn only converts the messages it hasn't seen yet.
+
+    CopilotKit resends the whole thread on every request. Cached messages are reused for the longest prefix of the
+    incoming thread matching the cached message ids and contents; everything after it is converted again.
+    """
+
+    def __init__(self, max_threads: int = 1024):
+        self.max_threads = max_threads
+        # thread_id -> [(AG-UI message id, AG-UI message content, converted message)], least recently used first
+        self.threads: OrderedDict[str, List[Tuple[str, Optional[str], Optional[Message]]]] = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = MessageCacheStats()
+
+    def convert(self, thread_id: str, messages: List[AGUIMessage], copy: bool = True) -> List[Message]:
+        """Convert the thread's AG-UI messages to Agno messages, reusing the ones converted on previous turns.
+
+        Without copy, the cached messages themselves are returned, and must be copied before being handed to a run.
+        """
+        with self.lock:
+            cached = self.threads.pop(thread_id, [])
+
+            reused = 0
+            limit = min(len(cached), len(messages))
+            while reused < limit:
+                message_id, content, _ = cached[reused]
+                if message_id != messages[reused].id or content != messages[reused].content:
+                    break
+                reused += 1
+            del cached[reused:]
+
+            for msg in messages[reused:]:
+                cached.append((msg.id, msg.content, convert_agui_message_to_agno_message(msg)))
+
+            self.stats.hits += reused
+            self.stats.misses += len(messages) - reused
+
+            self.threads[thread_id] = cached
+            while len(self.threads) > self.max_threads:
+                self.threads.popitem(last=False)
+                self.stats.evictions += 1
+
+        # Agno appends the given messages to the run as-is, so hand out copies to keep the cached ones untouched
+        if not copy:
+            return [entry[2] for entry in cached if entry[2] is not None]
+        return [copy_message(entry[2]) for entry in cached if entry[2] is not None]
+
+    def clear(self, thread_id: Optional[str] = None) -> None:
+        """Drop the cached messages of a thread, or of every thread."""
+        with self.lock:
+            if thread_id is None:
+                self.threads.clear()
+            else:
+                self.threads.pop(thread_id, None)
+
+
+def prepare_agno_messages(
+    run_input: RunAgentInput,
+    message_cache: Optional[AGUIMessageCache] = None,
+    history_delta_only: bool = False,
+    history_compactor: Optional[HistoryCompactor] = None,
+) -> List[Message]:
+    """Convert the AG-UI input messages of a run to the Agno messages passed to the Agent or Team.
+
+    With history_delta_only, only the input of the current turn is converted, relying on the session storage of the
+    Agent or Team to provide the earlier history. Otherwise, a history_compactor keeps the history within its token
+    budget.
+    """
+    messages = run_input.messages or []
+    if history_delta_only:
+        return convert_agui_messages_to_agno_messages(get_new_agui_messages(messages))
+    if history_compactor is None:
+        if message_cache is not None:
+            return message_cache.convert(run_input.thread_id, messages)
+        return convert_agui_messages_to_agno_messages(messages)
+
+    if message_cache is not None:
+        # Only copy the cached messages kept by the compactor
+        agno_messages = message_cache.convert(run_input.thread_id, messages, copy=False)
+        window = history_compactor.compact(run_input.thread_id, agno_messages)
+        return [copy_message(message) for message in window]
+    return history_compactor.compact(run_input.thread_id, convert_agui_messages_to_agno_messages(messages))
+
+
 def extract_team_response_chunk_content(response: TeamRunResponseContentEvent) -> str:
     """Given a response stream chunk, find and extract the content."""
 
@@ -118,95 +370,175 @@ def extract_response_chunk_content(response: RunResponseContentEvent) -> str:
     return str(response.content) if response.content else ""
 
 
+def _get_run_name(chunk: Union[RunResponseEvent, TeamRunResponseEvent]) -> str:
+    """Name of the Agent or Team emitting the chunk."""
+    return getattr(chunk, "agent_name", None) or getattr(chunk, "team_name", None) or ""
+
+
+def _emit_text(content: str, message_id: str, message_started: bool, events_to_emit: List[BaseEvent]) -> bool:
+    # Handle the message start event, emitted once per message
+    if not message_started:
+        message_started = True
+        events_to_emit.append(text_message_start(message_id=message_id, role="assistant"))
+
+    # Handle the text content event, emitted once per text chunk
+    if content:
+        events_to_emit.append(text_message_content(message_id=message_id, delta=content))
+    return message_started
+
+
+def _on_run_response_content(
+    chunk: RunResponseContentEvent,
+    message_id: str,
+    message_started: bool,
+    event_buffer: EventBuffer,
+    tool_payloads: Optional[ToolPayloadConfig],
+    events_to_emit: List[BaseEvent],
+) -> bool:
+    return _emit_text(extract_response_chunk_content(chunk), message_id, message_started, events_to_emit)
+
+
+def _on_team_run_response_content(
+    chunk: TeamRunResponseContentEvent,
+    message_id: str,
+    message_started: bool,
+    event_buffer: EventBuffer,
+    tool_payloads: Optional[ToolPayloadConfig],
+    events_to_emit: List[BaseEvent],
+) -> bool:
+    return _emit_text(extract_team_response_chunk_content(chunk), message_id, message_started, events_to_emit)
+
+
+def _on_run_started(
+    chunk: Union[RunResponseEvent, TeamRunResponseEvent],
+    message_id: str,
+    message_started: bool,
+    event_buffer: EventBuffer,
+    tool_payloads: Optional[ToolPayloadConfig],
+    events_to_emit: List[BaseEvent],
+) -> bool:
+    # Record the start of the Agent or Team run, timed until its completion event
+    if chunk.run_id is not None:
+        event_buffer.run_started_at[chunk.run_id] = time.perf_counter()
+        if event_buffer.run_trace is not None:
+            event_buffer.run_trace.start_member_run(chunk.run_id, _get_run_name(chunk))
+    return message_started
+
+
+def _on_tool_call_started(
+    chunk: Union[RunResponseEvent, TeamRunResponseEvent],
+    message_id: str,
+    message_started: bool,
+    event_buffer: EventBuffer,
+    tool_payloads: Optional[ToolPayloadConfig],
+    events_to_emit: List[BaseEvent],
+) -> bool:
+    tool_call = chunk.tool  # type: ignore
+    if tool_call is None:
+        return message_started
+
+    tool_call_id = tool_call.tool_call_id
+    event_buffer.tool_call_started_at[tool_call_id] = time.perf_counter()
+    if event_buffer.run_trace is not None:
+        event_buffer.run_trace.start_tool_call(tool_call_id, tool_call.tool_name or "", chunk.run_id)
+    events_to_emit.append(
+        tool_call_start(tool_call_id=tool_call_id, tool_call_name=tool_call.tool_name, parent_message_id=message_id)
+    )
+    for delta in limit_tool_args(json.dumps(tool_call.tool_args), tool_payloads):
+        events_to_emit.append(tool_call_args(tool_call_id=tool_call_id, delta=delta))
+    return message_started
+
+
+def _on_tool_call_completed(
+    chunk: Union[RunResponseEvent, TeamRunResponseEvent],
+    message_id: str,
+    message_started: bool,
+    event_buffer: EventBuffer,
+    tool_payloads: Optional[ToolPayloadConfig],
+    events_to_emit: List[BaseEvent],
+) -> bool:
+    tool_call = chunk.tool  # type: ignore
+    if tool_call is None:
+        return message_started
+
+    tool_call_id = tool_call.tool_call_id
+    started_at = event_buffer.tool_call_started_at.pop(tool_call_id, None)
+    if started_at is not None:
+        tool_call_duration.observe(time.perf_counter() - started_at, tool_call.tool_name or "")
+    if event_buffer.run_trace is not None:
+        event_buffer.run_trace.end_tool_call(tool_call_id, bool(tool_call.tool_call_error))
+    if tool_call_id not in event_buffer.ended_tool_call_ids:
+        events_to_emit.append(tool_call_end(tool_call_id=tool_call_id))
+
+        if tool_call.result is not None:
+            content = limit_tool_result(tool_call_id, str(tool_call.result), tool_payloads)
+            events_to_emit.append(
+                tool_call_result(tool_call_id=tool_call_id, content=content, role="tool", message_id=str(uuid.uuid4()))
+            )
+    return message_started
+
+
+def _on_reasoning_started(
+    chunk: Union[RunResponseEvent, TeamRunResponseEvent],
+    message_id: str,
+    message_started: bool,
+    event_buffer: EventBuffer,
+    tool_payloads: Optional[ToolPayloadConfig],
+    events_to_emit: List[BaseEvent],
+) -> bool:
+    events_to_emit.append(step_started(step_name="reasoning"))
+    return message_started
+
+
+def _on_reasoning_completed(
+    chunk: Union[RunResponseEvent, TeamRunResponseEvent],
+    message_id: str,
+    message_started: bool,
+    event_buffer: EventBuffer,
+    tool_payloads: Optional[ToolPayloadConfig],
+    events_to_emit: List[BaseEvent],
+) -> bool:
+    events_to_emit.append(step_finished(step_name="reasoning"))
+    return message_started
+
+
+# (chunk, message_id, message_started, event_buffer, tool_payloads, events_to_emit) -> message_started
+ChunkHandler = Callable[..., bool]
+
+# Handler of each kind of chunk mapped to AG-UI events, keyed by the value of its event. The handlers append the events
+# of the chunk to events_to_emit and return the updated message_started state.
+_CHUNK_HANDLERS: Dict[str, ChunkHandler] = {
+    RunEvent.run_response_content.value: _on_run_response_content,
+    TeamRunEvent.run_response_content.value: _on_team_run_response_content,
+    RunEvent.run_started.value: _on_run_started,
+    TeamRunEvent.run_started.value: _on_run_started,
+    RunEvent.tool_call_started.value: _on_tool_call_started,
+    RunEvent.tool_call_completed.value: _on_tool_call_completed,
+    RunEvent.reasoning_started.value: _on_reasoning_started,
+    RunEvent.reasoning_completed.value: _on_reasoning_completed,
+}
+
+# Chunks ending the run of an Agent or Team
+_COMPLETION_EVENTS = frozenset(
+    (RunEvent.run_completed.value, TeamRunEvent.run_completed.value, RunEvent.run_paused.value)
+)
+
+
 def _create_events_from_chunk(
     chunk: Union[RunResponseEvent, TeamRunResponseEvent],
     message_id: str,
     message_started: bool,
     event_buffer: EventBuffer,
+    tool_payloads: Optional[ToolPayloadConfig] = None,
 ) -> Tuple[List[BaseEvent], bool]:
     """
     Process a single chunk and return events to emit + updated message_started state.
     Returns: (events_to_emit, new_message_started_state)
     """
-    events_to_emit = []
-
-    # Extract content if the contextual event is a content event
-    if chunk.event == RunEvent.run_response_content:
-        content = extract_response_chunk_content(chunk)  # type: ignore
-    elif chunk.event == TeamRunEvent.run_response_content:
-        content = extract_team_response_chunk_content(chunk)  # type: ignore
-    else:
-        content = None
-
-    # Handle text responses
-    if content is not None:
-        # Handle the message start event, emitted once per message
-        if not message_started:
-            message_started = True
-            start_event = TextMessageStartEvent(
-                type=EventType.TEXT_MESSAGE_START,
-                message_id=message_id,
-                role="assistant",
-            )
-            events_to_emit.append(start_event)
-
-        # Handle the text content event, emitted once per text chunk
-        if content is not None and content != "":
-            content_event = TextMessageContentEvent(
-                type=EventType.TEXT_MESSAGE_CONTENT,
-                message_id=message_id,
-                delta=content,
-            )
-            events_to_emit.append(content_event)
-
-    # Handle starting a new tool call
-    elif chunk.event == RunEvent.tool_call_started:
-        if chunk.tool is not None:  # type: ignore
-            tool_call = chunk.tool  # type: ignore
-            start_event = ToolCallStartEvent(
-                type=EventType.TOOL_CALL_START,
-                tool_call_id=tool_call.tool_call_id,  # type: ignore
-                tool_call_name=tool_call.tool_name,  # type: ignore
-                parent_message_id=message_id,
-            )
-            events_to_emit.append(start_event)
-
-            args_event = ToolCallArgsEvent(
-                type=EventType.TOOL_CALL_ARGS,
-                tool_call_id=tool_call.tool_call_id,  # type: ignore
-                delta=json.dumps(tool_call.tool_args),
-            )
-            events_to_emit.append(args_event)
-
-    # Handle tool call completion
-    elif chunk.event == RunEvent.tool_call_completed:
-        if chunk.tool is not None:  # type: ignore
-            tool_call = chunk.tool  # type: ignore
-            if tool_call.tool_call_id not in event_buffer.ended_tool_call_ids:
-                end_event = ToolCallEndEvent(
-                    type=EventType.TOOL_CALL_END,
-                    tool_call_id=tool_call.tool_call_id,  # type: ignore
-                )
-                events_to_emit.append(end_event)
-
-                if tool_call.result is not None:
-                    result_event = ToolCallResultEvent(
-                        type=EventType.TOOL_CALL_RESULT,
-                        tool_call_id=tool_call.tool_call_id,  # type: ignore
-                        content=str(tool_call.result),
-                        role="tool",
-                        message_id=str(uuid.uuid4()),
-                    )
-                    events_to_emit.append(result_event)
-
-    # Handle reasoning
-    elif chunk.event == RunEvent.reasoning_started:
-        step_event = StepStartedEvent(type=EventType.STEP_STARTED, step_name="reasoning")
-        events_to_emit.append(step_event)
-    elif chunk.event == RunEvent.reasoning_completed:
-        step_event = StepFinishedEvent(type=EventType.STEP_FINISHED, step_name="reasoning")
-        events_to_emit.append(step_event)
-
+    events_to_emit: List[BaseEvent] = []
+    handler = _CHUNK_HANDLERS.get(chunk.event)
+    if handler is not None:
+        message_started = handler(chunk, message_id, message_started, event_buffer, tool_payloads, events_to_emit)
     return events_to_emit, message_started
 
 
@@ -215,23 +547,25 @@ def _create_completion_events(
     event_buffer: EventBuffer,
     message_started: bool,
     message_id: str,
+    tool_payloads: Optional[ToolPayloadConfig] = None,
 ) -> List[BaseEvent]:
     """Create events for run completion."""
     events_to_emit = []
 
+    started_at = event_buffer.run_started_at.pop(chunk.run_id, None) if chunk.run_id is not None else None
+    if started_at is not None:
+        agent_run_duration.observe(time.perf_counter() - started_at, _get_run_name(chunk))
+        if event_buffer.run_trace is not None:
+            event_buffer.run_trace.end_member_run(chunk.run_id)  # type: ignore
+
     # End remaining active tool calls if needed
     for tool_call_id in list(event_buffer.active_tool_call_ids):
         if tool_call_id not in event_buffer.ended_tool_call_ids:
-            end_event = ToolCallEndEvent(
-                type=EventType.TOOL_CALL_END,
-                tool_call_id=tool_call_id,
-            )
-            events_to_emit.append(end_event)
+            events_to_emit.append(tool_call_end(tool_call_id=tool_call_id))
 
     # End the message and run, denoting the end of the session
     if message_started:
-        end_message_event = TextMessageEndEvent(type=EventType.TEXT_MESSAGE_END, message_id=message_id)
-        events_to_emit.append(end_message_event)
+        events_to_emit.append(text_message_end(message_id=message_id))
 
     # emit frontend tool calls, i.e. external_execution=True
     if isinstance(chunk, RunResponsePausedEvent) and chunk.tools is not None:
@@ -239,152 +573,328 @@ def _create_completion_events(
             if tool.tool_call_id is None or tool.tool_name is None:
                 continue
 
-            start_event = ToolCallStartEvent(
-                type=EventType.TOOL_CALL_START,
-                tool_call_id=tool.tool_call_id,
-                tool_call_name=tool.tool_name,
-                parent_message_id=message_id,
-            )
-            events_to_emit.append(start_event)
-
-            args_event = ToolCallArgsEvent(
-                type=EventType.TOOL_CALL_ARGS,
-                tool_call_id=tool.tool_call_id,
-                delta=json.dumps(tool.tool_args),
-            )
-            events_to_emit.append(args_event)
-
-            end_event = ToolCallEndEvent(
-                type=EventType.TOOL_CALL_END,
-                tool_call_id=tool.tool_call_id,
+            events_to_emit.append(
+                tool_call_start(
+                    tool_call_id=tool.tool_call_id, tool_call_name=tool.tool_name, parent_message_id=message_id
+                )
             )
-            events_to_emit.append(end_event)
+            for delta in limit_tool_args(json.dumps(tool.tool_args), tool_payloads):
+                events_to_emit.append(tool_call_args(tool_call_id=tool.tool_call_id, delta=delta))
+            events_to_emit.append(tool_call_end(tool_call_id=tool.tool_call_id))
 
     return events_to_emit
 
 
-def _emit_event_logic(event: BaseEvent, event_buffer: EventBuffer) -> List[BaseEvent]:
-    """Process an event through the buffer and return events to actually emit."""
-    events_to_emit = []
+def _emit_event_logic(event: BaseEvent, event_buffer: EventBuffer, events_to_emit: List[BaseEvent]) -> None:
+    """Process an event through the buffer, appending the events to actually emit to events_to_emit."""
+    if _route_event(event, event_buffer, events_to_emit):
+        _flush_event_buffer(event_buffer, events_to_emit)
 
+
+def _route_event(event: BaseEvent, event_buffer: EventBuffer, events_to_emit: List[BaseEvent]) -> bool:
+    """Emit or hold back a single event. Returns True if the blocking tool call released its held events."""
     if event_buffer.is_blocked():
         # Handle events related to the current blocking tool call
         if event.type == EventType.TOOL_CALL_ARGS:
-            if hasattr(event, "tool_call_id") and event.tool_call_id in event_buffer.active_tool_call_ids:  # type: ignore
+            if event.tool_call_id in event_buffer.active_tool_call_ids:  # type: ignore
                 events_to_emit.append(event)
-            else:
-                event_buffer.buffer.append(event)
+                return False
         elif event.type == EventType.TOOL_CALL_END:
-            tool_call_id = getattr(event, "tool_call_id", None)
+            tool_call_id = event.tool_call_id  # type: ignore
             if tool_call_id and tool_call_id == event_buffer.blocking_tool_call_id:
                 events_to_emit.append(event)
                 event_buffer.end_tool_call(tool_call_id)
-                # Flush buffered events after ending the blocking tool call
-                while event_buffer.buffer:
-                    buffered_event = event_buffer.buffer.popleft()
-                    # Recursively process buffered events
-                    nested_events = _emit_event_logic(buffered_event, event_buffer)
-                    events_to_emit.extend(nested_events)
+                return True
             elif tool_call_id and tool_call_id in event_buffer.active_tool_call_ids:
-                event_buffer.buffer.append(event)
                 event_buffer.end_tool_call(tool_call_id)
-            else:
-                event_buffer.buffer.append(event)
-        # Handle all other events
-        elif event.type == EventType.TOOL_CALL_START:
-            event_buffer.buffer.append(event)
-        else:
-            event_buffer.buffer.append(event)
+
+        # Hold all other events back until the blocking tool call ends
+        held = event_buffer.buffer
+        held.append(event)
+        max_held_events = event_buffer.max_held_events
+        return max_held_events is not None and len(held) > max_held_events and event_buffer.release_held_events()
     # If the buffer is not blocked, emit the events normally
     else:
         if event.type == EventType.TOOL_CALL_START:
-            tool_call_id = getattr(event, "tool_call_id", None)
+            tool_call_id = event.tool_call_id  # type: ignore
             if tool_call_id:
                 event_buffer.start_tool_call(tool_call_id)
             events_to_emit.append(event)
         elif event.type == EventType.TOOL_CALL_END:
-            tool_call_id = getattr(event, "tool_call_id", None)
+            tool_call_id = event.tool_call_id  # type: ignore
             if tool_call_id:
                 event_buffer.end_tool_call(tool_call_id)
             events_to_emit.append(event)
         else:
             events_to_emit.append(event)
 
-    return events_to_emit
+    return False
+
+
+def _flush_event_buffer(event_buffer: EventBuffer, events_to_emit: List[BaseEvent]) -> None:
+    """Route the events released by the tool calls that ended, in order.
+
+    Each blocking tool call holds its events in a FIFO of its own. Routing a released event may block the buffer again,
+    holding the events after it in a new FIFO that's released behind the remaining ones, so every event is routed once
+    per blocking tool call it waits for.
+    """
+    released = event_buffer.released
+    while released:
+        held = released[0]
+        while held:
+            _route_event(held.popleft(), event_buffer, events_to_emit)
+        released.popleft()
 
 
 def stream_agno_response_as_agui_events(
-    response_stream: Iterator[Union[RunResponseEvent, TeamRunResponseEvent]]
+    response_stream: Iterator[Union[RunResponseEvent, TeamRunResponseEvent]],
+    run_trace: Optional[RunTrace] = None,
+    tool_payloads: Optional[ToolPayloadConfig] = None,
 ) -> Iterator[BaseEvent]:
     """Map the Agno response stream to AG-UI format, handling event ordering constraints."""
     message_id = str(uuid.uuid4())
     message_started = False
-    event_buffer = EventBuffer()
+    event_buffer = EventBuffer(run_trace)
+    events_to_emit: List[BaseEvent] = []
 
     for chunk in response_stream:
         # Handle the lifecycle end event
-        if (
-            chunk.event == RunEvent.run_completed
-            or chunk.event == TeamRunEvent.run_completed
-            or chunk.event == RunEvent.run_paused
-        ):
+        if chunk.event in _COMPLETION_EVENTS:
             completion_events = _create_completion_events(
-                chunk, event_buffer, message_started, message_id
+                chunk, event_buffer, message_started, message_id, tool_payloads
             )
 
             # Reset to false to ensure next team member emits a new TextMessageStartEvent
             message_started = False
 
             for event in completion_events:
-                events_to_emit = _emit_event_logic(event_buffer=event_buffer, event=event)
-                for emit_event in events_to_emit:
-                    yield emit_event
+                _emit_event_logic(event=event, event_buffer=event_buffer, events_to_emit=events_to_emit)
         else:
             # Process regular chunk
             events_from_chunk, message_started = _create_events_from_chunk(
-                chunk, message_id, message_started, event_buffer
+                chunk, message_id, message_started, event_buffer, tool_payloads
             )
 
             for event in events_from_chunk:
-                events_to_emit = _emit_event_logic(event_buffer=event_buffer, event=event)
-                for emit_event in events_to_emit:
-                    yield emit_event
+                _emit_event_logic(event=event, event_buffer=event_buffer, events_to_emit=events_to_emit)
+
+        for emit_event in events_to_emit:
+            yield emit_event
+        events_to_emit.clear()
 
 
 # Async version - thin wrapper
 async def async_stream_agno_response_as_agui_events(
     response_stream: AsyncIterator[Union[RunResponseEvent, TeamRunResponseEvent]],
+    run_trace: Optional[RunTrace] = None,
+    tool_payloads: Optional[ToolPayloadConfig] = None,
+    new_message_per_completion: bool = False,
 ) -> AsyncIterator[BaseEvent]:
-    """Map the Agno response stream to AG-UI format, handling event ordering constraints."""
+    """Map the Agno response stream to AG-UI format, handling event ordering constraints.
+
+    With new_message_per_completion, the text following each completed run gets a new message_id, e.g. for the member
+    streams of a fan-out, which are interleaved with each other. Otherwise the stream keeps one message_id throughout.
+    """
     message_id = str(uuid.uuid4())
     message_started = False
-    event_buffer = EventBuffer()
+    event_buffer = EventBuffer(run_trace)
+    events_to_emit: List[BaseEvent] = []
 
     async for chunk in response_stream:
         # Handle the lifecycle end event
-        if (
-            chunk.event == TeamRunEvent.run_completed
-            or chunk.event == RunEvent.run_completed
-            or chunk.event == RunEvent.run_paused
-        ):
+        if chunk.event in _COMPLETION_EVENTS:
             completion_events = _create_completion_events(
-                chunk, event_buffer, message_started, message_id
+                chunk, event_buffer, message_started, message_id, tool_payloads
             )
 
             # Reset to false to ensure next team member emits a new TextMessageStartEvent
             message_started = False
+            if new_message_per_completion:
+                message_id = str(uuid.uuid4())
 
             for event in completion_events:
-                events_to_emit = _emit_event_logic(event_buffer=event_buffer, event=event)
-                for emit_event in events_to_emit:
-                    yield emit_event
+                _emit_event_logic(event=event, event_buffer=event_buffer, events_to_emit=events_to_emit)
         else:
             # Process regular chunk
             events_from_chunk, message_started = _create_events_from_chunk(
-                chunk, message_id, message_started, event_buffer
+                chunk, message_id, message_started, event_buffer, tool_payloads
             )
 
             for event in events_from_chunk:
-                events_to_emit = _emit_event_logic(event_buffer=event_buffer, event=event)
-                for emit_event in events_to_emit:
-                    yield emit_event
+                _emit_event_logic(event=event, event_buffer=event_buffer, events_to_emit=events_to_emit)
+
+        for emit_event in events_to_emit:
+            yield emit_event
+        events_to_emit.clear()
+
+
+def coalesce_text_deltas(events: Iterator[BaseEvent], config: TextCoalescingConfig) -> Iterator[BaseEvent]:
+    """Merge consecutive text deltas of the same message, flushing before any other event to keep the ordering.
+
+    The sync version has no timer, so the latency window is only checked when the next event arrives.
+    """
+    coalescer = TextDeltaCoalescer(config)
+
+    for event in events:
+        if event.type == EventType.TEXT_MESSAGE_CONTENT:
+            yield from coalescer.add(event)  # type: ignore
+            if coalescer.has_pending() and coalescer.time_left() == 0.0:
+                yield from coalescer.flush()
+        else:
+            yield from coalescer.flush()
+            yield event
+
+    yield from coalescer.flush()
+
+
+class _CoalescingPump:
+    """Coalesces the text deltas of a stream from a task of its own, waking the consumer only for the merged events.
+
+    The pending text is flushed by a timer once the latency window elapses, even if the stream is idle. At most
+    max_ready events wait for the consumer before the stream stops being read.
+    """
+
+    def __init__(self, events: AsyncIterator[BaseEvent], config: TextCoalescingConfig, max_ready: int = 64):
+        self.events = events
+        self.coalescer = TextDeltaCoalescer(config)
+        self.max_ready = max_ready
+        self.ready: Deque[BaseEvent] = deque()
+        self.finished = False
+        self.error: Optional[BaseException] = None
+        self.loop = asyncio.get_running_loop()
+        self.waiter: Optional[asyncio.Future] = None
+        self.reader_waiter: Optional[asyncio.Future] = None
+        self.timer: Optional[asyncio.TimerHandle] = None
+        self.timer_event: Optional[BaseEvent] = None  # First delta of the pending text the timer flushes
+        self.task = asyncio.ensure_future(self._read())
+
+    async def _read(self) -> None:
+        coalescer = self.coalescer
+        try:
+            async for event in self.events:
+                if event.type == EventType.TEXT_MESSAGE_CONTENT:
+                    self.ready.extend(coalescer.add(event))  # type: ignore
+                else:
+                    self.ready.extend(coalescer.flush())
+                    self.ready.append(event)
+                self._schedule_flush()
+                if self.ready:
+                    self._wake_consumer()
+                    if len(self.ready) >= self.max_ready:
+                        self.reader_waiter = self.loop.create_future()
+                        await self.reader_waiter
+            self.ready.extend(coalescer.flush())
+        except Exception as e:
+            self.error = e
+        finally:
+            self._cancel_timer()
+            self.finished = True
+            self._wake_consumer()
+
+    def _schedule_flush(self) -> None:
+        """Time the flush of the pending text, once per first delta."""
+        first_event = self.coalescer.first_event
+        if first_event is self.timer_event:
+            return
+        self._cancel_timer()
+        if first_event is not None:
+            self.timer_event = first_event
+            self.timer = self.loop.call_later(self.coalescer.time_left(), self._flush_pending)
+
+    def _cancel_timer(self) -> None:
+        if self.timer is not None:
+            self.timer.cancel()
+        self.timer = None
+        self.timer_event = None
+
+    def _flush_pending(self) -> None:
+        self.timer = None
+        self.timer_event = None
+        self.ready.extend(self.coalescer.flush())
+        self._wake_consumer()
+
+    def _wake_consumer(self) -> None:
+        if self.waiter is not None and not self.waiter.done():
+            self.waiter.set_result(None)
+
+    async def wait(self) -> None:
+        """Wait for events to emit or the end of the stream."""
+        if self.ready or self.finished:
+            return
+        self.waiter = self.loop.create_future()
+        try:
+            await self.waiter
+        finally:
+            self.waiter = None
+
+    def pop(self) -> BaseEvent:
+        event = self.ready.popleft()
+        if self.reader_waiter is not None and not self.reader_waiter.done():
+            self.reader_waiter.set_result(None)
+        return event
+
+    async def close(self) -> None:
+        # Let the cancellation reach the upstream stream before it is closed
+        self.task.cancel()
+        await asyncio.wait({self.task})
+        self._cancel_timer()
+
+
+async def async_coalesce_text_deltas(
+    events: AsyncIterator[BaseEvent], config: TextCoalescingConfig
+) -> AsyncIterator[BaseEvent]:
+    """Merge consecutive text deltas of the same message, flushing before any other event to keep the ordering.
+
+    Pending text is flushed once the latency window elapses, even if the upstream stream is idle.
+    """
+    pump = _CoalescingPump(events, config)
+    try:
+        while True:
+            await pump.wait()
+            if not pump.ready:
+                break
+            while pump.ready:
+                yield pump.pop()
+        if pump.error is not None:
+            raise pump.error
+    finally:
+        await pump.close()
+
+
+@dataclass
+class RunStats:
+    """Counters of the runs streamed by an AG-UI router."""
+
+    started: int = 0
+    completed: int = 0
+    cancelled: int = 0  # Runs abandoned before their end, e.g. because the client disconnected
+
+    @property
+    def in_progress(self) -> int:
+        return self.started - self.completed - self.cancelled
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "started": self.started,
+            "completed": self.completed,
+            "cancelled": self.cancelled,
+            "in_progress": self.in_progress,
+        }
+
+
+async def track_run(events: AsyncIterator[T], run_stats: RunStats) -> AsyncIterator[T]:
+    """Stream the events of a run, closing the run as soon as its response is abandoned.
+
+    The server cancels or closes the response stream when the client disconnects. The run is closed right away
+    instead of when the stream gets garbage collected, so no further chunks are pulled from the Agent or Team.
+    """
+    run_stats.started += 1
+    try:
+        async for event in events:
+            yield event
+    except (asyncio.CancelledError, GeneratorExit):
+        run_stats.cancelled += 1
+        log_info("Run cancelled, the client disconnected")
+        await events.aclose()  # type: ignore
+        raise
+    run_stats.completed += 1
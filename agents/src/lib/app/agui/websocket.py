@@ -0,0 +1,339 @@
+"""WebSocket transport of the AG-UI router, one long-lived connection per thread carrying its successive runs.
+
+The client sends JSON messages with a type:
+    {"type": "run", "threadId": ..., "runId": ..., "messages": [...], ...}  Starts a run, fields of RunAgentInput
+    {"type": "cancel"}  Cancels the run in progress
+
+The first run of a connection carries the whole thread and binds the connection to its threadId. The later runs only
+carry their new messages, e.g. the user message or the results of frontend tools, and may omit the state, tools,
+context and forwarded props to reuse the previous ones. The responses of the runs are recorded into the thread by the
+server, from their events.
+
+The server sends the AG-UI events of the runs as JSON text frames, like the data of the SSE frames. Cancelled runs
+end with a RUN_ERROR event with the CANCELLED code. Messages that can't be acted upon are answered with
+{"type": "error", "code": ..., "message": ...}.
+"""
+
+import asyncio
+import json
+import uuid
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+from ag_ui.core import BaseEvent, EventType, RunAgentInput, RunErrorEvent
+from ag_ui.core.types import (
+    AssistantMessage,
+    ConfiguredBaseModel,
+    Context,
+    FunctionCall,
+    Tool,
+    ToolCall,
+    ToolMessage,
+)
+from ag_ui.core.types import Message as AGUIMessage
+from fastapi import WebSocket, WebSocketDisconnect
+from pydantic import ValidationError
+
+from agno.utils.log import log_debug, log_warning
+from lib.app.admission import AdmissionController, AdmissionRejected
+from lib.app.agui.tracing import AGUITracing, RunTrace
+from lib.app.agui.utils import RunStats, track_run
+
+# Close code of the connections replaced by a newer connection to the same thread
+REPLACED_CLOSE_CODE = 4000
+
+
+class RunDelta(ConfiguredBaseModel):
+    """Input of a run sent over a WebSocket, the fields of RunAgentInput that changed since the previous run."""
+
+    thread_id: Optional[str] = None
+    run_id: Optional[str] = None
+    messages: List[AGUIMessage] = []
+    state: Optional[Any] = None
+    tools: Optional[List[Tool]] = None
+    context: Optional[List[Context]] = None
+    forwarded_props: Optional[Any] = None
+
+
+class AGUIThread:
+    """The messages of a thread, updated with the messages sent by the client and the events of the runs."""
+
+    def __init__(self, thread_id: str):
+        self.thread_id = thread_id
+        self.messages: List[AGUIMessage] = []
+        # Message id -> index in messages
+        self.index: Dict[str, int] = {}
+        # Message id -> text deltas of the assistant messages being streamed
+        self.pending_text: Dict[str, List[str]] = {}
+        # Tool call id -> (id of the assistant message making it, name, args deltas) of the tool calls being streamed
+        self.pending_tool_calls: Dict[str, tuple] = {}
+
+    def upsert(self, message: AGUIMessage) -> None:
+        """Add the message, or replace the message of the same id where it is."""
+        index = self.index.get(message.id)
+        if index is None:
+            self.index[message.id] = len(self.messages)
+            self.messages.append(message)
+        else:
+            self.messages[index] = message
+
+    def record(self, event: BaseEvent) -> None:
+        """Record an event of a run into the messages, the way AG-UI clients build them."""
+        if event.type == EventType.TEXT_MESSAGE_START:
+            self._get_assistant_message(event.message_id)  # type: ignore
+            self.pending_text[event.message_id] = []  # type: ignore
+        elif event.type == EventType.TEXT_MESSAGE_CONTENT:
+            self.pending_text.setdefault(event.message_id, []).append(event.delta)  # type: ignore
+        elif event.type == EventType.TEXT_MESSAGE_END:
+            self._end_text(event.message_id)  # type: ignore
+        elif event.type == EventType.TOOL_CALL_START:
+            message_id = event.parent_message_id or str(uuid.uuid4())  # type: ignore
+            self._get_assistant_message(message_id)
+            self.pending_tool_calls[event.tool_call_id] = (message_id, event.tool_call_name, [])  # type: ignore
+        elif event.type == EventType.TOOL_CALL_ARGS:
+            pending = self.pending_tool_calls.get(event.tool_call_id)  # type: ignore
+            if pending is not None:
+                pending[2].append(event.delta)  # type: ignore
+        elif event.type == EventType.TOOL_CALL_END:
+            self._end_tool_call(event.tool_call_id)  # type: ignore
+        elif event.type == EventType.TOOL_CALL_RESULT:
+            self.upsert(
+                ToolMessage(
+                    id=event.message_id,  # type: ignore
+                    role="tool",
+                    content=event.content,  # type: ignore
+                    tool_call_id=event.tool_call_id,  # type: ignore
+                )
+            )
+
+    def end_run(self) -> None:
+        """Record the messages left streaming by a run that ended early, e.g. when cancelled."""
+        for message_id in list(self.pending_text):
+            self._end_text(message_id)
+        for tool_call_id in list(self.pending_tool_calls):
+            self._end_tool_call(tool_call_id)
+
+    def _get_assistant_message(self, message_id: str) -> AssistantMessage:
+        index = self.index.get(message_id)
+        if index is not None and isinstance(self.messages[index], AssistantMessage):
+            return self.messages[index]  # type: ignore
+        message = AssistantMessage(id=message_id, role="assistant")
+        self.upsert(message)
+        return message
+
+    def _end_text(self, message_id: str) -> None:
+        parts = self.pending_text.pop(message_id, None)
+        if not parts:
+            return
+        message = self._get_assistant_message(message_id)
+        self.upsert(message.model_copy(update={"content": (message.content or "") + "".join(parts)}))
+
+    def _end_tool_call(self, tool_call_id: str) -> None:
+        pending = self.pending_tool_calls.pop(tool_call_id, None)
+        if pending is None:
+            return
+        message_id, name, args = pending
+        message = self._get_assistant_message(message_id)
+        tool_call = ToolCall(
+            id=tool_call_id,
+            type="function",
+            function=FunctionCall(name=name, arguments="".join(args)),
+        )
+        self.upsert(message.model_copy(update={"tool_calls": [*(message.tool_calls or []), tool_call]}))
+
+
+class AGUIWebSocketSession:
+    """A WebSocket connection to a thread: the thread so far, the inputs of its last run and the run in progress."""
+
+    def __init__(self, websocket: WebSocket, thread_id: str):
+        self.websocket = websocket
+        self.thread = AGUIThread(thread_id)
+        self.state: Any = {}
+        self.tools: List[Tool] = []
+        self.context: List[Context] = []
+        self.forwarded_props: Any = {}
+        self.run_task: Optional[asyncio.Task] = None
+
+    @property
+    def thread_id(self) -> str:
+        return self.thread.thread_id
+
+    def is_running(self) -> bool:
+        return self.run_task is not None and not self.run_task.done()
+
+    def apply(self, delta: RunDelta) -> RunAgentInput:
+        """Apply the delta of a run to the thread, returning the full input of the run."""
+        for message in delta.messages:
+            self.thread.upsert(message)
+        if delta.state is not None:
+            self.state = delta.state
+        if delta.tools is not None:
+            self.tools = delta.tools
+        if delta.context is not None:
+            self.context = delta.context
+        if delta.forwarded_props is not None:
+            self.forwarded_props = delta.forwarded_props
+        return RunAgentInput(
+            thread_id=self.thread_id,
+            run_id=delta.run_id or str(uuid.uuid4()),
+            state=self.state,
+            messages=list(self.thread.messages),
+            tools=self.tools,
+            context=self.context,
+            forwarded_props=self.forwarded_props,
+        )
+
+    async def cancel_run(self) -> bool:
+        """Cancel the run in progress and wait for it to end, returning whether there was one."""
+        if self.run_task is None:
+            return False
+        running = not self.run_task.done()
+        if running:
+            self.run_task.cancel()
+        # Also collects the error of a run that failed sending, e.g. to a disconnected client
+        await asyncio.gather(self.run_task, return_exceptions=True)
+        self.run_task = None
+        return running
+
+    async def close(self, code: int, reason: str) -> None:
+        await self.cancel_run()
+        try:
+            await self.websocket.close(code=code, reason=reason)
+        except RuntimeError:
+            # Already closed
+            pass
+
+
+class AGUIWebSocketSessions:
+    """The WebSocket connection of each thread, a newer connection to a thread replacing the older one.
+
+    Keeping a single connection per thread keeps e.g. a stale browser tab from running on the thread concurrently.
+    """
+
+    def __init__(self):
+        self.sessions: Dict[str, AGUIWebSocketSession] = {}
+
+    async def register(self, session: AGUIWebSocketSession) -> None:
+        replaced = self.sessions.get(session.thread_id)
+        self.sessions[session.thread_id] = session
+        if replaced is not None and replaced is not session:
+            log_debug(f"Replacing the WebSocket connection of thread {session.thread_id}")
+            await replaced.close(REPLACED_CLOSE_CODE, "Replaced by a newer connection to the thread")
+
+    def unregister(self, session: AGUIWebSocketSession) -> None:
+        if self.sessions.get(session.thread_id) is session:
+            del self.sessions[session.thread_id]
+
+    def __len__(self) -> int:
+        return len(self.sessions)
+
+
+async def _send_error(websocket: WebSocket, code: str, message: str) -> None:
+    await websocket.send_text(json.dumps({"type": "error", "code": code, "message": message}))
+
+
+async def _send_event(websocket: WebSocket, event: BaseEvent) -> None:
+    await websocket.send_text(event.model_dump_json(by_alias=True, exclude_none=True))
+
+
+async def _stream_run(
+    session: AGUIWebSocketSession,
+    run_input: RunAgentInput,
+    start_run: Callable[[RunAgentInput, Optional[RunTrace]], AsyncIterator[BaseEvent]],
+    admission_control: Optional[AdmissionController],
+    tracing: Optional[AGUITracing],
+    run_stats: Optional[RunStats],
+) -> None:
+    """Run on the session's thread, sending the events of the run and recording them into the thread."""
+    websocket = session.websocket
+    run_trace: Optional[RunTrace] = None
+    events: Optional[AsyncIterator[BaseEvent]] = None
+    admitted = cancelled = False
+    try:
+        if admission_control is not None:
+            await admission_control.acquire()
+            admitted = True
+        run_trace = tracing.start_run(run_input) if tracing is not None else None
+        events = start_run(run_input, run_trace)
+        if run_stats is not None:
+            events = track_run(events, run_stats)
+        async for event in events:
+            session.thread.record(event)
+            await _send_event(websocket, event)
+    except AdmissionRejected as e:
+        await _send_event(websocket, RunErrorEvent(type=EventType.RUN_ERROR, message=e.detail, code=str(e.status_code)))
+    except asyncio.CancelledError:
+        cancelled = True
+    finally:
+        # Stop the underlying run if it didn't complete
+        if events is not None:
+            await events.aclose()  # type: ignore
+        session.thread.end_run()
+        if run_trace is not None:
+            run_trace.finish()
+        if admitted:
+            admission_control.release()  # type: ignore
+    if cancelled:
+        await _send_event(websocket, RunErrorEvent(type=EventType.RUN_ERROR, message="Run cancelled", code="CANCELLED"))
+
+
+async def serve_agui_websocket(
+    websocket: WebSocket,
+    sessions: AGUIWebSocketSessions,
+    start_run: Callable[[RunAgentInput, Optional[RunTrace]], AsyncIterator[BaseEvent]],
+    admission_control: Optional[AdmissionController] = None,
+    tracing: Optional[AGUITracing] = None,
+    run_stats: Optional[RunStats] = None,
+) -> None:
+    """Serve the runs of a thread over the WebSocket until the client disconnects."""
+    await websocket.accept()
+    session: Optional[AGUIWebSocketSession] = None
+    try:
+        while True:
+            try:
+                message = json.loads(await websocket.receive_text())
+            except json.JSONDecodeError as e:
+                await _send_error(websocket, "INVALID_MESSAGE", f"Invalid JSON: {e}")
+                continue
+            message_type = message.pop("type", None) if isinstance(message, dict) else None
+
+            if message_type == "cancel":
+                if session is None or not await session.cancel_run():
+                    await _send_error(websocket, "NO_RUN", "No run in progress")
+                continue
+            if message_type != "run":
+                await _send_error(websocket, "INVALID_MESSAGE", f"Unknown message type {message_type!r}")
+                continue
+
+            try:
+                delta = RunDelta.model_validate(message)
+            except ValidationError as e:
+                await _send_error(websocket, "INVALID_MESSAGE", str(e))
+                continue
+            if session is None:
+                if delta.thread_id is None:
+                    await _send_error(websocket, "INVALID_MESSAGE", "The first run of a connection needs a threadId")
+                    continue
+                session = AGUIWebSocketSession(websocket, delta.thread_id)
+                await sessions.register(session)
+            elif delta.thread_id not in (None, session.thread_id):
+                await _send_error(websocket, "THREAD_MISMATCH", f"The connection is to thread {session.thread_id}")
+                continue
+            if session.is_running():
+                await _send_error(websocket, "RUN_IN_PROGRESS", "Cancel the run in progress or wait for it to end")
+                continue
+
+            # Collect the previous run before starting the next one
+            await session.cancel_run()
+            run_input = session.apply(delta)
+            session.run_task = asyncio.create_task(
+                _stream_run(session, run_input, start_run, admission_control, tracing, run_stats)
+            )
+    except WebSocketDisconnect:
+        pass
+    except RuntimeError as e:
+        # Receiving once the connection was closed, e.g. replaced by a newer one
+        log_warning(f"WebSocket connection ended: {e}")
+    finally:
+        if session is not None:
+            await session.cancel_run()
+            sessions.unregister(session)
@@ -1,11 +1,14 @@
+import asyncio
+import threading
 from abc import ABC, abstractmethod
+from contextlib import asynccontextmanager
 from os import getenv
-from typing import Any, Dict, Optional, Union
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple, Union
 from uuid import uuid4
 
 import uvicorn
 from fastapi import FastAPI, HTTPException, Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from fastapi.routing import APIRouter
 from starlette.middleware.cors import CORSMiddleware
 
@@ -13,11 +16,20 @@ from agno.agent.agent import Agent
 from agno.api.app import AppCreate, create_app
 from agno.app.settings import APIAppSettings
 from agno.team.team import Team
-from agno.utils.log import log_debug, log_info
+from agno.utils.log import log_debug, log_error, log_info, log_warning
+from lib.app.admission import AdmissionController, AdmissionMiddleware
+from lib.app.metrics import PROMETHEUS_CONTENT_TYPE, registry
+from lib.app.startup import startup_timer
+from lib.app.workers import serve_with_workers
 
 
 class BaseAPIApp(ABC):
     type: Optional[str] = None
+    # Paths of the routes starting runs, subject to admission control
+    run_paths: Tuple[str, ...] = ()
+    # Seconds before retrying a failed lazy initialization, doubled on each failure up to the max
+    warm_up_retry_delay: float = 1.0
+    warm_up_max_retry_delay: float = 60.0
 
     def __init__(
         self,
@@ -31,7 +43,15 @@ class BaseAPIApp(ABC):
         name: Optional[str] = None,
         description: Optional[str] = None,
         version: Optional[str] = None,
+        admission_control: Optional[AdmissionController] = None,
+        lazy_initialization: bool = False,
     ):
+        """
+        Args:
+            lazy_initialization (bool): Initialize the Agent or Team and its members concurrently, in the background
+                once the app starts, instead of here. /ready answers 503 until they are initialized, the initialization
+                being retried with backoff until it succeeds.
+        """
         if not agent and not team:
             raise ValueError("Either agent or team must be provided.")
 
@@ -48,25 +68,29 @@ class BaseAPIApp(ABC):
         self.name: Optional[str] = name
         self.description = description
         self.version = version
+        self.admission_control: Optional[AdmissionController] = admission_control
+        self.lazy_initialization = lazy_initialization
+        self.ready = False
         self.set_app_id()
 
         if self.agent:
             if not self.agent.app_id:
                 self.agent.app_id = self.app_id
-            self.agent.initialize_agent()
 
         if self.team:
             if not self.team.app_id:
                 self.team.app_id = self.app_id
-            self.team.initialize_team()
             for member in self.team.members:
                 if isinstance(member, Agent):
                     if not member.app_id:
                         member.app_id = self.app_id
                     member.team_id = None
-                    member.initialize_agent()
-                elif isinstance(member, Team):
-                    member.initialize_team()
+
+        if not self.lazy_initialization:
+            with startup_timer.phase("initialize members"):
+                for initialize in self._get_initializers():
+                    initialize()
+            self.ready = True
 
     def set_app_id(self) -> str:
         # If app_id is already set, keep it instead of overriding with UUID
@@ -76,6 +100,82 @@ class BaseAPIApp(ABC):
         # Don't override existing app_id
         return self.app_id
 
+    def _get_initializers(self) -> List[Callable[[], None]]:
+        """Return the initializers of the Agent or Team, then of its members, which are independent of each other."""
+        if self.agent:
+            return [self.agent.initialize_agent]
+
+        initializers: List[Callable[[], None]] = [self.team.initialize_team]  # type: ignore
+        for member in self.team.members:  # type: ignore
+            if isinstance(member, Agent):
+                initializers.append(member.initialize_agent)
+            elif isinstance(member, Team):
+                initializers.append(member.initialize_team)
+        return initializers
+
+    def _get_models(self) -> List[Any]:
+        if self.agent:
+            runners: List[Union[Agent, Team]] = [self.agent]
+        else:
+            runners = [self.team, *self.team.members]  # type: ignore
+        return [runner.model for runner in runners if runner.model is not None]
+
+    async def warm_up(self) -> None:
+        """Initialize the Agent or Team and its members concurrently, and create their model clients.
+
+        A failed initialization is retried with backoff, the app staying unready meanwhile.
+        """
+        if self.ready:
+            return
+
+        initializers = self._get_initializers()
+        retry_delay = self.warm_up_retry_delay
+        while True:
+            try:
+                with startup_timer.phase("initialize members"):
+                    # The members are initialized once the Team is, as it configures them
+                    await asyncio.to_thread(initializers[0])
+                    await asyncio.gather(*(asyncio.to_thread(initialize) for initialize in initializers[1:]))
+                break
+            except Exception as e:
+                # Runs initialize what they use themselves until then
+                log_error(f"Could not initialize the app, retrying in {retry_delay:g}s: {e}")
+                await asyncio.sleep(retry_delay)
+                retry_delay = min(retry_delay * 2, self.warm_up_max_retry_delay)
+
+        # Clients are otherwise created by the first run of each model
+        with startup_timer.phase("create model clients"):
+            clients = [model.get_client for model in self._get_models() if hasattr(model, "get_client")]
+            results = await asyncio.gather(
+                *(asyncio.to_thread(get_client) for get_client in clients), return_exceptions=True
+            )
+            for result in results:
+                if isinstance(result, Exception):
+                    log_warning(f"Could not create a model client: {result}")
+
+        self.ready = True
+        log_info(startup_timer.report())
+
+    def _with_warm_up(self, lifespan: Callable[[FastAPI], Any]) -> Callable[[FastAPI], Any]:
+        """Wrap the lifespan of the app, warming up in the background while the app starts serving.
+
+        An app initialized eagerly only reports its startup phases once it starts serving.
+        """
+
+        @asynccontextmanager
+        async def lifespan_with_warm_up(app: FastAPI) -> AsyncIterator[Any]:
+            warm_up_task = asyncio.create_task(self.warm_up()) if not self.ready else None
+            try:
+                async with lifespan(app) as state:
+                    if warm_up_task is None:
+                        log_info(startup_timer.report())
+                    yield state
+            finally:
+                if warm_up_task is not None:
+                    warm_up_task.cancel()
+
+        return lifespan_with_warm_up
+
     def _set_monitoring(self) -> None:
         monitor_env = getenv("AGNO_MONITOR")
         if monitor_env is not None:
@@ -137,8 +237,26 @@ class BaseAPIApp(ABC):
         else:
             self.router.include_router(self.get_router())
 
+        @self.router.get("/metrics", include_in_schema=False)
+        async def get_metrics():
+            return Response(content=registry.render(), media_type=PROMETHEUS_CONTENT_TYPE)
+
+        @self.router.get("/ready", include_in_schema=False)
+        async def get_ready():
+            return JSONResponse(status_code=200 if self.ready else 503, content={"ready": self.ready})
+
         self.api_app.include_router(self.router)
 
+        self.api_app.router.lifespan_context = self._with_warm_up(self.api_app.router.lifespan_context)
+
+        if self.admission_control is not None:
+            self._register_admission_metrics(self.admission_control)
+            self.api_app.add_middleware(
+                AdmissionMiddleware,
+                controller=self.admission_control,
+                paths=[f"{prefix}{path}" for path in self.run_paths],
+            )
+
         self.api_app.add_middleware(
             CORSMiddleware,
             allow_origins=["*"],
@@ -150,6 +268,12 @@ class BaseAPIApp(ABC):
 
         return self.api_app
 
+    @staticmethod
+    def _register_admission_metrics(controller: AdmissionController) -> None:
+        stats = controller.stats
+        registry.gauge("agui_admission_in_flight", "Runs currently admitted.", lambda: stats.in_flight)
+        registry.gauge("agui_admission_queued", "Runs waiting for admission.", lambda: stats.queued)
+
     def serve(
         self,
         app: Union[str, FastAPI],
@@ -157,10 +281,23 @@ class BaseAPIApp(ABC):
         host: str = "localhost",
         port: int = 7777,
         reload: bool = False,
+        workers: int = 1,
         **kwargs,
     ):
         self.set_app_id()
-        self.register_app_on_platform()
+        # Registration may wait on a network timeout, don't hold the startup back
+        threading.Thread(target=self.register_app_on_platform, name="platform-registration", daemon=True).start()
+
+        # Serve from multiple processes, routing the runs of a thread to the same worker
+        if workers > 1:
+            if not isinstance(app, str):
+                raise ValueError("The app must be given as an import string to be served by multiple workers.")
+            if reload:
+                raise ValueError("Reload is not supported with multiple workers.")
+            log_info(f"Starting API on {host}:{port} with {workers} workers")
+            serve_with_workers(app, host=host, port=port, workers=workers, **kwargs)
+            return
+
         log_info(f"Starting API on {host}:{port}")
 
         uvicorn.run(app=app, host=host, port=port, reload=reload, **kwargs)
@@ -170,11 +307,12 @@ class BaseAPIApp(ABC):
         if not self.monitoring:
             return
 
-        try:
-            log_debug(f"Creating app on Platform: {self.name}, {self.app_id}")
-            create_app(app=AppCreate(name=self.name, app_id=self.app_id, config=self.to_dict()))
-        except Exception as e:
-            log_debug(f"Could not create Agent app: {e}")
+        with startup_timer.phase("platform registration"):
+            try:
+                log_debug(f"Creating app on Platform: {self.name}, {self.app_id}")
+                create_app(app=AppCreate(name=self.name, app_id=self.app_id, config=self.to_dict()))
+            except Exception as e:
+                log_debug(f"Could not create Agent app: {e}")
         log_debug(f"Agent app created: {self.name}, {self.app_id}")
 
     def to_dict(self) -> Dict[str, Any]:
@@ -0,0 +1,166 @@
+"""Minimal metrics registry rendering the Prometheus text exposition format."""
+
+import threading
+from bisect import bisect_left
+from typing import Callable, Dict, List, Sequence, Tuple
+
+# Buckets of latency histograms, in seconds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape_label_value(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(label_names: Sequence[str], label_values: Sequence[str], extra: str = "") -> str:
+    labels = [f'{name}="{_escape_label_value(str(value))}"' for name, value in zip(label_names, label_values)]
+    if extra:
+        labels.append(extra)
+    return "{" + ",".join(labels) + "}" if labels else ""
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """Base class of the registry metrics."""
+
+    type: str = "untyped"
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.lock = threading.Lock()
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        lines.extend(self.render_samples())
+        return lines
+
+    def render_samples(self) -> List[str]:
+        raise NotImplementedError("render_samples must be implemented")
+
+
+class Counter(Metric):
+    """Monotonically increasing value, per combination of label values."""
+
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        super().__init__(name, documentation, label_names)
+        self.values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *label_values: str, amount: float = 1) -> None:
+        with self.lock:
+            self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def render_samples(self) -> List[str]:
+        with self.lock:
+            values = list(self.values.items())
+        return [
+            f"{self.name}_total{_format_labels(self.label_names, labels)} {_format_value(value)}"
+            for labels, value in values
+        ]
+
+
+class Histogram(Metric):
+    """Distribution of observed values over fixed buckets, per combination of label values."""
+
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        label_names: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [count per bucket..., count above the last bucket, sum]
+        self.states: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, *label_values: str) -> None:
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            state = self.states.get(label_values)
+            if state is None:
+                state = self.states[label_values] = [0] * (len(self.buckets) + 2)
+            state[index] += 1
+            state[-1] += value
+
+    def render_samples(self) -> List[str]:
+        with self.lock:
+            states = [(labels, list(state)) for labels, state in self.states.items()]
+
+        lines = []
+        for labels, state in states:
+            cumulative = 0
+            for bound, count in zip(self.buckets, state):
+                cumulative += count
+                bucket_labels = _format_labels(self.label_names, labels, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            cumulative += state[-2]
+            bucket_labels = _format_labels(self.label_names, labels, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, labels)} {_format_value(state[-1])}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, labels)} {cumulative}")
+        return lines
+
+
+class Gauge(Metric):
+    """Value read from a callback whenever the metrics are rendered."""
+
+    type = "gauge"
+
+    def __init__(self, name: str, documentation: str, read: Callable[[], float]):
+        super().__init__(name, documentation)
+        self.read = read
+
+    def render_samples(self) -> List[str]:
+        return [f"{self.name} {_format_value(self.read())}"]
+
+
+class MetricsRegistry:
+    """Holds the metrics of the process, rendering them in the Prometheus text format."""
+
+    def __init__(self):
+        self.metrics: Dict[str, Metric] = {}
+        self.lock = threading.Lock()
+
+    def register(self, metric: Metric) -> Metric:
+        """Register the metric, replacing any previous metric of the same name."""
+        with self.lock:
+            self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, label_names: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, label_names))  # type: ignore
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        label_names: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> Histogram:
+        return self.register(Histogram(name, documentation, label_names, buckets))  # type: ignore
+
+    def gauge(self, name: str, documentation: str, read: Callable[[], float]) -> Gauge:
+        return self.register(Gauge(name, documentation, read))  # type: ignore
+
+    def render(self) -> str:
+        with self.lock:
+            metrics = list(self.metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# Registry of the process, exposed at /metrics by the API apps
+registry = MetricsRegistry()
@@ -0,0 +1,41 @@
+"""Timing of the startup phases of the app, reported once it's ready to serve."""
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, List, Tuple
+
+
+class StartupTimer:
+    """Records how long each startup phase took, from the moment the timer was created."""
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.phases: List[Tuple[str, float]] = []
+        self.lock = threading.Lock()
+
+    def record(self, name: str, seconds: float) -> None:
+        with self.lock:
+            self.phases.append((name, seconds))
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started_at)
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started_at
+
+    def report(self) -> str:
+        with self.lock:
+            phases = list(self.phases)
+        lines = [f"Startup phases, ready after {self.elapsed():.3f}s:"]
+        lines.extend(f"  {name:<32} {seconds:8.3f}s" for name, seconds in phases)
+        return "\n".join(lines)
+
+
+# Timer of the process, created when the app's modules are first imported
+startup_timer = StartupTimer()
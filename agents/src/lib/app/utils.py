@@ -1,47 +1,334 @@
-from typing import Optional
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+import threading
+import weakref
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import IO, Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
 from uuid import uuid4
 
 from fastapi import HTTPException, UploadFile
+from starlette.datastructures import FormData
+from starlette.requests import Request
+from starlette.types import Message
 
 from agno.media import Audio, Image, Video
 from agno.media import File as FileMedia
-from agno.utils.log import logger
+from agno.utils.log import log_debug, logger
 
+MiB = 1024 * 1024
 
-def process_image(file: UploadFile) -> Image:
-    content = file.file.read()
-    if not content:
-        raise HTTPException(status_code=400, detail="Empty file")
+# Prefix of the subdirectories storing the uploads of each process
+PROCESS_DIRECTORY_PREFIX = "process-"
+
+
+@dataclass
+class UploadLimits:
+    """Most bytes accepted for an upload of each kind, enforced while it's read."""
+
+    image: int = 20 * MiB
+    audio: int = 200 * MiB
+    video: int = 2048 * MiB
+    document: int = 50 * MiB
+    # Most bytes of a whole multipart request, its uploads and form fields, checked before the form is parsed
+    request: int = 2049 * MiB
+
+    def get(self, kind: str) -> int:
+        return getattr(self, kind)
+
+
+@dataclass
+class UploadedMedia:
+    """The media of the uploads of a run, passed to the Agent or Team run."""
+
+    images: List[Image] = field(default_factory=list)
+    audio: List[Audio] = field(default_factory=list)
+    videos: List[Video] = field(default_factory=list)
+    files: List[FileMedia] = field(default_factory=list)
+    # Stored uploads the media are read from, kept from being pruned until released, at the latest once garbage
+    # collected
+    paths: List[Path] = field(default_factory=list)
+    release: Callable[[], Any] = field(default=lambda: None, repr=False, compare=False)
+
+    def to_run_kwargs(self) -> Dict[str, Any]:
+        return {
+            "images": self.images or None,
+            "audio": self.audio or None,
+            "videos": self.videos or None,
+            "files": self.files or None,
+        }
+
+
+def get_upload_kind(file: UploadFile) -> str:
+    """Kind of the upload, from its content type: image, audio, video or document."""
+    content_type = (file.content_type or "").split("/")[0]
+    return content_type if content_type in ("image", "audio", "video") else "document"
+
+
+class MediaIntake:
+    """Reads uploads in chunks, without ever holding more than spool_threshold bytes of one in memory.
+
+    Uploads up to spool_threshold bytes are handed to the Agno media as content. Larger ones are spooled to directory
+    and handed over by path, under the SHA-256 of their content, so the same upload is only stored once. Once the
+    stored uploads take more than max_stored_bytes, the least recently uploaded ones are removed, except the ones held
+    by the media of process_uploads until they are released. The files of the media of the process_* functions aren't
+    held.
+
+    The holders are only known to the process, so worker processes sharing a directory would prune each other's held
+    uploads. With per_process, each process stores its uploads in a subdirectory of its own instead, max_stored_bytes
+    applying to each of them, and the subdirectories of the processes that are gone are removed.
+    """
+
+    def __init__(
+        self,
+        directory: Optional[Union[str, Path]] = None,
+        limits: Optional[UploadLimits] = None,
+        spool_threshold: int = 1 * MiB,
+        chunk_size: int = 1 * MiB,
+        max_stored_bytes: int = 10 * 1024 * MiB,
+        per_process: bool = False,
+    ):
+        self.directory = Path(directory) if directory is not None else Path(tempfile.gettempdir()) / "agno_uploads"
+        if per_process:
+            _remove_stale_process_directories(self.directory)
+            self.directory = self.directory / f"{PROCESS_DIRECTORY_PREFIX}{os.getpid()}"
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.limits = limits or UploadLimits()
+        self.spool_threshold = spool_threshold
+        self.chunk_size = chunk_size
+        self.max_stored_bytes = max_stored_bytes
+        self.lock = threading.Lock()
+        # Path of a stored upload -> number of media holding it
+        self.holders: Dict[str, int] = {}
+
+    async def read_form(self, request: Request) -> FormData:
+        """Parse the multipart form of an upload request, rejecting it with 413 once it's over limits.request.
+
+        The Content-Length of the request is checked before its body is read, and the bytes received while it's read,
+        so requests without a Content-Length, e.g. chunked ones, stop being spooled as soon as they're over the limit.
+        Close the returned form once its uploads are read.
+        """
+        limit = self.limits.request
+        detail = f"The request is larger than {limit} bytes"
+        content_length = request.headers.get("content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > limit:
+            raise HTTPException(status_code=413, detail=detail)
+
+        received = 0
+        over_limit = False
+
+        async def receive_within_limit() -> Message:
+            nonlocal received, over_limit
+            if not over_limit:
+                message = await request.receive()
+                if message["type"] != "http.request":
+                    return message
+                received += len(message.get("body", b""))
+                if received <= limit:
+                    return message
+                over_limit = True
+            # End the body there, the parser then closing the files it spooled
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        form: Optional[FormData] = None
+        try:
+            form = await Request(request.scope, receive_within_limit).form()
+        except HTTPException:
+            # The form cut short may not parse
+            if not over_limit:
+                raise
+        if over_limit:
+            if form is not None:
+                await form.close()
+            raise HTTPException(status_code=413, detail=detail)
+        return form  # type: ignore
+
+    def read(self, file: UploadFile, kind: str, hold: bool = False) -> Tuple[Optional[bytes], Optional[Path]]:
+        """Read the upload, returning its content if it's small enough to stay in memory, else the path storing it.
+
+        With hold, the stored upload is kept from being pruned until released.
+        """
+        limit = self.limits.get(kind)
+        if file.size is not None and file.size > limit:
+            raise HTTPException(status_code=413, detail=f"The {kind} is larger than {limit} bytes")
+
+        digest = hashlib.sha256()
+        buffer = bytearray()
+        spool: Optional[IO[bytes]] = None
+        size = 0
+        try:
+            while chunk := file.file.read(self.chunk_size):
+                size += len(chunk)
+                if size > limit:
+                    raise HTTPException(status_code=413, detail=f"The {kind} is larger than {limit} bytes")
+                digest.update(chunk)
+                if spool is not None:
+                    spool.write(chunk)
+                    continue
+                buffer += chunk
+                if len(buffer) > self.spool_threshold:
+                    spool = tempfile.NamedTemporaryFile(dir=self.directory, prefix=".upload-", delete=False)
+                    spool.write(buffer)
+                    buffer = bytearray()
+        except BaseException:
+            if spool is not None:
+                spool.close()
+                os.unlink(spool.name)
+            raise
+
+        if size == 0:
+            raise HTTPException(status_code=400, detail="Empty file")
+        if spool is None:
+            return bytes(buffer), None
+
+        spool.close()
+        return None, self._store(Path(spool.name), digest.hexdigest(), file.filename, hold)
+
+    def _store(self, spooled_path: Path, digest: str, filename: Optional[str], hold: bool) -> Path:
+        # Gemini names the uploaded files after the file stem, at most 40 lowercase alphanumeric characters
+        suffix = Path(filename).suffix.lower() if filename else ""
+        if not re.fullmatch(r"\.[a-z0-9]{1,10}", suffix):
+            suffix = ""
+        path = self.directory / f"{digest[:32]}{suffix}"
+
+        with self.lock:
+            if hold:
+                self.holders[str(path)] = self.holders.get(str(path), 0) + 1
+            if path.exists():
+                log_debug(f"Upload already stored at {path}")
+                spooled_path.unlink()
+                # Keeps it from being pruned, as the least recently uploaded
+                os.utime(path)
+                return path
+            spooled_path.replace(path)
+            self._prune(keep=path)
+        return path
+
+    def _release(self, paths: Iterable[Path]) -> None:
+        with self.lock:
+            for path in paths:
+                holders = self.holders.pop(str(path), 0) - 1
+                if holders > 0:
+                    self.holders[str(path)] = holders
+
+    def _prune(self, keep: Path) -> None:
+        entries = [entry for entry in os.scandir(self.directory) if entry.is_file() and not entry.name.startswith(".")]
+        stored_bytes = sum(entry.stat().st_size for entry in entries)
+        for entry in sorted(entries, key=lambda entry: entry.stat().st_mtime):
+            if stored_bytes <= self.max_stored_bytes:
+                break
+            # Still read by a run
+            if entry.path == str(keep) or entry.path in self.holders:
+                continue
+            stored_bytes -= entry.stat().st_size
+            os.unlink(entry.path)
+
+    def process_uploads(self, files: List[UploadFile]) -> UploadedMedia:
+        """Read the uploads of a run into the media passed to the Agent or Team.
+
+        Unlike process_document, an empty or oversized document fails the whole upload, like the other kinds. The
+        stored uploads are held until media.release() is called, once the run is done with them.
+        """
+        media = UploadedMedia()
+        try:
+            for file in files:
+                kind = get_upload_kind(file)
+                content, path = self.read(file, kind, hold=True)
+                if path is not None:
+                    media.paths.append(path)
+                if kind == "image":
+                    media.images.append(_to_image(content, path))
+                elif kind == "audio":
+                    media.audio.append(_to_audio(file, content, path))
+                elif kind == "video":
+                    media.videos.append(_to_video(file, content, path))
+                else:
+                    media.files.append(_to_document(file, content, path))
+        except BaseException:
+            self._release(media.paths)
+            raise
+        media.release = weakref.finalize(media, self._release, list(media.paths))
+        return media
+
+
+def _remove_stale_process_directories(directory: Path) -> None:
+    """Remove the upload subdirectories of the processes that are gone."""
+    if os.name != "posix" or not directory.is_dir():
+        return
+    for entry in os.scandir(directory):
+        pid = entry.name[len(PROCESS_DIRECTORY_PREFIX) :]
+        if not entry.is_dir() or not entry.name.startswith(PROCESS_DIRECTORY_PREFIX) or not pid.isdigit():
+            continue
+        try:
+            os.kill(int(pid), 0)
+        except ProcessLookupError:
+            log_debug(f"Removing the uploads of process {pid}")
+            shutil.rmtree(entry.path, ignore_errors=True)
+        except PermissionError:
+            # Running under another user
+            pass
+
+
+# Used by the process_* functions when not given an intake
+default_media_intake: Optional[MediaIntake] = None
+
+
+def get_default_media_intake() -> MediaIntake:
+    global default_media_intake
+    if default_media_intake is None:
+        default_media_intake = MediaIntake()
+    return default_media_intake
+
+
+def _to_image(content: Optional[bytes], path: Optional[Path]) -> Image:
+    if path is not None:
+        return Image(filepath=path)
     return Image(content=content)
 
 
-def process_audio(file: UploadFile) -> Audio:
-    content = file.file.read()
-    if not content:
-        raise HTTPException(status_code=400, detail="Empty file")
+def _to_audio(file: UploadFile, content: Optional[bytes], path: Optional[Path]) -> Audio:
     format = None
     if file.filename and "." in file.filename:
         format = file.filename.split(".")[-1].lower()
     elif file.content_type:
         format = file.content_type.split("/")[-1]
 
+    if path is not None:
+        return Audio(filepath=path, format=format)
     return Audio(content=content, format=format)
 
 
-def process_video(file: UploadFile) -> Video:
-    content = file.file.read()
-    if not content:
-        raise HTTPException(status_code=400, detail="Empty file")
+def _to_video(file: UploadFile, content: Optional[bytes], path: Optional[Path]) -> Video:
+    if path is not None:
+        return Video(filepath=path, format=file.content_type)
     return Video(content=content, format=file.content_type)
 
 
-def process_document(file: UploadFile) -> Optional[FileMedia]:
-    try:
-        content = file.file.read()
-        if not content:
-            raise HTTPException(status_code=400, detail="Empty file")
+def _to_document(file: UploadFile, content: Optional[bytes], path: Optional[Path]) -> FileMedia:
+    if path is not None:
+        return FileMedia(filepath=path, mime_type=file.content_type)
+    return FileMedia(content=content, mime_type=file.content_type)
+
+
+def process_image(file: UploadFile, intake: Optional[MediaIntake] = None) -> Image:
+    return _to_image(*(intake or get_default_media_intake()).read(file, "image"))
 
-        return FileMedia(content=content, mime_type=file.content_type)
+
+def process_audio(file: UploadFile, intake: Optional[MediaIntake] = None) -> Audio:
+    return _to_audio(file, *(intake or get_default_media_intake()).read(file, "audio"))
+
+
+def process_video(file: UploadFile, intake: Optional[MediaIntake] = None) -> Video:
+    return _to_video(file, *(intake or get_default_media_intake()).read(file, "video"))
+
+
+def process_document(file: UploadFile, intake: Optional[MediaIntake] = None) -> Optional[FileMedia]:
+    """Read an uploaded document, None if it's empty or can't be read, e.g. over its size limit."""
+    try:
+        return _to_document(file, *(intake or get_default_media_intake()).read(file, "document"))
     except Exception as e:
         logger.error(f"Error processing document {file.filename}: {e}")
         return None
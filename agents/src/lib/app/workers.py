@@ -0,0 +1,548 @@
+"""Multi-process serving of an API app, with requests of a thread routed to the same worker."""
+
+import asyncio
+import itertools
+import json
+import multiprocessing
+import os
+import shutil
+import signal
+import sys
+import tempfile
+import time
+import zlib
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple, Union
+
+import httpx
+import uvicorn
+from python_multipart.multipart import MultipartParser, parse_options_header
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.types import Receive, Scope, Send
+from starlette.websockets import WebSocket
+from websockets.asyncio.client import unix_connect
+from websockets.exceptions import ConnectionClosed, InvalidHandshake
+
+from agno.utils.log import log_debug, log_info, log_warning
+from lib.app.metrics import PROMETHEUS_CONTENT_TYPE
+
+# Headers describing a single connection, never forwarded between the client and the workers
+HOP_BY_HOP_HEADERS = {
+    "connection",
+    "keep-alive",
+    "proxy-authenticate",
+    "proxy-authorization",
+    "te",
+    "trailers",
+    "transfer-encoding",
+    "upgrade",
+}
+
+
+def get_run_keys(body: bytes) -> Tuple[Optional[str], Optional[str]]:
+    """Extract the thread_id and run_id of an AG-UI run from its JSON request body, or WebSocket message."""
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        return None, None
+    if not isinstance(payload, dict):
+        return None, None
+    thread_id = payload.get("threadId", payload.get("thread_id"))
+    run_id = payload.get("runId", payload.get("run_id"))
+    return thread_id if isinstance(thread_id, str) else None, run_id if isinstance(run_id, str) else None
+
+
+def get_thread_id(body: bytes) -> Optional[str]:
+    """Extract the thread_id of an AG-UI run from its JSON request body."""
+    return get_run_keys(body)[0]
+
+
+async def peek_multipart_field(
+    stream: AsyncIterator[bytes], content_type: str, field: str, max_bytes: int
+) -> Tuple[Optional[bytes], List[bytes]]:
+    """Read a multipart/form-data body until a field is complete, without reading the rest of the body.
+
+    Args:
+        stream (AsyncIterator[bytes]): Chunks of the body, left open to stream the rest through.
+        content_type (str): Content-Type header of the request, giving the boundary of the parts.
+        field (str): Name of the field to read.
+        max_bytes (int): Bytes of the body read at most looking for the field.
+
+    Returns:
+        The value of the field, None if it isn't within the first max_bytes, and the chunks read.
+    """
+    _, options = parse_options_header(content_type)
+    boundary = options.get(b"boundary")
+    chunks: List[bytes] = []
+    if not boundary:
+        return None, chunks
+
+    part: Dict[str, Any] = {"header_field": b"", "header_value": b"", "name": None, "data": []}
+    found: List[bytes] = []
+
+    def on_part_begin() -> None:
+        part.update(name=None, data=[])
+
+    def on_header_field(data: bytes, start: int, end: int) -> None:
+        part["header_field"] += data[start:end]
+
+    def on_header_value(data: bytes, start: int, end: int) -> None:
+        part["header_value"] += data[start:end]
+
+    def on_header_end() -> None:
+        if part["header_field"].lower() == b"content-disposition":
+            part["name"] = parse_options_header(part["header_value"])[1].get(b"name")
+        part.update(header_field=b"", header_value=b"")
+
+    def on_part_data(data: bytes, start: int, end: int) -> None:
+        if part["name"] == field.encode():
+            part["data"].append(data[start:end])
+
+    def on_part_end() -> None:
+        if part["name"] == field.encode() and not found:
+            found.append(b"".join(part["data"]))
+
+    parser = MultipartParser(
+        boundary,
+        {
+            "on_part_begin": on_part_begin,
+            "on_header_field": on_header_field,
+            "on_header_value": on_header_value,
+            "on_header_end": on_header_end,
+            "on_part_data": on_part_data,
+            "on_part_end": on_part_end,
+        },
+    )
+    size = 0
+    async for chunk in stream:
+        chunks.append(chunk)
+        size += len(chunk)
+        try:
+            parser.write(chunk)
+        except Exception as e:
+            log_debug(f"Could not parse the multipart body: {e}")
+            break
+        if found or size >= max_bytes:
+            break
+    return (found[0] if found else None), chunks
+
+
+def _add_label(sample: str, label: str) -> str:
+    """Add a label to a sample line of the Prometheus text format."""
+    name_end = len(sample.split(" ", 1)[0].split("{", 1)[0])
+    if sample[name_end] == "{":
+        return f"{sample[: name_end + 1]}{label},{sample[name_end + 1 :]}"
+    return f"{sample[:name_end]}{{{label}}}{sample[name_end:]}"
+
+
+def merge_metrics(expositions: Sequence[Optional[str]]) -> str:
+    """Merge the Prometheus text expositions of the workers, labelling every sample with the index of its worker.
+
+    The samples of each metric stay together under a single HELP and TYPE, as the format requires.
+    """
+    # metric name -> (HELP and TYPE lines, samples of every worker)
+    families: Dict[str, Tuple[List[str], List[str]]] = {}
+    for worker, exposition in enumerate(expositions):
+        if exposition is None:
+            continue
+        family: Optional[Tuple[List[str], List[str]]] = None
+        for line in exposition.splitlines():
+            if not line:
+                continue
+            if line.startswith("#"):
+                parts = line.split(" ", 3)
+                if len(parts) >= 3 and parts[1] in ("HELP", "TYPE"):
+                    family = families.setdefault(parts[2], ([], []))
+                    if line not in family[0]:
+                        family[0].append(line)
+                continue
+            if family is None:
+                family = families.setdefault("", ([], []))
+            family[1].append(_add_label(line, f'worker="{worker}"'))
+    lines = [line for headers, samples in families.values() for line in headers + samples]
+    return "\n".join(lines) + "\n"
+
+
+class AffinityDispatcher:
+    """ASGI app forwarding every request to one of the worker processes.
+
+    Requests to the affinity paths, and WebSockets, are routed by a stable hash of their thread_id, taken from the
+    JSON body or the first message. All the runs of a thread hit the same worker and its in-memory caches, e.g. the
+    session cache of its storage. The thread_id of a multipart/form-data run, e.g. one with uploads, is given by a
+    thread_id query parameter, or else read from its run_input field, which must then come before the files. Only the
+    JSON bodies of the affinity paths are read before forwarding, the others are streamed through.
+
+    The state of the runs lives in the worker running them. The dispatcher remembers the worker of the latest runs,
+    so GET requests under the owned paths, e.g. /agui/runs/{run_id}, reach it first, the other workers being tried in
+    turn while they answer 404. The status, metrics and ready paths are answered from every worker: /status lists
+    their statuses, /metrics merges their samples under a worker label, and /ready is ready once they all are. Other
+    requests are spread round-robin.
+    """
+
+    def __init__(
+        self,
+        worker_sockets: Sequence[str],
+        affinity_paths: Sequence[str] = ("/agui", "/agui/multipart"),
+        owned_paths: Sequence[str] = ("/agui/runs/", "/agui/tool-results/"),
+        status_path: str = "/status",
+        metrics_path: str = "/metrics",
+        ready_path: str = "/ready",
+        max_runs: int = 10_000,
+        max_form_prefix_bytes: int = 1024 * 1024,
+    ):
+        """
+        Args:
+            worker_sockets (Sequence[str]): Unix sockets the workers listen on.
+            affinity_paths (Sequence[str]): Paths of the requests routed by the thread_id of their run input, the
+                run_paths of the AGUIApp.
+            owned_paths (Sequence[str]): Path prefixes of the GET requests served by the worker owning the run or
+                tool call, the run_id following the /agui/runs/ prefix.
+            status_path (str): Path of the status of every worker.
+            metrics_path (str): Path of the Prometheus metrics of every worker.
+            ready_path (str): Path of the readiness of every worker.
+            max_runs (int): Number of runs whose worker is remembered.
+            max_form_prefix_bytes (int): Bytes of a multipart/form-data body read at most looking for its run_input
+                field. The request is rejected if the field isn't within them.
+        """
+        self.worker_sockets = list(worker_sockets)
+        self.affinity_paths = set(affinity_paths)
+        self.owned_paths = tuple(owned_paths)
+        self.status_path = status_path
+        self.metrics_path = metrics_path
+        self.ready_path = ready_path
+        self.max_runs = max_runs
+        self.max_form_prefix_bytes = max_form_prefix_bytes
+        self.clients: List[httpx.AsyncClient] = []
+        self.round_robin = itertools.count()
+        # run_id -> worker running it, least recently started first
+        self.run_workers: OrderedDict[str, int] = OrderedDict()
+
+    def pick_worker(self, path: str, body: bytes) -> int:
+        if path in self.affinity_paths:
+            thread_id = get_thread_id(body)
+            if thread_id is not None:
+                return self.get_thread_worker(thread_id)
+        return self._next_worker()
+
+    def get_thread_worker(self, thread_id: str) -> int:
+        return zlib.crc32(thread_id.encode("utf-8")) % len(self.worker_sockets)
+
+    def get_owner_workers(self, path: str, thread_id: Optional[str] = None) -> List[int]:
+        """Return the workers to try for a GET request under the owned paths, the known owner first.
+
+        The owner of a run is the worker of its thread, given by a thread_id query parameter, or else the worker
+        remembered for its run_id.
+        """
+        workers = list(range(len(self.worker_sockets)))
+        run_id = path[len("/agui/runs/") :].split("/", 1)[0] if path.startswith("/agui/runs/") else None
+        if run_id is not None and thread_id is not None:
+            owner: Optional[int] = self.get_thread_worker(thread_id)
+        else:
+            owner = self.run_workers.get(run_id) if run_id is not None else None
+        if owner is None:
+            return workers
+        return [owner] + [worker for worker in workers if worker != owner]
+
+    def _next_worker(self) -> int:
+        return next(self.round_robin) % len(self.worker_sockets)
+
+    def _remember_run(self, run_id: str, worker: int) -> None:
+        self.run_workers.pop(run_id, None)
+        self.run_workers[run_id] = worker
+        while len(self.run_workers) > self.max_runs:
+            self.run_workers.popitem(last=False)
+
+    def _get_clients(self) -> List[httpx.AsyncClient]:
+        if not self.clients:
+            self.clients = [
+                httpx.AsyncClient(
+                    transport=httpx.AsyncHTTPTransport(uds=worker_socket),
+                    base_url="http://worker",
+                    timeout=httpx.Timeout(None, connect=5.0),
+                )
+                for worker_socket in self.worker_sockets
+            ]
+        return self.clients
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] == "websocket":
+            await self._proxy_websocket(WebSocket(scope, receive, send))
+            return
+        if scope["type"] != "http":
+            raise RuntimeError(f"Unsupported scope type: {scope['type']}")
+
+        request = Request(scope, receive)
+        path = request.url.path
+        content: Union[bytes, AsyncIterator[bytes], None] = None
+        if request.method == "GET" and path in (self.status_path, self.metrics_path, self.ready_path):
+            response = await self._broadcast(request)
+            await response(scope, receive, send)
+            return
+        if request.method == "GET" and path.startswith(self.owned_paths):
+            workers = self.get_owner_workers(path, request.query_params.get("thread_id"))
+        elif path in self.affinity_paths:
+            if request.headers.get("content-type", "").startswith("multipart/form-data"):
+                content, thread_id, run_id = await self._read_form_run_keys(request)
+                if content is None:
+                    response = JSONResponse(
+                        status_code=400,
+                        content={"detail": "Pass a thread_id query parameter, or the run_input field before the files"},
+                    )
+                    await response(scope, receive, send)
+                    return
+            else:
+                content = await request.body()
+                thread_id, run_id = get_run_keys(content)
+            worker = self.get_thread_worker(thread_id) if thread_id is not None else self._next_worker()
+            if run_id is not None:
+                self._remember_run(run_id, worker)
+            workers = [worker]
+        else:
+            # Forwarded as it arrives, the content-length header is kept
+            content = request.stream()
+            workers = [self._next_worker()]
+
+        headers = [
+            (name, value)
+            for name, value in request.headers.raw
+            if name.decode("latin-1").lower() not in HOP_BY_HOP_HEADERS | {"host"}
+        ]
+        upstream_response: Optional[httpx.Response] = None
+        not_found = False
+        for attempt, worker in enumerate(workers):
+            client = self._get_clients()[worker]
+            upstream_request = client.build_request(
+                request.method, path, params=request.url.query, headers=headers, content=content
+            )
+            try:
+                upstream_response = await client.send(upstream_request, stream=True)
+            except httpx.TransportError as e:
+                log_warning(f"Worker {worker} is unavailable: {e}")
+                continue
+            # Another worker may own the run or tool call
+            if upstream_response.status_code == 404 and attempt < len(workers) - 1:
+                await upstream_response.aclose()
+                upstream_response = None
+                not_found = True
+                continue
+            break
+
+        if upstream_response is None:
+            # A worker not owning the run answered, the others being unavailable
+            if not_found:
+                response = JSONResponse(status_code=404, content={"detail": "Not Found"})
+            else:
+                response = JSONResponse(status_code=503, content={"detail": "Worker unavailable"})
+            await response(scope, receive, send)
+            return
+
+        async def stream_upstream_response() -> AsyncIterator[bytes]:
+            try:
+                async for chunk in upstream_response.aiter_raw():  # type: ignore
+                    yield chunk
+            finally:
+                await upstream_response.aclose()  # type: ignore
+
+        # The dispatcher's own server sets the date and server headers
+        response = StreamingResponse(stream_upstream_response(), status_code=upstream_response.status_code)
+        response.raw_headers = [
+            (name, value)
+            for name, value in upstream_response.headers.raw
+            if name.decode("latin-1").lower() not in HOP_BY_HOP_HEADERS | {"date", "server"}
+        ]
+        await response(scope, receive, send)
+
+    async def _read_form_run_keys(
+        self, request: Request
+    ) -> Tuple[Optional[AsyncIterator[bytes]], Optional[str], Optional[str]]:
+        """Return the body of a multipart run to stream through, with its thread_id and run_id.
+
+        The thread_id query parameter is used as is, otherwise the body is read up to the end of its run_input field.
+        The body is None if neither gives a thread_id.
+        """
+        stream = request.stream()
+        thread_id = request.query_params.get("thread_id")
+        if thread_id is not None:
+            return stream, thread_id, None
+
+        run_input, chunks = await peek_multipart_field(
+            stream, request.headers["content-type"], "run_input", self.max_form_prefix_bytes
+        )
+        thread_id, run_id = get_run_keys(run_input) if run_input is not None else (None, None)
+        if thread_id is None:
+            return None, None, None
+
+        async def content() -> AsyncIterator[bytes]:
+            for chunk in chunks:
+                yield chunk
+            async for chunk in stream:
+                yield chunk
+
+        return content(), thread_id, run_id
+
+    async def _broadcast(self, request: Request) -> Response:
+        """Answer a status, metrics or ready request from the responses of every worker."""
+        path = request.url.path
+
+        async def fetch(client: httpx.AsyncClient) -> Optional[httpx.Response]:
+            try:
+                return await client.get(path, params=request.url.query)
+            except httpx.TransportError as e:
+                log_warning(f"Worker is unavailable: {e}")
+                return None
+
+        responses = await asyncio.gather(*(fetch(client) for client in self._get_clients()))
+        if path == self.metrics_path:
+            expositions = [response.text if response is not None else None for response in responses]
+            return Response(content=merge_metrics(expositions), media_type=PROMETHEUS_CONTENT_TYPE)
+
+        statuses: List[Any] = [
+            response.json() if response is not None and response.status_code < 500 else {"status": "unavailable"}
+            for response in responses
+        ]
+        if path == self.ready_path:
+            ready = all(response is not None and response.status_code == 200 for response in responses)
+            return JSONResponse(status_code=200 if ready else 503, content={"ready": ready, "workers": statuses})
+        available = all(isinstance(status, dict) and status.get("status") == "available" for status in statuses)
+        return JSONResponse(content={"status": "available" if available else "degraded", "workers": statuses})
+
+    async def _proxy_websocket(self, websocket: WebSocket) -> None:
+        """Relay a WebSocket to the worker of the thread named by its first message, until either side closes it."""
+        await websocket.accept()
+        first_message = await websocket.receive()
+        if first_message["type"] == "websocket.disconnect":
+            return
+        first_data = first_message.get("text") or first_message.get("bytes") or b""
+        thread_id = get_thread_id(first_data)
+        worker = self.get_thread_worker(thread_id) if thread_id is not None else self._next_worker()
+
+        path = websocket.url.path + (f"?{websocket.url.query}" if websocket.url.query else "")
+        try:
+            upstream = await unix_connect(
+                self.worker_sockets[worker], f"ws://worker{path}", compression=None, max_size=None, ping_interval=None
+            )
+        except (OSError, InvalidHandshake) as e:
+            log_warning(f"Worker {worker} is unavailable: {e}")
+            await websocket.close(code=1011, reason="Worker unavailable")
+            return
+
+        async def client_to_worker() -> None:
+            message = first_message
+            while message["type"] != "websocket.disconnect":
+                await upstream.send(message["text"] if message.get("text") is not None else message["bytes"])
+                message = await websocket.receive()
+            code = message.get("code", 1000)
+            await upstream.close(code=code if code not in (1005, 1006) else 1000, reason=message.get("reason") or "")
+
+        async def worker_to_client() -> None:
+            try:
+                async for data in upstream:
+                    if isinstance(data, str):
+                        await websocket.send_text(data)
+                    else:
+                        await websocket.send_bytes(data)
+            except ConnectionClosed:
+                pass
+            # Pass the close code on, e.g. the one of a connection replaced by a newer one to the thread
+            code = upstream.close_code
+            if code is None or code == 1006:
+                code = 1011
+            elif code == 1005:
+                code = 1000
+            await websocket.close(code=code, reason=upstream.close_reason or "")
+
+        tasks = [asyncio.create_task(client_to_worker()), asyncio.create_task(worker_to_client())]
+        try:
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in tasks:
+                task.cancel()
+            for result in await asyncio.gather(*tasks, return_exceptions=True):
+                if isinstance(result, Exception):
+                    log_debug(f"WebSocket relay ended: {result!r}")
+            await upstream.close()
+
+    async def _lifespan(self, receive: Receive, send: Send) -> None:
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                for client in self.clients:
+                    await client.aclose()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+
+def _run_worker(app: str, uds: str, kwargs: dict) -> None:
+    uvicorn.run(app, uds=uds, **kwargs)
+
+
+class WorkerPool:
+    """Worker processes each serving the app on their own unix socket."""
+
+    def __init__(self, app: str, workers: int, socket_dir: Optional[str] = None, **kwargs: Any):
+        """
+        Args:
+            app (str): Import string of the app, e.g. "main:app", as each worker imports it on its own.
+            workers (int): Number of worker processes.
+            socket_dir (Optional[str]): Directory of the worker sockets. Defaults to a new temporary directory.
+            **kwargs: Passed to uvicorn.run in each worker.
+        """
+        self.app = app
+        self.workers = workers
+        self.socket_dir = socket_dir or tempfile.mkdtemp(prefix="agui-workers-")
+        self.kwargs = kwargs
+        self.sockets = [os.path.join(self.socket_dir, f"worker-{index}.sock") for index in range(workers)]
+        self.processes: List[multiprocessing.process.BaseProcess] = []
+
+    def start(self, ready_timeout: float = 60) -> None:
+        """Start the workers, waiting until each of them listens on its socket."""
+        context = multiprocessing.get_context("spawn")
+        for worker_socket in self.sockets:
+            if os.path.exists(worker_socket):
+                os.remove(worker_socket)
+            process = context.Process(target=_run_worker, args=(self.app, worker_socket, self.kwargs), daemon=True)
+            process.start()
+            self.processes.append(process)
+
+        deadline = time.monotonic() + ready_timeout
+        while not all(os.path.exists(worker_socket) for worker_socket in self.sockets):
+            if time.monotonic() > deadline:
+                log_warning("Timed out waiting for the workers to start")
+                break
+            time.sleep(0.1)
+        log_debug(f"Started {self.workers} workers in {self.socket_dir}")
+
+    def stop(self, timeout: float = 30) -> None:
+        """Stop the workers, giving them time to run their shutdown hooks."""
+        for process in self.processes:
+            process.terminate()
+        for process in self.processes:
+            process.join(timeout=timeout)
+            if process.is_alive():
+                process.kill()
+        self.processes = []
+        shutil.rmtree(self.socket_dir, ignore_errors=True)
+
+
+def serve_with_workers(app: str, *, host: str, port: int, workers: int, **kwargs: Any) -> None:
+    """Serve the app from multiple worker processes behind a dispatcher routing runs by thread_id.
+
+    Workers running the same Agent or Team share its storage. For SQLite, use a storage in WAL mode (e.g. wrapped in
+    WriteBehindStorage) so the workers don't block each other.
+    """
+    pool = WorkerPool(app, workers=workers, **kwargs)
+    pool.start()
+    log_info(f"Dispatching {host}:{port} to {workers} workers")
+
+    # uvicorn re-raises SIGTERM once shut down, exit through the finally block to stop the workers too
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        uvicorn.run(AffinityDispatcher(pool.sockets), host=host, port=port)
+    finally:
+        pool.stop()
@@ -0,0 +1,4 @@
+from lib.storage.cache import CachedStorage, SessionCacheStats
+from lib.storage.write_behind import WriteBehindStorage
+
+__all__ = ["CachedStorage", "SessionCacheStats", "WriteBehindStorage"]
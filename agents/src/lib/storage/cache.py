@@ -0,0 +1,230 @@
+"""Storage wrapper keeping recently used Agno sessions deserialized in memory."""
+
+import json
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Literal, Optional, Tuple
+
+from agno.storage.base import Storage
+from agno.storage.session import Session
+from agno.utils.log import log_warning
+
+
+def estimate_session_size(session: Session) -> int:
+    """Approximate the memory held by a session with the size of its JSON serialization."""
+    return len(json.dumps(session.to_dict(), default=str))
+
+
+@dataclass
+class SessionCacheStats:
+    """Counters describing the effectiveness and footprint of a CachedStorage."""
+
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    entries: int = 0
+    resident_bytes: int = 0  # Approximate size of the cached sessions
+
+    @property
+    def hit_ratio(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hit_ratio,
+            "evictions": self.evictions,
+            "entries": self.entries,
+            "resident_bytes": self.resident_bytes,
+        }
+
+
+class CachedStorage(Storage):
+    """Wraps an Agno storage with a read-through LRU cache of deserialized sessions, keyed by session_id.
+
+    Sessions written through this wrapper replace their cached copy, so the cache stays coherent as long as every
+    write goes through it. The cache is bounded both by entry count and by the approximate size of the sessions.
+
+    Estimating the size of a session takes as long as serializing it, so it's done by a background thread instead of
+    the reads and upserts. Until then a session counts with the size of its previous version, or none.
+    """
+
+    def __init__(
+        self,
+        storage: Storage,
+        max_entries: int = 256,
+        max_bytes: int = 64 * 1024 * 1024,
+        size_of: Callable[[Session], int] = estimate_session_size,
+    ):
+        """
+        Args:
+            storage (Storage): The storage sessions are read from and written to.
+            max_entries (int): Maximum number of cached sessions.
+            max_bytes (int): Maximum approximate size of the cached sessions, in bytes.
+            size_of (Callable[[Session], int]): Estimates the size of a session, called in the background whenever
+                one is cached.
+        """
+        self.storage = storage
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.size_of = size_of
+        self.stats = SessionCacheStats()
+
+        # session_id -> (session, approximate size), least recently used first
+        self.sessions: OrderedDict[str, Tuple[Session, int]] = OrderedDict()
+        # session_id -> cached session whose size is still to be estimated, in caching order
+        self.unsized: OrderedDict[str, Session] = OrderedDict()
+        self.lock = threading.Lock()
+        self.condition = threading.Condition(self.lock)
+
+        self.sizer = threading.Thread(target=self._run_sizer, name="session-cache-sizer", daemon=True)
+        self.sizer.start()
+
+    @property
+    def mode(self) -> Literal["agent", "team", "workflow", "workflow_v2"]:  # type: ignore
+        return self.storage.mode  # type: ignore
+
+    @mode.setter
+    def mode(self, value: Optional[Literal["agent", "team", "workflow", "workflow_v2"]]) -> None:
+        if value != self.storage.mode:
+            self.clear()
+        self.storage.mode = value  # type: ignore
+
+    def create(self) -> None:
+        self.storage.create()
+
+    def read(self, session_id: str, user_id: Optional[str] = None) -> Optional[Session]:
+        with self.lock:
+            entry = self.sessions.get(session_id)
+            if entry is not None:
+                self.sessions.move_to_end(session_id)
+                self.stats.hits += 1
+            else:
+                self.stats.misses += 1
+
+        if entry is not None:
+            session = entry[0]
+            if user_id is not None and session.user_id != user_id:
+                return None
+            return session
+
+        session = self.storage.read(session_id=session_id, user_id=user_id)
+        if session is not None:
+            self._put(session)
+        return session
+
+    def get_all_session_ids(self, user_id: Optional[str] = None, entity_id: Optional[str] = None) -> List[str]:
+        return self.storage.get_all_session_ids(user_id=user_id, entity_id=entity_id)
+
+    def get_all_sessions(self, user_id: Optional[str] = None, entity_id: Optional[str] = None) -> List[Session]:
+        return self.storage.get_all_sessions(user_id=user_id, entity_id=entity_id)
+
+    def get_recent_sessions(
+        self,
+        user_id: Optional[str] = None,
+        entity_id: Optional[str] = None,
+        limit: Optional[int] = 2,
+    ) -> List[Session]:
+        return self.storage.get_recent_sessions(user_id=user_id, entity_id=entity_id, limit=limit)
+
+    def upsert(self, session: Session) -> Optional[Session]:
+        upserted_session = self.storage.upsert(session)
+        if upserted_session is None:
+            self.invalidate(session.session_id)
+        else:
+            self._put(upserted_session)
+        return upserted_session
+
+    def delete_session(self, session_id: Optional[str] = None):
+        if session_id is not None:
+            self.invalidate(session_id)
+        self.storage.delete_session(session_id=session_id)
+
+    def drop(self) -> None:
+        self.clear()
+        self.storage.drop()
+
+    def upgrade_schema(self) -> None:
+        self.storage.upgrade_schema()
+
+    def invalidate(self, session_id: str) -> None:
+        """Drop the cached copy of a session."""
+        with self.lock:
+            entry = self.sessions.pop(session_id, None)
+            self.unsized.pop(session_id, None)
+            if entry is not None:
+                self.stats.entries -= 1
+                self.stats.resident_bytes -= entry[1]
+
+    def clear(self) -> None:
+        """Drop every cached session."""
+        with self.lock:
+            self.sessions.clear()
+            self.unsized.clear()
+            self.stats.entries = 0
+            self.stats.resident_bytes = 0
+
+    def estimate_sizes(self) -> None:
+        """Estimate the size of the sessions cached since the last call, evicting sessions if the cache got too big."""
+        while True:
+            with self.lock:
+                if not self.unsized:
+                    return
+                session_id, session = self.unsized.popitem(last=False)
+
+            size = self.size_of(session)
+            with self.lock:
+                entry = self.sessions.get(session_id)
+                # Skip the sessions replaced or dropped in the meantime
+                if entry is None or entry[0] is not session:
+                    continue
+
+                # Sessions larger than the whole cache are never cached
+                if size > self.max_bytes:
+                    del self.sessions[session_id]
+                    self.stats.entries -= 1
+                    self.stats.resident_bytes -= entry[1]
+                    continue
+
+                self.sessions[session_id] = (session, size)
+                self.stats.resident_bytes += size - entry[1]
+                self._evict()
+
+    def _put(self, session: Session) -> None:
+        with self.lock:
+            # Count the session with the size of its previous version until its own is estimated
+            previous = self.sessions.pop(session.session_id, None)
+            size = previous[1] if previous is not None else 0
+            if previous is None:
+                self.stats.entries += 1
+
+            self.sessions[session.session_id] = (session, size)
+            self.unsized.pop(session.session_id, None)
+            self.unsized[session.session_id] = session
+            self.condition.notify()
+            self._evict()
+
+    def _evict(self) -> None:
+        """Evict the least recently used sessions until the cache fits its bounds. Must be called with the lock held."""
+        while self.stats.entries > self.max_entries or self.stats.resident_bytes > self.max_bytes:
+            evicted_id, (_, evicted_size) = self.sessions.popitem(last=False)
+            self.unsized.pop(evicted_id, None)
+            self.stats.entries -= 1
+            self.stats.resident_bytes -= evicted_size
+            self.stats.evictions += 1
+
+    def _run_sizer(self) -> None:
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.unsized)
+            try:
+                self.estimate_sizes()
+            except Exception as e:
+                log_warning(f"Could not estimate the size of a cached session: {e}")
+
+    def __deepcopy__(self, memo):
+        # The cached sessions are shared by every copy of the Agent or Team using this storage
+        return self
@@ -0,0 +1,183 @@
+"""Storage wrapper persisting Agno sessions from a background worker instead of the request path."""
+
+import copy
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Literal, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import sessionmaker
+
+from agno.storage.base import Storage
+from agno.storage.session import Session
+from agno.utils.log import log_debug, log_warning
+
+
+class WriteBehindStorage(Storage):
+    """Wraps an Agno storage, queueing session upserts in memory and persisting them from a background thread.
+
+    Multiple upserts of the same session before it is persisted are coalesced into one write. For SQLAlchemy based
+    storages every batch is written in a single transaction, and SQLite databases are switched to WAL mode. Reads
+    of sessions not persisted yet are served from the queue, so callers always read their own writes.
+
+    Call flush() to wait until every queued session is persisted, and close() on shutdown.
+    """
+
+    def __init__(self, storage: Storage, batch_interval: float = 0.05, max_batch_size: int = 100):
+        """
+        Args:
+            storage (Storage): The storage sessions are persisted to.
+            batch_interval (float): Seconds the worker waits for more upserts before writing a batch.
+            max_batch_size (int): Maximum number of sessions written in one transaction.
+        """
+        self.storage = storage
+        self.batch_interval = batch_interval
+        self.max_batch_size = max_batch_size
+
+        # session_id -> latest session, in upsert order
+        self.pending: OrderedDict[str, Session] = OrderedDict()
+        # Sessions of the batch currently being written, still visible to reads
+        self.writing: Dict[str, Session] = {}
+        self.condition = threading.Condition()
+        self.closed = False
+        self.table_created = False
+
+        self._enable_wal()
+        self.worker = threading.Thread(target=self._run, name="write-behind-storage", daemon=True)
+        self.worker.start()
+
+    @property
+    def mode(self) -> Literal["agent", "team", "workflow", "workflow_v2"]:  # type: ignore
+        return self.storage.mode  # type: ignore
+
+    @mode.setter
+    def mode(self, value: Optional[Literal["agent", "team", "workflow", "workflow_v2"]]) -> None:
+        self.storage.mode = value  # type: ignore
+
+    def _enable_wal(self) -> None:
+        db_engine = getattr(self.storage, "db_engine", None)
+        if db_engine is None or db_engine.dialect.name != "sqlite":
+            return
+        try:
+            with db_engine.connect() as connection:
+                connection.execute(text("PRAGMA journal_mode=WAL"))
+        except Exception as e:
+            log_warning(f"Could not enable WAL mode: {e}")
+
+    def create(self) -> None:
+        self.storage.create()
+
+    def read(self, session_id: str, user_id: Optional[str] = None) -> Optional[Session]:
+        with self.condition:
+            session = self.pending.get(session_id) or self.writing.get(session_id)
+        if session is not None:
+            if user_id is not None and session.user_id != user_id:
+                return None
+            return session
+        return self.storage.read(session_id=session_id, user_id=user_id)
+
+    def get_all_session_ids(self, user_id: Optional[str] = None, entity_id: Optional[str] = None) -> List[str]:
+        self.flush()
+        return self.storage.get_all_session_ids(user_id=user_id, entity_id=entity_id)
+
+    def get_all_sessions(self, user_id: Optional[str] = None, entity_id: Optional[str] = None) -> List[Session]:
+        self.flush()
+        return self.storage.get_all_sessions(user_id=user_id, entity_id=entity_id)
+
+    def get_recent_sessions(
+        self,
+        user_id: Optional[str] = None,
+        entity_id: Optional[str] = None,
+        limit: Optional[int] = 2,
+    ) -> List[Session]:
+        self.flush()
+        return self.storage.get_recent_sessions(user_id=user_id, entity_id=entity_id, limit=limit)
+
+    def upsert(self, session: Session) -> Optional[Session]:
+        """Queue the session to be persisted, returning it right away."""
+        with self.condition:
+            if self.closed:
+                return self.storage.upsert(session)
+            self.pending.pop(session.session_id, None)
+            self.pending[session.session_id] = session
+            self.condition.notify_all()
+        return session
+
+    def delete_session(self, session_id: Optional[str] = None):
+        with self.condition:
+            if session_id is not None:
+                self.pending.pop(session_id, None)
+        self.flush()
+        self.storage.delete_session(session_id=session_id)
+
+    def drop(self) -> None:
+        with self.condition:
+            self.pending.clear()
+        self.flush()
+        self.storage.drop()
+
+    def upgrade_schema(self) -> None:
+        self.storage.upgrade_schema()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until every queued session is persisted. Returns False if the timeout elapsed first."""
+        with self.condition:
+            self.condition.notify_all()
+            return self.condition.wait_for(lambda: not self.pending and not self.writing, timeout=timeout)
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """Persist the queued sessions and stop the worker. Later upserts are written synchronously."""
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        self.worker.join(timeout=timeout)
+
+    def _run(self) -> None:
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.pending or self.closed)
+                if not self.pending and self.closed:
+                    return
+
+                # Give concurrent upserts a chance to join the batch
+                if not self.closed and len(self.pending) < self.max_batch_size:
+                    self.condition.wait(timeout=self.batch_interval)
+
+                while self.pending and len(self.writing) < self.max_batch_size:
+                    session_id, session = self.pending.popitem(last=False)
+                    self.writing[session_id] = session
+                batch = list(self.writing.values())
+
+            try:
+                self._write_batch(batch)
+            except Exception as e:
+                log_warning(f"Could not persist {len(batch)} sessions: {e}")
+            finally:
+                with self.condition:
+                    self.writing.clear()
+                    self.condition.notify_all()
+
+    def _write_batch(self, batch: List[Session]) -> None:
+        log_debug(f"Persisting {len(batch)} sessions")
+        db_engine = getattr(self.storage, "db_engine", None)
+        if db_engine is None or not hasattr(self.storage, "SqlSession"):
+            for session in batch:
+                self.storage.upsert(session)
+            return
+
+        # The storage creates its table lazily on a failed upsert, which can't happen inside the batch transaction
+        if not self.table_created:
+            if not self.storage.table_exists():  # type: ignore
+                self.storage.create()
+            self.table_created = True
+
+        # Run every upsert of the batch in one transaction, each in a savepoint so a failure only skips its session
+        with db_engine.begin() as connection:
+            batch_storage = copy.copy(self.storage)
+            batch_storage.SqlSession = sessionmaker(bind=connection, join_transaction_mode="create_savepoint")  # type: ignore
+            for session in batch:
+                batch_storage.upsert(session)
+
+    def __deepcopy__(self, memo):
+        # The queue and worker are shared by every copy of the Agent or Team using this storage
+        return self
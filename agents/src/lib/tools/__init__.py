@@ -0,0 +1,3 @@
+from lib.tools.cache import ToolCacheStats, ToolResultCache
+
+__all__ = ["ToolCacheStats", "ToolResultCache"]
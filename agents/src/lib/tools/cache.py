@@ -0,0 +1,225 @@
+"""In-memory caching of tool results, shared by every Agent and Team using the wrapped tools."""
+
+import asyncio
+import json
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from functools import wraps
+from inspect import isasyncgen, iscoroutinefunction, isgenerator, signature
+from typing import Any, Callable, Dict, Optional, Tuple, TypeVar, Union
+
+from agno.tools.toolkit import Toolkit
+from agno.utils.log import log_debug
+
+ToolType = TypeVar("ToolType", bound=Union[Toolkit, Callable])
+
+# Arguments injected by Agno, not part of the tool call itself
+INJECTED_ARGUMENTS = {"agent", "team", "fc", "self"}
+
+
+@dataclass
+class ToolCacheStats:
+    """Counters describing the effectiveness of a ToolResultCache."""
+
+    hits: int = 0
+    misses: int = 0
+    coalesced: int = 0  # Calls that waited on an identical in-flight call instead of calling the tool
+    evictions: int = 0  # Entries dropped to respect max_entries
+    expirations: int = 0  # Entries dropped because their TTL elapsed
+
+    def to_dict(self) -> Dict[str, int]:
+        return asdict(self)
+
+
+class _InFlightCall:
+    """An ongoing sync tool call that identical concurrent calls wait on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class ToolResultCache:
+    """TTL and LRU bounded cache of tool results, keyed on the tool name and the normalized call arguments.
+
+    Concurrent identical calls are collapsed into a single upstream call (single-flight). Failed calls, and tools
+    returning generators, are never cached.
+    """
+
+    def __init__(
+        self,
+        default_ttl: float = 60,
+        ttls: Optional[Dict[str, float]] = None,
+        max_entries: int = 1024,
+        normalize_strings: bool = True,
+    ):
+        """
+        Args:
+            default_ttl (float): Seconds a result is kept for tools without an entry in ttls.
+            ttls (Optional[Dict[str, float]]): Per-tool TTLs in seconds, keyed by tool name. A TTL of 0 disables caching.
+            max_entries (int): Maximum number of cached results, least recently used ones are evicted first.
+            normalize_strings (bool): Strip and case-fold string arguments when building the cache key.
+        """
+        self.default_ttl = default_ttl
+        self.ttls: Dict[str, float] = ttls or {}
+        self.max_entries = max_entries
+        self.normalize_strings = normalize_strings
+        self.stats = ToolCacheStats()
+
+        # cache key -> (expiry time, result), least recently used first
+        self.entries: OrderedDict[str, Tuple[float, Any]] = OrderedDict()
+        self.sync_in_flight: Dict[str, _InFlightCall] = {}
+        self.async_in_flight: Dict[str, asyncio.Future] = {}
+        self.lock = threading.Lock()
+
+    def wrap(self, tool: ToolType) -> ToolType:
+        """Cache the results of a function tool or of every function of a toolkit.
+
+        Toolkits are updated in place and returned. For function tools, a wrapper keeping the name, docstring and
+        signature of the original function is returned.
+        """
+        if isinstance(tool, Toolkit):
+            for function in tool.functions.values():
+                if function.entrypoint is not None:
+                    function.entrypoint = self.wrap_callable(function.entrypoint, name=function.name)
+            return tool  # type: ignore
+        return self.wrap_callable(tool)  # type: ignore
+
+    def wrap_callable(self, func: Callable, name: Optional[str] = None) -> Callable:
+        """Return a wrapper of func serving its results from the cache."""
+        tool_name = name or func.__name__
+        func_signature = signature(func)
+
+        if iscoroutinefunction(func):
+
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                if self.get_ttl(tool_name) <= 0:
+                    return await func(*args, **kwargs)
+                key = self.make_key(tool_name, func_signature.bind(*args, **kwargs).arguments)
+                return await self._call_async(key, tool_name, func, args, kwargs)
+
+            return async_wrapper
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if self.get_ttl(tool_name) <= 0:
+                return func(*args, **kwargs)
+            key = self.make_key(tool_name, func_signature.bind(*args, **kwargs).arguments)
+            return self._call_sync(key, tool_name, func, args, kwargs)
+
+        return wrapper
+
+    def get_ttl(self, tool_name: str) -> float:
+        return self.ttls.get(tool_name, self.default_ttl)
+
+    def make_key(self, tool_name: str, arguments: Dict[str, Any]) -> str:
+        """Build the cache key of a tool call from its name and arguments."""
+        call_arguments = {
+            arg_name: self._normalize(value)
+            for arg_name, value in arguments.items()
+            if arg_name not in INJECTED_ARGUMENTS
+        }
+        return f"{tool_name}:{json.dumps(call_arguments, sort_keys=True, default=repr)}"
+
+    def _normalize(self, value: Any) -> Any:
+        if self.normalize_strings and isinstance(value, str):
+            return value.strip().casefold()
+        return value
+
+    def _get(self, key: str) -> Tuple[bool, Any]:
+        """Look up a cached result. Must be called with the lock held."""
+        entry = self.entries.get(key)
+        if entry is None:
+            return False, None
+
+        expires_at, result = entry
+        if expires_at <= time.monotonic():
+            del self.entries[key]
+            self.stats.expirations += 1
+            return False, None
+
+        self.entries.move_to_end(key)
+        self.stats.hits += 1
+        return True, result
+
+    def _set(self, key: str, tool_name: str, result: Any) -> None:
+        if isgenerator(result) or isasyncgen(result):
+            return
+
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.get_ttl(tool_name), result)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.stats.evictions += 1
+
+    def _call_sync(self, key: str, tool_name: str, func: Callable, args: tuple, kwargs: dict) -> Any:
+        with self.lock:
+            found, result = self._get(key)
+            if found:
+                return result
+
+            in_flight = self.sync_in_flight.get(key)
+            is_leader = in_flight is None
+            if in_flight is None:
+                in_flight = _InFlightCall()
+                self.sync_in_flight[key] = in_flight
+                self.stats.misses += 1
+            else:
+                self.stats.coalesced += 1
+
+        # Wait for the identical call already running
+        if not is_leader:
+            in_flight.done.wait()
+            if in_flight.error is not None:
+                raise in_flight.error
+            return in_flight.result
+
+        log_debug(f"Tool cache miss: {key}")
+        try:
+            result = func(*args, **kwargs)
+            in_flight.result = result
+            self._set(key, tool_name, result)
+            return result
+        except BaseException as e:
+            in_flight.error = e
+            raise
+        finally:
+            with self.lock:
+                self.sync_in_flight.pop(key, None)
+            in_flight.done.set()
+
+    async def _call_async(self, key: str, tool_name: str, func: Callable, args: tuple, kwargs: dict) -> Any:
+        with self.lock:
+            found, result = self._get(key)
+            if found:
+                return result
+
+            task = self.async_in_flight.get(key)
+            if task is None:
+                self.stats.misses += 1
+            else:
+                self.stats.coalesced += 1
+
+        if task is None:
+            log_debug(f"Tool cache miss: {key}")
+            # The upstream call runs in its own task, so a cancelled caller doesn't cancel it for the others
+            task = asyncio.ensure_future(self._run_async(key, tool_name, func, args, kwargs))
+            self.async_in_flight[key] = task
+            task.add_done_callback(lambda _: self.async_in_flight.pop(key, None))
+
+        return await asyncio.shield(task)
+
+    async def _run_async(self, key: str, tool_name: str, func: Callable, args: tuple, kwargs: dict) -> Any:
+        result = await func(*args, **kwargs)
+        self._set(key, tool_name, result)
+        return result
+
+    def clear(self) -> None:
+        """Drop every cached result."""
+        with self.lock:
+            self.entries.clear()
@@ -1,35 +1,114 @@
 import os
 import asyncio
+from lib.app.startup import startup_timer  # Imported first, so the startup report covers the other imports
 import uvicorn
 # from agno.app.agui.app import AGUIApp  # <-- Uncomment this to test the bug
 from lib.app.agui.app import AGUIApp     # <-- Uncomment this to test the fix
+from lib.app.agui.event_log import RunEventLog, SqliteEventLogBackend
+from lib.app.agui.fan_out import MemberFanOut
+from lib.app.agui.history import HistoryCompactor, HistoryWindowConfig
+from lib.app.agui.payloads import SqliteToolResultStore, ToolPayloadConfig
+from lib.app.agui.tracing import AGUITracing
+from lib.app.agui.utils import AGUIMessageCache
+from lib.app.agui.websocket import AGUIWebSocketSessions
+from lib.app.admission import AdmissionController
+from lib.app.utils import MediaIntake
+from lib.app.workers import serve_with_workers
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import BatchSpanProcessor
 
-from agents.investment_advisor_team import investment_advisor_team
-from agents.stock_price_agent import stock_price_agent
+with startup_timer.phase("import agents"):
+    from agents.company_news_agent import company_news_agent
+    from agents.investment_advisor_team import investment_advisor_team, team_storage
+    from agents.stock_price_agent import stock_price_agent
+    from agents.tool_cache import tool_cache
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     yield  # Application runs after this yield
 
-async def main():
+    # Persist the sessions still queued by the write-behind storage
+    await asyncio.to_thread(team_storage.close)
+
+def create_tracing() -> AGUITracing | None:
+    if os.getenv("AGUI_TRACING", "false").lower() != "true":
+        return None
+
+    # Spans are exported to the endpoint given by the OTEL_EXPORTER_OTLP_* variables
+    tracer_provider = TracerProvider()
+    tracer_provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+    return AGUITracing(
+        tracer_provider=tracer_provider,
+        sample_ratio=float(os.getenv("AGUI_TRACING_SAMPLE_RATIO", "1.0")),
+    )
+
+def create_app() -> FastAPI:
     agui_app = AGUIApp(
         team=investment_advisor_team,
         # agent=stock_price_agent,
         name="multiagent_agui",
         app_id="multiagent_agui",
         description="Multiagent AGUI",
+        # Shed load once this many team runs are in progress in a worker
+        admission_control=AdmissionController(
+            max_in_flight=int(os.getenv("AGUI_MAX_IN_FLIGHT", "32")),
+            max_queued=int(os.getenv("AGUI_MAX_QUEUED", "64")),
+        ),
+        # Get the price and the news concurrently, then let the leader summarize them
+        member_fan_out=(
+            MemberFanOut(members=[stock_price_agent.name, company_news_agent.name])  # type: ignore
+            if os.getenv("AGUI_MEMBER_FAN_OUT", "false").lower() == "true"
+            else None
+        ),
+        # Let clients resume dropped runs, the log is shared by the workers through SQLite
+        # A run left without any client is cancelled right away, or after AGUI_RESUME_GRACE seconds
+        event_log=RunEventLog(
+            resume_grace=float(os.getenv("AGUI_RESUME_GRACE", "0")),
+            backend=SqliteEventLogBackend("/tmp/agui_events.db"),
+        ),
+        tracing=create_tracing(),
+        # Split or truncate tool payloads over this size, e.g. YFinance histories, truncated results are fetched from
+        # /agui/tool-results/{tool_call_id}, shared by the workers through the SQLite file of the event log
+        tool_payloads=ToolPayloadConfig(
+            max_frame_bytes=int(os.getenv("AGUI_MAX_FRAME_BYTES", "16384")),
+            result_store=SqliteToolResultStore("/tmp/agui_events.db"),
+        ),
+        # Accept uploads on /agui/multipart, spooling the large ones to disk, in a subdirectory per worker process
+        media_intake=MediaIntake(directory=os.getenv("AGUI_UPLOAD_DIR", "/tmp/agui_uploads"), per_process=True),
+        # Only convert the messages of the resent thread that the previous turns haven't
+        message_cache=AGUIMessageCache(),
+        # Keep the resent thread within a token budget, summarizing the turns that don't fit
+        history_compactor=HistoryCompactor(
+            HistoryWindowConfig(max_tokens=int(os.getenv("AGUI_HISTORY_MAX_TOKENS", "8000")))
+        ),
+        # Serve /agui/ws, where clients keep a connection to their thread and only send the new messages of each run
+        websocket_sessions=AGUIWebSocketSessions() if os.getenv("AGUI_WEBSOCKET", "false").lower() == "true" else None,
+        # Initialize the members in the background, /ready answers 503 until they are
+        lazy_initialization=os.getenv("AGUI_LAZY_INIT", "false").lower() == "true",
+        # Report the hits of the tool cache shared by the agents and of the team's session cache on /status
+        status_stats={
+            "tool_cache": tool_cache.stats.to_dict,
+            "session_cache": investment_advisor_team.storage.stats.to_dict,  # type: ignore
+        },
+        api_app=FastAPI(title="agno-app", lifespan=lifespan),
     )
 
-    app = agui_app.get_app()
-    app.router.lifespan_context = lifespan
+    return agui_app.get_app()
 
-    config = uvicorn.Config(app=app, host="0.0.0.0", port=8000)
+async def main():
+    config = uvicorn.Config(app=create_app(), host="0.0.0.0", port=8000)
     server = uvicorn.Server(config)
     await server.serve()
 
 
 if __name__ == '__main__':
-    asyncio.run(main())
+    workers = int(os.getenv("AGUI_WORKERS", "1"))
+    if workers > 1:
+        # Each worker process builds its own app from the factory
+        serve_with_workers("main:create_app", factory=True, host="0.0.0.0", port=8000, workers=workers)
+    else:
+        asyncio.run(main())
 
@@ -0,0 +1,49 @@
+"""Run slots of the AdmissionController."""
+
+import asyncio
+
+import pytest
+
+from lib.app import admission
+from lib.app.admission import AdmissionController, AdmissionRejected
+
+
+def test_slot_handed_over_as_the_wait_times_out_is_released(monkeypatch):
+    controller = AdmissionController(max_in_flight=1, max_queued=1)
+
+    async def wait_for_handed_over(waiter: asyncio.Future, timeout: float) -> None:
+        # The slot is released to the waiter right as its timeout fires
+        controller.release()
+        assert waiter.done()
+        raise asyncio.TimeoutError
+
+    async def run() -> None:
+        await controller.acquire()
+        monkeypatch.setattr(admission.asyncio, "wait_for", wait_for_handed_over)
+        with pytest.raises(AdmissionRejected) as rejected:
+            await controller.acquire()
+        assert rejected.value.status_code == 503
+
+    asyncio.run(run())
+    assert controller.stats.in_flight == 0
+    assert controller.stats.queued == 0
+    assert not controller.waiters
+
+
+def test_released_slots_go_to_the_waiters_in_order():
+    controller = AdmissionController(max_in_flight=1, max_queued=2)
+    admitted = []
+
+    async def run(name: str) -> None:
+        await controller.acquire()
+        admitted.append(name)
+        await asyncio.sleep(0.01)
+        controller.release()
+
+    async def run_all() -> None:
+        await asyncio.gather(run("a"), run("b"), run("c"))
+
+    asyncio.run(run_all())
+    assert admitted == ["a", "b", "c"]
+    assert controller.stats.in_flight == 0
+    assert controller.stats.admitted == 3
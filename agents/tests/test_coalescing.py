@@ -0,0 +1,44 @@
+"""Sessions of the runs sharing a single underlying run."""
+
+import asyncio
+from typing import AsyncIterator, List, Tuple
+
+from ag_ui.core import BaseEvent, EventType, RunAgentInput, RunFinishedEvent, RunStartedEvent, UserMessage
+
+from lib.app.agui.coalescing import RunCoalescer
+
+
+def run_input(thread_id: str) -> RunAgentInput:
+    return RunAgentInput(
+        thread_id=thread_id,
+        run_id=f"run_{thread_id}",
+        state={},
+        messages=[UserMessage(id="1", role="user", content="How is AAPL doing?")],
+        tools=[],
+        context=[],
+        forwarded_props={},
+    )
+
+
+async def start_run(run_input: RunAgentInput) -> AsyncIterator[BaseEvent]:
+    yield RunStartedEvent(type=EventType.RUN_STARTED, thread_id=run_input.thread_id, run_id=run_input.run_id)
+    await asyncio.sleep(0.01)
+    yield RunFinishedEvent(type=EventType.RUN_FINISHED, thread_id=run_input.thread_id, run_id=run_input.run_id)
+
+
+def test_session_is_copied_to_every_subscriber_thread():
+    copies: List[Tuple[str, str]] = []
+    run_coalescer = RunCoalescer()
+
+    async def subscribe(thread_id: str) -> List[str]:
+        events = run_coalescer.stream(run_input(thread_id), start_run, lambda *threads: copies.append(threads))
+        return [event.thread_id async for event in events]  # type: ignore
+
+    async def run_all():
+        return await asyncio.gather(subscribe("a"), subscribe("b"), subscribe("c"), subscribe("a"))
+
+    threads = asyncio.run(run_all())
+
+    assert threads == [["a", "a"], ["b", "b"], ["c", "c"], ["a", "a"]]
+    assert sorted(copies) == [("a", "b"), ("a", "c")]
+    assert not run_coalescer.runs
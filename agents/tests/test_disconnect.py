@@ -0,0 +1,163 @@
+"""Runs stopped when the client of their SSE stream disconnects."""
+
+import asyncio
+import time
+from typing import Any, AsyncIterator, Dict, Iterator, List
+
+import pytest
+from fastapi import FastAPI
+from starlette.testclient import TestClient
+
+from benchmarks.synthetic import Chunk, SyntheticRunner, build_scenario
+from lib.app.admission import AdmissionController, AdmissionMiddleware
+from lib.app.agui.async_router import get_async_agui_router
+from lib.app.agui.event_log import RunEventLog
+from lib.app.agui.sync_router import get_sync_agui_router
+
+RUN_INPUT = (
+    b'{"threadId":"thread_1","runId":"run_1","state":{},"tools":[],"context":[],"forwardedProps":{},'
+    b'"messages":[{"id":"1","role":"user","content":"How is AAPL doing?"}]}'
+)
+CHUNK_DELAY = 0.005
+
+
+class StubRunner(SyntheticRunner):
+    """Replays a long answer, recording the chunks pulled from its response stream and whether it was closed."""
+
+    def __init__(self):
+        super().__init__(build_scenario("long_text"))
+        self.pulled = 0
+        self.closed = False
+
+    def run(self, *args, **kwargs) -> Iterator[Chunk]:
+        try:
+            for chunk in self.chunks:
+                time.sleep(CHUNK_DELAY)
+                self.pulled += 1
+                yield chunk
+        finally:
+            self.closed = True
+
+    async def arun(self, *args, **kwargs) -> AsyncIterator[Chunk]:
+        async def stream() -> AsyncIterator[Chunk]:
+            try:
+                for chunk in self.chunks:
+                    await asyncio.sleep(CHUNK_DELAY)
+                    self.pulled += 1
+                    yield chunk
+            finally:
+                self.closed = True
+
+        return stream()
+
+
+async def stream_until_disconnect(app: FastAPI, frames: int) -> List[Dict[str, Any]]:
+    """Post a run to the app, the client disconnecting once it received the given number of body frames."""
+    received: List[Dict[str, Any]] = []
+    disconnected = asyncio.Event()
+    request_sent = False
+
+    async def receive() -> Dict[str, Any]:
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": RUN_INPUT, "more_body": False}
+        await disconnected.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message: Dict[str, Any]) -> None:
+        received.append(message)
+        if sum(message["type"] == "http.response.body" for message in received) >= frames:
+            disconnected.set()
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": "/agui",
+        "raw_path": b"/agui",
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(b"content-type", b"application/json"), (b"accept", b"text/event-stream")],
+        "client": ("127.0.0.1", 50000),
+        "server": ("127.0.0.1", 8000),
+    }
+    await asyncio.wait_for(app(scope, receive, send), timeout=10)
+    return received
+
+
+@pytest.mark.parametrize("get_router", [get_async_agui_router, get_sync_agui_router])
+def test_disconnect_stops_the_run(get_router):
+    runner = StubRunner()
+    app = FastAPI()
+    app.include_router(get_router(agent=runner))
+
+    received = asyncio.run(stream_until_disconnect(app, frames=3))
+
+    assert received[0]["status"] == 200
+    # The sync run stops at its next chunk
+    deadline = time.monotonic() + 5
+    while not runner.closed and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert runner.closed
+    pulled = runner.pulled
+    assert pulled < len(runner.chunks) // 2
+    time.sleep(CHUNK_DELAY * 10)
+    assert runner.pulled == pulled
+
+    with TestClient(app) as client:
+        runs = client.get("/status").json()["runs"]
+    assert (runs["started"], runs["completed"], runs["cancelled"]) == (1, 0, 1)
+
+
+@pytest.mark.parametrize("resume_grace", [0, 0.2])
+def test_logged_runs_hold_their_admission_slot_until_done(resume_grace):
+    runner = StubRunner()
+    controller = AdmissionController(max_in_flight=2)
+    app = FastAPI()
+    app.include_router(get_async_agui_router(agent=runner, event_log=RunEventLog(resume_grace=resume_grace)))
+    app.add_middleware(AdmissionMiddleware, controller=controller, paths=["/agui"])
+
+    async def main() -> None:
+        await stream_until_disconnect(app, frames=3)
+        if resume_grace:
+            # Waiting for a client to resume it, the run keeps going and keeps its slot
+            await asyncio.sleep(CHUNK_DELAY * 5)
+            assert not runner.closed
+            assert controller.stats.in_flight == 1
+        deadline = time.monotonic() + 10
+        while not runner.closed and time.monotonic() < deadline:
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0)
+        assert controller.stats.in_flight == 0
+
+    asyncio.run(main())
+    # Cancelled once nobody resumed it within the grace
+    assert runner.closed
+    assert runner.pulled < len(runner.chunks)
+
+
+def test_logged_runs_are_only_replayed_to_resuming_clients():
+    app = FastAPI()
+    runner = SyntheticRunner(build_scenario("tool_calls"))
+    app.include_router(get_async_agui_router(agent=runner, event_log=RunEventLog()))  # type: ignore
+
+    with TestClient(app) as client:
+        first = client.post("/agui", content=RUN_INPUT, headers={"content-type": "application/json"})
+        assert first.status_code == 200
+        # Reusing the run_id without a Last-Event-ID doesn't replay the run
+        again = client.post("/agui", content=RUN_INPUT, headers={"content-type": "application/json"})
+        assert again.status_code == 409
+
+        headers = {"content-type": "application/json", "last-event-id": "run_1:1"}
+        resumed = client.post("/agui", content=RUN_INPUT, headers=headers)
+        assert resumed.text == first.text.split("\n\n", 1)[1]
+
+        # Another thread reusing the run_id gets a run of its own
+        other_thread = RUN_INPUT.replace(b'"thread_1"', b'"thread_2"')
+        other_run = client.post("/agui", content=other_thread, headers={"content-type": "application/json"})
+        assert other_run.status_code == 200
+        assert client.get("/agui/runs/run_1", params={"thread_id": "thread_3"}).status_code == 404
+        assert client.get("/agui/runs/run_1", params={"thread_id": "thread_1"}).text == first.text
@@ -0,0 +1,346 @@
+"""Encodings of the AG-UI events, and the negotiation of the encoding from the Accept header."""
+
+import struct
+from typing import Any, Dict, List, Optional, Tuple
+
+import pytest
+from ag_ui.core import (
+    BaseEvent,
+    CustomEvent,
+    EventType,
+    RawEvent,
+    RunErrorEvent,
+    RunFinishedEvent,
+    RunStartedEvent,
+    StateSnapshotEvent,
+    StepFinishedEvent,
+    StepStartedEvent,
+    TextMessageContentEvent,
+    TextMessageEndEvent,
+    TextMessageStartEvent,
+    ToolCallArgsEvent,
+    ToolCallEndEvent,
+    ToolCallResultEvent,
+    ToolCallStartEvent,
+)
+from ag_ui.encoder import AGUI_MEDIA_TYPE, EventEncoder
+from google.protobuf import descriptor_pb2, descriptor_pool, json_format, message_factory, struct_pb2
+
+from lib.app.agui.encoder import (
+    _PROTOBUF_EVENTS,
+    AGUIEventEncoder,
+    FastSSEEventEncoder,
+    ProtobufEventEncoder,
+    negotiate_encoder,
+)
+
+STRING = descriptor_pb2.FieldDescriptorProto.TYPE_STRING
+INT64 = descriptor_pb2.FieldDescriptorProto.TYPE_INT64
+ENUM = descriptor_pb2.FieldDescriptorProto.TYPE_ENUM
+MESSAGE = descriptor_pb2.FieldDescriptorProto.TYPE_MESSAGE
+VALUE = ".google.protobuf.Value"
+
+# The messages of events.proto of the AG-UI protocol: name -> [(field name, number, type, type name, optional)]
+PROTO_MESSAGES: Dict[str, List[Tuple[str, int, int, Optional[str], bool]]] = {
+    "BaseEvent": [
+        ("type", 1, ENUM, ".ag_ui.EventType", False),
+        ("timestamp", 2, INT64, None, True),
+        ("raw_event", 3, MESSAGE, VALUE, True),
+    ],
+    "TextMessageStartEvent": [("message_id", 2, STRING, None, False), ("role", 3, STRING, None, True)],
+    "TextMessageContentEvent": [("message_id", 2, STRING, None, False), ("delta", 3, STRING, None, False)],
+    "TextMessageEndEvent": [("message_id", 2, STRING, None, False)],
+    "ToolCallStartEvent": [
+        ("tool_call_id", 2, STRING, None, False),
+        ("tool_call_name", 3, STRING, None, False),
+        ("parent_message_id", 4, STRING, None, True),
+    ],
+    "ToolCallArgsEvent": [("tool_call_id", 2, STRING, None, False), ("delta", 3, STRING, None, False)],
+    "ToolCallEndEvent": [("tool_call_id", 2, STRING, None, False)],
+    "StateSnapshotEvent": [("snapshot", 2, MESSAGE, VALUE, False)],
+    "RawEvent": [("event", 2, MESSAGE, VALUE, False), ("source", 3, STRING, None, True)],
+    "CustomEvent": [("name", 2, STRING, None, False), ("value", 3, MESSAGE, VALUE, True)],
+    "RunStartedEvent": [("thread_id", 2, STRING, None, False), ("run_id", 3, STRING, None, False)],
+    "RunFinishedEvent": [
+        ("thread_id", 2, STRING, None, False),
+        ("run_id", 3, STRING, None, False),
+        ("result", 4, MESSAGE, VALUE, True),
+    ],
+    "RunErrorEvent": [("code", 2, STRING, None, True), ("message", 3, STRING, None, False)],
+    "StepStartedEvent": [("step_name", 2, STRING, None, False)],
+    "StepFinishedEvent": [("step_name", 2, STRING, None, False)],
+}
+
+# The Event oneof: field name -> (number, message)
+PROTO_EVENT_ONEOF: Dict[str, Tuple[int, str]] = {
+    "text_message_start": (1, "TextMessageStartEvent"),
+    "text_message_content": (2, "TextMessageContentEvent"),
+    "text_message_end": (3, "TextMessageEndEvent"),
+    "tool_call_start": (4, "ToolCallStartEvent"),
+    "tool_call_args": (5, "ToolCallArgsEvent"),
+    "tool_call_end": (6, "ToolCallEndEvent"),
+    "state_snapshot": (7, "StateSnapshotEvent"),
+    "raw": (10, "RawEvent"),
+    "custom": (11, "CustomEvent"),
+    "run_started": (12, "RunStartedEvent"),
+    "run_finished": (13, "RunFinishedEvent"),
+    "run_error": (14, "RunErrorEvent"),
+    "step_started": (15, "StepStartedEvent"),
+    "step_finished": (16, "StepFinishedEvent"),
+}
+
+PROTO_EVENT_TYPES = [
+    "TEXT_MESSAGE_START",
+    "TEXT_MESSAGE_CONTENT",
+    "TEXT_MESSAGE_END",
+    "TOOL_CALL_START",
+    "TOOL_CALL_ARGS",
+    "TOOL_CALL_END",
+    "STATE_SNAPSHOT",
+    "STATE_DELTA",
+    "MESSAGES_SNAPSHOT",
+    "RAW",
+    "CUSTOM",
+    "RUN_STARTED",
+    "RUN_FINISHED",
+    "RUN_ERROR",
+    "STEP_STARTED",
+    "STEP_FINISHED",
+]
+
+
+def add_field(
+    message: descriptor_pb2.DescriptorProto,
+    name: str,
+    number: int,
+    field_type: int,
+    type_name: Optional[str] = None,
+    optional: bool = False,
+) -> None:
+    field = message.field.add(name=name, number=number, type=field_type)
+    field.label = descriptor_pb2.FieldDescriptorProto.LABEL_OPTIONAL
+    if type_name is not None:
+        field.type_name = type_name
+    if optional:
+        # proto3 optional fields live in a synthetic oneof of their own
+        field.proto3_optional = True
+        field.oneof_index = len(message.oneof_decl)
+        message.oneof_decl.add(name=f"_{name}")
+
+
+def build_event_class() -> Any:
+    """Build the ag_ui.Event message class from the events.proto schema."""
+    pool = descriptor_pool.DescriptorPool()
+    pool.AddSerializedFile(struct_pb2.DESCRIPTOR.serialized_pb)
+    file = descriptor_pb2.FileDescriptorProto(
+        name="events.proto", package="ag_ui", syntax="proto3", dependency=["google/protobuf/struct.proto"]
+    )
+    event_type = file.enum_type.add(name="EventType")
+    for number, name in enumerate(PROTO_EVENT_TYPES):
+        event_type.value.add(name=name, number=number)
+    for message_name, fields in PROTO_MESSAGES.items():
+        message = file.message_type.add(name=message_name)
+        if message_name != "BaseEvent":
+            add_field(message, "base_event", 1, MESSAGE, ".ag_ui.BaseEvent")
+        for field in fields:
+            add_field(message, *field)
+    event = file.message_type.add(name="Event")
+    event.oneof_decl.add(name="event")
+    for name, (number, message_name) in PROTO_EVENT_ONEOF.items():
+        field = event.field.add(name=name, number=number, type=MESSAGE, type_name=f".ag_ui.{message_name}")
+        field.label = descriptor_pb2.FieldDescriptorProto.LABEL_OPTIONAL
+        field.oneof_index = 0
+    pool.Add(file)
+    return message_factory.GetMessageClass(pool.FindMessageTypeByName("ag_ui.Event"))
+
+
+Event = build_event_class()
+
+SNAPSHOT = {"symbol": "AAPL", "price": 210.5, "volume": 3, "up": True, "halted": False, "notes": None, "tags": ["a", 1]}
+
+EVENTS: List[BaseEvent] = [
+    TextMessageStartEvent(type=EventType.TEXT_MESSAGE_START, message_id="message_1", role="assistant"),
+    TextMessageContentEvent(
+        type=EventType.TEXT_MESSAGE_CONTENT, message_id="message_1", delta='Prix "€" \n\t\x01 📈'
+    ),
+    TextMessageEndEvent(type=EventType.TEXT_MESSAGE_END, message_id="message_1", timestamp=1760000000000),
+    ToolCallStartEvent(type=EventType.TOOL_CALL_START, tool_call_id="call_1", tool_call_name="get_stock_price"),
+    ToolCallStartEvent(
+        type=EventType.TOOL_CALL_START, tool_call_id="call_2", tool_call_name="get_news", parent_message_id="message_1"
+    ),
+    ToolCallArgsEvent(type=EventType.TOOL_CALL_ARGS, tool_call_id="call_1", delta='{"symbol": "AAPL"}' * 20),
+    ToolCallEndEvent(type=EventType.TOOL_CALL_END, tool_call_id="call_1", raw_event={"source": "agno", "ids": [1, 2]}),
+    StateSnapshotEvent(type=EventType.STATE_SNAPSHOT, snapshot=SNAPSHOT),
+    StateSnapshotEvent(type=EventType.STATE_SNAPSHOT, snapshot=None),
+    RawEvent(type=EventType.RAW, event={"chunk": "RunStarted"}, source="agno"),
+    CustomEvent(type=EventType.CUSTOM, name="progress", value=[0.5, "half"]),
+    CustomEvent(type=EventType.CUSTOM, name="ping", value=None),
+    RunStartedEvent(type=EventType.RUN_STARTED, thread_id="thread_1", run_id="run_1", timestamp=0),
+    RunFinishedEvent(type=EventType.RUN_FINISHED, thread_id="thread_1", run_id="run_1", result={"done": True}),
+    RunErrorEvent(type=EventType.RUN_ERROR, message="Le modèle a échoué", code="MODEL_ERROR"),
+    RunErrorEvent(type=EventType.RUN_ERROR, message=""),
+    StepStartedEvent(type=EventType.STEP_STARTED, step_name="reasoning"),
+    StepFinishedEvent(type=EventType.STEP_FINISHED, step_name="reasoning"),
+]
+
+
+def decode_frames(data: bytes) -> List[Any]:
+    """Split the length-prefixed frames, decoding each as an Event message."""
+    messages = []
+    while data:
+        (length,) = struct.unpack(">I", data[:4])
+        assert len(data) >= 4 + length
+        messages.append(Event.FromString(data[4 : 4 + length]))
+        data = data[4 + length :]
+    return messages
+
+
+def to_python(value: struct_pb2.Value) -> Any:
+    return json_format.MessageToDict(value)
+
+
+def check_decoded(message: Any, event: BaseEvent) -> None:
+    oneof = message.WhichOneof("event")
+    assert oneof == event.type.value.lower()
+    body = getattr(message, oneof)
+
+    base_event = body.base_event
+    assert PROTO_EVENT_TYPES[base_event.type] == event.type.value
+    assert base_event.HasField("timestamp") == (event.timestamp is not None)
+    assert base_event.timestamp == (event.timestamp or 0)
+    assert base_event.HasField("raw_event") == (event.raw_event is not None)
+    if event.raw_event is not None:
+        assert to_python(base_event.raw_event) == event.raw_event
+
+    for name, _, field_type, type_name, optional in PROTO_MESSAGES[type(body).DESCRIPTOR.name]:
+        value = getattr(event, name)
+        if optional:
+            assert body.HasField(name) == (value is not None), name
+        if type_name == VALUE:
+            assert to_python(getattr(body, name)) == value, name
+        else:
+            assert getattr(body, name) == (value or ""), name
+
+
+@pytest.mark.parametrize("event", EVENTS, ids=lambda event: event.type.value)
+def test_protobuf_events_decode_with_the_schema(event: BaseEvent):
+    (message,) = decode_frames(ProtobufEventEncoder().encode(event))
+
+    check_decoded(message, event)
+
+
+def test_every_protobuf_event_type_is_covered():
+    schema_types = {EventType(name.upper()) for name in PROTO_EVENT_ONEOF}
+
+    assert set(_PROTOBUF_EVENTS) == schema_types
+    assert {event.type for event in EVENTS} == schema_types
+
+
+def test_events_missing_from_the_schema_are_sent_as_custom_events():
+    event = ToolCallResultEvent(
+        type=EventType.TOOL_CALL_RESULT, message_id="message_2", tool_call_id="call_1", content="210.5", timestamp=5
+    )
+
+    (message,) = decode_frames(ProtobufEventEncoder().encode(event))
+
+    assert message.WhichOneof("event") == "custom"
+    assert message.custom.base_event.type == PROTO_EVENT_TYPES.index("CUSTOM")
+    assert message.custom.base_event.timestamp == 5
+    assert message.custom.name == "TOOL_CALL_RESULT"
+    assert to_python(message.custom.value) == event.model_dump(by_alias=True, exclude_none=True)
+
+
+def test_protobuf_frames_are_pinned():
+    encoder = ProtobufEventEncoder()
+
+    # The default TEXT_MESSAGE_START type isn't encoded, leaving an empty BaseEvent
+    assert encoder.encode(
+        TextMessageStartEvent(type=EventType.TEXT_MESSAGE_START, message_id="m", role="assistant")
+    ) == bytes.fromhex("00000012" "0a10" "0a00" "12016d" "1a09617373697374616e74")
+    assert encoder.encode(TextMessageContentEvent(type=EventType.TEXT_MESSAGE_CONTENT, message_id="m", delta="é")) == (
+        bytes.fromhex("0000000d" "120b" "0a020801" "12016d" "1a02c3a9")
+    )
+    assert encoder.encode(ToolCallEndEvent(type=EventType.TOOL_CALL_END, tool_call_id="c", timestamp=300)) == (
+        bytes.fromhex("0000000c" "320a" "0a05080510ac02" "120163")
+    )
+    assert encoder.encode(RunErrorEvent(type=EventType.RUN_ERROR, message="x", code="E")) == bytes.fromhex(
+        "0000000c" "720a" "0a02080d" "120145" "1a0178"
+    )
+
+
+# Text with quotes, backslashes, control characters and non-ASCII characters, all escaped or not alike
+TRICKY_TEXTS = ['say "hi"', "C:\\path\\", "tab\tnew\nline\r\x00\x1f\x7f", "é 株価 📈 \u2028"]
+
+
+def fast_path_events() -> List[BaseEvent]:
+    events: List[BaseEvent] = []
+    for text in TRICKY_TEXTS:
+        events.append(TextMessageContentEvent(type=EventType.TEXT_MESSAGE_CONTENT, message_id=text, delta=text))
+        events.append(ToolCallArgsEvent(type=EventType.TOOL_CALL_ARGS, tool_call_id=text, delta=text))
+        events.append(ToolCallEndEvent(type=EventType.TOOL_CALL_END, tool_call_id=text))
+    # Events with a timestamp or raw_event go through the reference encoder
+    fields: List[Dict[str, Any]] = [{"timestamp": 1700000000000}, {"raw_event": {"delta": 'say "hi"', "index": 0}}]
+    for extra in fields:
+        events.append(
+            TextMessageContentEvent(type=EventType.TEXT_MESSAGE_CONTENT, message_id="m", delta="é\n", **extra)
+        )
+        events.append(ToolCallArgsEvent(type=EventType.TOOL_CALL_ARGS, tool_call_id="c", delta='{"a":', **extra))
+        events.append(ToolCallEndEvent(type=EventType.TOOL_CALL_END, tool_call_id="c", **extra))
+    return events
+
+
+@pytest.mark.parametrize("event", fast_path_events(), ids=lambda event: event.type.value)
+def test_fast_sse_frames_match_the_reference_encoder(event: BaseEvent):
+    assert FastSSEEventEncoder().encode(event) == EventEncoder().encode(event).encode("utf-8")
+
+
+class PlainEncoder(AGUIEventEncoder):
+    def __init__(self, content_type: str):
+        self.content_type = content_type
+
+    def get_content_type(self) -> str:
+        return self.content_type
+
+    def encode(self, event: BaseEvent) -> bytes:
+        return b""
+
+
+SSE = FastSSEEventEncoder()
+PROTOBUF = ProtobufEventEncoder()
+
+
+@pytest.mark.parametrize(
+    "accept, expected",
+    [
+        (None, SSE),
+        ("", SSE),
+        (AGUI_MEDIA_TYPE, PROTOBUF),
+        (f"text/event-stream;q=0.5, {AGUI_MEDIA_TYPE}", PROTOBUF),
+        (f"{AGUI_MEDIA_TYPE};q=0.4, text/event-stream", SSE),
+        (f"{AGUI_MEDIA_TYPE}; Q=0.9 , text/event-stream;q=0.8", PROTOBUF),
+        # Equal qualities are preferred in the order of the header
+        (f"{AGUI_MEDIA_TYPE}, text/event-stream", PROTOBUF),
+        (f"text/event-stream, {AGUI_MEDIA_TYPE}", SSE),
+        # Wildcards, the first encoder winning a tie on the same range
+        ("*/*", SSE),
+        ("application/*", PROTOBUF),
+        ("text/*;q=0.2, application/*;q=0.3", PROTOBUF),
+        ("application/*;q=0.9, */*;q=0.1", PROTOBUF),
+        # The most specific range applies, even with a lower quality
+        (f"{AGUI_MEDIA_TYPE};q=0, application/*", SSE),
+        (f"{AGUI_MEDIA_TYPE};q=0.1, */*", SSE),
+        # Nothing acceptable falls back to the first encoder
+        ("text/html", SSE),
+        (f"{AGUI_MEDIA_TYPE};q=0", SSE),
+        # Invalid qualities count as 1
+        (f"text/event-stream;q=0.5, {AGUI_MEDIA_TYPE};q=high", PROTOBUF),
+    ],
+)
+def test_negotiate_encoder(accept: Optional[str], expected: AGUIEventEncoder):
+    assert negotiate_encoder(accept, [SSE, PROTOBUF]) is expected
+
+
+def test_negotiate_encoder_with_a_single_encoder():
+    assert negotiate_encoder(AGUI_MEDIA_TYPE, [SSE]) is SSE
+    encoders = [PlainEncoder("application/json"), PlainEncoder("application/x-ndjson")]
+    assert negotiate_encoder("application/x-ndjson, application/json;q=0.5", encoders) is encoders[1]
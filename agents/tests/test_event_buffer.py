@@ -0,0 +1,185 @@
+"""Ordering of the events held back by blocking tool calls, checked against the recursive flush it replaced."""
+
+import random
+from collections import deque
+from typing import Deque, List, Optional, Set
+
+import pytest
+from ag_ui.core import BaseEvent, EventType
+
+from lib.app.agui.events import text_message_content, tool_call_args, tool_call_end, tool_call_start
+from lib.app.agui.utils import EventBuffer, _emit_event_logic
+
+TOOL_CALL_IDS = ["call_0", "call_1", "call_2", "call_3"]
+
+
+class ReferenceBuffer:
+    """The state of the baseline EventBuffer."""
+
+    def __init__(self):
+        self.buffer: Deque[BaseEvent] = deque()
+        self.blocking_tool_call_id: Optional[str] = None
+        self.active_tool_call_ids: Set[str] = set()
+        self.stuck = 0  # Flushes of the baseline that never returned
+
+    def is_blocked(self) -> bool:
+        return self.blocking_tool_call_id is not None
+
+    def start_tool_call(self, tool_call_id: str) -> None:
+        self.active_tool_call_ids.add(tool_call_id)
+        if self.blocking_tool_call_id is None:
+            self.blocking_tool_call_id = tool_call_id
+
+    def end_tool_call(self, tool_call_id: str) -> None:
+        self.active_tool_call_ids.discard(tool_call_id)
+        if tool_call_id == self.blocking_tool_call_id:
+            self.blocking_tool_call_id = None
+
+
+def reference_emit(event: BaseEvent, event_buffer: ReferenceBuffer) -> List[BaseEvent]:
+    """The recursive flush of the baseline, stopping where it would have looped forever.
+
+    The baseline flush kept re-holding the events behind a tool call started during the flush and not ended among
+    them, never returning. Those events are expected to stay held, in the order they were held again, until the tool
+    call ends: the flush stops once a whole pass over the held events neither emitted an event nor ended a tool call,
+    later passes being identical, and so do the flushes it was nested in.
+    """
+    events_to_emit: List[BaseEvent] = []
+    if event_buffer.is_blocked():
+        if event.type == EventType.TOOL_CALL_ARGS:
+            if event.tool_call_id in event_buffer.active_tool_call_ids:  # type: ignore
+                events_to_emit.append(event)
+            else:
+                event_buffer.buffer.append(event)
+        elif event.type == EventType.TOOL_CALL_END:
+            tool_call_id = event.tool_call_id  # type: ignore
+            if tool_call_id == event_buffer.blocking_tool_call_id:
+                events_to_emit.append(event)
+                event_buffer.end_tool_call(tool_call_id)
+                # Route the held events in passes over the buffer, events held again going back to its end
+                changed = True
+                while event_buffer.buffer and changed:
+                    changed = False
+                    for _ in range(len(event_buffer.buffer)):
+                        if not event_buffer.buffer:
+                            break
+                        state = (event_buffer.blocking_tool_call_id, len(event_buffer.active_tool_call_ids))
+                        stuck = event_buffer.stuck
+                        nested_events = reference_emit(event_buffer.buffer.popleft(), event_buffer)
+                        events_to_emit.extend(nested_events)
+                        # A nested flush looping forever never gave the control back to this one
+                        if event_buffer.stuck > stuck:
+                            return events_to_emit
+                        if nested_events or state != (
+                            event_buffer.blocking_tool_call_id,
+                            len(event_buffer.active_tool_call_ids),
+                        ):
+                            changed = True
+                # Where the baseline looped forever
+                event_buffer.stuck += bool(event_buffer.buffer)
+            elif tool_call_id in event_buffer.active_tool_call_ids:
+                event_buffer.buffer.append(event)
+                event_buffer.end_tool_call(tool_call_id)
+            else:
+                event_buffer.buffer.append(event)
+        else:
+            event_buffer.buffer.append(event)
+    else:
+        if event.type == EventType.TOOL_CALL_START:
+            event_buffer.start_tool_call(event.tool_call_id)  # type: ignore
+        elif event.type == EventType.TOOL_CALL_END:
+            event_buffer.end_tool_call(event.tool_call_id)  # type: ignore
+        events_to_emit.append(event)
+    return events_to_emit
+
+
+def random_events(rng: random.Random, length: int) -> List[BaseEvent]:
+    """Interleaved tool calls and text, each tool call started before its arguments and end, or not at all."""
+    events: List[BaseEvent] = []
+    started = set()
+    for index in range(length):
+        tool_call_id = rng.choice(TOOL_CALL_IDS)
+        kind = rng.random()
+        if kind < 0.3:
+            events.append(text_message_content(message_id="message", delta=f"text {index}"))
+        elif tool_call_id not in started or kind < 0.4:
+            started.add(tool_call_id)
+            events.append(tool_call_start(tool_call_id=tool_call_id, tool_call_name="tool"))
+        elif kind < 0.75:
+            events.append(tool_call_args(tool_call_id=tool_call_id, delta=f"args {index}"))
+        else:
+            events.append(tool_call_end(tool_call_id=tool_call_id))
+    return events
+
+
+def emit_all(events: List[BaseEvent], event_buffer: EventBuffer) -> List[BaseEvent]:
+    emitted: List[BaseEvent] = []
+    for event in events:
+        _emit_event_logic(event, event_buffer, emitted)
+    return emitted
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_flush_order_matches_reference(seed: int):
+    rng = random.Random(seed)
+    stuck = 0
+    for _ in range(100):
+        events = random_events(rng, rng.randint(1, 60))
+
+        reference_buffer = ReferenceBuffer()
+        expected: List[BaseEvent] = []
+        for event in events:
+            expected.extend(reference_emit(event, reference_buffer))
+
+        event_buffer = EventBuffer()
+        assert emit_all(events, event_buffer) == expected
+        assert not event_buffer.released
+        assert event_buffer.blocking_tool_call_id == reference_buffer.blocking_tool_call_id
+        assert list(event_buffer.buffer) == list(reference_buffer.buffer)
+        stuck += reference_buffer.stuck > 0
+    assert stuck
+
+
+def test_held_events_are_flushed_once_per_blocking_tool_call():
+    event_buffer = EventBuffer()
+    emitted: List[BaseEvent] = []
+    _emit_event_logic(tool_call_start(tool_call_id="call_0", tool_call_name="tool"), event_buffer, emitted)
+    texts = [text_message_content(message_id="message", delta=str(index)) for index in range(1000)]
+    for text in texts:
+        _emit_event_logic(text, event_buffer, emitted)
+    assert len(emitted) == 1
+
+    _emit_event_logic(tool_call_end(tool_call_id="call_0"), event_buffer, emitted)
+    assert emitted[2:] == texts
+    assert not event_buffer.buffer and not event_buffer.released
+
+
+def test_held_events_are_only_released_early_over_an_opt_in_cap():
+    start = tool_call_start(tool_call_id="call_0", tool_call_name="tool")
+    texts = [text_message_content(message_id="message", delta=str(index)) for index in range(5)]
+    end = tool_call_end(tool_call_id="call_0")
+
+    assert emit_all([start, *texts, end], EventBuffer()) == [start, end, *texts]
+
+    # Over the cap, the held events go out before the tool call ends
+    event_buffer = EventBuffer(max_held_events=3)
+    assert emit_all([start, *texts, end], event_buffer) == [start, *texts, end]
+    assert not event_buffer.is_blocked()
+    assert not event_buffer.buffer and not event_buffer.released
+
+
+def test_events_stay_held_behind_a_tool_call_started_while_flushing():
+    event_buffer = EventBuffer()
+    events = [
+        tool_call_start(tool_call_id="call_0", tool_call_name="tool"),
+        tool_call_start(tool_call_id="call_1", tool_call_name="tool"),
+        text_message_content(message_id="message", delta="held"),
+        tool_call_end(tool_call_id="call_0"),
+    ]
+
+    emitted = emit_all(events, event_buffer)
+
+    assert emitted == [events[0], events[3], events[1]]
+    assert event_buffer.blocking_tool_call_id == "call_1"
+    assert list(event_buffer.buffer) == [events[2]]
+    assert emit_all([tool_call_end(tool_call_id="call_1")], event_buffer)[1:] == [events[2]]
@@ -0,0 +1,115 @@
+"""Runs of the RunEventLog left without any client, and the lookup of runs in its backend."""
+
+import asyncio
+import time
+from typing import AsyncIterator, List
+
+from lib.app.agui.event_log import RunEventLog, SqliteEventLogBackend
+
+RUN_KEY = ("thread_1", "run_1")
+
+
+class Run:
+    """Frames of a run let through one by one by the test, recording whether the run was cancelled."""
+
+    def __init__(self):
+        self.cancelled = False
+        self.allowed_frames = asyncio.Semaphore(0)
+
+    async def frames(self) -> AsyncIterator[bytes]:
+        try:
+            for index in range(3):
+                await self.allowed_frames.acquire()
+                yield f"data: {index}\n\n".encode()
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+
+
+async def disconnect_after_first_frame(event_log: RunEventLog, run: Run) -> None:
+    stream = event_log.stream(RUN_KEY, run.frames)
+    run.allowed_frames.release()
+    await stream.__anext__()
+    await stream.aclose()
+    await asyncio.sleep(0.05)
+
+
+def test_run_is_cancelled_right_away_by_default():
+    async def main() -> List[bool]:
+        run = Run()
+        done: List[bool] = []
+        stream = RunEventLog().stream(RUN_KEY, run.frames, on_run_done=lambda: done.append(True))
+        run.allowed_frames.release()
+        await stream.__anext__()
+        await stream.aclose()
+        await asyncio.sleep(0.05)
+        return [run.cancelled, bool(done)]
+
+    assert asyncio.run(main()) == [True, True]
+
+
+def test_run_keeps_going_for_a_resume_within_the_grace():
+    async def main() -> List[bytes]:
+        event_log = RunEventLog(resume_grace=5)
+        run = Run()
+        await disconnect_after_first_frame(event_log, run)
+        assert not run.cancelled
+        # Another thread reusing the run_id doesn't see its frames
+        assert not await event_log.has_run(("thread_2", "run_1"))
+
+        run.allowed_frames.release()
+        run.allowed_frames.release()
+        return [frame async for frame in event_log.resume(RUN_KEY, after=1)]
+
+    assert asyncio.run(main()) == [b"id: run_1:2\ndata: 1\n\n", b"id: run_1:3\ndata: 2\n\n"]
+
+
+def test_has_run_reads_the_backend(tmp_path):
+    backend = SqliteEventLogBackend(str(tmp_path / "events.db"))
+    # Appended by another worker, written in the background
+    backend.append(RUN_KEY, 1, b"data: 0\n\n")
+    deadline = time.monotonic() + 5
+    while not backend.has_run(RUN_KEY) and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    async def main() -> List[bool]:
+        event_log = RunEventLog(backend=backend)
+        return [
+            await event_log.has_run(RUN_KEY),
+            await event_log.has_run(("thread_1", "run_2")),
+            # Known within its thread only
+            await event_log.has_run(("thread_2", "run_1")),
+        ]
+
+    assert asyncio.run(main()) == [True, False, False]
+
+
+def test_frames_over_the_limits_are_dropped_from_memory(tmp_path):
+    async def frames() -> AsyncIterator[bytes]:
+        for index in range(10):
+            # Lets the client follow the run live
+            await asyncio.sleep(0.001)
+            yield f"data: {index}\n\n".encode()
+
+    async def main(backend=None) -> List[bytes]:
+        event_log = RunEventLog(backend=backend, max_run_frames=3, max_bytes=0)
+        run_key = ("thread_1", "run_1")
+        live = [frame async for frame in event_log.stream(run_key, frames)]
+        assert len(live) == 10
+        # Finished and over max_bytes, the run is dropped from memory altogether
+        assert run_key not in event_log.runs and event_log.size == 0
+
+        event_log = RunEventLog(backend=backend, max_run_frames=3)
+        run_key = ("thread_1", "run_2")
+        assert len([frame async for frame in event_log.stream(run_key, frames)]) == 10
+        assert len(event_log.runs[run_key].frames) == 3
+        # The frames dropped from memory are replayed from the backend, if any
+        if backend is not None:
+            deadline = time.monotonic() + 5
+            while len(backend.read(run_key, 0)[0]) < 10 and time.monotonic() < deadline:
+                await asyncio.sleep(0.01)
+        return [frame async for frame in event_log.resume(run_key, after=5)]
+
+    assert asyncio.run(main()) == []
+    replayed = asyncio.run(main(SqliteEventLogBackend(str(tmp_path / "events.db"))))
+    assert replayed == [f"id: run_2:{seq}\ndata: {seq - 1}\n\n".encode() for seq in range(6, 11)]
@@ -0,0 +1,77 @@
+"""Accounting of the runs waiting for a thread of the RunExecutor."""
+
+import asyncio
+import threading
+from typing import Iterator, List
+
+import pytest
+
+from lib.app.agui.executor import RunExecutor
+
+
+def blocking_events(release: threading.Event) -> Iterator[int]:
+    yield 1
+    release.wait(timeout=5)
+    yield 2
+
+
+async def consume(executor: RunExecutor, events: Iterator[int]) -> List[int]:
+    return [item async for item in executor.stream(events)]
+
+
+async def wait_for(condition) -> None:
+    for _ in range(500):
+        if condition():
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("Timed out")
+
+
+def test_cancelled_waiting_run_is_not_counted():
+    executor = RunExecutor(max_workers=1)
+    release = threading.Event()
+    started: List[str] = []
+
+    def waiting_events() -> Iterator[int]:
+        started.append("waiting")
+        yield 3
+
+    async def run() -> List[int]:
+        running = asyncio.create_task(consume(executor, blocking_events(release)))
+        await wait_for(lambda: executor.stats.active_runs == 1)
+        waiting = asyncio.create_task(consume(executor, waiting_events()))
+        await wait_for(lambda: executor.stats.waiting_runs == 1)
+
+        waiting.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+        assert executor.stats.waiting_runs == 0
+
+        release.set()
+        return await running
+
+    assert asyncio.run(run()) == [1, 2]
+    assert executor.stats.active_runs == 0
+    assert not started
+    executor.shutdown()
+
+
+def test_shutdown_ends_waiting_runs():
+    executor = RunExecutor(max_workers=1)
+    release = threading.Event()
+
+    async def run() -> None:
+        running = asyncio.create_task(consume(executor, blocking_events(release)))
+        await wait_for(lambda: executor.stats.active_runs == 1)
+        waiting = asyncio.create_task(consume(executor, iter([3])))
+        await wait_for(lambda: executor.stats.waiting_runs == 1)
+
+        executor.shutdown()
+        with pytest.raises(RuntimeError):
+            await waiting
+        assert executor.stats.waiting_runs == 0
+
+        release.set()
+        assert await running == [1, 2]
+
+    asyncio.run(run())
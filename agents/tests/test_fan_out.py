@@ -0,0 +1,201 @@
+"""Team members run concurrently ahead of the leader, their responses interleaved on one AG-UI stream."""
+
+import asyncio
+import json
+from types import SimpleNamespace
+from typing import AsyncIterator, Dict, List
+
+import pytest
+from ag_ui.core import BaseEvent, EventType
+from fastapi import FastAPI
+from starlette.testclient import TestClient
+
+from benchmarks.synthetic import Chunk, ChunkFactory, SyntheticRunner
+from lib.app.agui.async_router import get_async_agui_router
+from lib.app.agui.events import text_message_content, text_message_end, text_message_start
+from lib.app.agui.fan_out import MemberFanOut, get_synthesis_messages, multiplex_event_streams, stream_member_fan_out
+
+RUN_INPUT = {
+    "threadId": "thread_1",
+    "runId": "run_1",
+    "state": {},
+    "tools": [],
+    "context": [],
+    "forwardedProps": {},
+    "messages": [{"id": "1", "role": "user", "content": "How is AAPL doing?"}],
+}
+
+
+class Member(SyntheticRunner):
+    """A member replaying an Agent run, recording the tasks it's given."""
+
+    def __init__(self, name: str, seed: int, chunk_delay: float = 0.001):
+        super().__init__(ChunkFactory(seed).agent_run(name, text_deltas=4, tool_calls=1), chunk_delay)
+        self.name = name
+        self.tasks: List[str] = []
+
+    async def arun(self, message, *args, **kwargs) -> AsyncIterator[Chunk]:
+        self.tasks.append(message)
+        return await super().arun(message, *args, **kwargs)
+
+
+class Leader(SyntheticRunner):
+    """A team replaying a short answer, recording the messages it's given."""
+
+    def __init__(self, members: List[Member]):
+        super().__init__(ChunkFactory(0).agent_run("Investment Advisor Team", text_deltas=2))
+        self.name = "Investment Advisor Team"
+        self.members = members
+        self.storage = None
+        self.messages: List[List[str]] = []
+
+    async def arun(self, message, *args, **kwargs) -> AsyncIterator[Chunk]:
+        self.messages.append(message)
+        return await super().arun(message, *args, **kwargs)
+
+
+def get_members() -> List[Member]:
+    return [Member("Stock Price Agent", 1), Member("Company News Agent", 2), Member("Stock Summary Agent", 3)]
+
+
+def get_content(member: Member) -> str:
+    return "".join(chunk.content for chunk in member.chunks if isinstance(chunk.content, str))  # type: ignore
+
+
+async def collect(events: AsyncIterator[BaseEvent]) -> List[BaseEvent]:
+    return [event async for event in events]
+
+
+def test_streams_are_interleaved_per_event():
+    turns = [asyncio.Event() for _ in range(7)]
+
+    async def stream(message_id: str, steps: List[int]) -> AsyncIterator[BaseEvent]:
+        events = [
+            text_message_start(message_id=message_id, role="assistant"),
+            text_message_content(message_id=message_id, delta=message_id),
+            text_message_end(message_id=message_id),
+        ]
+        for step, event in zip(steps, events):
+            await turns[step].wait()
+            yield event
+            turns[step + 1].set()
+
+    async def main() -> List[BaseEvent]:
+        turns[0].set()
+        return await collect(multiplex_event_streams([stream("a", [0, 2, 4]), stream("b", [1, 3, 5])]))
+
+    events = asyncio.run(main())
+
+    # The messages are in progress at the same time, each in its own order
+    assert [(event.type, event.message_id) for event in events] == [  # type: ignore
+        (EventType.TEXT_MESSAGE_START, "a"),
+        (EventType.TEXT_MESSAGE_START, "b"),
+        (EventType.TEXT_MESSAGE_CONTENT, "a"),
+        (EventType.TEXT_MESSAGE_CONTENT, "b"),
+        (EventType.TEXT_MESSAGE_END, "a"),
+        (EventType.TEXT_MESSAGE_END, "b"),
+    ]
+
+
+def test_a_failed_member_cancels_the_others():
+    other_closed = asyncio.Event()
+
+    async def failing() -> AsyncIterator[BaseEvent]:
+        yield text_message_start(message_id="a", role="assistant")
+        await asyncio.sleep(0.01)
+        raise RuntimeError("Stock Price Agent failed")
+
+    async def pending() -> AsyncIterator[BaseEvent]:
+        try:
+            yield text_message_start(message_id="b", role="assistant")
+            await asyncio.Event().wait()
+        finally:
+            other_closed.set()
+
+    async def main() -> List[BaseEvent]:
+        events: List[BaseEvent] = []
+        with pytest.raises(RuntimeError, match="Stock Price Agent failed"):
+            async for event in multiplex_event_streams([failing(), pending()]):
+                events.append(event)
+        assert other_closed.is_set()
+        return events
+
+    assert {event.message_id for event in asyncio.run(main())} == {"a", "b"}  # type: ignore
+
+
+def test_only_the_listed_members_run_on_their_tasks():
+    members = get_members()
+    price, news, summary = members
+    member_fan_out = MemberFanOut(
+        members=[news.name, price.name], tasks={news.name: "Get the latest news for the request: {request}"}
+    )
+    member_outputs: Dict[str, str] = {}
+
+    events = asyncio.run(
+        collect(
+            stream_member_fan_out(
+                SimpleNamespace(name="Investment Advisor Team", members=members),  # type: ignore
+                member_fan_out,
+                ["How is", "AAPL doing?"],
+                "thread_1",
+                member_outputs,
+            )
+        )
+    )
+
+    assert price.tasks == ["How is\nAAPL doing?"]
+    assert news.tasks == ["Get the latest news for the request: How is\nAAPL doing?"]
+    assert not summary.tasks
+    assert list(member_outputs.items()) == [(news.name, get_content(news)), (price.name, get_content(price))]
+    # Each member streams its text under a message id of its own
+    message_ids = [event.message_id for event in events if event.type == EventType.TEXT_MESSAGE_START]  # type: ignore
+    assert len(message_ids) == len(set(message_ids)) == 2
+
+
+def test_unknown_members_are_rejected():
+    leader = Leader(get_members())
+
+    with pytest.raises(ValueError, match="Stock Ticker Agent"):
+        get_async_agui_router(team=leader, member_fan_out=MemberFanOut(members=["Stock Ticker Agent"]))  # type: ignore
+    member_fan_out = MemberFanOut(members=["Stock Price Agent"], tasks={"Stock Ticker Agent": "{request}"})
+    with pytest.raises(ValueError, match="Stock Ticker Agent"):
+        member_fan_out.get_members(leader)  # type: ignore
+
+
+def test_synthesis_messages_carry_the_member_responses():
+    messages = get_synthesis_messages(
+        ["How is AAPL doing?"], {"Stock Price Agent": "AAPL is at 210.", "Company News Agent": "AAPL beat estimates."}
+    )
+
+    assert messages[0] == "How is AAPL doing?"
+    assert messages[1] == (
+        "The team members Stock Price Agent, Company News Agent already worked on this request in parallel. Do not "
+        "transfer tasks to them again, respond to the request using their responses:\n\n"
+        "Stock Price Agent:\nAAPL is at 210.\n\nCompany News Agent:\nAAPL beat estimates."
+    )
+
+
+def test_leader_responds_after_the_members():
+    members = get_members()
+    price, news, summary = members
+    leader = Leader(members)
+    app = FastAPI()
+    app.include_router(
+        get_async_agui_router(team=leader, member_fan_out=MemberFanOut(members=[price.name, news.name]))  # type: ignore
+    )
+
+    with TestClient(app) as client:
+        response = client.post("/agui", json=RUN_INPUT)
+
+    events = [json.loads(frame[len("data: ") :]) for frame in response.text.split("\n\n") if frame]
+    types = [event["type"] for event in events]
+    assert types[0] == "RUN_STARTED" and types[-1] == "RUN_FINISHED"
+    assert leader.messages == [
+        get_synthesis_messages(["How is AAPL doing?"], {price.name: get_content(price), news.name: get_content(news)})
+    ]
+    assert not summary.tasks
+    # The leader's answer follows every event of the members
+    leader_message_id = [event for event in events if event["type"] == "TEXT_MESSAGE_START"][-1]["messageId"]
+    leader_events = [index for index, event in enumerate(events) if event.get("messageId") == leader_message_id]
+    member_events = [index for index, event in enumerate(events[1:-1], 1) if index not in leader_events]
+    assert max(member_events) < min(leader_events)
@@ -0,0 +1,118 @@
+"""History of the runs kept within a token budget by the HistoryCompactor, the older turns summarized."""
+
+from typing import List, Optional, Tuple
+
+from agno.models.message import Message
+from lib.app.agui.history import SUMMARY_PREFIX, HistoryCompactor, HistoryWindowConfig, estimate_message_tokens
+
+# Each turn takes 14 + 24 = 38 estimated tokens, two of them fitting in the 80 tokens left next to the summary
+CONFIG = HistoryWindowConfig(max_tokens=100, summary_max_tokens=20)
+
+
+class RecordingSummarizer:
+    """Summarizes turns into the list of their message contents, recording its calls."""
+
+    def __init__(self):
+        self.calls: List[Tuple[Optional[str], List[Message]]] = []
+
+    def __call__(self, summary: Optional[str], messages: List[Message]) -> str:
+        self.calls.append((summary, messages))
+        return ",".join([summary] * (summary is not None) + [str(message.content)[:3] for message in messages])
+
+
+def turn(index: int) -> List[Message]:
+    return [
+        Message(role="user", content=f"u{index:02d}".ljust(40, ".")),
+        Message(role="assistant", content=f"a{index:02d}".ljust(80, ".")),
+    ]
+
+
+def history(turns: int) -> List[Message]:
+    return [message for index in range(turns) for message in turn(index)]
+
+
+def test_history_within_the_budget_is_passed_as_is():
+    summarizer = RecordingSummarizer()
+    compactor = HistoryCompactor(CONFIG, summarizer)
+    messages = history(2)
+
+    assert compactor.compact("thread_1", messages) is messages
+    assert not summarizer.calls and not compactor.summaries
+
+
+def test_turns_outside_of_the_window_are_summarized_in_a_system_message():
+    summarizer = RecordingSummarizer()
+    compactor = HistoryCompactor(CONFIG, summarizer)
+    messages = history(5)
+
+    window = compactor.compact("thread_1", messages)
+
+    assert window[1:] == messages[6:]
+    assert window[0].role == "system"
+    assert window[0].content == SUMMARY_PREFIX + "u00,a00,u01,a01,u02,a02"
+    assert summarizer.calls == [(None, messages[:6])]
+    assert sum(estimate_message_tokens(message) for message in window) <= CONFIG.max_tokens
+
+
+def test_the_latest_turn_is_kept_whatever_its_size():
+    compactor = HistoryCompactor(CONFIG, RecordingSummarizer())
+    messages = history(2) + [Message(role="user", content="u02" + "." * 1000)]
+
+    assert compactor.compact("thread_1", messages)[1:] == messages[4:]
+
+
+def test_max_turns_limits_the_window():
+    config = HistoryWindowConfig(max_tokens=100, summary_max_tokens=20, max_turns=1)
+    compactor = HistoryCompactor(config, RecordingSummarizer())
+    messages = history(2)
+
+    assert compactor.compact("thread_1", messages)[1:] == messages[2:]
+
+
+def test_the_summary_is_updated_with_the_turns_leaving_the_window():
+    summarizer = RecordingSummarizer()
+    compactor = HistoryCompactor(CONFIG, summarizer)
+    messages = history(5)
+    compactor.compact("thread_1", messages)
+
+    # The client resends the thread with a new turn, as new message objects
+    window = compactor.compact("thread_1", history(6))
+
+    # Only the turn leaving the window is summarized, on top of the cached summary
+    assert summarizer.calls[1] == ("u00,a00,u01,a01,u02,a02", turn(3))
+    assert window[0].content == SUMMARY_PREFIX + "u00,a00,u01,a01,u02,a02,u03,a03"
+    assert window[1:] == history(6)[8:]
+
+    # Resending the same thread reuses the summary as is
+    assert compactor.compact("thread_1", history(6)) == window
+    assert len(summarizer.calls) == 2
+
+
+def test_the_thread_is_summarized_again_when_its_history_was_edited():
+    summarizer = RecordingSummarizer()
+    compactor = HistoryCompactor(CONFIG, summarizer)
+    compactor.compact("thread_1", history(5))
+
+    edited = history(6)
+    edited[2] = Message(role="user", content="e01".ljust(40, "."))
+    window = compactor.compact("thread_1", edited)
+
+    assert summarizer.calls[1] == (None, edited[:8])
+    assert window[0].content == SUMMARY_PREFIX + "u00,a00,e01,a01,u02,a02,u03,a03"
+
+    # As when the history got shorter than the summarized messages
+    window = compactor.compact("thread_1", history(4))
+    assert summarizer.calls[2] == (None, history(4)[:4])
+    assert window[0].content == SUMMARY_PREFIX + "u00,a00,u01,a01"
+
+
+def test_summaries_are_kept_per_thread():
+    summarizer = RecordingSummarizer()
+    compactor = HistoryCompactor(CONFIG, summarizer, max_threads=1)
+    compactor.compact("thread_1", history(5))
+    compactor.compact("thread_2", history(5))
+
+    # The least recently used thread was dropped, it's summarized again
+    compactor.compact("thread_1", history(5))
+    assert [summary for summary, _ in summarizer.calls] == [None, None, None]
+    assert list(compactor.summaries) == ["thread_1"]
@@ -0,0 +1,191 @@
+"""Uploads read by the MediaIntake, and the pruning of the stored ones."""
+
+import asyncio
+import gc
+import io
+import os
+import subprocess
+import sys
+from typing import Any, AsyncIterator, Dict, List, Tuple
+
+import pytest
+from fastapi import FastAPI, HTTPException, UploadFile
+from starlette.datastructures import Headers
+from starlette.requests import Request
+from starlette.testclient import TestClient
+
+from benchmarks.synthetic import Chunk, SyntheticRunner, build_scenario
+from lib.app.agui.async_router import get_async_agui_router
+from lib.app.utils import MediaIntake, UploadLimits, process_document
+
+
+def upload(content: bytes, filename: str, content_type: str) -> UploadFile:
+    return UploadFile(file=io.BytesIO(content), filename=filename, headers=Headers({"content-type": content_type}))
+
+
+def video(index: int) -> UploadFile:
+    return upload(bytes([index]) * 4096, f"clip_{index}.mp4", "video/mp4")
+
+
+class RecordingRunner(SyntheticRunner):
+    """Replays a short answer, recording the arguments of its runs."""
+
+    def __init__(self):
+        super().__init__(build_scenario("long_text")[:3])
+        self.kwargs: List[Dict[str, Any]] = []
+
+    async def arun(self, *args, **kwargs) -> AsyncIterator[Chunk]:
+        self.kwargs.append(kwargs)
+        return await super().arun(*args, **kwargs)
+
+
+def test_held_uploads_are_not_pruned(tmp_path):
+    intake = MediaIntake(directory=tmp_path, spool_threshold=1024, max_stored_bytes=4096)
+
+    first = intake.process_uploads([video(1)])
+    second = intake.process_uploads([video(2)])
+
+    # Over max_stored_bytes, but the first run still reads its upload
+    assert first.paths[0].exists() and second.paths[0].exists()
+
+    first.release()
+    third = intake.process_uploads([video(3)])
+    assert not first.paths[0].exists()
+    assert second.paths[0].exists() and third.paths[0].exists()
+
+
+def test_uploads_are_released_once_the_media_are_collected(tmp_path):
+    intake = MediaIntake(directory=tmp_path, spool_threshold=1024, max_stored_bytes=4096)
+
+    path = intake.process_uploads([video(1)]).paths[0]
+    gc.collect()
+    assert not intake.holders
+
+    second = intake.process_uploads([video(2)])
+    assert not path.exists()
+    assert list(intake.holders) == [str(second.paths[0])]
+
+
+def test_failed_uploads_release_the_stored_ones(tmp_path):
+    intake = MediaIntake(directory=tmp_path, spool_threshold=1024)
+
+    with pytest.raises(HTTPException) as failure:
+        intake.process_uploads([video(1), upload(b"", "notes.pdf", "application/pdf")])
+
+    assert failure.value.status_code == 400
+    assert not intake.holders
+
+
+def test_process_document_returns_none_for_an_empty_document(tmp_path):
+    intake = MediaIntake(directory=tmp_path)
+
+    assert process_document(upload(b"", "notes.pdf", "application/pdf"), intake) is None
+    assert process_document(upload(b"AAPL", "notes.pdf", "application/pdf"), intake).content == b"AAPL"  # type: ignore
+
+
+RUN_INPUT = (
+    '{"threadId":"thread_1","runId":"run_1","state":{},"tools":[],"context":[],"forwardedProps":{},'
+    '"messages":[{"id":"1","role":"user","content":"What is in this clip?"}]}'
+)
+
+
+def multipart_body(boundary: str, content: bytes) -> bytes:
+    return (
+        f'--{boundary}\r\nContent-Disposition: form-data; name="run_input"\r\n\r\n{RUN_INPUT}\r\n'
+        f'--{boundary}\r\nContent-Disposition: form-data; name="files"; filename="clip.mp4"\r\n'
+        "Content-Type: video/mp4\r\n\r\n"
+    ).encode() + content + f"\r\n--{boundary}--\r\n".encode()
+
+
+def form_request(body: bytes, chunk_size: int, content_length: bool) -> Tuple[Request, List[int]]:
+    """A request streaming the multipart body in chunks, recording the chunks pulled."""
+    pulled: List[int] = []
+    chunks = [body[start : start + chunk_size] for start in range(0, len(body), chunk_size)]
+    headers = [(b"content-type", b"multipart/form-data; boundary=boundary")]
+    if content_length:
+        headers.append((b"content-length", str(len(body)).encode()))
+
+    async def receive() -> Dict[str, Any]:
+        index = len(pulled)
+        pulled.append(index)
+        return {"type": "http.request", "body": chunks[index], "more_body": index < len(chunks) - 1}
+
+    scope = {"type": "http", "method": "POST", "path": "/agui/multipart", "headers": headers, "query_string": b""}
+    return Request(scope, receive), pulled
+
+
+@pytest.mark.parametrize("content_length", [True, False])
+def test_forms_within_the_request_limit_are_parsed(tmp_path, content_length: bool):
+    intake = MediaIntake(directory=tmp_path, limits=UploadLimits(request=64 * 1024))
+    request, _ = form_request(multipart_body("boundary", b"\x00" * 4096), 1024, content_length)
+
+    async def main() -> Tuple[str, bytes]:
+        form = await intake.read_form(request)
+        try:
+            return form["run_input"], await form["files"].read()  # type: ignore
+        finally:
+            await form.close()
+
+    assert asyncio.run(main()) == (RUN_INPUT, b"\x00" * 4096)
+
+
+def test_requests_over_the_limit_are_rejected_before_their_body_is_read(tmp_path):
+    intake = MediaIntake(directory=tmp_path, limits=UploadLimits(request=64 * 1024))
+    request, pulled = form_request(multipart_body("boundary", b"\x00" * 1024 * 1024), 1024, content_length=True)
+
+    with pytest.raises(HTTPException) as rejection:
+        asyncio.run(intake.read_form(request))
+
+    assert rejection.value.status_code == 413
+    assert not pulled
+
+
+def test_requests_without_a_content_length_stop_being_read_over_the_limit(tmp_path):
+    intake = MediaIntake(directory=tmp_path, limits=UploadLimits(request=64 * 1024))
+    request, pulled = form_request(multipart_body("boundary", b"\x00" * 1024 * 1024), 1024, content_length=False)
+
+    with pytest.raises(HTTPException) as rejection:
+        asyncio.run(intake.read_form(request))
+
+    assert rejection.value.status_code == 413
+    assert len(pulled) == 65
+
+
+def test_multipart_runs_get_their_uploads_as_media(tmp_path):
+    runner = RecordingRunner()
+    intake = MediaIntake(directory=tmp_path, spool_threshold=1024, limits=UploadLimits(request=64 * 1024))
+    app = FastAPI()
+    app.include_router(get_async_agui_router(agent=runner, media_intake=intake))  # type: ignore
+    files = {"files": ("clip.mp4", b"\x01" * 4096, "video/mp4")}
+
+    with TestClient(app) as client:
+        response = client.post("/agui/multipart", data={"run_input": RUN_INPUT}, files=files)
+        assert response.status_code == 200
+        assert '"type":"RUN_FINISHED"' in response.text
+        (video,) = runner.kwargs[0]["videos"]
+        assert video.filepath.read_bytes() == b"\x01" * 4096
+
+        files = {"files": ("clip.mp4", b"\x01" * 128 * 1024, "video/mp4")}
+        response = client.post("/agui/multipart", data={"run_input": RUN_INPUT}, files=files)
+        assert response.status_code == 413
+        assert len(runner.kwargs) == 1
+
+        files = {"files": ("clip.mp4", b"\x01", "video/mp4")}
+        response = client.post("/agui/multipart", data={"runInput": RUN_INPUT}, files=files)
+        assert response.status_code == 422
+
+
+def test_processes_store_their_uploads_apart(tmp_path):
+    exited = subprocess.Popen([sys.executable, "-c", "pass"])
+    exited.wait()
+    (tmp_path / f"process-{exited.pid}").mkdir()
+    (tmp_path / f"process-{exited.pid}" / "stale.mp4").write_bytes(b"\x01")
+    (tmp_path / f"process-{os.getppid()}").mkdir()
+
+    intake = MediaIntake(directory=tmp_path, spool_threshold=1024, per_process=True)
+    path = intake.process_uploads([video(1)]).paths[0]
+
+    assert path.parent == tmp_path / f"process-{os.getpid()}"
+    # The uploads of the processes that are gone are removed, not those of the running ones
+    assert not (tmp_path / f"process-{exited.pid}").exists()
+    assert (tmp_path / f"process-{os.getppid()}").exists()
@@ -0,0 +1,84 @@
+"""The messages prepared through the AGUIMessageCache, checked against their uncached conversion."""
+
+import random
+from typing import Any, Dict, List
+
+import pytest
+from ag_ui.core import AssistantMessage, FunctionCall, RunAgentInput, ToolCall, ToolMessage, UserMessage
+from ag_ui.core.types import Message as AGUIMessage
+from agno.models.message import Message
+
+from lib.app.agui.utils import AGUIMessageCache, prepare_agno_messages
+
+
+def random_message(rng: random.Random, index: int) -> AGUIMessage:
+    kind = rng.random()
+    content = f"message {index} " * rng.randint(1, 3)
+    if kind < 0.4:
+        return UserMessage(id=f"user_{index}", role="user", content=content)
+    if kind < 0.8:
+        return AssistantMessage(id=f"assistant_{index}", role="assistant", content=content)
+    if kind < 0.9:
+        tool_call = ToolCall(
+            id=f"call_{index}", type="function", function=FunctionCall(name="tool", arguments='{"ticker":"AAPL"}')
+        )
+        return AssistantMessage(id=f"assistant_{index}", role="assistant", tool_calls=[tool_call])
+    return ToolMessage(id=f"tool_{index}", role="tool", tool_call_id=f"call_{index - 1}", content=content)
+
+
+def resend(rng: random.Random, thread: List[AGUIMessage], index: int) -> List[AGUIMessage]:
+    """The thread of the next turn: new messages, an edited or regenerated message, or a truncated thread."""
+    kind = rng.random()
+    if kind < 0.6 or not thread:
+        return thread + [random_message(rng, index + offset) for offset in range(rng.randint(1, 3))]
+    if kind < 0.8:
+        edited = rng.randrange(len(thread))
+        message = thread[edited].model_copy(update={"content": f"edited {index}"})
+        return thread[:edited] + [message] + thread[edited + 1 :]
+    return thread[: rng.randrange(len(thread))]
+
+
+def dump(messages: List[Message]) -> List[Dict[str, Any]]:
+    # Except when the messages were converted, which the cached ones keep from their first turn
+    return [message.model_dump(exclude={"created_at"}) for message in messages]
+
+
+def run_input(thread_id: str, thread: List[AGUIMessage]) -> RunAgentInput:
+    return RunAgentInput(
+        thread_id=thread_id, run_id="run", state={}, messages=thread, tools=[], context=[], forwarded_props={}
+    )
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_cached_messages_match_uncached_conversion(seed: int):
+    rng = random.Random(seed)
+    message_cache = AGUIMessageCache(max_threads=2)
+    threads: List[List[AGUIMessage]] = [[], [], []]
+    for turn in range(60):
+        thread_index = rng.randrange(len(threads))
+        threads[thread_index] = resend(rng, threads[thread_index], turn * 10)
+        turn_input = run_input(f"thread_{thread_index}", threads[thread_index])
+
+        cached = prepare_agno_messages(turn_input, message_cache)
+        expected = prepare_agno_messages(turn_input)
+        assert dump(cached) == dump(expected)
+
+        # Agno mutates the messages of a run, which mustn't leak into the next turn
+        for message in cached:
+            message.content = "changed by the run"
+
+    stats = message_cache.stats
+    assert stats.hits and stats.misses and stats.evictions
+
+
+def test_stats_count_reused_and_converted_messages():
+    message_cache = AGUIMessageCache()
+    thread: List[AGUIMessage] = [
+        UserMessage(id="1", role="user", content="How is AAPL doing?"),
+        AssistantMessage(id="2", role="assistant", content="Up 2% today."),
+    ]
+    prepare_agno_messages(run_input("thread", thread), message_cache)
+    thread.append(UserMessage(id="3", role="user", content="And TSLA?"))
+    prepare_agno_messages(run_input("thread", thread), message_cache)
+
+    assert message_cache.stats.to_dict() == {"hits": 2, "misses": 3, "evictions": 0}
@@ -0,0 +1,71 @@
+"""Size accounting of the CachedStorage, estimated in the background."""
+
+import threading
+import time
+from typing import Callable, List
+
+from agno.storage.session.team import TeamSession
+from agno.storage.sqlite import SqliteStorage
+
+from lib.storage import CachedStorage
+
+
+def team_session(session_id: str, content: str) -> TeamSession:
+    return TeamSession(session_id=session_id, team_id="team", memory={"runs": [content]}, created_at=int(time.time()))
+
+
+def wait_until(predicate: Callable[[], bool], timeout: float = 5) -> None:
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_sizes_are_estimated_off_the_upserting_thread(tmp_path):
+    sizing_threads: List[str] = []
+    upserted = threading.Event()
+
+    def size_of(session: TeamSession) -> int:
+        upserted.wait()
+        sizing_threads.append(threading.current_thread().name)
+        return len(session.memory["runs"][0])  # type: ignore
+
+    storage = SqliteStorage(table_name="sessions", db_file=str(tmp_path / "sessions.db"), mode="team")
+    cached_storage = CachedStorage(storage, max_bytes=250, size_of=size_of)
+
+    for index in range(3):
+        cached_storage.upsert(team_session(f"session_{index}", "x" * 100))
+    assert cached_storage.stats.entries == 3
+    assert cached_storage.stats.resident_bytes == 0
+    upserted.set()
+
+    # The least recently used session is evicted once the sizes are known
+    wait_until(lambda: cached_storage.stats.evictions == 1)
+    assert sizing_threads == ["session-cache-sizer"] * 3
+    assert list(cached_storage.sessions) == ["session_1", "session_2"]
+    assert cached_storage.stats.resident_bytes == 200
+    assert cached_storage.stats.entries == 2
+
+
+def test_replaced_sessions_are_sized_again(tmp_path):
+    storage = SqliteStorage(table_name="sessions", db_file=str(tmp_path / "sessions.db"), mode="team")
+    cached_storage = CachedStorage(storage, size_of=lambda session: len(session.memory["runs"][0]))  # type: ignore
+
+    cached_storage.upsert(team_session("session", "x" * 100))
+    wait_until(lambda: cached_storage.stats.resident_bytes == 100)
+    cached_storage.upsert(team_session("session", "x" * 150))
+
+    wait_until(lambda: cached_storage.stats.resident_bytes == 150)
+    assert cached_storage.stats.entries == 1
+
+
+def test_sessions_larger_than_the_cache_are_dropped(tmp_path):
+    storage = SqliteStorage(table_name="sessions", db_file=str(tmp_path / "sessions.db"), mode="team")
+    cached_storage = CachedStorage(storage, max_bytes=50, size_of=lambda session: 100)
+
+    cached_storage.upsert(team_session("session", "content"))
+
+    wait_until(lambda: not cached_storage.sessions)
+    assert cached_storage.stats.entries == 0
+    assert cached_storage.stats.resident_bytes == 0
+    assert cached_storage.read("session") is not None
@@ -0,0 +1,138 @@
+"""Results of the local get_company_news tool served by the ToolResultCache, without any network call."""
+
+import asyncio
+import threading
+import time
+from typing import List, Optional
+
+import pytest
+
+from agents.company_news_agent import get_company_news
+from lib.tools import ToolResultCache
+
+
+class CountedNews:
+    """The local get_company_news, counting its calls and optionally holding them until released."""
+
+    def __init__(self, gate: Optional[threading.Event] = None):
+        self.calls: List[str] = []
+        self.gate = gate
+
+    def __call__(self, company_name: str) -> Optional[str]:
+        self.calls.append(company_name)
+        if self.gate is not None:
+            self.gate.wait(timeout=5)
+        return get_company_news(company_name)
+
+
+def test_normalized_calls_hit_the_cache():
+    cache = ToolResultCache()
+    news = CountedNews()
+    cached_news = cache.wrap_callable(news, name="get_company_news")
+
+    assert cached_news("Tesla") == get_company_news("tesla")
+    assert cached_news("  tesla ") == get_company_news("tesla")
+    assert cached_news(company_name="TESLA") == get_company_news("tesla")
+    assert cached_news("Ford") is None
+
+    assert news.calls == ["Tesla", "Ford"]
+    assert (cache.stats.hits, cache.stats.misses) == (2, 2)
+
+
+def test_concurrent_sync_calls_share_one_upstream_call():
+    cache = ToolResultCache()
+    news = CountedNews(gate=threading.Event())
+    cached_news = cache.wrap_callable(news, name="get_company_news")
+    results: List[Optional[str]] = []
+
+    threads = [threading.Thread(target=lambda: results.append(cached_news("tesla"))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    deadline = time.monotonic() + 5
+    while cache.stats.coalesced < 4 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    news.gate.set()  # type: ignore
+    for thread in threads:
+        thread.join()
+
+    assert news.calls == ["tesla"]
+    assert results == [get_company_news("tesla")] * 5
+    assert (cache.stats.misses, cache.stats.coalesced) == (1, 4)
+
+
+def test_concurrent_async_calls_share_one_upstream_call():
+    cache = ToolResultCache()
+    calls: List[str] = []
+
+    async def get_company_news_async(company_name: str) -> Optional[str]:
+        calls.append(company_name)
+        await asyncio.sleep(0.01)
+        return get_company_news(company_name)
+
+    cached_news = cache.wrap_callable(get_company_news_async, name="get_company_news")
+
+    async def main() -> List[Optional[str]]:
+        return await asyncio.gather(*(cached_news("Tesla") for _ in range(5)))
+
+    assert asyncio.run(main()) == [get_company_news("tesla")] * 5
+    assert calls == ["Tesla"]
+    assert (cache.stats.misses, cache.stats.coalesced) == (1, 4)
+
+
+def test_failed_calls_are_not_cached():
+    cache = ToolResultCache()
+    calls: List[str] = []
+
+    def failing_news(company_name: str) -> str:
+        calls.append(company_name)
+        raise ConnectionError("News API unavailable")
+
+    cached_news = cache.wrap_callable(failing_news, name="get_company_news")
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            cached_news("tesla")
+
+    assert calls == ["tesla", "tesla"]
+    assert not cache.entries
+
+
+def test_results_expire_after_their_ttl():
+    cache = ToolResultCache(default_ttl=60, ttls={"get_company_news": 0.05})
+    news = CountedNews()
+    cached_news = cache.wrap_callable(news, name="get_company_news")
+
+    cached_news("tesla")
+    cached_news("tesla")
+    time.sleep(0.1)
+    cached_news("tesla")
+
+    assert len(news.calls) == 2
+    assert (cache.stats.hits, cache.stats.misses, cache.stats.expirations) == (1, 2, 1)
+
+
+def test_zero_ttl_disables_caching():
+    cache = ToolResultCache(ttls={"get_company_news": 0})
+    news = CountedNews()
+    cached_news = cache.wrap_callable(news, name="get_company_news")
+
+    cached_news("tesla")
+    cached_news("tesla")
+
+    assert len(news.calls) == 2
+    assert cache.stats.to_dict() == {"hits": 0, "misses": 0, "coalesced": 0, "evictions": 0, "expirations": 0}
+
+
+def test_least_recently_used_results_are_evicted():
+    cache = ToolResultCache(max_entries=2)
+    news = CountedNews()
+    cached_news = cache.wrap_callable(news, name="get_company_news")
+
+    cached_news("tesla")
+    cached_news("ford")
+    cached_news("tesla")  # Ford is now the least recently used
+    cached_news("gm")
+    cached_news("tesla")
+    cached_news("ford")
+
+    assert news.calls == ["tesla", "ford", "gm", "ford"]
+    assert (cache.stats.hits, cache.stats.misses, cache.stats.evictions) == (2, 4, 2)
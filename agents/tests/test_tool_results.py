@@ -0,0 +1,53 @@
+"""Full tool results shared by the workers through the SQLite file of a SqliteToolResultStore."""
+
+import time
+from typing import Optional
+
+from lib.app.agui.payloads import SqliteToolResultStore
+
+
+def wait_for_result(store: SqliteToolResultStore, tool_call_id: str) -> Optional[str]:
+    """Get the result once the writer of the other store persisted it."""
+    deadline = time.monotonic() + 5
+    content = store.get(tool_call_id)
+    while content is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+        content = store.get(tool_call_id)
+    return content
+
+
+def test_results_are_served_by_every_worker(tmp_path):
+    db_file = str(tmp_path / "agui.db")
+    worker_0 = SqliteToolResultStore(db_file)
+    worker_1 = SqliteToolResultStore(db_file)
+
+    worker_0.put("call_1", "AAPL " * 1000, 5000)
+
+    assert worker_0.get("call_1") == "AAPL " * 1000
+    assert wait_for_result(worker_1, "call_1") == "AAPL " * 1000
+    assert worker_1.get("call_2") is None
+
+
+def test_results_evicted_from_memory_are_read_back(tmp_path):
+    store = SqliteToolResultStore(str(tmp_path / "agui.db"), max_bytes=10)
+    store.put("call_1", "first result", 12)
+    assert wait_for_result(SqliteToolResultStore(str(tmp_path / "agui.db")), "call_1") is not None
+
+    store.put("call_2", "second result", 13)
+
+    assert "call_1" not in store.results
+    assert store.get("call_1") == "first result"
+
+
+def test_expired_results_are_deleted(tmp_path):
+    db_file = str(tmp_path / "agui.db")
+    worker_0 = SqliteToolResultStore(db_file, ttl=0)
+    reader = SqliteToolResultStore(db_file)
+
+    worker_0.put("call_1", "first result", 12)
+    assert wait_for_result(reader, "call_1") == "first result"
+    time.sleep(0.01)
+    worker_0.put("call_2", "second result", 13)
+    assert wait_for_result(reader, "call_2") == "second result"
+
+    assert reader.get("call_1") is None
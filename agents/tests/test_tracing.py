@@ -0,0 +1,108 @@
+"""Spans of the traced AG-UI runs, exported in memory."""
+
+from typing import Callable, List, Tuple
+
+import pytest
+from fastapi import APIRouter, FastAPI
+from opentelemetry.sdk.trace import ReadableSpan, TracerProvider
+from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+from opentelemetry.trace import SpanKind
+from starlette.testclient import TestClient
+
+from benchmarks.synthetic import SyntheticRunner, build_scenario
+from lib.app.agui.async_router import get_async_agui_router
+from lib.app.agui.sync_router import get_sync_agui_router
+from lib.app.agui.tracing import AGUITracing
+
+RUN_INPUT = {
+    "threadId": "thread_1",
+    "runId": "run_1",
+    "state": {},
+    "tools": [],
+    "context": [],
+    "forwardedProps": {},
+    "messages": [{"id": "1", "role": "user", "content": "How is AAPL doing?"}],
+}
+
+ROUTERS = {"async": get_async_agui_router, "sync": get_sync_agui_router}
+
+
+def run_traced(get_router: Callable[..., APIRouter], sample_ratio: float = 1.0) -> Tuple[List[ReadableSpan], str]:
+    """Post a team run to a traced app, returning the finished spans and the response."""
+    exporter = InMemorySpanExporter()
+    tracer_provider = TracerProvider()
+    tracer_provider.add_span_processor(SimpleSpanProcessor(exporter))
+    app = FastAPI()
+    app.include_router(
+        get_router(
+            agent=SyntheticRunner(build_scenario("team")),
+            tracing=AGUITracing(tracer_provider=tracer_provider, sample_ratio=sample_ratio),
+        )
+    )
+
+    with TestClient(app) as client:
+        response = client.post("/agui", json=RUN_INPUT)
+    assert response.status_code == 200
+    return list(exporter.get_finished_spans()), response.text
+
+
+@pytest.mark.parametrize("router", ROUTERS)
+def test_each_request_has_a_root_span(router: str):
+    spans, _ = run_traced(ROUTERS[router])
+
+    roots = [span for span in spans if span.parent is None]
+    assert [root.name for root in roots] == ["agui.run"]
+    assert roots[0].kind == SpanKind.SERVER
+    assert roots[0].attributes == {"agui.thread_id": "thread_1", "agui.run_id": "run_1"}
+    assert {span.context.trace_id for span in spans} == {roots[0].context.trace_id}
+
+
+def test_members_and_tool_calls_have_child_spans():
+    chunks = build_scenario("team")
+    spans, _ = run_traced(ROUTERS["async"])
+    root = next(span for span in spans if span.parent is None)
+    spans_by_id = {span.context.span_id: span for span in spans}
+
+    # A span per Agent or Team run, under the root span
+    run_names = {chunk.run_id: getattr(chunk, "agent_name", None) or getattr(chunk, "team_name") for chunk in chunks}
+    run_spans = {span.attributes["agno.run_id"]: span for span in spans if span.name.startswith("agno.run ")}
+    assert {run_id: span.name for run_id, span in run_spans.items()} == {
+        run_id: f"agno.run {name}" for run_id, name in run_names.items()
+    }
+    assert all(span.parent.span_id == root.context.span_id for span in run_spans.values())  # type: ignore
+
+    # A span per tool call of the members, under the span of the run calling it. Like their AG-UI events, the transfers
+    # of the Team aren't traced.
+    tool_calls = {chunk.tool.tool_call_id: chunk for chunk in chunks if chunk.event == "ToolCallStarted"}
+    tool_call_spans = {
+        span.attributes["agno.tool_call_id"]: span for span in spans if span.name.startswith("agno.tool_call ")
+    }
+    assert tool_call_spans.keys() == tool_calls.keys()
+    for tool_call_id, span in tool_call_spans.items():
+        chunk = tool_calls[tool_call_id]
+        assert span.name == f"agno.tool_call {chunk.tool.tool_name}"  # type: ignore
+        assert spans_by_id[span.parent.span_id] is run_spans[chunk.run_id]  # type: ignore
+
+
+def test_the_blocking_tool_calls_are_recorded_on_the_root_span():
+    spans, _ = run_traced(ROUTERS["async"])
+    root = next(span for span in spans if span.parent is None)
+
+    blocked = [event for event in root.events if event.name == "agui.buffer.blocked"]
+    unblocked = [event for event in root.events if event.name == "agui.buffer.unblocked"]
+    assert blocked
+    # Every blocking tool call releases the buffer, holding back the text that came meanwhile
+    assert [event.attributes["agui.tool_call_id"] for event in blocked] == [  # type: ignore
+        event.attributes["agui.tool_call_id"] for event in unblocked  # type: ignore
+    ]
+    assert any(event.attributes["agui.buffer.held_events"] > 0 for event in unblocked)  # type: ignore
+    assert all(event.attributes["agui.buffer.blocked_seconds"] >= 0 for event in unblocked)  # type: ignore
+
+
+@pytest.mark.parametrize("router", ROUTERS)
+def test_runs_left_out_of_the_sample_create_no_spans(router: str):
+    spans, text = run_traced(ROUTERS[router], sample_ratio=0)
+
+    assert not spans
+    assert '"type":"RUN_FINISHED"' in text
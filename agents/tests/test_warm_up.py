@@ -0,0 +1,69 @@
+"""Initialization of the app's Agent, eager or lazy in the background, gating /ready."""
+
+import time
+from typing import List
+
+import pytest
+from agno.agent import Agent
+from starlette.testclient import TestClient
+
+import lib.app.base
+from lib.app.agui.app import AGUIApp
+
+
+class FlakyAgent(Agent):
+    """An Agent whose first initializations fail, initializing nothing afterwards."""
+
+    def __init__(self, failures: int):
+        super().__init__(name="Stock Price Agent")
+        self.failures = failures
+        self.initializations = 0
+
+    def initialize_agent(self) -> None:
+        self.initializations += 1
+        if self.initializations <= self.failures:
+            raise ConnectionError("Storage unavailable")
+
+
+@pytest.fixture
+def logs(monkeypatch: pytest.MonkeyPatch) -> List[str]:
+    logs: List[str] = []
+    monkeypatch.setattr(lib.app.base, "log_info", logs.append)
+    monkeypatch.setattr(lib.app.base, "log_error", logs.append)
+    return logs
+
+
+def wait_until_ready(client: TestClient, timeout: float = 5) -> None:
+    deadline = time.monotonic() + timeout
+    while client.get("/ready").status_code != 200:
+        assert time.monotonic() < deadline, "The app never got ready"
+        time.sleep(0.01)
+
+
+def test_failed_lazy_initializations_are_retried(monkeypatch: pytest.MonkeyPatch, logs: List[str]):
+    monkeypatch.setattr(AGUIApp, "warm_up_retry_delay", 0.01)
+    agent = FlakyAgent(failures=3)
+    app = AGUIApp(agent=agent, lazy_initialization=True, monitoring=False)
+
+    with TestClient(app.get_app()) as client:
+        wait_until_ready(client)
+
+    assert agent.initializations == 4
+    errors = [log for log in logs if log.startswith("Could not initialize the app")]
+    # The delay doubles on each failure
+    assert errors == [
+        f"Could not initialize the app, retrying in {delay:g}s: Storage unavailable" for delay in (0.01, 0.02, 0.04)
+    ]
+    assert logs[-1].startswith("Startup phases, ready after")
+
+
+def test_eagerly_initialized_apps_report_their_startup_once_serving(logs: List[str]):
+    app = AGUIApp(agent=FlakyAgent(failures=0), monitoring=False)
+    assert app.ready
+
+    api_app = app.get_app()
+    assert not logs
+    with TestClient(api_app) as client:
+        assert client.get("/ready").status_code == 200
+
+    assert len(logs) == 1 and logs[0].startswith("Startup phases, ready after")
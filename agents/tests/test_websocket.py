@@ -0,0 +1,211 @@
+"""Runs of a thread over a WebSocket connection, served by serve_agui_websocket."""
+
+import asyncio
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import pytest
+from ag_ui.core import (
+    BaseEvent,
+    EventType,
+    RunAgentInput,
+    RunFinishedEvent,
+    RunStartedEvent,
+    TextMessageContentEvent,
+    TextMessageEndEvent,
+    TextMessageStartEvent,
+    ToolCallArgsEvent,
+    ToolCallEndEvent,
+    ToolCallResultEvent,
+    ToolCallStartEvent,
+)
+from fastapi import FastAPI, WebSocket
+from starlette.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+from lib.app.agui.tracing import RunTrace
+from lib.app.agui.websocket import REPLACED_CLOSE_CODE, AGUIWebSocketSessions, serve_agui_websocket
+
+USER_MESSAGE = {"id": "user_1", "role": "user", "content": "How is AAPL doing?"}
+FOLLOW_UP = {"id": "user_2", "role": "user", "content": "And MSFT?"}
+
+
+class Runs:
+    """Starts the runs of the WebSocket, recording their inputs.
+
+    Runs whose id starts with "slow" never end on their own, the others answer with a text message and a tool call.
+    """
+
+    def __init__(self):
+        self.inputs: List[RunAgentInput] = []
+        self.closed: List[str] = []
+
+    def __call__(self, run_input: RunAgentInput, run_trace: Optional[RunTrace] = None) -> AsyncIterator[BaseEvent]:
+        self.inputs.append(run_input)
+        return self.stream(run_input)
+
+    async def stream(self, run_input: RunAgentInput) -> AsyncIterator[BaseEvent]:
+        thread_id, run_id = run_input.thread_id, run_input.run_id
+        try:
+            yield RunStartedEvent(type=EventType.RUN_STARTED, thread_id=thread_id, run_id=run_id)
+            if run_id.startswith("slow"):
+                await asyncio.Event().wait()
+            yield TextMessageStartEvent(type=EventType.TEXT_MESSAGE_START, message_id=f"{run_id}_answer")
+            yield TextMessageContentEvent(
+                type=EventType.TEXT_MESSAGE_CONTENT, message_id=f"{run_id}_answer", delta="AAPL is at "
+            )
+            yield ToolCallStartEvent(
+                type=EventType.TOOL_CALL_START,
+                tool_call_id=f"{run_id}_call",
+                tool_call_name="get_current_stock_price",
+                parent_message_id=f"{run_id}_answer",
+            )
+            yield ToolCallArgsEvent(type=EventType.TOOL_CALL_ARGS, tool_call_id=f"{run_id}_call", delta='{"symbol":')
+            yield ToolCallArgsEvent(type=EventType.TOOL_CALL_ARGS, tool_call_id=f"{run_id}_call", delta='"AAPL"}')
+            yield ToolCallEndEvent(type=EventType.TOOL_CALL_END, tool_call_id=f"{run_id}_call")
+            yield ToolCallResultEvent(
+                type=EventType.TOOL_CALL_RESULT,
+                message_id=f"{run_id}_result",
+                tool_call_id=f"{run_id}_call",
+                content="210.5",
+                role="tool",
+            )
+            yield TextMessageContentEvent(
+                type=EventType.TEXT_MESSAGE_CONTENT, message_id=f"{run_id}_answer", delta="210.5"
+            )
+            yield TextMessageEndEvent(type=EventType.TEXT_MESSAGE_END, message_id=f"{run_id}_answer")
+            yield RunFinishedEvent(type=EventType.RUN_FINISHED, thread_id=thread_id, run_id=run_id)
+        finally:
+            self.closed.append(run_id)
+
+
+@pytest.fixture
+def runs() -> Runs:
+    return Runs()
+
+
+@pytest.fixture
+def sessions() -> AGUIWebSocketSessions:
+    return AGUIWebSocketSessions()
+
+
+@pytest.fixture
+def client(runs: Runs, sessions: AGUIWebSocketSessions):
+    app = FastAPI()
+
+    @app.websocket("/agui/ws")
+    async def agui_websocket(websocket: WebSocket):
+        await serve_agui_websocket(websocket, sessions, runs)
+
+    # A single event loop for every connection, like the server's
+    with TestClient(app) as client:
+        yield client
+
+
+def run_message(run_id: str, messages: List[Dict[str, Any]], thread_id: Optional[str] = None, **fields: Any):
+    message = {"type": "run", "runId": run_id, "messages": messages, **fields}
+    if thread_id is not None:
+        message["threadId"] = thread_id
+    return message
+
+
+def receive_until(websocket, event_type: str) -> List[Dict[str, Any]]:
+    messages = []
+    while not messages or messages[-1]["type"] != event_type:
+        messages.append(websocket.receive_json())
+    return messages
+
+
+def test_later_runs_reuse_the_recorded_thread(client: TestClient, runs: Runs):
+    with client.websocket_connect("/agui/ws") as websocket:
+        websocket.send_json(
+            run_message(
+                "run_1", [USER_MESSAGE], "thread_1", state={"symbols": ["AAPL"]}, forwardedProps={"debug": True}
+            )
+        )
+        first = receive_until(websocket, "RUN_FINISHED")
+        # The second run only carries its new message
+        websocket.send_json(run_message("run_2", [FOLLOW_UP]))
+        second = receive_until(websocket, "RUN_FINISHED")
+
+    assert first[0] == {"type": "RUN_STARTED", "threadId": "thread_1", "runId": "run_1"}
+    assert second[0] == {"type": "RUN_STARTED", "threadId": "thread_1", "runId": "run_2"}
+
+    first_input, second_input = runs.inputs
+    assert [message.id for message in first_input.messages] == ["user_1"]
+    # The answer and tool result of the first run were recorded from its events
+    assert [message.model_dump(by_alias=True, exclude_none=True) for message in second_input.messages] == [
+        USER_MESSAGE,
+        {
+            "id": "run_1_answer",
+            "role": "assistant",
+            "content": "AAPL is at 210.5",
+            "toolCalls": [
+                {
+                    "id": "run_1_call",
+                    "type": "function",
+                    "function": {"name": "get_current_stock_price", "arguments": '{"symbol":"AAPL"}'},
+                }
+            ],
+        },
+        {"id": "run_1_result", "role": "tool", "content": "210.5", "toolCallId": "run_1_call"},
+        FOLLOW_UP,
+    ]
+    # The omitted fields reuse the previous ones
+    assert second_input.state == {"symbols": ["AAPL"]}
+    assert second_input.forwarded_props == {"debug": True}
+
+
+def test_cancelled_runs_end_with_a_cancelled_error(client: TestClient, runs: Runs):
+    with client.websocket_connect("/agui/ws") as websocket:
+        websocket.send_json(run_message("slow_1", [USER_MESSAGE], "thread_1"))
+        assert websocket.receive_json()["type"] == "RUN_STARTED"
+
+        websocket.send_json({"type": "cancel"})
+        assert websocket.receive_json() == {"type": "RUN_ERROR", "message": "Run cancelled", "code": "CANCELLED"}
+        assert runs.closed == ["slow_1"]
+
+        websocket.send_json({"type": "cancel"})
+        assert websocket.receive_json() == {"type": "error", "code": "NO_RUN", "message": "No run in progress"}
+
+        # The connection goes on with the next run
+        websocket.send_json(run_message("run_2", [FOLLOW_UP]))
+        assert receive_until(websocket, "RUN_FINISHED")[0]["runId"] == "run_2"
+
+
+def test_runs_are_rejected_while_one_is_in_progress_or_for_another_thread(client: TestClient, runs: Runs):
+    with client.websocket_connect("/agui/ws") as websocket:
+        websocket.send_json(run_message("slow_1", [USER_MESSAGE], "thread_1"))
+        assert websocket.receive_json()["type"] == "RUN_STARTED"
+
+        websocket.send_json(run_message("run_2", [FOLLOW_UP]))
+        assert websocket.receive_json()["code"] == "RUN_IN_PROGRESS"
+        websocket.send_json(run_message("run_3", [FOLLOW_UP], "thread_2"))
+        assert websocket.receive_json() == {
+            "type": "error",
+            "code": "THREAD_MISMATCH",
+            "message": "The connection is to thread thread_1",
+        }
+        assert [run_input.run_id for run_input in runs.inputs] == ["slow_1"]
+
+        websocket.send_json({"type": "cancel"})
+        assert websocket.receive_json()["code"] == "CANCELLED"
+
+
+def test_a_newer_connection_replaces_the_older_one(client: TestClient, runs: Runs, sessions: AGUIWebSocketSessions):
+    with client.websocket_connect("/agui/ws") as first:
+        first.send_json(run_message("slow_1", [USER_MESSAGE], "thread_1"))
+        assert first.receive_json()["type"] == "RUN_STARTED"
+
+        with client.websocket_connect("/agui/ws") as second:
+            second.send_json(run_message("run_2", [USER_MESSAGE], "thread_1"))
+            assert receive_until(second, "RUN_FINISHED")[0]["runId"] == "run_2"
+
+            # The run of the older connection was cancelled before it was closed
+            assert first.receive_json()["code"] == "CANCELLED"
+            with pytest.raises(WebSocketDisconnect) as disconnect:
+                first.receive_json()
+            assert disconnect.value.code == REPLACED_CLOSE_CODE
+            assert runs.closed[0] == "slow_1"
+            assert len(sessions) == 1
+
+    assert not sessions.sessions
@@ -0,0 +1,237 @@
+"""Routing of the requests and WebSockets of the dispatcher to the worker processes."""
+
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Set, Tuple
+
+import httpx
+import pytest
+import uvicorn
+from fastapi import FastAPI, Request, WebSocket
+from fastapi.responses import JSONResponse, PlainTextResponse
+from starlette.testclient import TestClient
+
+from lib.app.workers import AffinityDispatcher, merge_metrics, peek_multipart_field
+
+
+def worker_app(worker: int) -> FastAPI:
+    """App of a worker, owning the runs it started."""
+    runs: Set[str] = set()
+    app = FastAPI()
+
+    @app.post("/agui")
+    async def run(request: Request) -> Dict[str, object]:
+        payload = await request.json()
+        runs.add(payload["runId"])
+        return {"worker": worker, "threadId": payload["threadId"]}
+
+    @app.post("/agui/multipart")
+    async def run_multipart(request: Request) -> Dict[str, object]:
+        form = await request.form()
+        payload = json.loads(form["run_input"])  # type: ignore
+        runs.add(payload["runId"])
+        files = [await upload.read() for upload in form.getlist("files")]  # type: ignore
+        return {"worker": worker, "threadId": payload["threadId"], "size": sum(len(file) for file in files)}
+
+    @app.get("/agui/runs/{run_id}")
+    async def get_run(run_id: str):
+        if run_id not in runs:
+            return JSONResponse(status_code=404, content={"detail": "Run not found"})
+        return {"worker": worker}
+
+    @app.post("/upload")
+    async def upload(request: Request) -> Dict[str, object]:
+        size = 0
+        async for chunk in request.stream():
+            size += len(chunk)
+        return {"size": size, "content_length": request.headers.get("content-length")}
+
+    @app.get("/status")
+    async def status() -> Dict[str, object]:
+        return {"status": "available", "runs": len(runs)}
+
+    @app.get("/metrics")
+    async def metrics() -> PlainTextResponse:
+        exposition = f'# HELP agui_runs Runs\n# TYPE agui_runs counter\nagui_runs{{mode="sse"}} {len(runs)}\n'
+        return PlainTextResponse(exposition)
+
+    @app.websocket("/agui/ws")
+    async def websocket(websocket: WebSocket) -> None:
+        await websocket.accept()
+        while True:
+            message = await websocket.receive_json()
+            if message.get("type") == "close":
+                await websocket.close(code=4000, reason="Replaced")
+                return
+            await websocket.send_json({"worker": worker, "threadId": message.get("threadId")})
+
+    return app
+
+
+@pytest.fixture(scope="module")
+def worker_sockets() -> Iterator[List[str]]:
+    socket_dir = tempfile.mkdtemp(prefix="agui-test-workers-")
+    servers = []
+    sockets = [os.path.join(socket_dir, f"worker-{index}.sock") for index in range(3)]
+    for index, worker_socket in enumerate(sockets):
+        server = uvicorn.Server(uvicorn.Config(worker_app(index), uds=worker_socket, log_level="warning"))
+        threading.Thread(target=server.run, daemon=True).start()
+        servers.append(server)
+    while not all(server.started for server in servers):
+        time.sleep(0.05)
+    yield sockets
+    for server in servers:
+        server.should_exit = True
+
+
+def run_body(thread_id: str, run_id: str) -> Dict[str, object]:
+    return {"threadId": thread_id, "runId": run_id, "messages": []}
+
+
+def test_runs_of_a_thread_reach_the_same_worker(worker_sockets):
+    dispatcher = AffinityDispatcher(worker_sockets)
+    with TestClient(dispatcher) as client:
+        for thread in range(10):
+            thread_id = f"thread_{thread}"
+            responses = [client.post("/agui", json=run_body(thread_id, f"run_{thread}_{run}")) for run in range(3)]
+            workers = {response.json()["worker"] for response in responses}
+            assert workers == {dispatcher.get_thread_worker(thread_id)}
+
+
+def test_run_requests_reach_the_owner(worker_sockets):
+    dispatcher = AffinityDispatcher(worker_sockets)
+    with TestClient(dispatcher) as client:
+        owner = client.post("/agui", json=run_body("thread_owner", "run_owner")).json()["worker"]
+        assert client.get("/agui/runs/run_owner").json() == {"worker": owner}
+
+        # Unknown to the dispatcher, e.g. started before a restart, the workers are tried in turn
+        dispatcher.run_workers.clear()
+        assert client.get("/agui/runs/run_owner").json() == {"worker": owner}
+        assert client.get("/agui/runs/run_missing").status_code == 404
+
+
+def test_multipart_runs_reach_the_worker_of_their_thread(worker_sockets):
+    dispatcher = AffinityDispatcher(worker_sockets)
+    with TestClient(dispatcher) as client:
+        for thread in range(10):
+            thread_id = f"thread_{thread}"
+            worker = client.post("/agui", json=run_body(thread_id, f"run_{thread}_0")).json()["worker"]
+
+            run_input = json.dumps(run_body(thread_id, f"run_{thread}_1"))
+            files = {"files": ("clip.mp4", b"x" * 100_000, "video/mp4")}
+            response = client.post("/agui/multipart", data={"run_input": run_input}, files=files)
+            assert response.json() == {"worker": worker, "threadId": thread_id, "size": 100_000}
+            assert client.get(f"/agui/runs/run_{thread}_1").json() == {"worker": worker}
+
+            # Named by the query parameter, the body is streamed through without reading the form
+            response = client.post(f"/agui/multipart?thread_id={thread_id}", data={"run_input": run_input}, files=files)
+            assert response.json()["worker"] == worker
+
+
+def test_multipart_fields_are_read_up_to_a_limit():
+    async def peek(files, max_bytes: int) -> Tuple[Optional[bytes], bytes]:
+        request = httpx.Request("POST", "http://worker/agui/multipart", files=files)
+        body = request.read()
+
+        async def chunks() -> AsyncIterator[bytes]:
+            for start in range(0, len(body), 1024):
+                yield body[start : start + 1024]
+
+        stream = chunks()
+        value, read = await peek_multipart_field(stream, request.headers["content-type"], "run_input", max_bytes)
+        # The chunks read and the rest of the stream make up the body
+        assert b"".join(read) + b"".join([chunk async for chunk in stream]) == body
+        return value, b"".join(read)
+
+    run_input = json.dumps(run_body("thread_1", "run_1")).encode()
+    video = ("clip.mp4", b"x" * 10_000, "video/mp4")
+
+    value, read = asyncio.run(peek([("run_input", (None, run_input)), ("files", video)], 4096))
+    assert value == run_input
+    assert len(read) == 1024
+
+    # The files come first, the run_input isn't within the bytes read
+    value, read = asyncio.run(peek([("files", video), ("run_input", (None, run_input))], 4096))
+    assert value is None
+    assert len(read) == 4096
+
+
+def test_request_bodies_are_streamed_through(worker_sockets):
+    dispatcher = AffinityDispatcher(worker_sockets)
+
+    def chunks() -> Iterator[bytes]:
+        for _ in range(64):
+            yield b"x" * 1024
+
+    with TestClient(dispatcher) as client:
+        assert client.post("/upload", content=chunks()).json() == {"size": 65536, "content_length": None}
+        assert client.post("/upload", content=b"x" * 1000).json() == {"size": 1000, "content_length": "1000"}
+
+
+def test_owned_requests_fall_back_to_404_or_503():
+    def not_found(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(404, json={"detail": "Run not found"})
+
+    def unavailable(request: httpx.Request) -> httpx.Response:
+        raise httpx.ConnectError("Connection refused", request=request)
+
+    def dispatcher_of(*handlers) -> AffinityDispatcher:
+        dispatcher = AffinityDispatcher([f"worker-{index}.sock" for index in range(len(handlers))])
+        dispatcher.clients = [
+            httpx.AsyncClient(transport=httpx.MockTransport(handler), base_url="http://worker") for handler in handlers
+        ]
+        return dispatcher
+
+    # The last worker tried is unavailable after the others answered 404
+    with TestClient(dispatcher_of(not_found, not_found, unavailable)) as client:
+        response = client.get("/agui/runs/run_1")
+        assert response.status_code == 404
+    with TestClient(dispatcher_of(unavailable, unavailable)) as client:
+        assert client.get("/agui/runs/run_1").status_code == 503
+
+
+def test_status_and_metrics_cover_every_worker(worker_sockets):
+    dispatcher = AffinityDispatcher(worker_sockets)
+    with TestClient(dispatcher) as client:
+        status = client.get("/status").json()
+        assert status["status"] == "available"
+        assert len(status["workers"]) == len(worker_sockets)
+
+        metrics = client.get("/metrics").text
+        assert metrics.count("# TYPE agui_runs counter") == 1
+        for worker in range(len(worker_sockets)):
+            assert f'agui_runs{{worker="{worker}",mode="sse"}}' in metrics
+
+
+def test_websockets_are_relayed_to_the_thread_worker(worker_sockets):
+    dispatcher = AffinityDispatcher(worker_sockets)
+    with TestClient(dispatcher) as client:
+        with client.websocket_connect("/agui/ws") as websocket:
+            websocket.send_json({"type": "run", "threadId": "thread_ws"})
+            worker = dispatcher.get_thread_worker("thread_ws")
+            assert websocket.receive_json() == {"worker": worker, "threadId": "thread_ws"}
+            websocket.send_json({"type": "run"})
+            assert websocket.receive_json()["worker"] == worker
+
+            websocket.send_json({"type": "close"})
+            message = websocket.receive()
+            assert (message["type"], message["code"], message["reason"]) == ("websocket.close", 4000, "Replaced")
+
+
+def test_merge_metrics():
+    worker_0 = "# HELP agui_runs Runs\n# TYPE agui_runs counter\nagui_runs 1\n# TYPE agui_open gauge\nagui_open 2\n"
+    worker_1 = '# HELP agui_runs Runs\n# TYPE agui_runs counter\nagui_runs 3\nagui_runs_total{mode="ws"} 4\n'
+
+    assert merge_metrics([worker_0, None, worker_1]) == (
+        "# HELP agui_runs Runs\n"
+        "# TYPE agui_runs counter\n"
+        'agui_runs{worker="0"} 1\n'
+        'agui_runs{worker="2"} 3\n'
+        'agui_runs_total{worker="2",mode="ws"} 4\n'
+        "# TYPE agui_open gauge\n"
+        'agui_open{worker="0"} 2\n'
+    )